@@ -5,6 +5,5 @@ class EimsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'eims'
 
-def ready(self):
-    import eims.signals  # noqa: F401
-
+    def ready(self):
+        import eims.signals  # noqa: F401
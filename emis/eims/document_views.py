@@ -4,8 +4,9 @@ from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_http_methods
 from django.conf import settings
 from .models import Candidate
+from .utilis.file_responses import serve_file
+from .utilis.media_store import blob_hash
 import os
-import mimetypes
 
 @login_required
 @require_http_methods(["GET"])
@@ -32,28 +33,9 @@ def serve_candidate_document(request, candidate_id, document_type):
     # Get the file path
     file_path = document_field.path
     
-    # Check if file exists on filesystem
-    if not os.path.exists(file_path):
-        raise Http404("File not found on server")
+    # Stored files are named by content hash; download under a readable name
+    ext = os.path.splitext(file_path)[1]
+    filename = f"{(candidate.reg_number or str(candidate.id)).replace('/', '-')}_{document_type}{ext}"
     
-    # Determine content type
-    content_type, _ = mimetypes.guess_type(file_path)
-    if not content_type:
-        content_type = 'application/octet-stream'
-    
-    # Read and serve the file
-    try:
-        with open(file_path, 'rb') as f:
-            file_data = f.read()
-        
-        response = HttpResponse(file_data, content_type=content_type)
-        
-        # Set appropriate headers
-        filename = os.path.basename(file_path)
-        response['Content-Disposition'] = f'inline; filename="{filename}"'
-        response['Content-Length'] = len(file_data)
-        
-        return response
-        
-    except IOError:
-        raise Http404("Error reading file")
+    # Streamed (or handed to the web server), with Range and conditional GET support
+    return serve_file(request, file_path, filename, etag=blob_hash(document_field.name))
@@ -3,11 +3,11 @@ from django.http import HttpResponse
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
 from django.shortcuts import get_object_or_404
-import openpyxl
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-from openpyxl.utils import get_column_letter
 from datetime import datetime
 from .models import Candidate, Result, CandidateLevel, CandidateModule, CandidatePaper
+from .utilis.file_responses import workbook_response
+from .utilis.xlsx_export import streaming_workbook, SheetWriter, EXPORT_CHUNK_SIZE
 import io
 
 @login_required
@@ -25,17 +25,12 @@ def export_candidates(request):
     candidates = Candidate.objects.filter(
         id__in=candidate_ids
     ).select_related(
-        'assessment_center', 'occupation', 'district', 'village', 'created_by', 'updated_by'
+        'assessment_center', 'assessment_series', 'occupation', 'district', 'village', 'created_by', 'updated_by'
     ).prefetch_related(
         'nature_of_disability', 'candidatelevel_set__level', 'candidatemodule_set__module',
         'candidatepaper_set__paper', 'result_set'
     ).order_by('reg_number')
     
-    # Create workbook and worksheet
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Candidates Export"
-    
     # Define styles
     header_font = Font(bold=True, color="FFFFFF")
     header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
@@ -80,16 +75,44 @@ def export_candidates(request):
         "Status", "Created Date", "Created By", "Updated Date", "Updated By"
     ]
     
-    # Write headers
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
-        cell.border = border
+    # Column widths are fixed up front so rows can be streamed straight to the sheet
+    widths = [
+        # Bio Data
+        24, 30, 14, 10, 14, 16, 16, 25, 25, 18,
+        # Address Information
+        18, 18, 30,
+        # Educational Background
+        18, 30, 18,
+        # Assessment Information
+        40, 35, 23, 12, 10, 16, 22, 14, 14,
+        # Disability Information
+        15, 25,
+        # Enrollment Information
+        20, 40, 40,
+        # Financial Information
+        14,
+        # Results Summary
+        13, 14, 20,
+        # System Information
+        10, 18, 16, 18, 16,
+    ]
+    
+    # Format specific columns
+    column_styles = {col: {'alignment': Alignment(horizontal="center")} for col in [3, 23, 25, 26, 33, 35, 37]}  # Date columns
+    column_styles.update({col: {'alignment': Alignment(horizontal="right")} for col in [34, 36]})  # Numeric columns
+    
+    wb = streaming_workbook()
+    sheet = SheetWriter(
+        wb, "Candidates Export", headers,
+        widths=widths,
+        header_style={'font': header_font, 'fill': header_fill, 'alignment': header_alignment, 'border': border},
+        cell_style={'border': border},
+        column_styles=column_styles,
+        freeze_header=True,
+    )
     
     # Write data for each candidate
-    for row, candidate in enumerate(candidates, 2):
+    for candidate in candidates.iterator(chunk_size=EXPORT_CHUNK_SIZE):
         # Get enrollment information
         enrolled_levels = list(candidate.candidatelevel_set.all())
         enrolled_modules = list(candidate.candidatemodule_set.all())
@@ -163,47 +186,10 @@ def export_candidates(request):
             candidate.updated_by.username if candidate.updated_by else ""
         ]
         
-        # Write data to worksheet
-        for col, value in enumerate(data, 1):
-            cell = ws.cell(row=row, column=col, value=value)
-            cell.border = border
-            
-            # Format specific columns
-            if col in [3, 23, 25, 26, 33, 35, 37]:  # Date columns
-                cell.alignment = Alignment(horizontal="center")
-            elif col in [34, 36]:  # Numeric columns
-                cell.alignment = Alignment(horizontal="right")
-    
-    # Auto-adjust column widths
-    for column in ws.columns:
-        max_length = 0
-        column_letter = get_column_letter(column[0].column)
-        
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        
-        # Set minimum and maximum widths
-        adjusted_width = min(max(max_length + 2, 10), 50)
-        ws.column_dimensions[column_letter].width = adjusted_width
-    
-    # Freeze the header row
-    ws.freeze_panes = "A2"
-    
-    # Create response
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
+        sheet.append(data)
     
     # Generate filename with timestamp
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     filename = f"EMIS_Candidates_Export_{timestamp}.xlsx"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    # Save workbook to response
-    wb.save(response)
     
-    return response
+    return workbook_response(wb, filename)
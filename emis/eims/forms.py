@@ -12,6 +12,7 @@ from datetime import datetime
 
 from django_countries.fields import CountryField
 from django_countries.widgets import CountrySelectWidget
+from .utilis.import_lookups import PreloadedModelChoiceField, PreloadedModelMultipleChoiceField
 
 CURRENT_YEAR = datetime.now().year
 YEAR_CHOICES = [(year, year) for year in range(CURRENT_YEAR, CURRENT_YEAR - 30, -1)]
@@ -476,7 +477,7 @@ class CandidateForm(forms.ModelForm):
         label="Disability",
         widget=forms.CheckboxInput(attrs={'class': 'ml-2'})
     )
-    nature_of_disability = forms.ModelMultipleChoiceField(
+    nature_of_disability = PreloadedModelMultipleChoiceField(
         queryset=NatureOfDisability.objects.all(),
         required=False,
         widget=forms.CheckboxSelectMultiple(attrs={'class': 'ml-2'}),
@@ -494,8 +495,11 @@ class CandidateForm(forms.ModelForm):
         help_text="Provide additional details about the disability and any assistance needed during exams"
     )
 
-    def __init__(self, *args, user=None, edit=False, **kwargs):
+    def __init__(self, *args, user=None, edit=False, lookups=None, **kwargs):
         super().__init__(*args, **kwargs)
+        # Imports pass their ImportLookups (utilis/import_lookups.py) so rows are validated
+        # without per-row queries
+        self.preloaded_fields = set()
         # Accept DD/MM/YYYY for all date fields
         for field in ['date_of_birth', 'start_date', 'finish_date', 'assessment_date']:
             if field in self.fields:
@@ -602,7 +606,7 @@ class CandidateForm(forms.ModelForm):
             # Formal: occupation category 'Formal'
             elif reg_cat_val == 'formal':
                 try:
-                    cat = OccupationCategory.objects.get(name__iexact='Formal')
+                    cat = lookups.occupation_category('Formal') if lookups else OccupationCategory.objects.get(name__iexact='Formal')
                     qs = Occupation.objects.filter(category=cat)
                     if user and user.groups.filter(name='CenterRep').exists():
                         qs = qs.filter(is_active=True)
@@ -612,10 +616,13 @@ class CandidateForm(forms.ModelForm):
             # Informal/Worker's PAS: occupation category 'Worker's PAS'
             elif reg_cat_val in ["worker's pas", 'workers pas', 'informal']:
                 from django.db.models import Q
-                cat = OccupationCategory.objects.filter(
-                    Q(name__iexact="Worker's PAS") | Q(name__iexact="Worker PAS")
-                ).first()
-                if not cat:
+                if lookups:
+                    cat = lookups.workers_pas_category()
+                else:
+                    cat = OccupationCategory.objects.filter(
+                        Q(name__iexact="Worker's PAS") | Q(name__iexact="Worker PAS")
+                    ).first()
+                if not cat and not lookups:
                     # Try regex for even more flexibility
                     cat = OccupationCategory.objects.filter(name__iregex=r"worker('?s)? pas").first()
                 if cat:
@@ -695,7 +702,7 @@ class CandidateForm(forms.ModelForm):
             if 'assessment_center' in self.data:  # If form is submitted with data
                 try:
                     center_id = int(self.data.get('assessment_center'))
-                    center = AssessmentCenter.objects.get(pk=center_id)
+                    center = lookups.center_by_pk(center_id) if lookups else AssessmentCenter.objects.get(pk=center_id)
                     if center.has_branches:
                         self.fields['assessment_center_branch'].queryset = AssessmentCenterBranch.objects.filter(assessment_center_id=center_id).order_by('branch_code')
                         self.fields['assessment_center_branch'].help_text = "This center has branches. Select a specific branch or leave blank for main center."
@@ -721,6 +728,14 @@ class CandidateForm(forms.ModelForm):
                         self.fields['assessment_center_branch'].help_text = "This center does not have branches."
                 except (ValueError, TypeError, AssessmentCenter.DoesNotExist):
                     pass
+        if lookups is not None:
+            self.preloaded_fields = lookups.bind_form(self)
+
+    def _get_validation_exclusions(self):
+        exclude = super()._get_validation_exclusions()
+        # Foreign keys resolved from an import's preloaded choices are known to exist
+        return exclude | self.preloaded_fields
+
     class Meta:
         model = Candidate
         exclude = ['status', 'fees_balance', 'verification_status', 'verification_date', 'verified_by', 'decline_reason']
@@ -754,6 +769,13 @@ class CandidateForm(forms.ModelForm):
             # ...add others similarly
 
             }
+        # Resolved from an import's ImportLookups when the form is given one (see __init__)
+        field_classes = {
+            name: PreloadedModelChoiceField for name in (
+                'district', 'village', 'assessment_center', 'assessment_center_branch', 'assessment_series',
+                'occupation', 'created_by', 'updated_by', 'payment_cleared_by',
+            )
+        }
 
     def clean_full_name(self):
         """Format name to standard format: SURNAME Other Names (sentence case)"""
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from eims.models import Candidate
+from eims.utilis.enrollment_flags import refresh_enrollment_flags
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the enrollment flags on every candidate (enrolled level/module counts, "
+        "has_enrollment, is_billed) from CandidateLevel and CandidateModule. Run once after "
+        "the columns are added, and again after enrollments are written behind the ORM's back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Candidates per UPDATE (default: 5000)')
+
+    def handle(self, *args, **opts):
+        batch_size = opts['batch_size']
+        pks = list(Candidate.objects.order_by('pk').values_list('pk', flat=True))
+        updated = 0
+        for start in range(0, len(pks), batch_size):
+            with transaction.atomic():
+                updated += refresh_enrollment_flags(pks[start:start + batch_size])
+            self.stdout.write(f"  {min(start + batch_size, len(pks))}/{len(pks)} candidates")
+
+        counts = Candidate.objects.filter(has_enrollment=True).count(), Candidate.objects.filter(is_billed=True).count()
+        self.stdout.write(self.style.SUCCESS(
+            f"Updated {updated} candidate(s): {counts[0]} enrolled, {counts[1]} billed for an enrollment."
+        ))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from eims.models import Candidate
+from eims.utilis.photo_renditions import PHOTO_FIELDS, build_photo_renditions, stale_rendition_fields
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the thumbnail/album/print renditions of candidate photos that have none, or "
+        "whose renditions belong to another file. Candidate.save() only renders photos it "
+        "uploads, so run this once for photos stored before renditions existed and after "
+        "photos are written behind save()'s back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only count the photos that need renditions')
+
+    def handle(self, *args, **opts):
+        with_photo = Q()
+        for field in PHOTO_FIELDS:
+            with_photo |= Q(**{f'{field}__gt': ''})
+        candidates = Candidate.objects.filter(with_photo).only('pk', 'photo_renditions', *PHOTO_FIELDS).order_by('pk')
+
+        built = failed = pending = 0
+        for candidate in candidates.iterator(chunk_size=500):
+            for field in stale_rendition_fields(candidate):
+                pending += 1
+                if opts['dry_run']:
+                    continue
+                try:
+                    if build_photo_renditions(candidate, field):
+                        built += 1
+                    else:
+                        failed += 1
+                        self.stderr.write(f"  {candidate.pk}: {getattr(candidate, field).name} not found")
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"  {candidate.pk}: {getattr(candidate, field).name}: {e}")
+
+        if opts['dry_run']:
+            self.stdout.write(f"{pending} photo(s) need renditions.")
+            return
+        self.stdout.write(self.style.SUCCESS(f"Built renditions for {built} photo(s); {failed} failed."))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from eims.models import Candidate
+from eims.utilis.registration_category import backfill_registration_category_codes
+
+
+class Command(BaseCommand):
+    help = (
+        "Set every candidate's registration_category_code from its registration_category, "
+        "mapping each spelling (Informal, Worker's PAS, workers pas, ...) to one code. Run once "
+        "after deploying the column and again after categories were changed outside Candidate.save()."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only-missing', action='store_true', help='Only fill rows without a code')
+
+    def handle(self, *args, **opts):
+        updated = backfill_registration_category_codes(only_missing=opts['only_missing'])
+        self.stdout.write(self.style.SUCCESS(f"Updated the registration category code of {updated} candidate(s)."))
+        unknown = Candidate.objects.filter(registration_category_code='').exclude(registration_category='')
+        for spelling in unknown.order_by().values_list('registration_category', flat=True).distinct():
+            self.stdout.write(self.style.WARNING(f"Unrecognised registration category: {spelling!r}"))
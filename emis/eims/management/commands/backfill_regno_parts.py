@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from eims.utilis.regno_sequence import backfill_reg_number_parts
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the indexed reg-number component columns (center code, nationality, year, intake, "
+        "occupation code, category, serial) from each candidate's reg number. Run once after "
+        "deploying the columns and again after reg numbers were changed outside Candidate.save()."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only-missing', action='store_true',
+                            help='Only fill rows whose components have never been set')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **opts):
+        updated = backfill_reg_number_parts(only_missing=opts['only_missing'], batch_size=opts['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Updated reg-number components for {updated} candidate(s)."))
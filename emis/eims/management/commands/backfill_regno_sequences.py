@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from eims.utilis.regno_sequence import backfill_sequences
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed the registration-number sequences from the serials in existing reg numbers. "
+        "Run once after deploying the sequence table (groups are otherwise seeded on first use) "
+        "and again after reg numbers have been edited outside the application."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report what would change without changing anything')
+
+    def handle(self, *args, **opts):
+        stats = backfill_sequences(dry_run=opts['dry_run'])
+        prefix = '[dry run] ' if opts['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{stats['groups']} group(s): {stats['created']} sequence(s) created, "
+            f"{stats['advanced']} advanced, {stats['unchanged']} already up to date."
+        ))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from eims.utilis.query_plans import check_query_plans, hot_query_names
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN the hot candidate, fee, marksheet and result queries against a synthetic "
+        "dataset (created in a transaction and rolled back) and fail if any plan reads a whole "
+        "candidate, result or enrollment table instead of using an index."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--candidates', type=int, default=2000, help='Synthetic candidates (default: 2000)')
+        parser.add_argument('--centers', type=int, default=20, help='Synthetic assessment centers (default: 20)')
+        parser.add_argument('--query', action='append', dest='queries', choices=hot_query_names(),
+                            help='Only check this query (repeatable)')
+        parser.add_argument('--show-plans', action='store_true', help='Print every plan, not only failing ones')
+
+    def handle(self, *args, **opts):
+        report = check_query_plans(candidates=opts['candidates'], centers=opts['centers'], names=opts['queries'])
+        failed = [entry for entry in report if entry['full_scans']]
+        for entry in report:
+            if entry['skipped']:
+                self.stdout.write(f"skipped    {entry['name']} (not checked on this database backend)")
+                continue
+            if entry['full_scans']:
+                self.stdout.write(self.style.ERROR(f"FULL SCAN  {entry['name']}: {', '.join(entry['full_scans'])}"))
+            else:
+                self.stdout.write(f"ok         {entry['name']}")
+            if entry['full_scans'] or opts['show_plans']:
+                self.stdout.write(f"    {entry['sql']}")
+                for line in entry['plan']:
+                    self.stdout.write(f"    | {line}")
+
+        if failed:
+            raise CommandError(f"{len(failed)} of {len(report)} queries read a whole table.")
+        checked = sum(not entry['skipped'] for entry in report)
+        self.stdout.write(self.style.SUCCESS(f"All {checked} checked queries use an index."))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+
+from eims.utilis.background_jobs import start_job
+from eims.utilis.photo_orientation import repair_photo_orientation
+
+
+class Command(BaseCommand):
+    help = (
+        "Repair candidate photos whose EXIF orientation leaves them rotated or mirrored. "
+        "Photos are checked in parallel worker processes; photos unchanged since their "
+        "last check are skipped unless --force is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report photos that need fixing without changing them')
+        parser.add_argument('--force', action='store_true', help='Re-check photos already checked and unchanged')
+        parser.add_argument('--workers', type=int, help='Worker processes (default: PHOTO_WORKERS or CPU count)')
+        parser.add_argument('--candidate', type=int, action='append', dest='candidates',
+                            help='Only check this candidate ID (repeatable)')
+
+    def handle(self, *args, **opts):
+        job = start_job(
+            'photo_orientation', repair_photo_orientation,
+            eager=True,
+            candidate_ids=opts['candidates'],
+            dry_run=opts['dry_run'],
+            force=opts['force'],
+            workers=opts['workers'],
+        )
+        if job.status == 'failed':
+            self.stderr.write(self.style.ERROR(f"Job {job.pk} failed: {job.error}"))
+            return
+
+        for result in job.results:
+            if result.get('success'):
+                verb = 'Fixed' if result.get('fixed') else 'Would fix'
+                self.stdout.write(f"{verb} candidate {result['id']} (orientation {result['orientation']})")
+            else:
+                self.stderr.write(f"Candidate {result['id']}: {result.get('error')}")
+
+        s = job.summary
+        fixed = f"would fix {s['would_fix']}" if s['dry_run'] else f"fixed {s['fixed']}"
+        rate = f", {s['photos_per_second']} photos/s" if s.get('photos_per_second') else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"Job {job.pk}: {job.total} photos, checked {s['checked']}, {fixed}, "
+            f"{s['unchanged_since_last_run']} unchanged since last run, {job.failed} failed "
+            f"in {s['elapsed_seconds']}s with {s['workers']} worker(s){rate}"
+        ))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from eims.utilis.media_store import adopt_legacy_files, collect_garbage
+
+
+class Command(BaseCommand):
+    help = (
+        "Garbage-collect the content-addressed media store: recount blob references from "
+        "the database and delete blobs nothing references. Use --adopt-legacy first to "
+        "move photos and documents uploaded before the store existed into it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report what would change without changing anything')
+        parser.add_argument('--grace-hours', type=float, default=24,
+                            help='Keep unreferenced blobs younger than this (default: 24)')
+        parser.add_argument('--adopt-legacy', action='store_true',
+                            help='Move files stored under their upload names into the store first')
+
+    def handle(self, *args, **opts):
+        dry_run = opts['dry_run']
+        prefix = '[dry run] ' if dry_run else ''
+
+        if opts['adopt_legacy']:
+            stats = adopt_legacy_files(dry_run=dry_run)
+            self.stdout.write(
+                f"{prefix}Adopted {stats['adopted']} file reference(s), removed {stats['files_removed']} "
+                f"legacy file(s), {stats['missing']} missing on disk."
+            )
+
+        stats = collect_garbage(grace_hours=opts['grace_hours'], dry_run=dry_run)
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{stats['blobs']} blob(s), {stats['referenced']} referenced, "
+            f"{stats['recounted']} recounted, {stats['deleted']} deleted "
+            f"({stats['bytes_freed'] / (1024 * 1024):.1f} MB freed)."
+        ))
+        if stats['missing']:
+            self.stderr.write(self.style.WARNING(f"{stats['missing']} referenced blob(s) are missing on disk."))
@@ -0,0 +1,71 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from eims.models import BackgroundJob
+from eims.utilis.housekeeping import TASKS, run_housekeeping
+
+
+class Command(BaseCommand):
+    help = (
+        "Run periodic housekeeping: purge stale candidate drafts and their uploads, remove "
+        "leftover temp photo and regno PNG files, clear expired sessions, prune old job "
+        "records and import files and fail jobs whose worker has gone. Runs each task when its interval has passed, until "
+        "stopped; --once runs the selected tasks a single time. Every run is recorded as a "
+        "'housekeeping' background job with the figures per task."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--task', action='append', dest='tasks', choices=sorted(TASKS),
+                            help='Only run this task (repeatable)')
+        parser.add_argument('--once', action='store_true', help='Run the selected tasks now and exit')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be removed without removing it')
+        parser.add_argument('--tick', type=int, default=60, help='Longest sleep between checks, in seconds (default: 60)')
+
+    def last_runs(self, names):
+        """Task name -> when it last ran, from the recorded housekeeping jobs"""
+        last = {}
+        jobs = BackgroundJob.objects.filter(kind='housekeeping', status='completed').exclude(summary__dry_run=True)
+        for job in jobs.order_by('-finished_at')[:100]:
+            for name in (job.summary or {}).get('tasks', {}):
+                last.setdefault(name, job.finished_at)
+            if all(name in last for name in names):
+                break
+        return last
+
+    def report(self, job):
+        for name, figures in job.summary.get('tasks', {}).items():
+            details = ', '.join(f"{k}={v}" for k, v in figures.items() if k not in ('task', 'success', 'error'))
+            if figures.get('success'):
+                self.stdout.write(f"[{timezone.now():%Y-%m-%d %H:%M:%S}] {name}: {details}")
+            else:
+                self.stderr.write(self.style.ERROR(f"{name} failed: {figures.get('error')}"))
+
+    def handle(self, *args, **opts):
+        names = opts['tasks'] or list(TASKS)
+        dry_run = opts['dry_run']
+
+        if opts['once']:
+            self.report(run_housekeeping(names, dry_run=dry_run))
+            return
+
+        last = self.last_runs(names)
+        self.stdout.write(f"Housekeeping started for: {', '.join(names)}")
+        try:
+            while True:
+                close_old_connections()
+                now = timezone.now()
+                due = [name for name in names
+                       if name not in last or (now - last[name]).total_seconds() >= TASKS[name][0]]
+                if due:
+                    job = run_housekeeping(due, dry_run=dry_run)
+                    self.report(job)
+                    for name in due:
+                        last[name] = job.finished_at
+                now = timezone.now()
+                wait = min(TASKS[name][0] - (now - last[name]).total_seconds() for name in names)
+                time.sleep(max(1, min(wait, opts['tick'])))
+        except KeyboardInterrupt:
+            self.stdout.write("Housekeeping stopped.")
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from eims.utilis.candidate_search import install_search_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Recreate the candidate name/reg-number search index: pg_trgm GIN indexes on "
+        "PostgreSQL, the FTS5 trigram table and its triggers on SQLite. migrate creates the "
+        "index when it is missing; run this if it was dropped or may have drifted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **opts):
+        if install_search_index(using=opts['database'], rebuild=True):
+            self.stdout.write(self.style.SUCCESS("Candidate search index rebuilt."))
+        else:
+            self.stderr.write(self.style.WARNING(
+                "No search index for this database; searches fall back to icontains."
+            ))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from eims.models import AssessmentSeries
+from eims.utilis.series_stats import rebuild_series_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the SeriesStatsCube used by the statistics pages and statistical reports.\n"
+        "Pages rebuild a series read after the candidates changed; run nightly to build it ahead of them.\n"
+        "Use --series to rebuild a single series."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--series",
+            type=int,
+            default=None,
+            help="Assessment series ID to rebuild (default: rebuild the whole cube).",
+        )
+
+    def handle(self, *args, **options):
+        series_id = options.get("series")
+
+        if series_id is None:
+            rows = rebuild_series_stats()
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt series stats cube: {rows} row(s)."))
+            return
+
+        try:
+            series = AssessmentSeries.objects.get(pk=series_id)
+        except AssessmentSeries.DoesNotExist:
+            raise CommandError(f"Assessment series {series_id} does not exist")
+
+        rows = rebuild_series_stats(series)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt series stats for {series.name}: {rows} row(s)."))
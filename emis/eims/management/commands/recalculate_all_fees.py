@@ -4,7 +4,6 @@ This fixes the issue where modular_module_count was not set but candidates have
 """
 
 from django.core.management.base import BaseCommand
-from django.db.models import Q
 from decimal import Decimal
 from eims.models import Candidate
 
@@ -29,9 +28,7 @@ class Command(BaseCommand):
             self.stdout.write(self.style.NOTICE('\n🔍 DRY RUN MODE\n'))
         
         # Get all candidates with enrollments
-        candidates = Candidate.objects.filter(
-            Q(candidatelevel__isnull=False) | Q(candidatemodule__isnull=False)
-        ).distinct()
+        candidates = Candidate.objects.filter(has_enrollment=True)
         
         total_candidates = candidates.count()
         self.stdout.write(f'\nFound {total_candidates} candidates with enrollments\n')
@@ -1,6 +1,8 @@
+import csv
+
 from django.core.management.base import BaseCommand
-from django.db import transaction
 from eims.models import Candidate
+from eims.utilis.regno_sequence import regenerate_reg_numbers
 
 class Command(BaseCommand):
     help = (
@@ -13,6 +15,7 @@ class Command(BaseCommand):
         parser.add_argument('--occupation-code-like', type=str, default='-old', help="Substring to match in occupation code, default='-old'")
         parser.add_argument('--limit', type=int, help='Process at most N candidates for testing')
         parser.add_argument('--apply', action='store_true', help='Persist changes')
+        parser.add_argument('--report', type=str, help='Write the old -> new mapping to this CSV file')
 
     def handle(self, *args, **opts):
         center_number = opts.get('center_number')
@@ -33,18 +36,16 @@ class Command(BaseCommand):
         self.stdout.write(self.style.WARNING('================== DRY RUN ==================' if not apply else '================== EXECUTION =================='))
         self.stdout.write(f"Candidates matched: {total} | processing now: {len(ids)}")
 
-        changed = 0
-        with transaction.atomic():
-            for cand in Candidate.objects.filter(id__in=ids).iterator(chunk_size=500):
-                old = cand.reg_number
-                # Force rebuild using current rules
-                cand.build_reg_number()
-                new = cand.reg_number
-                if new != old:
-                    self.stdout.write(f"{cand.id}: {old} -> {new}")
-                    changed += 1
-                    if apply:
-                        cand.save(update_fields=['reg_number'])
-            if not apply:
-                self.stdout.write(self.style.WARNING('Dry-run complete. Re-run with --apply to persist.'))
-        self.stdout.write(self.style.SUCCESS(f"Changed: {changed}"))
+        # Rebuild using current rules in one batch; a dry run rolls back and uses no serials
+        report = regenerate_reg_numbers(Candidate.objects.filter(id__in=ids), keep_current=True, dry_run=not apply)
+        for change in report['changes']:
+            self.stdout.write(f"{change['id']}: {change['old']} -> {change['new']}")
+        if opts.get('report'):
+            with open(opts['report'], 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=['id', 'old', 'new'])
+                writer.writeheader()
+                writer.writerows(report['changes'])
+            self.stdout.write(f"Mapping written to {opts['report']}")
+        if not apply:
+            self.stdout.write(self.style.WARNING('Dry-run complete. Re-run with --apply to persist.'))
+        self.stdout.write(self.style.SUCCESS(f"Changed: {len(report['changes'])}"))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from eims.models import ImportSession
+from eims.utilis.import_sessions import is_active, start_session_job
+
+
+class Command(BaseCommand):
+    help = (
+        "Resume chunked candidate imports and marks uploads that stopped before finishing "
+        "(failed, or left running by a web process that has gone). Each continues after its "
+        "last committed chunk. Sessions still being worked on are left alone."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--session', type=int, action='append', dest='sessions',
+                            help='Only resume this session ID (repeatable)')
+        parser.add_argument('--dry-run', action='store_true', help='List the sessions that would be resumed')
+
+    def handle(self, *args, **opts):
+        sessions = ImportSession.objects.exclude(status='completed').order_by('created_at')
+        if opts['sessions']:
+            sessions = sessions.filter(pk__in=opts['sessions'])
+
+        for session in sessions:
+            if is_active(session):
+                self.stdout.write(f"Session {session.pk} is still running; skipped")
+                continue
+            if opts['dry_run']:
+                self.stdout.write(f"Would resume {session} from row {session.rows_processed}")
+                continue
+            job = start_session_job(session, session.created_by, eager=True)
+            session.refresh_from_db()
+            if job.status == 'failed':
+                self.stderr.write(self.style.ERROR(f"Session {session.pk} failed again: {job.error.splitlines()[0]}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Session {session.pk}: {session.rows_processed}/{session.total_rows} rows, "
+                    f"{len(session.created_ids)} created, {session.updated_count} saved, {len(session.errors)} row errors"
+                ))
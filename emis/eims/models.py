@@ -1,6 +1,11 @@
+import logging
+
 from django.db import models
+from django.db.models.functions import Upper
 from django.contrib.auth.models import User
 
+logger = logging.getLogger(__name__)
+
 def format_title_case(text):
     """
     Convert text to title case, keeping small words lowercase except at the beginning.
@@ -29,6 +34,8 @@ import os
 from PIL import Image, UnidentifiedImageError
 from io import BytesIO
 from django.core.files.base import ContentFile
+from .utilis.media_store import content_addressed_storage
+from .utilis.registration_category import CATEGORY_CODE_CHOICES, registration_category_code
 from django.db import transaction
 from django.contrib.auth import get_user_model
 
@@ -554,6 +561,13 @@ class Result(models.Model):
         verbose_name = 'Result'
         verbose_name_plural = 'Results'
         ordering = ['assessment_date', 'candidate', 'level', 'module', 'paper']
+        indexes = [
+            # Marks upload and transcripts look up one result per candidate, paper/module and sitting
+            models.Index(fields=['candidate', 'paper', 'assessment_type', 'assessment_date'], name='result_candidate_paper_idx'),
+            models.Index(fields=['candidate', 'module', 'assessment_type', 'assessment_date'], name='result_candidate_module_idx'),
+            # Results of a period, in the default ordering
+            models.Index(fields=['assessment_date', 'candidate'], name='result_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.candidate} - {self.level} - {self.module or self.paper} - {self.mark}"
@@ -653,9 +667,14 @@ class Candidate(models.Model):
     GENDER_CHOICES = [('M', 'Male'), ('F', 'Female')]
     # Section 1 - Personal Information
     full_name = models.CharField(max_length=255)
-    passport_photo = models.ImageField(upload_to='candidate_photos/', blank=True, null=True)
+    # Photos and documents live in the deduplicating content-addressed store (utilis/media_store.py)
+    passport_photo = models.ImageField(upload_to='candidate_photos/', storage=content_addressed_storage, blank=True, null=True)
     # Stores the regno-stamped version of the passport photo (do not overwrite the original)
-    passport_photo_with_regno = models.ImageField(upload_to='candidate_photos/regno/', blank=True, null=True)
+    passport_photo_with_regno = models.ImageField(upload_to='candidate_photos/regno/', storage=content_addressed_storage, blank=True, null=True)
+    # SHA-256 of the source photo and reg number the stamped photo was built from; restamping is skipped while unchanged
+    regno_photo_signature = models.CharField(max_length=64, blank=True, default='', editable=False)
+    # Thumbnail/album/print renditions of the photo fields (see utilis/photo_renditions.py)
+    photo_renditions = models.JSONField(default=dict, blank=True, editable=False)
     date_of_birth = models.DateField()
     gender = models.CharField(max_length=1, choices=GENDER_CHOICES)
     nationality = models.CharField(max_length=64, help_text="Specify country of nationality (e.g. Ugandan, Kenyan, Rwandan, etc.)")
@@ -681,6 +700,10 @@ class Candidate(models.Model):
         ('Modular', 'Modular'),
         ('Informal', "Worker's PAS")
     ])
+    # registration_category normalized by save(), for exact-match filters (utilis/registration_category.py)
+    registration_category_code = models.CharField(
+        max_length=10, blank=True, default='', editable=False, choices=CATEGORY_CODE_CHOICES,
+    )
     # Preferred assessment language (optional, defaults to English if not provided)
     preferred_assessment_language = models.CharField(
         max_length=64,
@@ -722,6 +745,14 @@ class Candidate(models.Model):
     enrollment_label = models.CharField(max_length=100, blank=True, null=True)
 
     reg_number = models.CharField(max_length=100, unique=True, blank=True, null=True)
+    # Components of reg_number, kept in sync by save() so lookups can use indexes (utilis/regno_sequence.py)
+    regno_center_code = models.CharField(max_length=20, blank=True, default='', editable=False)
+    regno_nationality = models.CharField(max_length=1, blank=True, default='', editable=False)
+    regno_year = models.CharField(max_length=2, blank=True, default='', editable=False)
+    regno_intake = models.CharField(max_length=1, blank=True, default='', editable=False)
+    regno_occupation_code = models.CharField(max_length=20, blank=True, default='', editable=False)
+    regno_category = models.CharField(max_length=1, blank=True, default='', editable=False)
+    regno_serial = models.PositiveIntegerField(null=True, blank=True, editable=False)
 
 
     # Disability fields
@@ -804,10 +835,17 @@ class Candidate(models.Model):
         blank=True,
         help_text="Cached modular billing amount at time of center selection; preserves billing when enrollments are cleared."
     )
+
+    # Enrollment flags, recomputed from CandidateLevel/CandidateModule (utilis/enrollment_flags.py)
+    enrolled_level_count = models.PositiveIntegerField(default=0, editable=False)
+    enrolled_module_count = models.PositiveIntegerField(default=0, editable=False)
+    has_enrollment = models.BooleanField(default=False, editable=False, help_text="Enrolled in at least one level or module")
+    is_billed = models.BooleanField(default=False, editable=False, help_text="Billed for an enrollment (level, module or modular module count)")
     
     # Document attachments (optional)
     identification_document = models.FileField(
         upload_to='candidate_documents/identification/',
+        storage=content_addressed_storage,
         blank=True,
         null=True,
         validators=[validate_document_file],
@@ -815,6 +853,7 @@ class Candidate(models.Model):
     )
     qualification_document = models.FileField(
         upload_to='candidate_documents/qualifications/',
+        storage=content_addressed_storage,
         blank=True,
         null=True,
         validators=[validate_document_file],
@@ -858,8 +897,10 @@ class Candidate(models.Model):
         """
         from decimal import Decimal
         total_fees = Decimal('0.00')
+        # From the raw value, which may have been changed since the last save
+        category = registration_category_code(self.registration_category)
         
-        if self.registration_category == 'Modular':
+        if category == 'modular':
             # Decoupled modular billing: use stored center choice instead of live enrollments
             selected_count = self.modular_module_count or 0
             
@@ -901,7 +942,7 @@ class Candidate(models.Model):
                     except Exception:
                         pass
                     
-        elif self.registration_category == 'Formal':
+        elif category == 'formal':
             # For formal candidates: calculate based on level enrolled
             enrolled_levels = self.candidatelevel_set.all()
             for candidate_level in enrolled_levels:
@@ -909,7 +950,7 @@ class Candidate(models.Model):
                 fee = level.get_fee_for_registration('Formal', 1)
                 total_fees += fee
                 
-        elif self.registration_category in ['Informal', "Worker's PAS", 'Workers PAS', 'informal', "worker's pas"]:
+        elif category == 'informal':
             # For Worker's PAS candidates: calculate based on actual assessment attempts (results + enrollments)
             # This accounts for retakes where the same module may be attempted multiple times
             
@@ -951,17 +992,13 @@ class Candidate(models.Model):
         """
         return f"{self.fees_balance:,.2f}"
 
-    def build_reg_number(self):
-        """
-        Build a registration number in the format
-        CENTER_NO/N/YY/I/OC_CODE/REG_TYPE/SERIAL
-        Serial is always unique for (center, intake, year, occupation, reg cat).
-        """
-        from django.db import transaction
-        # Safety: if center is missing, do not rebuild to avoid downgrading to NOCNTR
-        # Keep the existing reg_number intact.
-        if not getattr(self, 'assessment_center_id', None):
-            return
+    def reg_number_group(self):
+        """(center, intake, entry year, occupation, registration category code) key the serial is unique in"""
+        return (self.assessment_center_id, self.intake, self.entry_year, self.occupation_id,
+                registration_category_code(self.registration_category))
+
+    def reg_number_prefix(self):
+        """Reg number without its serial: CENTER_NO/N/YY/I/OC_CODE/REG_TYPE"""
         # Use 'U' for Uganda (robust), 'X' for any other country
         UGANDA_VALUES = {"uganda", "ugandan", "ug", "256"}
         nat_val = str(self.nationality).strip().lower()
@@ -978,126 +1015,161 @@ class Candidate(models.Model):
         occ_code = occ_code.replace(' ', '').upper()
         reg_type = self.registration_category[0].upper() if self.registration_category else "X"
         center_code = self.assessment_center.center_number if self.assessment_center else "NOCNTR"
+        return f"{center_code}/{nat}/{year}/{intake}/{occ_code}/{reg_type}"
 
-        # Find max serial for this group
-        with transaction.atomic():
-            qs = Candidate.objects.filter(
-                assessment_center=self.assessment_center, 
-                intake=self.intake,
-                entry_year=self.entry_year,
-                occupation=self.occupation,
-                registration_category=self.registration_category
-            ).exclude(pk=self.pk)  # Exclude self if updating
-            max_serial = 0
-            for c in qs.only('reg_number'):
-                try:
-                    # New format: CENTER_NO/N/YY/I/OC_CODE/REG_TYPE/SERIAL
-                    # Old format: N/YY/I/OC_CODE/REG_TYPE/SERIAL-CENTER_NO
-                    # Alternative old format: N/YY/I/OC_CODE/LEVEL/SERIAL-CENTER_NO
-                    parts = c.reg_number.split('/')
-                    if len(parts) >= 7:
-                        # New format - serial is the last part
-                        serial_int = int(parts[-1])
-                    elif len(parts) >= 6 and '-' in parts[-1]:
-                        # Old format (6 parts) - serial is before the dash in the last part
-                        last_part = parts[-1]
-                        serial_part = last_part.split('-')[0]
-                        serial_int = int(serial_part)
-                    elif len(parts) == 5 and '-' in parts[-1]:
-                        # Alternative old format (5 parts) - serial is before the dash in the last part
-                        last_part = parts[-1]
-                        serial_part = last_part.split('-')[0]
-                        serial_int = int(serial_part)
-                    else:
-                        continue
-                    if serial_int > max_serial:
-                        max_serial = serial_int
-                except (ValueError, IndexError, AttributeError):
-                    continue
-            # Start with next serial after observed max
-            next_serial = max_serial + 1
-            # Probe for uniqueness and increment until a free reg_number is found
-            while True:
-                serial_str = str(next_serial).zfill(3)
-                proposed = f"{center_code}/{nat}/{year}/{intake}/{occ_code}/{reg_type}/{serial_str}"
-                collision = Candidate.objects.filter(reg_number=proposed).exclude(pk=self.pk).exists()
-                if not collision:
-                    break
-                next_serial += 1
-
-        self.reg_number = f"{center_code}/{nat}/{year}/{intake}/{occ_code}/{reg_type}/{serial_str}"
+    def has_current_reg_number(self, prefix=None):
+        """True if the stored reg number already matches the candidate's center, occupation, etc."""
+        from .utilis.regno_sequence import parse_reg_serial
+        prefix = prefix or self.reg_number_prefix()
+        return bool(self.reg_number and self.reg_number.rsplit('/', 1)[0] == prefix and parse_reg_serial(self.reg_number))
+
+    def build_reg_number(self, serial=None):
+        """
+        Build a registration number in the format
+        CENTER_NO/N/YY/I/OC_CODE/REG_TYPE/SERIAL
+        Serial is always unique for (center, intake, year, occupation, reg cat); it is taken
+        from the group's RegNumberSequence unless one reserved in advance is passed in.
+        """
+        from .utilis.regno_sequence import format_reg_number, reserve_serials
+        # Safety: if center is missing, do not rebuild to avoid downgrading to NOCNTR
+        # Keep the existing reg_number intact.
+        if not getattr(self, 'assessment_center_id', None):
+            return
+        prefix = self.reg_number_prefix()
+
+        # Nothing in the number changes: keep the serial already issued
+        if self.has_current_reg_number(prefix):
+            return
+
+        if serial is None:
+            serial = reserve_serials(self.reg_number_group())
+        # Serials are unique per group, but a number edited by hand (or issued under older
+        # rules) can still hold one; skip past it
+        while Candidate.objects.filter(reg_number=format_reg_number(prefix, serial)).exclude(pk=self.pk).exists():
+            serial = reserve_serials(self.reg_number_group())
+
+        self.reg_number = format_reg_number(prefix, serial)
 
     def save(self, *args, **kwargs):
             # regenerate if reg_number is empty
         if not self.reg_number:
             self.build_reg_number()
+        # Keep the indexed reg-number components in step with reg_number
+        from .utilis.regno_sequence import REGNO_PART_FIELDS, split_reg_number
+        for field, value in split_reg_number(self.reg_number).items():
+            setattr(self, field, value)
+        self.registration_category_code = registration_category_code(self.registration_category)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'reg_number' in update_fields:
+            update_fields = kwargs['update_fields'] = set(update_fields) | set(REGNO_PART_FIELDS)
+        if update_fields is not None and 'registration_category' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'registration_category_code'}
         super().save(*args, **kwargs)
 
-        # --- Start of Image Resizing Logic ---
-    def resize_passport_photo(self):
-        if self.passport_photo and hasattr(self.passport_photo, 'file') and self.passport_photo.file and hasattr(self.passport_photo.file, 'size'):
-            MAX_SIZE_KB = 500
-            if self.passport_photo.file.size > MAX_SIZE_KB * 1024:
-                try:
-                    self.passport_photo.file.seek(0)
-                    img = Image.open(self.passport_photo.file)
-                    original_format = img.format if img.format else 'JPEG'
-
-                    if img.mode in ('RGBA', 'P', 'LA'):
-                        img = img.convert('RGB')
-
-                    output_buffer = BytesIO()
-                    max_pixels = 800 
-                    if img.width > max_pixels or img.height > max_pixels:
-                        try:
-                            resampling_filter = Image.Resampling.LANCZOS
-                        except AttributeError:
-                            resampling_filter = Image.LANCZOS
-                        img.thumbnail((max_pixels, max_pixels), resampling_filter)
-
-                    if original_format.upper() == 'PNG':
-                        img.save(output_buffer, format='PNG', optimize=True)
-                        if output_buffer.tell() > MAX_SIZE_KB * 1024:
-                            output_buffer.seek(0); output_buffer.truncate(0)
-                            img.save(output_buffer, format='JPEG', quality=85)
-                    else:
-                        img.save(output_buffer, format='JPEG', quality=85)
-
-                    current_buffer_check_img = Image.open(BytesIO(output_buffer.getvalue()))
-                    if output_buffer.tell() > MAX_SIZE_KB * 1024 and current_buffer_check_img.format == 'JPEG':
-                        quality = 80
-                        while output_buffer.tell() > MAX_SIZE_KB * 1024 and quality >= 10:
-                            output_buffer.seek(0); output_buffer.truncate(0)
-                            img.save(output_buffer, format='JPEG', quality=quality)
-                            quality -= 5
-                    
-                    if output_buffer.tell() <= MAX_SIZE_KB * 1024:
-                        final_img_in_buffer = Image.open(BytesIO(output_buffer.getvalue()))
-                        final_format = final_img_in_buffer.format
-                        
-                        original_filename = os.path.basename(self.passport_photo.name)
-                        name_part, _ = os.path.splitext(original_filename)
-                        
-                        new_extension = '.jpg'
-                        if final_format == 'JPEG': new_extension = '.jpg'
-                        elif final_format == 'PNG': new_extension = '.png'
-                            
-                        new_filename = name_part + new_extension
-                        self.passport_photo.file = ContentFile(output_buffer.getvalue(), name=new_filename)
-                    else:
-                        print(f"Warning: Image {self.passport_photo.name} could not be resized to under {MAX_SIZE_KB}KB. Current size: {output_buffer.tell()/1024:.2f}KB. Original will be saved.")
-                        self.passport_photo.file.seek(0)
-
-                except (IOError, FileNotFoundError, UnidentifiedImageError, ValueError, TypeError, AttributeError) as e:
-                    print(f"Error resizing image {self.passport_photo.name if self.passport_photo and self.passport_photo.name else 'N/A'}: {e}")
-                    if hasattr(self.passport_photo, 'file') and self.passport_photo.file and hasattr(self.passport_photo.file, 'seek') and callable(self.passport_photo.file.seek):
-                        try:
-                            self.passport_photo.file.seek(0)
-                        except Exception as seek_e:
-                            print(f"Error seeking file pointer for {self.passport_photo.name}: {seek_e}")
-        # --- End of Image Resizing Logic ---
+        # Render thumbnail/album/print copies of photos uploaded by this save only
+        from .utilis.photo_renditions import build_photo_renditions, renditions_due
+        for field in renditions_due(self, kwargs.get('update_fields')):
+            try:
+                build_photo_renditions(self, field)
+            except Exception:
+                logger.exception("Error building photo renditions for %s", getattr(self, field).name)
+        self._remember_photo_names()
+        self._remember_billing_inputs()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_photo_names()
+        instance._remember_billing_inputs()
+        return instance
+
+    def _remember_photo_names(self):
+        """Photo names as stored, so save() can tell a new upload from an unchanged photo"""
+        from .utilis.photo_renditions import PHOTO_FIELDS
+        deferred = self.get_deferred_fields()
+        self._loaded_photo_names = {
+            field: getattr(self, field).name for field in PHOTO_FIELDS if field not in deferred
+        }
 
-        super().save(*args, **kwargs)
+    def _remember_billing_inputs(self):
+        """Billing inputs as stored, so a save that leaves them alone skips the flag refresh"""
+        from .utilis.enrollment_flags import BILLING_INPUT_FIELDS
+        deferred = self.get_deferred_fields()
+        self._loaded_billing_inputs = {
+            field: getattr(self, field) for field in BILLING_INPUT_FIELDS if field not in deferred
+        }
+
+    def billing_inputs_changed(self, update_fields=None):
+        """True if this save writes a billing input that differs from the stored value"""
+        from .utilis.enrollment_flags import BILLING_INPUT_FIELDS
+        loaded = getattr(self, '_loaded_billing_inputs', {})
+        fields = BILLING_INPUT_FIELDS if update_fields is None else set(update_fields) & set(BILLING_INPUT_FIELDS)
+        return any(field not in loaded or loaded[field] != getattr(self, field) for field in fields)
+
+    # --- Photo renditions: each falls back to the full image when no rendition exists ---
+    @property
+    def display_photo(self):
+        """Regno-stamped photo if there is one, else the original"""
+        return self.passport_photo_with_regno or self.passport_photo or None
+
+    def _photo_rendition(self, kind, field=None):
+        photo = getattr(self, field) if field else self.display_photo
+        if not photo:
+            return None, None
+        field = field or ('passport_photo_with_regno' if self.passport_photo_with_regno else 'passport_photo')
+        entry = (self.photo_renditions or {}).get(field) or {}
+        if entry.get('source') == photo.name and entry.get(kind):
+            return photo.storage, entry[kind]
+        return photo.storage, photo.name
+
+    @property
+    def photo_thumbnail_url(self):
+        """Small photo for candidate lists"""
+        storage, name = self._photo_rendition('thumb')
+        return storage.url(name) if name else None
+
+    @property
+    def photo_album_url(self):
+        """Album-size photo for the candidate page, albums and result lists"""
+        storage, name = self._photo_rendition('album')
+        return storage.url(name) if name else None
+
+    @property
+    def photo_album_path(self):
+        storage, name = self._photo_rendition('album')
+        return storage.path(name) if name else None
+
+    @property
+    def photo_print_path(self):
+        """Print-size unstamped photo for transcripts, testimonials and certificates"""
+        storage, name = self._photo_rendition('print', field='passport_photo')
+        return storage.path(name) if name else None
+
+    def resize_passport_photo(self, max_size_kb=500, max_pixels=800):
+        """Shrink a pending passport_photo upload to at most max_size_kb (not yet saved)"""
+        from .utilis.photo_renditions import encode_jpeg_within_budget
+        photo = self.passport_photo
+        if not (photo and getattr(photo, 'file', None) and getattr(photo.file, 'size', 0) > max_size_kb * 1024):
+            return
+        try:
+            photo.file.seek(0)
+            with Image.open(photo.file) as img:
+                if img.mode != 'RGB':
+                    img = img.convert('RGB')
+                img.thumbnail((max_pixels, max_pixels), Image.Resampling.LANCZOS)
+                content = encode_jpeg_within_budget(img, max_size_kb * 1024, min_quality=10, max_quality=85)
+            if len(content) > max_size_kb * 1024:
+                print(f"Warning: Image {photo.name} could not be resized to under {max_size_kb}KB. Current size: {len(content)/1024:.2f}KB. Original will be saved.")
+                photo.file.seek(0)
+                return
+            name_part = os.path.splitext(os.path.basename(photo.name))[0]
+            photo.file = ContentFile(content, name=name_part + '.jpg')
+        except (IOError, UnidentifiedImageError, ValueError, TypeError, AttributeError) as e:
+            print(f"Error resizing image {photo.name or 'N/A'}: {e}")
+            try:
+                photo.file.seek(0)
+            except Exception:
+                pass
 
     def delete(self, *args, **kwargs):
         """
@@ -1227,6 +1299,36 @@ class Candidate(models.Model):
 
     class Meta:
         ordering = ['reg_number']
+        indexes = [
+            # reg_number__iexact (portal login, marks upload) compares UPPER(reg_number)
+            models.Index(Upper('reg_number'), name='candidate_regno_upper_idx'),
+            models.Index(fields=['regno_center_code', 'regno_year', 'regno_intake'], name='candidate_regno_center_idx'),
+            # Max serial per reg-number group
+            models.Index(
+                fields=['assessment_center', 'intake', 'entry_year', 'occupation', 'registration_category_code', 'regno_serial'],
+                name='candidate_regno_group_idx',
+            ),
+            # Newest-first candidate list pages (utilis/keyset_pagination.py)
+            models.Index(fields=['-created_at', '-id'], name='candidate_created_idx'),
+            # Category filters of marksheets, reports and fee lists (utilis/registration_category.py)
+            models.Index(fields=['registration_category_code', 'assessment_series'], name='candidate_regcat_series_idx'),
+            models.Index(fields=['registration_category_code', 'occupation'], name='candidate_regcat_occ_idx'),
+            # Center/series pages narrowed by category and occupation (fees, marksheets, center reports)
+            models.Index(fields=['assessment_series', 'assessment_center', 'registration_category_code', 'occupation'],
+                         name='candidate_series_center_idx'),
+            # Series statistics by assessment date
+            models.Index(fields=['assessment_date'], name='candidate_assessment_date_idx'),
+            # Fee lists: candidates owing, largest balance first, and per center; cleared payments
+            models.Index(fields=['-fees_balance'], condition=models.Q(fees_balance__gt=0), name='candidate_owing_idx'),
+            models.Index(fields=['assessment_center', 'assessment_series'], condition=models.Q(fees_balance__gt=0),
+                         name='candidate_owing_center_idx'),
+            models.Index(fields=['assessment_center', 'assessment_series'], condition=models.Q(payment_cleared=True),
+                         name='candidate_cleared_center_idx'),
+            # Enrolled / billed candidates (utilis/enrollment_flags.py)
+            models.Index(fields=['reg_number'], condition=models.Q(has_enrollment=True), name='candidate_enrolled_regno_idx'),
+            models.Index(fields=['assessment_center', 'assessment_series'], condition=models.Q(is_billed=True),
+                         name='candidate_billed_center_idx'),
+        ]
 
 class CandidateLevel(models.Model):
     candidate = models.ForeignKey(Candidate, on_delete=models.CASCADE)
@@ -1556,6 +1658,242 @@ class CenterSeriesPayment(models.Model):
         return f"{self.assessment_center.center_name} - {series_name}: {self.amount_paid}"
 
 
+class SeriesStatsCube(models.Model):
+    """
+    Pre-aggregated candidate counts used by the statistics pages and reports.
+
+    One row per combination of series, center, district, occupation, level, registration
+    category code, gender, disability and refugee status. Rebuilt by the rebuild_series_stats
+    command, or when read after the candidates changed (see eims.utilis.series_stats),
+    rather than kept in sync row by row.
+    """
+    assessment_series = models.ForeignKey('AssessmentSeries', on_delete=models.CASCADE, null=True, blank=True)
+    assessment_center = models.ForeignKey('AssessmentCenter', on_delete=models.CASCADE, null=True, blank=True)
+    district = models.ForeignKey('District', on_delete=models.CASCADE, null=True, blank=True)
+    occupation = models.ForeignKey('Occupation', on_delete=models.CASCADE, null=True, blank=True)
+    level = models.ForeignKey('Level', on_delete=models.CASCADE, null=True, blank=True, help_text="Candidate's first enrolled level")
+    registration_category_code = models.CharField(max_length=10, blank=True, default='', choices=CATEGORY_CODE_CHOICES)
+    gender = models.CharField(max_length=10, blank=True, null=True)
+    disability = models.BooleanField(default=False)
+    is_refugee = models.BooleanField(default=False)
+    candidate_count = models.PositiveIntegerField(default=0)
+    # Candidate and CandidateLevel count versions the row was built from (series_stats.cube_version)
+    source_version = models.CharField(max_length=50, blank=True, default='')
+    built_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Series Stats Cube Row'
+        verbose_name_plural = 'Series Stats Cube'
+        indexes = [
+            models.Index(fields=['assessment_series', 'assessment_center']),
+        ]
+
+    def __str__(self):
+        series_name = self.assessment_series.name if self.assessment_series else 'No series'
+        return f"{series_name}: {self.candidate_count}"
+
+
+class CacheGeneration(models.Model):
+    """
+    Generation number of a family of cached values (eims.utilis.cache_generations), kept
+    in the database so that every worker process sees the same one.
+    """
+    name = models.CharField(max_length=100, primary_key=True)
+    value = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Cache Generation'
+        verbose_name_plural = 'Cache Generations'
+
+    def __str__(self):
+        return f"{self.name}={self.value}"
+
+
+class BackgroundJob(models.Model):
+    """
+    A long-running task started from the UI or a management command (see
+    eims.utilis.background_jobs). Progress and per-item results are stored here so the
+    browser can poll for them after the request that started the job has returned.
+    """
+    KIND_CHOICES = [
+        ('regno_photo_stamp', 'Stamp Reg Numbers on Photos'),
+        ('photo_orientation', 'Repair Photo Orientation'),
+        ('candidate_import', 'Import Candidates'),
+        ('marks_upload', 'Upload Marks'),
+        ('housekeeping', 'Housekeeping'),
+    ]
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=32, choices=KIND_CHOICES)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default='queued')
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    succeeded = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    results = models.JSONField(default=list, blank=True)
+    summary = models.JSONField(default=dict, blank=True, help_text="Job-level figures such as elapsed time and throughput")
+    error = models.TextField(blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Heartbeat: every save of the job's progress moves it (see fail_stale_jobs)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Background Job'
+        verbose_name_plural = 'Background Jobs'
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.pk} ({self.status})"
+
+    def save(self, *args, **kwargs):
+        # Progress saves name their fields; the heartbeat goes with them
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {'updated_at'}
+        super().save(*args, **kwargs)
+
+    @property
+    def is_finished(self):
+        return self.status in ('completed', 'failed')
+
+
+class ImportSession(models.Model):
+    """
+    A spreadsheet import run in chunks by a background job (eims.utilis.import_sessions).
+    The uploaded files are kept with their hash, and rows_processed, created_ids and the
+    counters advance in the same transaction as each chunk's writes, so an interrupted
+    import resumes after its last committed chunk and uploading the same file again
+    continues or reports this session instead of importing the rows twice.
+    """
+    KIND_CHOICES = [
+        ('candidates', 'Candidate Import'),
+        ('marks', 'Marks Upload'),
+    ]
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default='queued')
+    file = models.FileField(upload_to='import_sessions/%Y/%m/')
+    photo_zip = models.FileField(upload_to='import_sessions/%Y/%m/', blank=True)
+    file_name = models.CharField(max_length=255, blank=True)
+    file_hash = models.CharField(max_length=64, db_index=True, help_text="SHA-256 of the spreadsheet and any photo ZIP")
+    params = models.JSONField(default=dict, blank=True, help_text="Selections the upload was made with")
+    total_rows = models.PositiveIntegerField(default=0)
+    rows_processed = models.PositiveIntegerField(default=0)
+    created_ids = models.JSONField(default=list, blank=True)
+    updated_count = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    job = models.ForeignKey(BackgroundJob, on_delete=models.SET_NULL, null=True, blank=True, related_name='import_sessions')
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Import Session'
+        verbose_name_plural = 'Import Sessions'
+        indexes = [
+            models.Index(fields=['kind', 'file_hash']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.pk} {self.file_name} ({self.rows_processed}/{self.total_rows})"
+
+    @property
+    def is_finished(self):
+        return self.status == 'completed'
+
+
+class PhotoOrientationCheck(models.Model):
+    """
+    Manifest of the orientation repair job (eims.utilis.photo_orientation): the last
+    photo file checked for each candidate and its hash before/after any rewrite. Reruns
+    skip photos whose name, size and modification time still match.
+    """
+    candidate = models.OneToOneField('Candidate', on_delete=models.CASCADE, related_name='photo_orientation_check')
+    photo_name = models.CharField(max_length=255)
+    file_size = models.PositiveIntegerField(default=0)
+    file_mtime = models.FloatField(default=0)
+    orientation = models.PositiveSmallIntegerField(default=1, help_text="EXIF orientation found before any repair")
+    old_hash = models.CharField(max_length=64, blank=True)
+    new_hash = models.CharField(max_length=64, blank=True)
+    fixed = models.BooleanField(default=False)
+    checked_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Photo Orientation Check'
+        verbose_name_plural = 'Photo Orientation Checks'
+
+    def __str__(self):
+        return f"{self.candidate_id}: {self.photo_name} ({'fixed' if self.fixed else 'ok'})"
+
+
+class MediaBlob(models.Model):
+    """
+    A file in the content-addressed media store (eims.utilis.media_store) and the number
+    of references to it. gc_media_blobs recounts references and removes orphans.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    sha256 = models.CharField(max_length=64, db_index=True)
+    size = models.PositiveBigIntegerField(default=0)
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Media Blob'
+        verbose_name_plural = 'Media Blobs'
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} ref{'s' if self.ref_count != 1 else ''})"
+
+
+class RegNumberSequence(models.Model):
+    """
+    Last reg-number serial issued in a (center, intake, entry year, occupation,
+    registration category code) group. Serials are allocated by locking this row (see
+    eims.utilis.regno_sequence); backfill_regno_sequences seeds it from existing numbers.
+    """
+    assessment_center = models.ForeignKey(AssessmentCenter, on_delete=models.CASCADE, related_name='regno_sequences')
+    intake = models.CharField(max_length=6)
+    entry_year = models.PositiveIntegerField()
+    occupation = models.ForeignKey('Occupation', on_delete=models.CASCADE, null=True, blank=True, related_name='regno_sequences')
+    registration_category_code = models.CharField(max_length=10, choices=CATEGORY_CODE_CHOICES)
+    last_serial = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Reg Number Sequence'
+        verbose_name_plural = 'Reg Number Sequences'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['assessment_center', 'intake', 'entry_year', 'occupation', 'registration_category_code'],
+                name='unique_regno_sequence_group',
+            ),
+            # NULLs never collide in a unique index: candidates without an occupation need their own
+            models.UniqueConstraint(
+                fields=['assessment_center', 'intake', 'entry_year', 'registration_category_code'],
+                condition=models.Q(occupation__isnull=True),
+                name='unique_regno_sequence_group_no_occupation',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.assessment_center_id}/{self.intake}/{self.entry_year}/{self.occupation_id}/{self.registration_category_code}: {self.last_serial}"
+
+
 # =========================
 # Practical Assessment Module Models
 # =========================
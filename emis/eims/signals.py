@@ -1,7 +1,7 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_migrate, post_save
 from django.dispatch import receiver
-from .models import Candidate
-from .utils.regno_stamp import add_regno_to_image
+from .models import Candidate, CandidateLevel, CandidateModule, Result
+from .utilis.regno_stamp import add_regno_to_image
 
 
 # @receiver(post_save, sender=Candidate)
@@ -22,3 +22,55 @@ from .utils.regno_stamp import add_regno_to_image
 #     # only stamp if reg-number is new or changed
 #     if created or (old_reg != instance.reg_number):
 #         add_regno_to_image(instance.passport_photo.path, instance.reg_number)
+
+
+@receiver(post_migrate)
+def install_candidate_search(sender, app_config=None, using='default', **kwargs):
+    """Create the candidate name/reg-number search index once the tables exist"""
+    if app_config is None or app_config.label != 'eims':
+        return
+    from .utilis.candidate_search import install_search_index
+    install_search_index(using=using)
+
+
+@receiver(post_save, sender=Candidate)
+@receiver(post_delete, sender=Candidate)
+@receiver(post_save, sender=CandidateLevel)
+@receiver(post_delete, sender=CandidateLevel)
+@receiver(post_save, sender=CandidateModule)
+@receiver(post_delete, sender=CandidateModule)
+@receiver(post_save, sender=Result)
+@receiver(post_delete, sender=Result)
+def invalidate_cached_views(sender, **kwargs):
+    """
+    Cached list counts over this table (utilis/count_cache.py) and, for enrollment
+    changes, the statistics dashboard snapshot (utilis/statistics_snapshot.py) are out
+    of date. Both generations are bumped together, once, when the transaction commits.
+    """
+    from .utilis.cache_generations import bump_generation
+    from .utilis.count_cache import count_version_name
+    from .utilis.statistics_snapshot import SNAPSHOT_FIELDS, SNAPSHOT_GENERATION
+    names = [count_version_name(sender)]
+    update_fields = kwargs.get('update_fields')
+    if sender is not Result and not (
+            sender is Candidate and update_fields is not None and not set(update_fields) & set(SNAPSHOT_FIELDS)):
+        names.append(SNAPSHOT_GENERATION)
+    bump_generation(*names)
+
+
+@receiver(post_save, sender=Candidate)
+@receiver(post_save, sender=CandidateLevel)
+@receiver(post_delete, sender=CandidateLevel)
+@receiver(post_save, sender=CandidateModule)
+@receiver(post_delete, sender=CandidateModule)
+def refresh_candidate_enrollment_flags(sender, instance, **kwargs):
+    """
+    Recompute the candidate's enrollment flags (utilis/enrollment_flags.py). A Candidate
+    save only matters when it changes a billing input from the value it was loaded with.
+    """
+    from .utilis.enrollment_flags import refresh_enrollment_flags
+    if sender is Candidate and not kwargs.get('created') and not instance.billing_inputs_changed(kwargs.get('update_fields')):
+        return
+    candidate_id = instance.pk if sender is Candidate else instance.candidate_id
+    if candidate_id:
+        refresh_enrollment_flags([candidate_id])
@@ -1,5 +1,8 @@
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from datetime import date
+from io import BytesIO, StringIO
 
 from .models import (
     District,
@@ -11,6 +14,30 @@ from .models import (
     Level,
     OccupationLevel,
     Candidate,
+    CandidateLevel,
+    AssessmentSeries,
+    Result,
+    SeriesStatsCube,
+    PhotoOrientationCheck,
+    MediaBlob,
+    RegNumberSequence,
+)
+from .utilis.performance_report import build_performance_report_data
+from .utilis.series_stats import rebuild_series_stats, total
+from .utilis.xlsx_export import SheetWriter, column_widths, streaming_workbook
+from .utilis.regno_stamp import fit_text, stamp_candidate_photos
+from .utilis.background_jobs import start_job
+from .utilis.photo_orientation import repair_photo_orientation
+from .utilis.photo_ingest import PhotoIngest, match_photo
+from .utilis.import_lookups import ImportLookups
+from .utilis.photo_renditions import RENDITIONS, encode_jpeg_within_budget
+from .utilis.media_store import adopt_legacy_files, blob_hash, collect_garbage
+from .utilis.regno_sequence import (
+    backfill_sequences,
+    reg_number_filter,
+    regenerate_reg_numbers,
+    reserve_serials,
+    split_reg_number,
 )
 
 
@@ -75,6 +102,100 @@ class CandidateRegNumberTests(TestCase):
         self.assertIn("/M/", c2.reg_number)
         self.assertTrue(c2.reg_number.endswith("/001"))
 
+    def test_serials_come_from_the_group_sequence(self):
+        # Numbers issued before the sequence existed: the group is seeded past them
+        Candidate.objects.create(registration_category="Formal", **self._base_candidate_kwargs())
+        Candidate.objects.filter(reg_number__endswith="/001").update(
+            reg_number="UVT001/U/25/M/PR/F/041", **split_reg_number("UVT001/U/25/M/PR/F/041"))
+        RegNumberSequence.objects.all().delete()
+
+        c2 = Candidate.objects.create(registration_category="Formal", **self._base_candidate_kwargs())
+        self.assertTrue(c2.reg_number.endswith("/042"))
+        group = c2.reg_number_group()
+        self.assertEqual(RegNumberSequence.objects.get(assessment_center=self.center).last_serial, 42)
+
+        # Block reservation for bulk imports
+        self.assertEqual(reserve_serials(group, count=10), 43)
+        c3 = Candidate.objects.create(registration_category="Formal", **self._base_candidate_kwargs())
+        self.assertTrue(c3.reg_number.endswith("/053"))
+
+        # Rebuilding a number whose components are unchanged keeps its serial
+        c2.full_name = "Renamed Candidate"
+        c2.build_reg_number()
+        self.assertTrue(c2.reg_number.endswith("/042"))
+
+    def test_category_spellings_share_a_sequence(self):
+        # Both spellings give a /F/ number, so they must never draw the same serial
+        c1 = Candidate.objects.create(registration_category="Formal", **self._base_candidate_kwargs())
+        c2 = Candidate.objects.create(registration_category="formal", **self._base_candidate_kwargs())
+        self.assertEqual(c1.reg_number_group(), c2.reg_number_group())
+        self.assertEqual((c1.reg_number[-4:], c2.reg_number[-4:]), ("/001", "/002"))
+        self.assertEqual(RegNumberSequence.objects.get().registration_category_code, "formal")
+
+    def test_backfill_sequences(self):
+        c1 = Candidate.objects.create(registration_category="Formal", **self._base_candidate_kwargs())
+        # Written behind save()'s back: the component columns are filled by the backfill
+        Candidate.objects.filter(pk=c1.pk).update(reg_number="UVT001/U/25/M/PR/F/007", regno_serial=None)
+        Candidate.objects.create(registration_category="Modular", **self._base_candidate_kwargs())
+        RegNumberSequence.objects.filter(registration_category_code="formal").update(last_serial=3)
+
+        stats = backfill_sequences()
+        self.assertEqual((stats['advanced'], stats['unchanged']), (1, 1))
+        self.assertEqual(RegNumberSequence.objects.get(registration_category_code="formal").last_serial, 7)
+        self.assertEqual(Candidate.objects.get(pk=c1.pk).regno_serial, 7)
+
+    def test_batch_regeneration(self):
+        old_occ = Occupation.objects.create(code="EL-old", name="Electrician (old)", category=self.occ_cat)
+        kwargs = self._base_candidate_kwargs()
+        kwargs['occupation'] = old_occ
+        legacy = [Candidate.objects.create(registration_category="Formal", **kwargs) for _ in range(4)]
+        # Numbers issued before '-old' was stripped from reg numbers
+        for i, c in enumerate(legacy, start=1):
+            Candidate.objects.filter(pk=c.pk).update(reg_number=f"UVT001/U/25/M/EL-OLD/F/{i:03d}")
+        # A hand-edited number holding the next serial of the group
+        holder = Candidate.objects.create(registration_category="Formal", **self._base_candidate_kwargs())
+        Candidate.objects.filter(pk=holder.pk).update(reg_number="UVT001/U/25/M/EL/F/005")
+        current = Candidate.objects.create(registration_category="Formal", **self._base_candidate_kwargs())
+
+        candidates = Candidate.objects.filter(pk__in=[c.pk for c in legacy] + [current.pk])
+        preview = regenerate_reg_numbers(candidates, dry_run=True)
+        self.assertEqual((len(preview['changes']), preview['unchanged']), (4, 1))
+        self.assertTrue(Candidate.objects.filter(reg_number="UVT001/U/25/M/EL-OLD/F/001").exists())
+
+        with CaptureQueriesContext(connection) as queries:
+            report = regenerate_reg_numbers(candidates)
+        self.assertLess(len(queries), 20)
+        # Serials 5-8 were reserved; 5 was taken, so its candidate got 9
+        self.assertEqual(
+            sorted(c['new'] for c in report['changes']),
+            [f"UVT001/U/25/M/EL/F/{i:03d}" for i in range(6, 10)],
+        )
+        self.assertEqual(sorted(c['old'] for c in report['changes']), [f"UVT001/U/25/M/EL-OLD/F/{i:03d}" for i in range(1, 5)])
+        self.assertEqual(Candidate.objects.get(pk=current.pk).reg_number, current.reg_number)
+
+    def test_reg_number_components(self):
+        c1 = Candidate.objects.create(registration_category="Formal", **self._base_candidate_kwargs())
+        self.assertEqual(
+            (c1.regno_center_code, c1.regno_nationality, c1.regno_year, c1.regno_intake,
+             c1.regno_occupation_code, c1.regno_category, c1.regno_serial),
+            ("UVT001", "U", "25", "M", "PR", "F", 1),
+        )
+        self.assertEqual(split_reg_number("U/19/A/PR/F/012-UVT002")['regno_center_code'], "UVT002")
+        self.assertIsNone(split_reg_number("not a number")['regno_serial'])
+
+        # save(update_fields=['reg_number']) carries the components along
+        c1.registration_category = "Modular"
+        c1.reg_number = None
+        c1.save(update_fields=['registration_category', 'reg_number'])
+        self.assertEqual(Candidate.objects.get(pk=c1.pk).regno_category, "M")
+
+        c2 = Candidate.objects.create(registration_category="Formal", **self._base_candidate_kwargs())
+        self.assertEqual(list(Candidate.objects.filter(reg_number_filter(c2.reg_number.lower()))), [c2])
+        self.assertEqual(Candidate.objects.filter(reg_number_filter("uvt001/U/25/M")).count(), 2)
+        self.assertEqual(Candidate.objects.filter(reg_number_filter("UVT001/U/2")).count(), 2)
+        self.assertEqual(Candidate.objects.filter(reg_number_filter("UVT001/U/24")).count(), 0)
+        self.assertEqual(Candidate.objects.filter(reg_number_filter("PR/F")).count(), 1)
+
 
 class ModularFeesCalculationTests(TestCase):
     """Regression tests for Modular enrollment fee calculation and caching."""
@@ -138,3 +259,1418 @@ class ModularFeesCalculationTests(TestCase):
         cand.modular_billing_amount = 35000  # cached negotiated amount
         cand.update_fees_balance()
         self.assertEqual(float(cand.fees_balance), 35000.0)
+
+
+class SeriesCandidatesTestCase(TestCase):
+    """Fixtures for tests that need a series with candidates spread over centers."""
+
+    def setUp(self):
+        self.district = District.objects.create(name="Gulu", region="Northern")
+        self.village = Village.objects.create(name="Layibi", district=self.district)
+        self.center_cat = AssessmentCenterCategory.objects.create(name="TVET")
+        self.occ_cat = OccupationCategory.objects.create(name="Technical")
+        self.occupation = Occupation.objects.create(code="PR", name="Phone Repairer", category=self.occ_cat)
+        self.level = Level.objects.create(name="Level 1", occupation=self.occupation)
+        self.series = AssessmentSeries.objects.create(
+            name="March 2025",
+            start_date=date(2025, 3, 1),
+            end_date=date(2025, 3, 30),
+            date_of_release=date(2025, 5, 1),
+        )
+        self.centers = []
+
+    def _use_temp_media(self):
+        import tempfile
+        import shutil
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def _committed(self):
+        """Writes in the block behave as committed: their on_commit callbacks (cache generation bumps) run"""
+        return self.captureOnCommitCallbacks(execute=True)
+
+    def _add_candidates(self, n_centers, per_center):
+        with self._committed():
+            self._create_candidates(n_centers, per_center)
+
+    def _create_candidates(self, n_centers, per_center):
+        for i in range(n_centers):
+            center = AssessmentCenter.objects.create(
+                center_number=f"UVT{len(self.centers) + 1:03d}",
+                center_name=f"Center {len(self.centers) + 1}",
+                category=self.center_cat,
+                district=self.district,
+                village=self.village,
+            )
+            self.centers.append(center)
+            for j in range(per_center):
+                cand = Candidate.objects.create(
+                    full_name=f"Candidate {center.center_number}-{j}",
+                    date_of_birth=date(2000, 1, 1),
+                    gender="F" if j % 2 == 0 else "M",
+                    nationality="Ugandan",
+                    district=self.district,
+                    village=self.village,
+                    assessment_center=center,
+                    entry_year=2025,
+                    intake="M",
+                    occupation=self.occupation,
+                    registration_category="Formal",
+                    assessment_date=date(2025, 3, 15),
+                    assessment_series=self.series,
+                )
+                CandidateLevel.objects.create(candidate=cand, level=self.level)
+                # Every third candidate is absent, the rest alternate passing/failing the practical
+                if j % 3 == 2:
+                    continue
+                result = Result.objects.create(
+                    candidate=cand,
+                    level=self.level,
+                    assessment_date=date(2025, 3, 15),
+                    result_type="formal",
+                    assessment_type="practical",
+                    mark=80,
+                )
+                Result.objects.filter(pk=result.pk).update(comment="Successful" if j % 3 == 0 else "CTR")
+
+
+class PerformanceReportDataTests(SeriesCandidatesTestCase):
+    """The performance report figures come from a fixed number of grouped queries."""
+
+    def _build(self):
+        with CaptureQueriesContext(connection) as ctx:
+            data = build_performance_report_data(self.series, "Formal", "1")
+        return data, len(ctx.captured_queries)
+
+    def test_counts(self):
+        self._add_candidates(n_centers=2, per_center=6)
+        data, _ = self._build()
+
+        totals = data['totals']
+        self.assertEqual(totals['registered']['TT'], 12)
+        self.assertEqual(totals['absent']['TT'], 4)
+        self.assertEqual(totals['assessed']['TT'], 8)
+        self.assertEqual(totals['successful']['TT'], 4)
+        self.assertEqual(totals['unsuccessful']['TT'], 4)
+        self.assertEqual(totals['registered']['F'] + totals['registered']['M'], 12)
+        self.assertEqual(list(data['centers']), ["UVT001", "UVT002"])
+        self.assertEqual(data['centers']["UVT001"]['totals']['successful']['TT'], 2)
+        self.assertEqual(data['occupations']["PR"]['counts']['registered']['TT'], 12)
+
+    def test_query_count_independent_of_cohort_size(self):
+        self._add_candidates(n_centers=1, per_center=3)
+        _, small_queries = self._build()
+
+        self._add_candidates(n_centers=4, per_center=15)
+        data, large_queries = self._build()
+
+        self.assertEqual(data['totals']['registered']['TT'], 63)
+        self.assertEqual(small_queries, large_queries)
+
+
+class SeriesStatsCubeTests(SeriesCandidatesTestCase):
+    """The stats cube holds the same totals as the candidates table."""
+
+    def test_rebuild_matches_candidates(self):
+        self._add_candidates(n_centers=2, per_center=4)
+        Candidate.objects.filter(assessment_center=self.centers[0], gender="F").update(disability=True)
+
+        rebuild_series_stats(self.series)
+        cube = SeriesStatsCube.objects.filter(assessment_series=self.series)
+
+        self.assertEqual(total(cube), 8)
+        self.assertEqual(total(cube, gender="F"), 4)
+        self.assertEqual(total(cube, disability=True), 2)
+        self.assertEqual(total(cube, assessment_center=self.centers[1]), 4)
+        self.assertEqual(total(cube, level=self.level), 8)
+
+    def test_rebuild_replaces_series_rows(self):
+        self._add_candidates(n_centers=1, per_center=2)
+        rebuild_series_stats(self.series)
+        self._add_candidates(n_centers=1, per_center=3)
+        rebuild_series_stats(self.series)
+
+        self.assertEqual(total(SeriesStatsCube.objects.filter(assessment_series=self.series)), 5)
+
+    def test_read_after_writes_rebuilds_slice(self):
+        from .utilis.series_stats import series_stats
+
+        self._add_candidates(n_centers=1, per_center=2)
+        self.assertEqual(total(series_stats(self.series)), 2)
+        self._add_candidates(n_centers=1, per_center=1)
+        cube = series_stats(self.series)
+        self.assertEqual(total(cube), 3)
+        self.assertEqual(total(cube, registration_category_code='formal'), 3)
+        with CaptureQueriesContext(connection) as queries:
+            series_stats(self.series)
+        self.assertFalse([q for q in queries if 'eims_candidate' in q['sql']])
+
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_superuser('cube', 'cube@example.com', 'pw'))
+        context = self.client.get('/eims/statistics/assessment-series/2025/3/').context
+        self.assertEqual([(row['name'], row['count']) for row in context['reg_cat_breakdown']], [('Formal', 3)])
+
+
+class StreamingXlsxExportTests(TestCase):
+    """Write-only export sheets keep their precomputed widths, styles and rows."""
+
+    def test_sheet_round_trip(self):
+        import openpyxl
+        from io import BytesIO
+        from openpyxl.styles import Font
+
+        headers = ['Code', 'Name']
+        rows = [['PR', 'Phone Repairer'], ['ELC', 'Electrical Installation and Maintenance']]
+        self.assertEqual(column_widths(headers, rows, max_width=30), [10, 30])
+
+        wb = streaming_workbook()
+        sheet = SheetWriter(wb, 'Occupations', headers, widths=[12, 40], header_style={'font': Font(bold=True)}, freeze_header=True)
+        for row in rows:
+            sheet.append(row)
+        self.assertEqual(sheet.rows_written, 2)
+
+        buffer = BytesIO()
+        wb.save(buffer)
+        ws = openpyxl.load_workbook(buffer)['Occupations']
+        self.assertEqual([[c.value for c in row] for row in ws.iter_rows()], [headers] + rows)
+        self.assertTrue(ws['A1'].font.bold)
+        self.assertEqual(ws.column_dimensions['B'].width, 40)
+        self.assertEqual(ws.freeze_panes, 'A2')
+
+
+class RegnoPhotoStampTests(SeriesCandidatesTestCase):
+    """Bulk reg number stamping fits the text, writes JPEGs and skips unchanged photos."""
+
+    def setUp(self):
+        super().setUp()
+        self._use_temp_media()
+
+    def test_fit_text_uses_largest_fitting_font(self):
+        font, text, (width, _) = fit_text("UVT001/U/25/M/PR/F/001", 200)
+        self.assertEqual(text, "UVT001/U/25/M/PR/F/001")
+        self.assertLessEqual(width, 200)
+
+        font, text, (width, _) = fit_text("UVT001/U/25/M/PR/F/001" * 5, 60)
+        self.assertTrue(text.endswith('...'))
+        self.assertLessEqual(width, 60)
+
+    def test_restamp_skips_unchanged(self):
+        from io import BytesIO
+        from PIL import Image
+        from django.core.files.base import ContentFile
+
+        self._add_candidates(n_centers=1, per_center=2)
+        candidates = list(Candidate.objects.filter(assessment_series=self.series))
+        photo = BytesIO()
+        Image.new('RGB', (300, 400), (200, 10, 10)).save(photo, 'JPEG')
+        candidates[0].passport_photo.save('photo.jpg', ContentFile(photo.getvalue()), save=True)
+        ids = [c.pk for c in candidates]
+
+        job = start_job('regno_photo_stamp', stamp_candidate_photos, ids, workers=1, eager=True)
+        self.assertEqual((job.status, job.succeeded, job.failed), ('completed', 1, 1))
+        stamped = Candidate.objects.get(pk=candidates[0].pk)
+        with Image.open(stamped.passport_photo_with_regno.path) as img:
+            self.assertEqual(img.format, 'JPEG')
+            self.assertEqual(img.getpixel((150, 398)), (255, 255, 255))
+
+        job = start_job('regno_photo_stamp', stamp_candidate_photos, ids, workers=1, eager=True)
+        self.assertEqual((job.succeeded, job.skipped), (0, 1))
+
+    def test_stamps_in_spawned_workers(self):
+        from io import BytesIO
+        from PIL import Image
+        from django.core.files.base import ContentFile
+
+        self._add_candidates(n_centers=1, per_center=2)
+        candidates = list(Candidate.objects.filter(assessment_series=self.series))
+        for shade, candidate in enumerate(candidates):
+            photo = BytesIO()
+            Image.new('RGB', (300, 400), (200, 10 * shade, 10)).save(photo, 'JPEG')
+            candidate.passport_photo.save(f'photo{shade}.jpg', ContentFile(photo.getvalue()), save=True)
+
+        # Worker processes import the task's module without Django's app registry
+        job = start_job('regno_photo_stamp', stamp_candidate_photos, [c.pk for c in candidates], workers=2, eager=True)
+        self.assertEqual((job.status, job.succeeded, job.failed), ('completed', 2, 0))
+
+
+class PhotoOrientationRepairTests(SeriesCandidatesTestCase):
+    """Orientation repair rotates EXIF-rotated photos in place and skips them on rerun."""
+
+    def setUp(self):
+        super().setUp()
+        self._use_temp_media()
+
+    def test_repair_is_incremental(self):
+        from io import BytesIO
+        from PIL import Image
+        from django.core.files.base import ContentFile
+
+        self._add_candidates(n_centers=1, per_center=2)
+        rotated, upright = Candidate.objects.filter(assessment_series=self.series)
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        photo = BytesIO()
+        Image.new('RGB', (400, 300), (10, 10, 200)).save(photo, 'JPEG', exif=exif)
+        rotated.passport_photo.save('rotated.jpg', ContentFile(photo.getvalue()), save=True)
+        photo = BytesIO()
+        Image.new('RGB', (300, 400), (10, 200, 10)).save(photo, 'JPEG')
+        upright.passport_photo.save('upright.jpg', ContentFile(photo.getvalue()), save=True)
+
+        job = start_job('photo_orientation', repair_photo_orientation, workers=1, dry_run=True, eager=True)
+        self.assertEqual((job.summary['checked'], job.summary['would_fix']), (2, 1))
+        self.assertFalse(PhotoOrientationCheck.objects.exists())
+
+        job = start_job('photo_orientation', repair_photo_orientation, workers=1, eager=True)
+        self.assertEqual((job.status, job.succeeded, job.skipped), ('completed', 1, 1))
+        self.assertEqual([r['id'] for r in job.results], [rotated.pk])
+        with Image.open(Candidate.objects.get(pk=rotated.pk).passport_photo.path) as img:
+            self.assertEqual(img.size, (300, 400))
+        check = PhotoOrientationCheck.objects.get(candidate=rotated)
+        self.assertTrue(check.fixed)
+        self.assertEqual(check.orientation, 6)
+        self.assertNotEqual(check.old_hash, check.new_hash)
+
+        job = start_job('photo_orientation', repair_photo_orientation, workers=1, eager=True)
+        self.assertEqual((job.summary['checked'], job.summary['unchanged_since_last_run']), (0, 2))
+
+
+class PhotoIngestTests(TestCase):
+    """Import photos are matched by name and prepared from the ZIP in worker processes."""
+
+    def _zip(self):
+        import zipfile
+        from io import BytesIO
+        from PIL import Image
+
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        photo = BytesIO()
+        Image.new('RGB', (2000, 1000)).save(photo, 'JPEG', exif=exif)
+        archive = BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            zf.writestr('photos/540255.Afoyo_Vani.jpg', photo.getvalue())
+            zf.writestr('Kajumba_Ruth.jpg', photo.getvalue())
+            zf.writestr('Broken.jpg', b'not an image')
+            zf.writestr('notes.txt', b'')
+        archive.seek(0)
+        return archive
+
+    def test_match_photo_strategies(self):
+        with PhotoIngest(self._zip(), workers=1) as photos:
+            self.assertEqual(sorted(photos.image_name_map), ['afoyo vani', 'broken', 'kajumba ruth'])
+            self.assertEqual(match_photo(photos.image_name_map, 'Afoyo Vani'), 'photos/540255.Afoyo_Vani.jpg')
+            self.assertEqual(match_photo(photos.image_name_map, 'Kajumba Ruth Nakato'), 'Kajumba_Ruth.jpg')
+            self.assertEqual(match_photo(photos.image_name_map, 'Kajumba Mary Ruth'), 'Kajumba_Ruth.jpg')
+            self.assertIsNone(match_photo(photos.image_name_map, 'Nobody'))
+
+    def test_photos_prepared_in_workers(self):
+        from io import BytesIO
+        from PIL import Image
+
+        with PhotoIngest(self._zip(), workers=2) as photos:
+            photos.prefetch(['photos/540255.Afoyo_Vani.jpg', 'Broken.jpg'])
+            (content, renditions), error = photos.get('photos/540255.Afoyo_Vani.jpg')
+            self.assertIsNone(error)
+            self.assertEqual(sorted(renditions), ['album', 'print', 'thumb'])
+            with Image.open(BytesIO(content)) as img:
+                self.assertEqual((img.format, img.size), ('JPEG', (400, 800)))
+            prepared, error = photos.get('Broken.jpg')
+            self.assertIsNone(prepared)
+            self.assertTrue(error)
+
+
+class ImportLookupsTests(SeriesCandidatesTestCase):
+    """Import rows are resolved against reference data loaded once per upload."""
+
+    def test_lookups_resolve_without_queries(self):
+        from .models import AssessmentCenterBranch
+
+        self._add_candidates(n_centers=2, per_center=0)
+        branch = AssessmentCenterBranch.objects.create(
+            assessment_center=self.centers[1], branch_code="UVT002-Gulu", district=self.district, village=self.village)
+        lookups = ImportLookups()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(lookups.occupation(" pr "), self.occupation)
+            self.assertEqual(lookups.occupation("phone repairer"), self.occupation)
+            self.assertIsNone(lookups.occupation("Plumber"))
+            self.assertEqual(lookups.center("uvt001"), (self.centers[0], None))
+            self.assertEqual(lookups.center("Center 1"), (self.centers[0], None))
+            self.assertEqual(lookups.center("uvt002-gulu"), (self.centers[1], branch))
+            self.assertEqual(lookups.center("UVT999"), (None, None))
+            self.assertEqual(lookups.district("GULU"), self.district)
+            self.assertEqual(lookups.country("uganda"), "UG")
+            self.assertEqual(lookups.country("Bosnia & Herzegovina"), "BA")
+            self.assertIsNone(lookups.country("Atlantis"))
+
+    def test_form_fields_resolve_from_lookups_once_bound(self):
+        from .forms import CandidateForm
+
+        self._add_candidates(n_centers=1, per_center=0)
+        field = CandidateForm().fields['occupation']
+        self.assertIsNone(field.lookups)
+        self.assertEqual(field.clean(str(self.occupation.pk)), self.occupation)
+
+        lookups = ImportLookups()
+        form = CandidateForm({'assessment_center': self.centers[0].pk}, lookups=lookups)
+        self.assertIn('occupation', form.preloaded_fields)
+        field = form.fields['occupation']
+        self.assertIs(field.lookups, lookups)
+        field.clean(str(self.occupation.pk))
+        with self.assertNumQueries(0):
+            self.assertEqual(field.clean(str(self.occupation.pk)), self.occupation)
+        # Other forms' copies of the field are untouched
+        self.assertIsNone(CandidateForm().fields['occupation'].lookups)
+
+
+class CandidateImportTests(SeriesCandidatesTestCase):
+    """Imports validate every row first, then create the candidates in bulk."""
+
+    HEADERS = ['full_name', 'gender', 'nationality', 'date_of_birth', 'occupation', 'registration_category',
+               'assessment_center', 'entry_year', 'intake', 'start_date', 'finish_date', 'assessment_date']
+
+    def setUp(self):
+        super().setUp()
+        from django.contrib.auth.models import User
+
+        self._add_candidates(n_centers=1, per_center=0)
+        Occupation.objects.filter(pk=self.occupation.pk).update(has_modular=True)
+        self.client.force_login(User.objects.create_superuser('importer', 'importer@example.com', 'pw'))
+
+    def _workbook(self, names, bad_rows=()):
+        from io import BytesIO
+        from openpyxl import Workbook
+
+        wb = Workbook()
+        ws = wb.active
+        ws.append(self.HEADERS)
+        for name in names:
+            ws.append([name, 'F', 'Uganda', '20/06/2000', 'XX' if name in bad_rows else 'PR', 'Modular', 'UVT001', '2025', 'M',
+                       '01/01/2025', '31/12/2025', '15/06/2025'])
+        buffer = BytesIO()
+        wb.save(buffer)
+        return buffer.getvalue()
+
+    def _import(self, names, bad_rows=(), mode='', content=None):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        content = content or self._workbook(names, bad_rows)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/eims/candidates/import-dual/', {
+                'excel_file': SimpleUploadedFile('candidates.xlsx', content),
+                'mode': mode,
+            })
+        return response, len(queries)
+
+    def test_rows_created_in_bulk_with_sequential_reg_numbers(self):
+        response, few_queries = self._import([f"Small Batch {i}" for i in range(5)])
+        self.assertEqual(response.context['imported_count'], 5)
+        response, many_queries = self._import([f"Large Batch {i}" for i in range(40)] + ['Bad Row'], bad_rows=['Bad Row'])
+        self.assertEqual(response.context['imported_count'], 40)
+        self.assertIn("Row 42: Occupation 'XX' not found.", response.context['errors'])
+
+        serials = sorted(Candidate.objects.values_list('regno_serial', flat=True))
+        self.assertEqual(serials, list(range(1, 46)))
+        self.assertTrue(all(n.startswith('UVT001/U/25/M/PR/M/') for n in Candidate.objects.values_list('reg_number', flat=True)))
+        self.assertEqual(RegNumberSequence.objects.get().last_serial, 45)
+        # Reference data, serials and inserts cost no more for 41 rows than for 5 (the first
+        # import also created the group's sequence row)
+        self.assertLessEqual(many_queries, few_queries)
+
+    def test_invalid_rows_skipped_and_disabilities_linked(self):
+        from .models import NatureOfDisability
+        from .utilis.candidate_import import clean_candidate_row, create_candidates
+
+        natures = [NatureOfDisability.objects.create(name=name) for name in ('Visual', 'Hearing')]
+        lookups = ImportLookups()
+        errors = []
+        rows = []
+        for idx, occupation in enumerate(['PR', 'Plumber', 'PR'], start=2):
+            data = dict(zip(self.HEADERS, [f"Row {idx}", 'M', 'Uganda', '20/06/2000', occupation, 'Modular',
+                                           'UVT001', '2025', 'M', '01/01/2025', '31/12/2025', '15/06/2025']))
+            cleaned = clean_candidate_row(idx, data, lookups, errors)
+            if cleaned:
+                cleaned_data, m2m = cleaned
+                m2m['nature_of_disability'] = natures
+                rows.append((idx, cleaned_data, m2m))
+        self.assertEqual([idx for idx, _, _ in rows], [2, 4])
+        self.assertEqual(errors, ["Row 3: Occupation 'Plumber' not found."])
+
+        with CaptureQueriesContext(connection) as queries:
+            created = create_candidates(rows, errors)
+        statements = [q['sql'] for q in queries.captured_queries if 'SAVEPOINT' not in q['sql']]
+        # Sequence row (created, seeded, advanced), collision check, candidates, disability links;
+        # cache generations are bumped once the import commits
+        self.assertEqual(len(statements), 7)
+        self.assertTrue(all(c.pk for c in created))
+        for candidate in created:
+            self.assertEqual(set(candidate.nature_of_disability.all()), set(natures))
+            self.assertEqual(Candidate.objects.get(pk=candidate.pk).regno_serial, candidate.regno_serial)
+
+
+    def test_dry_run_writes_nothing(self):
+        response, _ = self._import(["Dry One", "Dry Two", "Dry Bad"], bad_rows=["Dry Bad"], mode='dry_run')
+        self.assertEqual((response.context['valid_count'], response.context['row_count']), (2, 3))
+        self.assertIn("Row 4: Occupation 'XX' not found.", response.context['errors'])
+        self.assertFalse(Candidate.objects.exists())
+        self.assertFalse(RegNumberSequence.objects.exists())
+
+    @override_settings(BACKGROUND_JOBS_EAGER=True, IMPORT_CHUNK_SIZE=2)
+    def test_chunked_import_resumes_and_is_not_repeated(self):
+        from unittest import mock
+        from .models import ImportSession
+        from .utilis import candidate_import
+
+        self._use_temp_media()
+        names = [f"Chunked {i}" for i in range(5)]
+        # The same file each time (saving a workbook stamps it with the time)
+        content = self._workbook(names)
+        real_create = candidate_import.create_candidates
+        calls = []
+
+        def interrupted(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 2:
+                raise RuntimeError("worker stopped")
+            return real_create(*args, **kwargs)
+
+        with mock.patch.object(candidate_import, 'create_candidates', interrupted):
+            response, _ = self._import(names, mode='chunked', content=content)
+        session = ImportSession.objects.get()
+        self.assertRedirects(response, f'/eims/candidates/import-dual/?session={session.pk}', fetch_redirect_response=False)
+        # The first chunk committed with its progress; the failed one left nothing behind
+        self.assertEqual((session.status, session.rows_processed, len(session.created_ids)), ('failed', 2, 2))
+        self.assertEqual(Candidate.objects.count(), 2)
+
+        # Uploading the same file resumes after the last committed chunk
+        self._import(names, mode='chunked', content=content)
+        session.refresh_from_db()
+        self.assertEqual((session.status, session.rows_processed, session.total_rows), ('completed', 5, 5))
+        self.assertEqual(sorted(Candidate.objects.values_list('full_name', flat=True)), [n.upper() for n in names])
+        self.assertEqual(sorted(session.created_ids), sorted(Candidate.objects.values_list('pk', flat=True)))
+
+        # ...and once complete, another upload of it imports nothing
+        self._import(names, mode='chunked', content=content)
+        self.assertEqual((ImportSession.objects.count(), Candidate.objects.count()), (1, 5))
+        response = self.client.get(f'/eims/candidates/import-dual/?session={session.pk}')
+        self.assertContains(response, '5 candidates created')
+
+
+    @override_settings(IMPORT_CHUNK_SIZE=2)
+    def test_two_jobs_never_import_the_same_rows(self):
+        from datetime import timedelta
+        from unittest import mock
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.utils import timezone
+        from .models import BackgroundJob, ImportSession
+        from .utilis import import_sessions
+
+        self._use_temp_media()
+        names = [f"Raced {i}" for i in range(5)]
+        session, _ = import_sessions.open_session(
+            'candidates', SimpleUploadedFile('candidates.xlsx', self._workbook(names)), None)
+
+        # Job A is queued; a second upload while it waits gets A rather than a new job
+        job_a = import_sessions.start_session_job(session, eager=False)
+        self.assertEqual(import_sessions.start_session_job(session, eager=False), job_a)
+        self.assertEqual(BackgroundJob.objects.count(), 1)
+
+        # A runs its first chunk, then is slow enough to look dead and job B takes over
+        real_process = import_sessions.CandidateChunks.process
+        job_b = []
+
+        def slow(handler, chunk, errors):
+            result = real_process(handler, chunk, errors)
+            if not job_b:
+                ImportSession.objects.filter(pk=session.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+                job_b.append(import_sessions.start_session_job(ImportSession.objects.get(pk=session.pk), eager=False))
+            return result
+
+        with mock.patch.object(import_sessions.CandidateChunks, 'process', slow):
+            import_sessions.run_import_session(job_a, session.pk)
+        session.refresh_from_db()
+        self.assertEqual((session.job_id, session.rows_processed), (job_b[0].pk, 2))
+        self.assertTrue(job_a.summary['superseded'])
+
+        # B resumes after A's committed chunk; A starting again (late pool slot) does nothing
+        import_sessions.run_import_session(job_b[0], session.pk)
+        import_sessions.run_import_session(job_a, session.pk)
+        session.refresh_from_db()
+        self.assertEqual((session.status, session.rows_processed), ('completed', 5))
+        self.assertEqual(sorted(Candidate.objects.values_list('full_name', flat=True)), [n.upper() for n in names])
+
+
+class MarksUploadTests(SeriesCandidatesTestCase):
+    """Marks sheets can be checked without saving, or saved in resumable chunks."""
+
+    def setUp(self):
+        super().setUp()
+        from django.contrib.auth.models import User
+
+        self._add_candidates(n_centers=1, per_center=3)
+        OccupationLevel.objects.create(occupation=self.occupation, level=self.level, structure_type='modules')
+        self.client.force_login(User.objects.create_superuser('marks', 'marks@example.com', 'pw'))
+        self.sheet = self._marks_sheet()
+
+    def _marks_sheet(self):
+        from io import BytesIO
+        from openpyxl import Workbook
+
+        wb = Workbook()
+        ws = wb.active
+        ws.append(['REG NUMBER', 'NAME', 'THEORY', 'PRACTICAL'])
+        for candidate in Candidate.objects.order_by('pk'):
+            ws.append([candidate.reg_number, candidate.full_name, 65, 'x'])
+        ws.append(['UVT999/U/25/M/PR/F/001', 'Nobody', 50, 50])
+        buffer = BytesIO()
+        wb.save(buffer)
+        return buffer.getvalue()
+
+    def _upload(self, mode):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        return self.client.post('/eims/results/upload-marks/', {
+            'marks_file': SimpleUploadedFile('marks.xlsx', self.sheet),
+            'assessment_series': self.series.pk,
+            'registration_category': 'formal',
+            'occupation': self.occupation.pk,
+            'level': self.level.pk,
+            'mode': mode,
+        }).json()
+
+    def test_dry_run_and_chunked_upload(self):
+        results = Result.objects.count()
+        data = self._upload('dry_run')
+        self.assertTrue(data['dry_run'])
+        self.assertEqual(data['updated_count'], 3)
+        self.assertEqual(len(data['errors']), 4)
+        self.assertEqual(Result.objects.count(), results)
+
+        with override_settings(BACKGROUND_JOBS_EAGER=True, IMPORT_CHUNK_SIZE=2):
+            self._use_temp_media()
+            data = self._upload('chunked')
+            self.assertFalse(data['existing'])
+            self.assertEqual(Result.objects.filter(assessment_type='theory', mark=65).count(), 3)
+            data = self._upload('chunked')
+        self.assertTrue(data['existing'])
+        self.assertEqual((data['status'], data['updated_count'], len(data['errors'])), ('completed', 3, 4))
+        self.assertEqual(Result.objects.filter(assessment_type='theory').count(), 3)
+
+class CandidateSearchTests(SeriesCandidatesTestCase):
+    """Name and reg-number search goes through the search index, which follows every write."""
+
+    def test_index_follows_writes(self):
+        from .utilis.candidate_search import search_filter, search_index_available
+
+        self.assertTrue(search_index_available())
+        self._add_candidates(n_centers=2, per_center=2)
+        first = Candidate.objects.get(full_name__iexact="Candidate UVT001-0")
+        # Trigram lookup, not a LIKE scan
+        self.assertIn('MATCH', str(Candidate.objects.filter(search_filter('uvt001-0')).query))
+
+        def found(value, **kwargs):
+            return set(Candidate.objects.filter(search_filter(value, **kwargs)).values_list('pk', flat=True))
+
+        self.assertEqual(found('uvt001-0'), {first.pk})
+        self.assertEqual(len(found('candidate uvt00')), 4)
+        self.assertEqual(len(found(first.reg_number[:12], fields=['reg_number'])), 2)
+        self.assertEqual(found('UVT001-0', fields=['reg_number']), set())
+        # Too short for trigrams: plain icontains
+        self.assertEqual(len(found('-1')), 2)
+
+        Candidate.objects.filter(pk=first.pk).update(full_name="Renamed Person")
+        self.assertEqual(found('uvt001-0'), set())
+        self.assertEqual(found('named pers'), {first.pk})
+        Candidate.objects.filter(pk=first.pk).delete()
+        self.assertEqual(found('named pers'), set())
+        self.assertEqual(Candidate.objects.filter(reg_number_filter('U/25/M/PR')).count(), 3)
+
+    def test_install_failure_falls_back_to_icontains(self):
+        from unittest import mock
+        from django.db import ProgrammingError
+        from .utilis import candidate_search
+
+        def denied(cursor, table, rebuild):
+            raise ProgrammingError('permission denied to create extension "pg_trgm"')
+
+        self.addCleanup(candidate_search._available.clear)
+        with mock.patch.object(candidate_search, '_install_sqlite', denied), \
+                self.assertLogs('eims.utilis.candidate_search', 'WARNING'):
+            self.assertFalse(candidate_search.install_search_index())
+        self.assertNotIn('MATCH', str(Candidate.objects.filter(candidate_search.search_filter('uvt001')).query))
+        # The failure did not abort the surrounding transaction
+        self.assertEqual(Candidate.objects.count(), 0)
+
+
+class KeysetPaginationTests(SeriesCandidatesTestCase):
+    """Cursor pages walk the same rows, in the same order, as OFFSET pages would."""
+
+    def setUp(self):
+        super().setUp()
+        self._add_candidates(n_centers=3, per_center=4)
+        pks = list(Candidate.objects.order_by('pk').values_list('pk', flat=True))
+        # Ties on the sort key and NULL reg numbers must not drop or repeat rows
+        Candidate.objects.filter(pk__in=pks[:5]).update(created_at=Candidate.objects.get(pk=pks[0]).created_at)
+        Candidate.objects.filter(pk__in=pks[::4]).update(reg_number=None)
+
+    def _walk(self, paginator):
+        page = paginator.get_page(None)
+        seen = [c.pk for c in page]
+        while page.has_next():
+            page = paginator.get_page(page.next_cursor)
+            self.assertEqual(page.start_index(), len(seen) + 1)
+            seen += [c.pk for c in page]
+        back = []
+        while page.has_previous():
+            page = paginator.get_page(page.previous_cursor)
+            back = [c.pk for c in page] + back
+        self.assertEqual(page.start_index(), 1)
+        self.assertEqual(back, seen[:len(back)])
+        return seen
+
+    def test_pages_match_offset_order(self):
+        from django.db.models import F
+        from .utilis.keyset_pagination import KeysetPaginator
+
+        candidates = Candidate.objects.all()
+        newest = list(candidates.order_by('-created_at', '-pk').values_list('pk', flat=True))
+        self.assertEqual(self._walk(KeysetPaginator(candidates, 5, ordering=('-created_at',))), newest)
+        by_regno = list(candidates.order_by(F('reg_number').asc(nulls_last=True), 'pk').values_list('pk', flat=True))
+        paginator = KeysetPaginator(candidates, 5, ordering=('reg_number',))
+        self.assertEqual(self._walk(paginator), by_regno)
+
+        last = paginator.get_page(paginator.last_cursor)
+        self.assertEqual([c.pk for c in last], by_regno[-5:])
+        self.assertEqual((last.start_index(), last.end_index(), paginator.count), (8, 12, 12))
+        self.assertEqual(paginator.get_page('not-a-cursor').start_index(), 1)
+
+    def test_deep_page_seeks_without_offset(self):
+        from .utilis.keyset_pagination import KeysetPaginator
+
+        paginator = KeysetPaginator(Candidate.objects.all(), 5, ordering=('-created_at',))
+        cursor = paginator.get_page(None).next_cursor
+        with CaptureQueriesContext(connection) as queries:
+            page = paginator.get_page(cursor)
+        self.assertEqual(page.start_index(), 6)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('OFFSET', queries[0]['sql'])
+        # The total is counted once, then served from the cache
+        self.assertEqual(paginator.count, 12)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(KeysetPaginator(Candidate.objects.all(), 5).count, 12)
+        self.assertEqual([q for q in queries if 'COUNT(' in q['sql']], [])
+
+
+class CountCacheTests(SeriesCandidatesTestCase):
+    """List counts are reused until a write to a table they read."""
+
+    def setUp(self):
+        super().setUp()
+        from django.core.cache import cache
+        cache.clear()
+        self._add_candidates(n_centers=2, per_center=3)
+
+    def _counts(self, queryset):
+        from .utilis.count_cache import cached_count
+        with CaptureQueriesContext(connection) as queries:
+            count = cached_count(queryset)
+        return count, sum('COUNT(' in q['sql'] for q in queries)
+
+    def test_counts_follow_writes(self):
+        from django.db.models import Exists, OuterRef
+        from .utilis.count_cache import bump_count_version
+
+        enrolled = Candidate.objects.filter(candidatelevel__isnull=False).distinct().annotate(
+            has_marks=Exists(Result.objects.filter(candidate=OuterRef('pk')))
+        ).filter(has_marks=True)
+        self.assertEqual(self._counts(enrolled), (4, 1))
+        self.assertEqual(self._counts(enrolled), (4, 0))
+        # Same filters built again: same signature
+        self.assertEqual(self._counts(Candidate.objects.filter(candidatelevel__isnull=False).distinct().annotate(
+            has_marks=Exists(Result.objects.filter(candidate=OuterRef('pk')))
+        ).filter(has_marks=True)), (4, 0))
+
+        # A result read only through the Exists subquery still invalidates
+        absent = Candidate.objects.filter(result__isnull=True).first()
+        with self._committed():
+            Result.objects.create(candidate=absent, level=self.level, assessment_date=date(2025, 3, 15),
+                                  result_type="formal", assessment_type="practical", mark=50)
+        self.assertEqual(self._counts(enrolled), (5, 1))
+
+        # Writes to tables the query does not read keep the cached count
+        by_center = Candidate.objects.filter(assessment_center=self.centers[0])
+        self.assertEqual(self._counts(by_center), (3, 1))
+        with self._committed():
+            CandidateLevel.objects.filter(candidate=absent).delete()
+        self.assertEqual(self._counts(by_center), (3, 0))
+        self.assertEqual(self._counts(enrolled), (4, 1))
+
+        # Versions are kept in the database, shared by every process and never evicted
+        from django.core.cache import cache
+        from .models import CacheGeneration
+        self.assertTrue(CacheGeneration.objects.filter(name='count-version:eims.result').exists())
+        cache.clear()
+        self.assertEqual(self._counts(by_center), (3, 1))
+        with self._committed():
+            Candidate.objects.filter(pk=absent.pk).update(assessment_center=self.centers[1])
+            bump_count_version(Candidate)
+        self.assertEqual(self._counts(by_center), (2, 1))
+
+    def test_versions_bumped_once_at_commit(self):
+        from django.db import transaction
+
+        by_center = Candidate.objects.filter(assessment_center=self.centers[0])
+        self.assertEqual(self._counts(by_center), (3, 1))
+        with CaptureQueriesContext(connection) as queries:
+            with self._committed(), transaction.atomic():
+                for candidate in by_center:
+                    candidate.fees_balance = 500
+                    candidate.save()
+                    CandidateLevel.objects.filter(candidate=candidate).delete()
+                # Nothing is written to the shared generation row before commit
+                self.assertFalse([q for q in queries if 'eims_cachegeneration' in q['sql']])
+        self.assertEqual(len([q for q in queries if 'eims_cachegeneration' in q['sql']]), 1)
+        self.assertEqual(self._counts(by_center), (3, 1))
+
+    def test_repeat_list_view_skips_count(self):
+        from django.contrib.auth.models import User
+
+        self.client.force_login(User.objects.create_superuser('counts', 'counts@example.com', 'pw'))
+        url = '/eims/candidates/enrollments/?name=candidate'
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in queries if 'COUNT(' in q['sql'] and 'eims_candidate' in q['sql']])
+
+
+class EnrollmentFlagsTests(SeriesCandidatesTestCase):
+    """Enrollment flags on Candidate follow level/module enrollments and billing inputs."""
+
+    def _flags(self, candidate):
+        return tuple(Candidate.objects.filter(pk=candidate.pk).values_list(
+            'enrolled_level_count', 'enrolled_module_count', 'has_enrollment', 'is_billed').get())
+
+    def test_flags_follow_enrollment_writes(self):
+        from django.core.management import call_command
+        from .models import CandidateModule, Module
+        from .utilis.enrollment_flags import billed_q
+
+        self._add_candidates(n_centers=1, per_center=2)
+        formal, other = Candidate.objects.order_by('pk')
+        self.assertEqual(self._flags(formal), (1, 0, True, True))
+
+        CandidateLevel.objects.filter(candidate=other).delete()
+        self.assertEqual(self._flags(other), (0, 0, False, False))
+        # Modular: billed once the center picks a module count, enrolled once modules are recorded
+        other.registration_category = 'Modular'
+        other.modular_module_count = 2
+        other.save()
+        self.assertEqual(self._flags(other), (0, 0, False, True))
+        module = Module.objects.create(name="Mod A", code="PR-M1", occupation=self.occupation, level=self.level)
+        CandidateModule.objects.create(candidate=other, module=module)
+        self.assertEqual(self._flags(other), (0, 1, True, True))
+
+        enrolled = Candidate.objects.filter(has_enrollment=True)
+        self.assertEqual(enrolled.count(), 2)
+        self.assertNotIn('JOIN', str(enrolled.query))
+        self.assertEqual(Candidate.objects.filter(billed_q()).count(), 2)
+
+        # Written behind the signals' back, then backfilled
+        Candidate.objects.update(has_enrollment=False, is_billed=False, enrolled_level_count=0)
+        call_command('backfill_enrollment_flags', stdout=StringIO())
+        self.assertEqual(self._flags(formal), (1, 0, True, True))
+        self.assertEqual(self._flags(other), (0, 1, True, True))
+
+    def test_save_without_billing_change_skips_refresh(self):
+        from unittest import mock
+        from .utilis import enrollment_flags
+
+        self._add_candidates(n_centers=1, per_center=1)
+        candidate = Candidate.objects.get()
+        with mock.patch.object(enrollment_flags, 'refresh_enrollment_flags') as refresh:
+            candidate.fees_balance = 500
+            candidate.save()
+            candidate.save(update_fields=['registration_category', 'fees_balance'])
+            self.assertFalse(refresh.called)
+            candidate.modular_module_count = 1
+            candidate.save()
+            # Compared with the values as saved last, not as first loaded
+            candidate.save()
+        refresh.assert_called_once_with([candidate.pk])
+
+    def test_enrollment_list_uses_flags(self):
+        from django.contrib.auth.models import User
+
+        self._add_candidates(n_centers=1, per_center=3)
+        CandidateLevel.objects.filter(candidate__full_name__endswith='-2').delete()
+        self.client.force_login(User.objects.create_superuser('flags', 'flags@example.com', 'pw'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/eims/candidates/enrollments/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'UVT001-1')
+        self.assertNotContains(response, 'UVT001-2')
+        self.assertFalse([q for q in queries if 'DISTINCT' in q['sql'] and 'eims_candidate' in q['sql']])
+
+
+class RegistrationCategoryCodeTests(SeriesCandidatesTestCase):
+    """Every spelling of a registration category is filtered through one indexed code."""
+
+    def test_spellings_share_a_code(self):
+        from .utilis.registration_category import registration_category_code
+
+        for spelling in ('Informal', 'informal', "Worker's PAS", 'Workers PAS', 'worker pas', 'workers_pas'):
+            self.assertEqual(registration_category_code(spelling), 'informal', spelling)
+        self.assertEqual(registration_category_code(' Formal '), 'formal')
+        self.assertEqual(registration_category_code('MODULAR'), 'modular')
+        self.assertEqual(registration_category_code('Other'), '')
+        self.assertEqual(registration_category_code(None), '')
+
+    def test_code_follows_writes_and_backfill(self):
+        from django.core.management import call_command
+        from .utilis.performance_report import performance_candidates
+
+        self._add_candidates(n_centers=1, per_center=3)
+        first, second, third = Candidate.objects.order_by('pk')
+        self.assertEqual(first.registration_category_code, 'formal')
+        second.registration_category = 'Informal'
+        second.save(update_fields=['registration_category'])
+        self.assertEqual(Candidate.objects.get(pk=second.pk).registration_category_code, 'informal')
+
+        # Legacy spellings written behind save()'s back
+        Candidate.objects.filter(pk=third.pk).update(registration_category='informal', registration_category_code='')
+        call_command('backfill_registration_category_codes', stdout=StringIO())
+        informal = performance_candidates(self.series, "Worker's PAS")
+        self.assertEqual(set(informal), {second, third})
+        self.assertIn('"registration_category_code" =', str(informal.query))
+        self.assertEqual(second.calculate_fees_balance(), third.calculate_fees_balance())
+
+    def test_exports_filtered_and_named_by_code(self):
+        from django.contrib.auth.models import User
+        from openpyxl import load_workbook
+
+        self._add_candidates(n_centers=1, per_center=3)
+        Candidate.objects.filter(full_name__endswith='-2').update(registration_category='Informal',
+                                                                  registration_category_code='informal')
+        self.client.force_login(User.objects.create_superuser('exports', 'exports@example.com', 'pw'))
+
+        response = self.client.get('/eims/statistics/assessment-series/2025/3/report-excel/', {'category': 'Formal'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('assessment_series_2025_3_formal.xlsx', response['Content-Disposition'])
+        sheet = load_workbook(BytesIO(b''.join(response.streaming_content))).active
+        self.assertEqual(sheet.max_row, 3)
+
+        response = self.client.get('/eims/results/download-printed-marksheet/', {
+            'assessment_month': '3', 'assessment_year': '2025', 'registration_category': "Worker's PAS",
+            'occupation': self.occupation.pk, 'level': self.level.pk,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('marksheet_informal_Phone Repairer_2025_3.pdf', response['Content-Disposition'])
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+
+class QueryPlanTests(TestCase):
+    """The hot candidate/result queries stay on indexes."""
+
+    def test_hot_queries_use_indexes(self):
+        from django.core.management import call_command
+
+        out = StringIO()
+        call_command('check_query_plans', '--candidates', '300', '--centers', '5', stdout=out)
+        self.assertIn('checked queries use an index', out.getvalue())
+        # The synthetic dataset is rolled back
+        self.assertFalse(Candidate.objects.exists())
+
+    def test_full_scan_is_reported(self):
+        from .utilis.query_plans import full_scans, scanned_tables
+
+        self.assertEqual(full_scans(Candidate.objects.filter(full_name='x').order_by(), scanned_tables()),
+                         [Candidate._meta.db_table])
+        self.assertEqual(full_scans(Candidate.objects.filter(reg_number='x'), scanned_tables()), [])
+
+
+class StatisticsSnapshotTests(SeriesCandidatesTestCase):
+    """statistics_home renders from a cached snapshot that enrollment changes drop."""
+
+    def setUp(self):
+        super().setUp()
+        from django.contrib.auth.models import User
+        from django.core.cache import cache
+        cache.clear()
+        self.client.force_login(User.objects.create_superuser('stats', 'stats@example.com', 'pw'))
+
+    def test_snapshot_figures_and_invalidation(self):
+        self._add_candidates(n_centers=2, per_center=3)
+        Candidate.objects.filter(full_name__endswith='UVT001-0').update(disability=True)
+
+        response = self.client.get('/eims/statistics/')
+        self.assertEqual(response.status_code, 200)
+        context = response.context
+        self.assertEqual(context['total_candidates'], 6)
+        self.assertEqual([(g['code'], g['count']) for g in context['gender_breakdown']], [('F', 4), ('M', 2)])
+        self.assertEqual(context['special_needs_breakdown'][0]['count'], 1)
+        self.assertEqual(context['reg_cat_by_gender'][0]['female_count'], 4)
+        year = context['assessment_series_year_blocks'][0]
+        self.assertEqual((year['year'], year['totals']['total_candidates'], year['totals']['occupation_count']), (2025, 6, 1))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/eims/statistics/')
+        self.assertFalse([q for q in queries if 'eims_candidate' in q['sql']])
+
+        # A new enrollment drops the snapshot; a fee update does not
+        candidate = Candidate.objects.first()
+        candidate.fees_balance = 1000
+        with self._committed():
+            candidate.save(update_fields=['fees_balance'])
+        self.assertEqual(self.client.get('/eims/statistics/').context['total_candidates'], 6)
+        self._add_candidates(n_centers=1, per_center=1)
+        self.assertEqual(self.client.get('/eims/statistics/').context['total_candidates'], 7)
+
+    def test_bulk_occupation_change_drops_snapshot(self):
+        import json
+        from .utilis.cache_generations import generation
+        from .utilis.statistics_snapshot import SNAPSHOT_GENERATION
+
+        self._add_candidates(n_centers=1, per_center=2)
+        candidate = Candidate.objects.first()
+        with self._committed():
+            CandidateLevel.objects.filter(candidate=candidate).delete()
+        welder = Occupation.objects.create(code="WD", name="Welder", category=self.occ_cat)
+        self.client.get('/eims/statistics/')
+
+        # Snapshots are keyed by a generation kept in the database, not in this process's cache
+        before = generation(SNAPSHOT_GENERATION)
+        with self._committed():
+            response = self.client.post('/eims/candidates/bulk-action/', json.dumps({
+                'action': 'change_occupation', 'candidate_ids': [candidate.pk], 'occupation_id': welder.pk,
+            }), content_type='application/json')
+        self.assertTrue(response.json()['success'])
+        self.assertNotEqual(generation(SNAPSHOT_GENERATION), before)
+        context = self.client.get('/eims/statistics/').context
+        self.assertEqual([row['occupation_count'] for row in context['assessment_series']], [2])
+
+    def test_save_bumps_snapshot_with_counts_in_one_write(self):
+        from .utilis.cache_generations import generations
+        from .utilis.count_cache import count_version_name
+        from .utilis.statistics_snapshot import SNAPSHOT_GENERATION
+
+        self._add_candidates(n_centers=1, per_center=1)
+        names = [count_version_name(Candidate), SNAPSHOT_GENERATION]
+        before = generations(names)
+        candidate = Candidate.objects.first()
+        candidate.gender = 'M'
+        with CaptureQueriesContext(connection) as queries, self._committed():
+            candidate.save()
+        self.assertEqual(len([q for q in queries if 'eims_cachegeneration' in q['sql']]), 1)
+        after = generations(names)
+        self.assertTrue(all(after[name] != before[name] for name in names))
+
+
+class PrintedMarksheetTests(SeriesCandidatesTestCase):
+    """The printed marksheet lays out one center at a time, as one PDF or a ZIP of PDFs."""
+
+    def setUp(self):
+        super().setUp()
+        from django.contrib.auth.models import User
+        OccupationLevel.objects.create(occupation=self.occupation, level=self.level, structure_type='modules')
+        self._add_candidates(n_centers=2, per_center=3)
+        self.client.force_login(User.objects.create_superuser('printer', 'printer@example.com', 'pw'))
+
+    def _download(self, **params):
+        response = self.client.get('/eims/results/download-printed-marksheet/', {
+            'assessment_month': '3', 'assessment_year': '2025', 'registration_category': 'Formal',
+            'occupation': self.occupation.pk, 'level': self.level.pk, **params,
+        })
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    @staticmethod
+    def _pages(pdf):
+        import re
+        return len(re.findall(rb'/Type /Page\b(?!s)', pdf))
+
+    def test_single_pdf_has_a_page_per_center(self):
+        response, pdf = self._download()
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertIn('marksheet_formal_Phone Repairer_2025_3.pdf', response['Content-Disposition'])
+        self.assertTrue(pdf.startswith(b'%PDF'))
+        self.assertEqual(self._pages(pdf), 2)
+
+    def test_zip_has_a_pdf_per_center(self):
+        import zipfile
+
+        response, archive = self._download(output='zip')
+        self.assertIn('marksheet_formal_Phone Repairer_2025_3.zip', response['Content-Disposition'])
+        with zipfile.ZipFile(BytesIO(archive)) as zf:
+            self.assertEqual(zf.namelist(), [
+                f"{center.center_number}_marksheet_formal_Phone Repairer_2025_3.pdf" for center in self.centers
+            ])
+            for name in zf.namelist():
+                pdf = zf.read(name)
+                self.assertTrue(pdf.startswith(b'%PDF'))
+                self.assertEqual(self._pages(pdf), 1)
+
+    def test_sections_are_pulled_as_the_document_lays_them_out(self):
+        from reportlab.lib.styles import getSampleStyleSheet
+        from reportlab.platypus import PageBreak, Paragraph
+        from .views import _SectionedDocTemplate
+
+        styles = getSampleStyleSheet()
+        buffer = BytesIO()
+        doc = _SectionedDocTemplate(buffer)
+        pulled_on_page = []
+
+        def sections():
+            for i in range(3):
+                pulled_on_page.append(doc.page)
+                yield ([PageBreak()] if i else []) + [Paragraph(f"Section {i}", styles['Normal'])]
+
+        doc.build_sections(sections())
+        self.assertEqual(pulled_on_page, [0, 1, 2])
+        self.assertEqual(self._pages(buffer.getvalue()), 3)
+
+
+class BulkCandidateActionTests(SeriesCandidatesTestCase):
+    """Bulk edits written with queryset.update() keep the side effects of Candidate.save()."""
+
+    def setUp(self):
+        super().setUp()
+        from django.contrib.auth.models import User
+        from django.core.cache import cache
+        cache.clear()
+        self._add_candidates(n_centers=2, per_center=2)
+        self.client.force_login(User.objects.create_superuser('bulk', 'bulk@example.com', 'pw'))
+
+    def _action(self, action, candidates, **data):
+        import json
+        with self._committed():
+            response = self.client.post('/eims/candidates/bulk-action/', json.dumps({
+                'action': action, 'candidate_ids': [c.pk for c in candidates], **data,
+            }), content_type='application/json')
+        self.assertTrue(response.json()['success'], response.json())
+        return response.json()
+
+    def test_change_center_recounts_and_renumbers(self):
+        from .utilis.count_cache import cached_count
+
+        moved = list(Candidate.objects.filter(assessment_center=self.centers[0]))
+        in_second = Candidate.objects.filter(assessment_center=self.centers[1])
+        self.assertEqual(cached_count(in_second), 2)
+        self._action('change_center', moved, assessment_center_id=self.centers[1].pk)
+
+        self.assertEqual(cached_count(in_second), 4)
+        for before in moved:
+            after = Candidate.objects.get(pk=before.pk)
+            self.assertTrue(after.reg_number.startswith('UVT002/'))
+            self.assertGreater(after.updated_at, before.updated_at)
+
+    def test_change_category_refreshes_flags_and_statistics(self):
+        # A center has picked one module for a candidate who is not enrolled on a level
+        candidate = Candidate.objects.first()
+        with self._committed():
+            CandidateLevel.objects.filter(candidate=candidate).delete()
+        Candidate.objects.filter(pk=candidate.pk).update(modular_module_count=1)
+        self.assertFalse(Candidate.objects.get(pk=candidate.pk).is_billed)
+        self.client.get('/eims/statistics/')
+        Occupation.objects.filter(pk=self.occupation.pk).update(has_modular=True)
+        self._action('change_reg_cat', [candidate], registration_category='Modular')
+
+        candidate = Candidate.objects.get(pk=candidate.pk)
+        self.assertEqual((candidate.registration_category_code, candidate.is_billed), ('modular', True))
+        categories = {row['name'] for row in self.client.get('/eims/statistics/').context['registration_categories']}
+        self.assertEqual(categories, {'Formal', 'Modular'})
+
+    def test_regenerate_renumbers_every_candidate(self):
+        # Another spelling of the category draws from the same /F/ sequence
+        center = self.centers[0]
+        Candidate.objects.filter(assessment_center=center).update(registration_category='formal')
+        candidates = Candidate.objects.filter(assessment_center=center).order_by('pk')
+        before = list(candidates.values_list('reg_number', flat=True))
+        response = self._action('regenerate', candidates)
+
+        self.assertEqual(response['message'], 'Regenerated registration numbers for 2 candidates.')
+        after = list(candidates.values_list('reg_number', flat=True))
+        self.assertEqual(after, ['UVT001/U/25/M/PR/F/003', 'UVT001/U/25/M/PR/F/004'])
+        self.assertEqual([c['old'] for c in response['changes']], before)
+
+
+class HousekeepingTests(SeriesCandidatesTestCase):
+    """Stale drafts, their uploads and leftover temp files are removed by housekeeping runs."""
+
+    def _file(self, name, age_hours=0):
+        import os
+        import time
+        from django.conf import settings
+
+        path = os.path.join(settings.MEDIA_ROOT, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'x' * 10)
+        stamp = time.time() - age_hours * 3600
+        os.utime(path, (stamp, stamp))
+        return path
+
+    def test_run_removes_leftovers(self):
+        import os
+        from datetime import timedelta
+        from django.contrib.auth.models import User
+        from django.utils import timezone
+        from .models import BackgroundJob, CandidateDraft
+        from .utilis.housekeeping import run_housekeeping
+
+        self._use_temp_media()
+        user = User.objects.create_user('drafter', password='pw')
+        stale_photo = self._file('candidate_drafts/1/stale.jpg')
+        fresh_photo = self._file('candidate_drafts/1/fresh.jpg', age_hours=5)
+        orphan = self._file('candidate_drafts/1/orphan.jpg', age_hours=5)
+        stale = CandidateDraft.objects.create(user=user, data={'passport_photo_draft_path': 'candidate_drafts/1/stale.jpg'})
+        CandidateDraft.objects.filter(pk=stale.pk).update(updated_at=timezone.now() - timedelta(hours=13))
+        CandidateDraft.objects.create(user=user, data={'passport_photo_draft_path': 'candidate_drafts/1/fresh.jpg'})
+        old_temp = self._file('temp_photo_cell_7.jpg', age_hours=5)
+        new_temp = self._file('temp_photo_cell_8.jpg')
+        old_png = self._file('candidate_photos/7_regno.png', age_hours=5)
+
+        job = run_housekeeping(['stale_drafts', 'temp_files'], dry_run=True)
+        self.assertEqual(job.summary['tasks']['stale_drafts']['drafts_deleted'], 1)
+        self.assertEqual(CandidateDraft.objects.count(), 2)
+        self.assertTrue(os.path.exists(stale_photo))
+
+        job = run_housekeeping(['stale_drafts', 'temp_files'])
+        self.assertEqual((job.kind, job.status, job.succeeded), ('housekeeping', 'completed', 2))
+        self.assertEqual(job.summary['tasks']['stale_drafts']['files_removed'], 2)
+        self.assertEqual(job.summary['tasks']['temp_files']['files_removed'], 2)
+        self.assertEqual(list(CandidateDraft.objects.values_list('data__passport_photo_draft_path', flat=True)),
+                         ['candidate_drafts/1/fresh.jpg'])
+        self.assertEqual([os.path.exists(p) for p in (stale_photo, orphan, old_temp, old_png)], [False] * 4)
+        self.assertTrue(os.path.exists(fresh_photo) and os.path.exists(new_temp))
+
+        # Old job records go with the report artifacts; this run's own record stays
+        BackgroundJob.objects.update(finished_at=timezone.now() - timedelta(days=40))
+        run = run_housekeeping(['report_artifacts', 'expired_sessions'])
+        self.assertEqual(run.summary['tasks']['report_artifacts']['jobs_deleted'], 2)
+        self.assertEqual(list(BackgroundJob.objects.values_list('pk', flat=True)), [run.pk])
+
+    def test_jobs_of_a_gone_worker_are_failed(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import BackgroundJob
+        from .utilis.housekeeping import run_housekeeping
+
+        dead, alive = (BackgroundJob.objects.create(kind='candidate_import', status='running') for _ in range(2))
+        queued = BackgroundJob.objects.create(kind='marks_upload')
+        BackgroundJob.objects.filter(pk__in=[dead.pk, queued.pk]).update(updated_at=timezone.now() - timedelta(hours=1))
+        # A progress save is a heartbeat even when it names its fields
+        BackgroundJob.objects.filter(pk=alive.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        alive.processed = 10
+        alive.save(update_fields=['processed'])
+
+        run = run_housekeeping(['stale_jobs'])
+        self.assertEqual(run.summary['tasks']['stale_jobs']['jobs_failed'], 2)
+        statuses = dict(BackgroundJob.objects.values_list('pk', 'status'))
+        self.assertEqual([statuses[job.pk] for job in (dead, queued, alive)], ['failed', 'failed', 'running'])
+        self.assertIn('worker running the job has stopped', BackgroundJob.objects.get(pk=dead.pk).error)
+
+    def test_candidate_list_leaves_drafts_alone(self):
+        from datetime import timedelta
+        from django.contrib.auth.models import User
+        from django.utils import timezone
+        from .models import CandidateDraft
+
+        user = User.objects.create_superuser('lister', 'lister@example.com', 'pw')
+        draft = CandidateDraft.objects.create(user=user, data={})
+        CandidateDraft.objects.filter(pk=draft.pk).update(updated_at=timezone.now() - timedelta(days=2))
+        self.client.force_login(user)
+        self.assertEqual(self.client.get('/eims/candidates/').status_code, 200)
+        self.assertTrue(CandidateDraft.objects.filter(pk=draft.pk).exists())
+
+
+class PhotoRenditionTests(SeriesCandidatesTestCase):
+    """Uploaded photos get thumbnail/album/print renditions within their byte budgets."""
+
+    def setUp(self):
+        super().setUp()
+        self._use_temp_media()
+
+    def test_encode_within_budget(self):
+        import random
+        from PIL import Image
+
+        random.seed(1)
+        img = Image.frombytes('RGB', (300, 300), bytes(random.getrandbits(8) for _ in range(300 * 300 * 3)))
+        data = encode_jpeg_within_budget(img, 40 * 1024)
+        self.assertLessEqual(len(data), 40 * 1024)
+        # Nothing fits: the smallest quality is used rather than failing
+        self.assertGreater(len(encode_jpeg_within_budget(img, 100)), 100)
+
+    def test_renditions_built_on_upload(self):
+        import os
+        from io import BytesIO
+        from PIL import Image
+        from django.core.files.base import ContentFile
+
+        self._add_candidates(n_centers=1, per_center=1)
+        candidate = Candidate.objects.get(assessment_series=self.series)
+        self.assertIsNone(candidate.photo_thumbnail_url)
+
+        photo = BytesIO()
+        Image.new('RGB', (1200, 1600), (90, 120, 200)).save(photo, 'JPEG', quality=95)
+        candidate.passport_photo.save('photo.jpg', ContentFile(photo.getvalue()), save=True)
+
+        candidate = Candidate.objects.get(pk=candidate.pk)
+        entry = candidate.photo_renditions['passport_photo']
+        self.assertEqual(entry['source'], candidate.passport_photo.name)
+        for kind, (max_pixels, max_bytes) in RENDITIONS.items():
+            path = candidate.passport_photo.storage.path(entry[kind])
+            self.assertLessEqual(os.path.getsize(path), max_bytes)
+            with Image.open(path) as img:
+                self.assertEqual(max(img.size), max_pixels)
+        storage = candidate.passport_photo.storage
+        self.assertEqual(candidate.photo_thumbnail_url, storage.url(entry['thumb']))
+        self.assertEqual(candidate.photo_print_path, storage.path(entry['print']))
+
+        # A photo the renditions were not built from falls back to the full image
+        candidate.photo_renditions['passport_photo']['source'] = 'candidate_photos/other.jpg'
+        self.assertEqual(candidate.photo_album_path, candidate.passport_photo.path)
+
+    def test_only_uploads_render_and_backfill_covers_the_rest(self):
+        from io import BytesIO
+        from PIL import Image
+        from django.core.files.base import ContentFile
+        from django.core.management import call_command
+
+        self._add_candidates(n_centers=1, per_center=1)
+        candidate = Candidate.objects.get(assessment_series=self.series)
+        photo = BytesIO()
+        Image.new('RGB', (400, 500), (90, 120, 200)).save(photo, 'JPEG')
+        candidate.passport_photo.save('photo.jpg', ContentFile(photo.getvalue()), save=True)
+        # A photo stored before renditions existed
+        Candidate.objects.filter(pk=candidate.pk).update(photo_renditions={})
+
+        # Saves that do not upload a photo leave it unrendered
+        candidate = Candidate.objects.get(pk=candidate.pk)
+        candidate.fees_balance = 1000
+        candidate.save(update_fields=['fees_balance'])
+        candidate.save()
+        self.assertEqual(Candidate.objects.get(pk=candidate.pk).photo_renditions, {})
+
+        out = StringIO()
+        call_command('backfill_photo_renditions', '--dry-run', stdout=out)
+        self.assertIn('1 photo(s) need renditions', out.getvalue())
+        call_command('backfill_photo_renditions', stdout=out)
+        candidate = Candidate.objects.get(pk=candidate.pk)
+        self.assertEqual(candidate.photo_renditions['passport_photo']['source'], candidate.passport_photo.name)
+
+
+class MediaStoreTests(SeriesCandidatesTestCase):
+    """Candidate files are stored once per content and reference-counted."""
+
+    def setUp(self):
+        super().setUp()
+        self._use_temp_media()
+        self._add_candidates(n_centers=1, per_center=2)
+        self.first, self.second = Candidate.objects.filter(assessment_series=self.series)
+
+    def test_identical_uploads_share_a_blob(self):
+        import os
+        from django.core.files.base import ContentFile
+
+        self.first.identification_document.save('id.pdf', ContentFile(b'%PDF-1.4 same'), save=True)
+        self.second.identification_document.save('other.PDF', ContentFile(b'%PDF-1.4 same'), save=True)
+        name = self.first.identification_document.name
+        self.assertEqual(name, self.second.identification_document.name)
+        self.assertTrue(blob_hash(name))
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 2)
+
+        path = self.first.identification_document.path
+        self.first.identification_document.delete(save=True)
+        self.second.identification_document.delete(save=True)
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 0)
+        # Unreferenced files are left to gc_media_blobs, never unlinked by the request
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(collect_garbage(grace_hours=1)['deleted'], 0)
+        self.assertEqual(collect_garbage(grace_hours=0)['deleted'], 1)
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+
+    def test_gc_recounts_and_removes_orphans(self):
+        import os
+        from django.core.files.base import ContentFile
+
+        self.first.qualification_document.save('q.pdf', ContentFile(b'%PDF-1.4 kept'), save=True)
+        kept = self.first.qualification_document.name
+        MediaBlob.objects.filter(name=kept).update(ref_count=5)
+        # Replaced without deleting the old file: its blob is now orphaned
+        orphan_path = self.first.qualification_document.path
+        self.first.qualification_document.save('q2.pdf', ContentFile(b'%PDF-1.4 new'), save=True)
+
+        stats = collect_garbage(grace_hours=0)
+        self.assertEqual((stats['deleted'], stats['referenced']), (1, 1))
+        self.assertFalse(os.path.exists(orphan_path))
+        self.assertEqual(MediaBlob.objects.get(name=self.first.qualification_document.name).ref_count, 1)
+
+    def test_adopt_legacy_files(self):
+        import os
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import FileSystemStorage
+
+        legacy = FileSystemStorage().save('candidate_documents/identification/id.pdf', ContentFile(b'%PDF-1.4 old'))
+        Candidate.objects.filter(pk__in=[self.first.pk, self.second.pk]).update(identification_document=legacy)
+
+        stats = adopt_legacy_files()
+        self.assertEqual((stats['adopted'], stats['files_removed']), (2, 1))
+        name = Candidate.objects.get(pk=self.first.pk).identification_document.name
+        self.assertTrue(blob_hash(name))
+        self.assertEqual(Candidate.objects.get(pk=self.second.pk).identification_document.name, name)
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 2)
+        self.assertFalse(os.path.exists(FileSystemStorage().path(legacy)))
+
+
+class DocumentServingTests(SeriesCandidatesTestCase):
+    """Candidate documents are streamed with conditional GET and byte-range support."""
+
+    def setUp(self):
+        super().setUp()
+        from django.contrib.auth.models import User
+        from django.core.files.base import ContentFile
+
+        self._use_temp_media()
+        self._add_candidates(n_centers=1, per_center=1)
+        self.candidate = Candidate.objects.get(assessment_series=self.series)
+        self.candidate.identification_document.save('id.pdf', ContentFile(b'%PDF-1.4 document body'), save=True)
+        self.client.force_login(User.objects.create_superuser('docs', 'docs@example.com', 'pw'))
+        self.url = f'/eims/candidates/{self.candidate.pk}/documents/identification/'
+
+    def test_full_and_conditional_get(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.4 document body')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('_identification.pdf', response['Content-Disposition'])
+        etag = response['ETag']
+        self.assertIn(blob_hash(self.candidate.identification_document.name), etag)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_range_requests(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-3')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 0-3/22')
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-4')
+        self.assertEqual(b''.join(response.streaming_content), b'body')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */22')
+
+    @override_settings(SENDFILE_BACKEND='nginx')
+    def test_sendfile_offload(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['X-Accel-Redirect'].startswith('/protected-media/blobs/'))
+        self.assertEqual(response.content, b'')
@@ -11,6 +11,7 @@ urlpatterns = [
     path('candidates/import-dual/', views.candidate_import_dual, name='candidate_import_dual'),
     path('candidates/download-template/', views.download_excel_template, name='download_excel_template'),
     path('candidates/bulk-action/', views.bulk_candidate_action, name='bulk_candidate_action'),
+    path('jobs/<int:job_id>/', views.job_status, name='job_status'),
     path('candidates/bulk-modules/', views.bulk_candidate_modules, name='bulk_candidate_modules'),
     path('candidates/export/', views.export_candidates, name='export_candidates'),
     #path('create/', views.eims_create, name='eims_create'),
@@ -0,0 +1,150 @@
+"""
+Minimal background job runner.
+
+Jobs run on a small thread pool inside the web process and record progress on a
+BackgroundJob row, which the browser polls through the job_status view. CPU-heavy work
+inside a job should fan out to worker processes itself, through process_pool() (see
+regno_stamp).
+
+Nothing outside the process knows about a job, so the web server must run its workers
+as long-lived processes (no max-requests recycling, a graceful timeout longer than the
+longest job): a worker that is restarted or killed takes its queued and running jobs
+with it. Their rows would then stay queued/running; every save of a job's progress moves
+BackgroundJob.updated_at, and the housekeeping command's stale_jobs task (see
+housekeeping.py) marks jobs failed once it has not moved for STALE_JOB_MINUTES.
+Interrupted chunked imports are picked up again by `manage.py resume_import_sessions`.
+
+Set BACKGROUND_JOBS_EAGER = True in settings to run jobs inline (used by tests and
+management commands, where there is no request to return early from).
+"""
+import logging
+import multiprocessing
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from ..models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+# A queued or running job whose row has not been saved for this long has lost its worker
+STALE_JOB_MINUTES = getattr(settings, 'BACKGROUND_JOB_STALE_MINUTES', 30)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'BACKGROUND_JOB_THREADS', 2),
+            thread_name_prefix='eims-job',
+        )
+    return _executor
+
+
+def _run(job_id, target, args, kwargs):
+    job = BackgroundJob.objects.get(pk=job_id)
+    job.status = 'running'
+    job.started_at = timezone.now()
+    job.save(update_fields=['status', 'started_at'])
+    try:
+        target(job, *args, **kwargs)
+        job.status = 'completed'
+    except Exception as e:
+        logger.exception("Background job %s (%s) failed", job.pk, job.kind)
+        job.status = 'failed'
+        job.error = f"{e}\n{traceback.format_exc()}"
+    job.finished_at = timezone.now()
+    job.save()
+    return job
+
+
+def _run_in_thread(job_id, target, args, kwargs):
+    # Pool threads keep their own database connection; drop it between jobs
+    close_old_connections()
+    try:
+        _run(job_id, target, args, kwargs)
+    finally:
+        connection.close()
+
+
+def start_job(kind, target, *args, user=None, total=0, eager=None, job=None, **kwargs):
+    """
+    Create a BackgroundJob (or take the queued one passed as job, e.g. one already linked
+    to the work it will do) and run target(job, *args, **kwargs) for it.
+
+    Returns the job immediately (queued) unless eager, in which case it returns once finished.
+    """
+    if job is None:
+        job = BackgroundJob.objects.create(kind=kind, total=total, created_by=user)
+    if eager is None:
+        eager = getattr(settings, 'BACKGROUND_JOBS_EAGER', False)
+    if eager:
+        return _run(job.pk, target, args, kwargs)
+    # The worker thread must see the job row, so only queue it once the request commits
+    transaction.on_commit(lambda: _get_executor().submit(_run_in_thread, job.pk, target, args, kwargs))
+    return job
+
+
+def process_pool(max_workers):
+    """
+    ProcessPoolExecutor for work fanned out from a job. Jobs run on threads, and a forked
+    child inherits whatever locks other threads held at that moment (logging, database
+    drivers, PIL) and can hang on them, so worker processes are spawned instead. Their
+    targets must be module-level functions whose modules import without Django's app
+    registry, as the photo tasks' modules do.
+    """
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def fail_stale_jobs(dry_run=False):
+    """Mark queued/running jobs whose worker has gone (see STALE_JOB_MINUTES) as failed"""
+    now = timezone.now()
+    stale = BackgroundJob.objects.filter(
+        status__in=['queued', 'running'], updated_at__lt=now - timedelta(minutes=STALE_JOB_MINUTES),
+    )
+    stats = {'jobs_failed': stale.count()}
+    if not dry_run:
+        stale.update(
+            status='failed', finished_at=now, updated_at=now,
+            error=f"No progress for {STALE_JOB_MINUTES} minutes; the worker running the job has stopped.",
+        )
+    return stats
+
+
+def record_result(job, result, save=True, keep=True):
+    """Bump the counters for one item and, if keep, append its result"""
+    job.processed += 1
+    if result.get('skipped'):
+        job.skipped += 1
+    elif result.get('success'):
+        job.succeeded += 1
+    else:
+        job.failed += 1
+    if keep:
+        job.results.append(result)
+    if save:
+        job.save(update_fields=['processed', 'succeeded', 'skipped', 'failed', 'results'])
+
+
+def job_payload(job):
+    """JSON-safe summary for the polling endpoint"""
+    return {
+        'id': job.pk,
+        'kind': job.kind,
+        'status': job.status,
+        'finished': job.is_finished,
+        'total': job.total,
+        'processed': job.processed,
+        'succeeded': job.succeeded,
+        'skipped': job.skipped,
+        'failed': job.failed,
+        'results': job.results if job.is_finished else [],
+        'summary': job.summary,
+        'error': job.error.splitlines()[0] if job.error else '',
+    }
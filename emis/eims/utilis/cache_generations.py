@@ -0,0 +1,72 @@
+"""
+Shared generation numbers for cached values.
+
+The cache backend may be per process (settings has no CACHES, so each worker gets its
+own LocMemCache) and may evict keys at any time, so it cannot hold the numbers that say
+whether a cached value is current. They are kept in the CacheGeneration table instead,
+one row per name, and cached values are stored under keys that include the generation
+they were computed at. Bumping a generation (replacing it with a new random number) from
+any process makes every process miss its old entries, which then expire on their own:
+
+    key = f"report:{generation('report')}"       # read the current generation
+    bump_generation('report')                    # after the data behind it changes
+
+A bump is written once the writer's transaction commits, never inside it: other
+processes cannot see the new rows before then anyway, and an upsert inside the
+transaction would hold the generation row's lock until commit, serialising every writer
+on it. All the names bumped in one transaction are written together by a single upsert
+when it commits (immediately outside a transaction).
+"""
+import secrets
+
+from django.db import transaction
+
+
+def generations(names):
+    """{name: generation} for names, 0 for a name never bumped"""
+    from ..models import CacheGeneration
+
+    current = dict(CacheGeneration.objects.filter(name__in=names).values_list('name', 'value'))
+    return {name: current.get(name, 0) for name in names}
+
+
+def generation(name):
+    return generations([name])[name]
+
+
+def _bump(names):
+    from ..models import CacheGeneration
+
+    # A fresh random number rather than an increment: one upsert, no read of the old value
+    CacheGeneration.objects.bulk_create(
+        [CacheGeneration(name=name, value=secrets.randbits(62) + 1) for name in sorted(names)],
+        update_conflicts=True, unique_fields=['name'], update_fields=['value'],
+    )
+
+
+class _PendingBumps:
+    """on_commit callback writing the names bumped during one transaction"""
+
+    def __init__(self):
+        self.names = set()
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        _bump(self.names)
+
+
+def bump_generation(*names, using=None):
+    """Make every cached value of the given generation names out of date, in every process"""
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        _bump(names)
+        return
+    # Join the callback already registered by this transaction; rolled back ones are gone
+    for _, callback, _ in reversed(connection.run_on_commit):
+        if isinstance(callback, _PendingBumps) and not callback.done:
+            callback.names.update(names)
+            return
+    pending = _PendingBumps()
+    pending.names.update(names)
+    transaction.on_commit(pending, using=using)
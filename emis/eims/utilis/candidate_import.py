@@ -0,0 +1,217 @@
+"""
+Candidate spreadsheet import (candidate_import_dual).
+
+Every row is validated first: dates, nationality, occupation, center/branch and district
+are resolved against reference data loaded once (ImportLookups), then the row goes
+through CandidateForm with the same lookups. Only after all rows are checked is anything
+written, in one transaction:
+
+    headers, rows = read_candidate_sheet(ws)
+    cleaned = clean_candidate_row(idx, data, lookups, errors)   # per row, no writes
+    created = create_candidates(valid_rows)                     # all valid rows at once
+
+create_candidates reserves each reg-number group's serials in one allocation, inserts the
+candidates with bulk_create in chunks (each chunk in a savepoint, so a failing chunk is
+retried row by row and only its bad rows are lost) and adds the nature_of_disability links
+with a single bulk_create.
+"""
+import datetime as dt
+
+from openpyxl.utils.datetime import from_excel
+
+DATE_FIELDS = ['date_of_birth', 'start_date', 'finish_date', 'assessment_date']
+FK_FIELDS = ['occupation', 'assessment_center', 'assessment_center_branch', 'district']
+DATE_FORMATS = ('%d/%m/%Y', '%-d/%-m/%Y', '%Y-%m-%d')
+CREATE_CHUNK_SIZE = 500
+
+
+def _parse_date(val):
+    for fmt in DATE_FORMATS:
+        try:
+            return dt.datetime.strptime(val, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def read_candidate_sheet(ws):
+    """(lower-cased headers, [(row number, values)] for the non-empty rows) of a worksheet"""
+    rows = ws.iter_rows(values_only=True)
+    first = next(rows, ())
+    headers = [str(value).replace(u'\xa0', ' ').strip().lower() for value in first if value]
+    rows = [row for row in rows if not all(cell is None for cell in row)]
+    return headers, list(enumerate(rows, start=2))
+
+
+def clean_candidate_row(idx, data, lookups, errors):
+    """
+    Validate one spreadsheet row (a {header: value} dict). Returns (cleaned_data without
+    M2M fields, {m2m field: [objects]}) or None, appending messages for row `idx` to errors.
+    """
+    from ..forms import CandidateForm
+
+    form_data = data.copy()
+    # Normalize registration_category for modular candidates
+    regcat = str(form_data.get('registration_category', '')).strip().capitalize()
+    if regcat == 'Modular':
+        form_data['registration_category'] = 'Modular'
+
+    # Robust date parsing: handle string, datetime, and Excel serial (float/int)
+    for date_field in DATE_FIELDS:
+        val = form_data.get(date_field)
+        if not val:
+            continue
+        if isinstance(val, (dt.date, dt.datetime)):
+            form_data[date_field] = val.date() if isinstance(val, dt.datetime) else val
+        elif isinstance(val, (float, int)):
+            try:
+                form_data[date_field] = from_excel(val).date()
+            except Exception:
+                errors.append(f"Row {idx}: Invalid Excel serial date in '{date_field}'.")
+        elif isinstance(val, str):
+            parsed = _parse_date(val)
+            if parsed:
+                form_data[date_field] = parsed
+            else:
+                errors.append(f"Row {idx}: Invalid date format in '{date_field}'. Use D/M/YYYY, DD/MM/YYYY, or YYYY-MM-DD.")
+
+    nat_val = form_data.get('nationality', '')
+    if nat_val:
+        nat_val_str = str(nat_val).strip()
+        if nat_val_str:
+            # Exact country name first, then normalized
+            country_found = lookups.country(nat_val_str)
+            if country_found:
+                form_data['nationality'] = country_found
+            else:
+                errors.append(f"Row {idx}: Invalid nationality '{nat_val_str}'. Must be a valid country name.")
+                return None
+
+    # Handle occupation lookup (try both code and name)
+    occ_val = form_data.get('occupation')
+    if occ_val:
+        occ_str = str(occ_val).strip()
+        occupation = lookups.occupation(occ_str)
+        if occupation:
+            form_data['occupation'] = occupation.id
+        else:
+            errors.append(f"Row {idx}: Occupation '{occ_str}' not found.")
+            return None
+
+    # Assessment center/branch lookup: branch code first, then center number, then center name
+    center_val = form_data.get('assessment_center')
+    if center_val:
+        center_str = str(center_val).strip()
+        center_found, branch_found = lookups.center(center_str)
+        if center_found:
+            form_data['assessment_center'] = center_found.id
+            form_data['assessment_center_branch'] = branch_found.id if branch_found else None
+        else:
+            errors.append(f"Row {idx}: Assessment Center or Branch '{center_str}' not found. Please use a valid center number, center name, or branch code.")
+            return None
+
+    # District lookup: do this BEFORE form validation
+    district_val = form_data.get('district')
+    if district_val is None or str(district_val).strip() == '':
+        form_data['district'] = None
+    else:
+        district_str = str(district_val).strip()
+        district_obj = lookups.district(district_str)
+        if district_obj:
+            form_data['district'] = district_obj.id
+        else:
+            form_data['district'] = None
+            # Add to errors for visibility but don't stop processing
+            errors.append(f"Row {idx}: District '{district_str}' not found - candidate will be created without district")
+
+    # Village is not imported
+    form_data['village'] = None
+
+    # Coerce every other field except dates and foreign keys to string
+    for k in form_data:
+        if k not in DATE_FIELDS + FK_FIELDS:
+            v = form_data[k]
+            if v is not None and not isinstance(v, str):
+                form_data[k] = str(v)
+
+    # Reg numbers are always generated
+    form_data.pop('reg_number', None)
+
+    form = CandidateForm(form_data, lookups=lookups)
+    if 'district' in form.fields:
+        form.fields['district'].required = False
+    if not form.is_valid():
+        error_list = '; '.join([f"{k}: {v[0]}" for k, v in form.errors.items()])
+        errors.append(f"Row {idx}: {error_list}")
+        return None
+
+    cleaned_data = form.cleaned_data.copy()
+    # Convert date fields in cleaned_data from DD/MM/YYYY string to date objects
+    for date_field in DATE_FIELDS:
+        val = cleaned_data.get(date_field)
+        if val and isinstance(val, str):
+            cleaned_data[date_field] = _parse_date(val) or val
+
+    # Many-to-many fields are added once the candidates exist
+    m2m = {}
+    if 'nature_of_disability' in cleaned_data:
+        m2m['nature_of_disability'] = list(cleaned_data.pop('nature_of_disability') or [])
+    return cleaned_data, m2m
+
+
+def create_candidates(rows, errors=None, chunk_size=CREATE_CHUNK_SIZE):
+    """
+    Create candidates for validated rows [(idx, cleaned_data, m2m)] in one transaction.
+    Returns a list aligned with rows: the saved Candidate, or None where the row could
+    not be inserted (with a message appended to errors).
+    """
+    from django.db import IntegrityError, transaction
+    from ..models import Candidate
+    from .count_cache import bump_count_version
+    from .regno_sequence import assign_reg_numbers
+    from .registration_category import registration_category_code
+    from .statistics_snapshot import invalidate_statistics_snapshot
+
+    errors = errors if errors is not None else []
+    candidates = [Candidate(**cleaned_data) for _, cleaned_data, _ in rows]
+    # bulk_create skips Candidate.save()
+    for candidate in candidates:
+        candidate.registration_category_code = registration_category_code(candidate.registration_category)
+    created = [None] * len(rows)
+
+    with transaction.atomic():
+        # Serials for every group in the file are reserved together
+        assign_reg_numbers(candidates)
+
+        for start in range(0, len(candidates), chunk_size):
+            chunk = range(start, min(start + chunk_size, len(candidates)))
+            try:
+                with transaction.atomic():
+                    Candidate.objects.bulk_create([candidates[i] for i in chunk])
+                for i in chunk:
+                    created[i] = candidates[i]
+            except IntegrityError:
+                # Find the offending rows; the rest of the chunk still goes in
+                for i in chunk:
+                    candidate = candidates[i]
+                    candidate.pk = None
+                    candidate._state.adding = True
+                    try:
+                        with transaction.atomic():
+                            candidate.save()
+                        created[i] = candidate
+                    except IntegrityError as e:
+                        errors.append(f"Row {rows[i][0]}: could not be saved ({e})")
+
+        links = []
+        for (_, _, m2m), candidate in zip(rows, created):
+            if candidate is None:
+                continue
+            for nature in m2m.get('nature_of_disability') or []:
+                links.append(Candidate.nature_of_disability.through(candidate_id=candidate.pk, natureofdisability_id=nature.pk))
+        if links:
+            Candidate.nature_of_disability.through.objects.bulk_create(links, ignore_conflicts=True)
+        # bulk_create sends no post_save
+        bump_count_version(Candidate)
+        invalidate_statistics_snapshot()
+    return created
@@ -0,0 +1,153 @@
+"""
+Indexed candidate search by name and reg number.
+
+`full_name__icontains` and `reg_number__icontains` read the whole candidate table.
+search_filter() returns a Q with the same matching (case-insensitive substring) that an
+index can answer:
+
+- PostgreSQL: pg_trgm GIN indexes on UPPER(full_name) and UPPER(reg_number) serve the
+  `UPPER(column) LIKE UPPER('%term%')` that icontains compiles to, so the Q stays icontains.
+- SQLite: an FTS5 table with the trigram tokenizer mirrors both columns. Triggers keep it
+  in step with every insert, update and delete (bulk_create/update included), and the Q
+  looks the term up in it.
+
+Terms shorter than a trigram fall back to icontains, as does a database without the index.
+install_search_index() runs after migrate (see signals.py);
+`python manage.py rebuild_candidate_search` recreates and refills the index. On PostgreSQL
+creating pg_trgm needs a role allowed to create extensions; when the migrating role is
+not, the failure is logged, searches use plain icontains, and a superuser runs once
+
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+in the database, followed by `python manage.py rebuild_candidate_search`.
+
+    candidates.filter(search_filter(q))                        # name or reg number
+    candidates.filter(search_filter(name, fields=['full_name']))
+"""
+import logging
+
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+SEARCH_FIELDS = ('full_name', 'reg_number')
+FTS_TABLE = 'eims_candidate_search'
+MIN_TRIGRAM_LENGTH = 3
+
+logger = logging.getLogger(__name__)
+
+# Database alias -> whether its search index can be used
+_available = {}
+
+
+def _candidate_table():
+    from ..models import Candidate
+    return Candidate._meta.db_table
+
+
+def _fts_exists(cursor):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+    return cursor.fetchone() is not None
+
+
+def _install_sqlite(cursor, table, rebuild):
+    columns = ', '.join(SEARCH_FIELDS)
+    new_values = ', '.join(f'new.{field}' for field in SEARCH_FIELDS)
+    old_values = ', '.join(f'old.{field}' for field in SEARCH_FIELDS)
+    if rebuild:
+        for suffix in ('ai', 'ad', 'au'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}')
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    created = not _fts_exists(cursor)
+    # External content: the index stores no copy of the text, only the trigrams
+    cursor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        f"{columns}, content='{table}', content_rowid='id', tokenize='trigram')"
+    )
+    cursor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values}); END"
+    )
+    cursor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END"
+    )
+    cursor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF {columns} ON {table} BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values}); END"
+    )
+    if created:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def _trgm_indexes_exist(cursor, table):
+    names = [f'{table}_{field}_trgm' for field in SEARCH_FIELDS]
+    cursor.execute('SELECT COUNT(*) FROM pg_indexes WHERE indexname = ANY(%s)', [names])
+    return cursor.fetchone()[0] == len(names)
+
+
+def _install_postgresql(cursor, table, rebuild):
+    cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for field in SEARCH_FIELDS:
+        name = f'{table}_{field}_trgm'
+        if rebuild:
+            cursor.execute(f'DROP INDEX IF EXISTS {name}')
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin (UPPER("{field}"::text) gin_trgm_ops)'
+        )
+
+
+def install_search_index(using=DEFAULT_DB_ALIAS, rebuild=False):
+    """
+    Create the search index for the database if it is missing (or recreate it, with
+    rebuild). Returns True if searches on it will use the index.
+    """
+    connection = connections[using]
+    installers = {'sqlite': _install_sqlite, 'postgresql': _install_postgresql}
+    installer = installers.get(connection.vendor)
+    _available.pop(using, None)
+    if installer is None:
+        return False
+    try:
+        # A failed statement must not leave an outer transaction aborted
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            installer(cursor, _candidate_table(), rebuild)
+    except DatabaseError as e:
+        # e.g. SQLite built without FTS5 / the trigram tokenizer (3.34+), or a PostgreSQL
+        # role without permission to create pg_trgm
+        logger.warning("Candidate search index not installed, searches use icontains: %s", e)
+        _available[using] = False
+        return False
+    return search_index_available(using)
+
+
+def search_index_available(using=DEFAULT_DB_ALIAS):
+    if using not in _available:
+        connection = connections[using]
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                _available[using] = _fts_exists(cursor)
+        elif connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                _available[using] = _trgm_indexes_exist(cursor, _candidate_table())
+        else:
+            _available[using] = False
+    return _available[using]
+
+
+def search_filter(value, fields=SEARCH_FIELDS, using=DEFAULT_DB_ALIAS):
+    """Q for candidates whose fields contain value (case-insensitive), through the index where possible"""
+    value = (value or '').strip()
+    if not value:
+        return Q()
+    fields = list(fields)
+    if (connections[using].vendor == 'sqlite' and len(value) >= MIN_TRIGRAM_LENGTH
+            and search_index_available(using)):
+        phrase = '"' + value.replace('"', '""') + '"'
+        match = f"{{{' '.join(fields)}}} : {phrase}"
+        return Q(pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match]))
+    q = Q()
+    for field in fields:
+        q |= Q(**{f'{field}__icontains': value})
+    return q
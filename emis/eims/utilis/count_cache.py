@@ -0,0 +1,96 @@
+"""
+Cached row counts for paginated lists.
+
+A paginated list counts its whole filtered query on every view, even page 1. cached_count()
+stores the count under the query's signature (its compiled COUNT SQL and parameters, so
+the same filters give the same key whatever view builds them) together with a version
+number for each tracked table the query reads. post_save/post_delete on those models bump
+their table's version (see signals.py), so a write makes the next view recount, while
+repeat views with the same filters are served from the cache. Writes that bypass signals
+(queryset.update(), bulk_create) call bump_count_version() themselves or are caught by
+the timeout. The versions are shared generation numbers (see cache_generations.py), so a
+write in one worker process is seen by all of them even with a per-process cache.
+
+    count = cached_count(candidates)
+    paginator = CachedCountPaginator(candidates, 50)     # Paginator with a cached .count
+    bump_count_version(Candidate)                        # after a bulk write
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from .cache_generations import bump_generation, generations
+
+COUNT_CACHE_SECONDS = getattr(settings, 'PAGINATION_COUNT_CACHE_SECONDS', 600)
+# Below this many rows an exact count is cheap enough not to estimate
+APPROXIMATE_COUNT_MIN = getattr(settings, 'PAGINATION_APPROXIMATE_COUNT_MIN', 100000)
+
+
+def tracked_models():
+    from ..models import Candidate, CandidateLevel, CandidateModule, Result
+    return (Candidate, CandidateLevel, CandidateModule, Result)
+
+
+def count_version_name(model):
+    """Cache generation name of the counts over model's table"""
+    return f'count-version:{model._meta.label_lower}'
+
+
+def bump_count_version(model):
+    """Invalidate the cached counts of every query that reads model's table"""
+    bump_generation(count_version_name(model))
+
+
+def _count_cache_key(queryset):
+    sql, params = queryset.order_by().query.sql_with_params()
+    quote_name = connections[queryset.db].ops.quote_name
+    read = [model for model in tracked_models() if quote_name(model._meta.db_table) in sql]
+    versions = generations([count_version_name(model) for model in read]) if read else {}
+    signature = '|'.join([
+        queryset.db, sql, repr(params),
+        *(f'{model._meta.label_lower}={versions[count_version_name(model)]}' for model in read),
+    ])
+    return 'count:' + hashlib.sha1(signature.encode('utf-8')).hexdigest()
+
+
+def _estimated_count(queryset):
+    """Planner row estimate for an unfiltered table on PostgreSQL, or None"""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql' or queryset.query.where or queryset.query.distinct:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [queryset.model._meta.db_table])
+        row = cursor.fetchone()
+    if not row or row[0] < APPROXIMATE_COUNT_MIN:
+        return None
+    return int(row[0])
+
+
+def cached_count(queryset, timeout=COUNT_CACHE_SECONDS):
+    """Row count of queryset, estimated for a large unfiltered table, cached until its tables change"""
+    try:
+        key = _count_cache_key(queryset)
+    except EmptyResultSet:
+        return 0
+    count = cache.get(key)
+    if count is None:
+        count = _estimated_count(queryset)
+        if count is None:
+            count = queryset.order_by().count()
+        cache.set(key, count, timeout)
+    return count
+
+
+class CachedCountPaginator(Paginator):
+    """Django's Paginator, counting through cached_count()"""
+
+    @cached_property
+    def count(self):
+        if hasattr(self.object_list, 'query'):
+            return cached_count(self.object_list)
+        return super().count
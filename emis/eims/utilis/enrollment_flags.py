@@ -0,0 +1,72 @@
+"""
+Enrollment flags kept on Candidate.
+
+"Enrolled" used to be asked as `Q(candidatelevel__isnull=False) | Q(candidatemodule__isnull=False)`
+plus `.distinct()`, a join that repeats each candidate once per level and module. Candidate
+now carries the answer in indexed columns:
+
+- enrolled_level_count / enrolled_module_count: CandidateLevel and CandidateModule rows
+- has_enrollment: either count is above zero
+- is_billed: billed for an enrollment, i.e. a level, or for a Modular candidate a module
+  or a center-chosen modular_module_count (what the fee views count as billed, less
+  the balance and payment columns they check directly)
+
+refresh_enrollment_flags() recomputes them from the enrollment tables in one UPDATE. It
+runs after every save/delete of a CandidateLevel or CandidateModule, and after a Candidate
+save that changes a billing input (see signals.py); code that writes with queryset.update() or bulk_create calls it itself, and
+`python manage.py backfill_enrollment_flags` fills every candidate.
+
+    Candidate.objects.filter(has_enrollment=True)          # instead of the OR join
+    refresh_enrollment_flags([candidate.pk])               # after a bulk write
+"""
+from django.db.models import BooleanField, Count, Exists, ExpressionWrapper, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .registration_category import MODULAR
+
+ENROLLMENT_FLAG_FIELDS = ('enrolled_level_count', 'enrolled_module_count', 'has_enrollment', 'is_billed')
+# Candidate fields is_billed depends on besides the enrollment tables
+BILLING_INPUT_FIELDS = ('registration_category', 'modular_module_count')
+
+
+def billed_q(prefix=''):
+    """Q for the candidates the fee views bill: billed for an enrollment, owing or paid"""
+    return (Q(**{f'{prefix}is_billed': True}) | Q(**{f'{prefix}fees_balance__gt': 0})
+            | Q(**{f'{prefix}payment_cleared': True}))
+
+
+def _rows(model):
+    return model.objects.filter(candidate=OuterRef('pk')).order_by()
+
+
+def _count(model):
+    counts = _rows(model).values('candidate').annotate(n=Count('pk')).values('n')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def refresh_enrollment_flags(candidates=None):
+    """
+    Recompute the flags of candidates (a queryset or primary keys; every candidate when
+    None) from their enrollments. Returns the number of candidates updated.
+    """
+    from ..models import Candidate, CandidateLevel, CandidateModule
+
+    if candidates is None:
+        queryset = Candidate.objects.all()
+    elif hasattr(candidates, 'values'):
+        queryset = Candidate.objects.filter(pk__in=candidates.values('pk'))
+    else:
+        queryset = Candidate.objects.filter(pk__in=list(candidates))
+    has_level, has_module = Q(Exists(_rows(CandidateLevel))), Q(Exists(_rows(CandidateModule)))
+    modular = Q(registration_category_code=MODULAR)
+    return queryset.update(
+        enrolled_level_count=_count(CandidateLevel),
+        enrolled_module_count=_count(CandidateModule),
+        has_enrollment=ExpressionWrapper(has_level | has_module, output_field=BooleanField()),
+        # NULL registration_category/modular_module_count would make the condition NULL
+        is_billed=Coalesce(
+            ExpressionWrapper(has_level | (modular & (Q(modular_module_count__in=[1, 2]) | has_module)),
+                              output_field=BooleanField()),
+            Value(False),
+        ),
+    )
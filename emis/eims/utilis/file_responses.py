@@ -0,0 +1,163 @@
+import os
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.http import FileResponse
+
+PDF_CONTENT_TYPE = 'application/pdf'
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+ZIP_CONTENT_TYPE = 'application/zip'
+
+# Generated files stay in memory up to this size, then roll over to a temp file on disk
+DEFAULT_SPOOL_MAX_SIZE = 2 * 1024 * 1024
+
+
+def spooled_buffer(max_size=None):
+    """
+    Return a writable binary buffer for building PDFs/workbooks.
+    Small outputs stay in memory; large ones spill to disk instead of growing worker RSS.
+    """
+    if max_size is None:
+        max_size = getattr(settings, 'REPORT_SPOOL_MAX_SIZE', DEFAULT_SPOOL_MAX_SIZE)
+    return SpooledTemporaryFile(max_size=max_size, mode='w+b')
+
+
+def spooled_file_response(buffer, filename, content_type=PDF_CONTENT_TYPE, as_attachment=True):
+    """
+    Stream a finished buffer back to the client without copying it into the response.
+    The buffer is closed by Django once the response has been sent.
+    """
+    size = buffer.seek(0, os.SEEK_END)
+    buffer.seek(0)
+    response = FileResponse(buffer, content_type=content_type, as_attachment=as_attachment, filename=filename)
+    response['Content-Length'] = size
+    return response
+
+
+def pdf_response(buffer, filename, as_attachment=True):
+    """Shortcut for a built ReportLab document"""
+    return spooled_file_response(buffer, filename, PDF_CONTENT_TYPE, as_attachment=as_attachment)
+
+
+def workbook_response(wb, filename):
+    """Save an openpyxl workbook to a spooled buffer and stream it"""
+    buffer = spooled_buffer()
+    wb.save(buffer)
+    return spooled_file_response(buffer, filename, XLSX_CONTENT_TYPE)
+
+
+class _FileRange:
+    """Read-only view of `length` bytes of an open file from `start`, for FileResponse"""
+
+    def __init__(self, f, start, length):
+        self._file = f
+        self._remaining = length
+        f.seek(start)
+
+    def read(self, size=-1):
+        if self._remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def close(self):
+        self._file.close()
+
+
+def _parse_range(header, size):
+    """(start, end) inclusive for a single 'bytes=' range, None to ignore it, or 'unsatisfiable'"""
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    start, _, end = header[len('bytes='):].strip().partition('-')
+    try:
+        if not start:
+            # Suffix range: the last N bytes
+            length = int(end)
+            if length <= 0:
+                return 'unsatisfiable'
+            return max(size - length, 0), size - 1
+        start = int(start)
+        end = int(end) if end else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return 'unsatisfiable'
+    return start, min(end, size - 1)
+
+
+def serve_file(request, path, filename, content_type=None, as_attachment=False, etag=None):
+    """
+    Serve a file from disk without reading it into memory.
+
+    Answers conditional requests (If-None-Match / If-Modified-Since) with 304 and
+    single byte-range requests with 206. Behind nginx or Apache set
+    SENDFILE_BACKEND = 'nginx' (with SENDFILE_URL_PREFIX, an internal location aliased
+    to MEDIA_ROOT) or 'xsendfile' so the web server sends the body instead.
+    `etag` defaults to one built from the file's size and modification time.
+    """
+    import mimetypes
+    from urllib.parse import quote
+    from django.http import Http404, HttpResponse
+    from django.utils.cache import get_conditional_response, patch_cache_control
+    from django.utils.http import http_date
+
+    try:
+        stat = os.stat(path)
+    except OSError:
+        raise Http404("File not found on server")
+    size = stat.st_size
+    etag = f'"{etag or f"{size:x}-{stat.st_mtime_ns:x}"}"'
+    last_modified = int(stat.st_mtime)
+
+    # Authenticated content: browsers may keep it, but must revalidate (cheap 304s)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    if content_type is None:
+        content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    backend = getattr(settings, 'SENDFILE_BACKEND', None)
+    if backend:
+        response = HttpResponse(content_type=content_type)
+        if backend == 'nginx':
+            relative = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+            prefix = getattr(settings, 'SENDFILE_URL_PREFIX', '/protected-media/').rstrip('/')
+            response['X-Accel-Redirect'] = quote(f"{prefix}/{relative}")
+        else:
+            response['X-Sendfile'] = path
+        disposition = 'attachment' if as_attachment else 'inline'
+        response['Content-Disposition'] = f'{disposition}; filename="{filename}"'
+    else:
+        byte_range = None
+        if request.method == 'GET':
+            byte_range = _parse_range(request.META.get('HTTP_RANGE'), size)
+            if_range = request.META.get('HTTP_IF_RANGE')
+            if byte_range and if_range and if_range not in (etag, http_date(last_modified)):
+                byte_range = None
+        if byte_range == 'unsatisfiable':
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        f = open(path, 'rb')
+        if byte_range:
+            start, end = byte_range
+            response = FileResponse(_FileRange(f, start, end - start + 1), content_type=content_type,
+                                    as_attachment=as_attachment, filename=filename, status=206)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = end - start + 1
+        else:
+            response = FileResponse(f, content_type=content_type, as_attachment=as_attachment, filename=filename)
+            response['Content-Length'] = size
+        response['Accept-Ranges'] = 'bytes'
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,206 @@
+"""
+Periodic housekeeping, run by `python manage.py housekeeping` instead of on page views.
+
+Each task removes one kind of leftover and returns its figures:
+
+- stale_drafts: CandidateDrafts not touched for DRAFT_MAX_AGE_HOURS, with the photo and
+  document files they uploaded under candidate_drafts/, plus files there no draft refers to
+- temp_files: temp_photo_cell_*.jpg written by the photo album and, from before photos
+  moved into the media store, the *_regno*.png intermediates of in-request regno stamping
+  (stamped photos are now blobs named by their hash, which the pattern never matches)
+- expired_sessions: Django sessions past their expiry
+- report_artifacts: finished BackgroundJob records (with their per-item results) and the
+  uploaded files of completed ImportSessions, after REPORT_RETENTION_DAYS
+- stale_jobs: BackgroundJobs left queued or running by a worker process that has gone,
+  marked failed (background_jobs.fail_stale_jobs)
+- media_blobs: blobs of the content-addressed media store nothing references any more,
+  after MEDIA_GC_GRACE_HOURS (media_store.collect_garbage, as gc_media_blobs runs it)
+
+The command runs every task when it is due (TASKS gives the interval) and records each
+run as a 'housekeeping' BackgroundJob whose summary holds the figures per task:
+
+    python manage.py housekeeping                   # loop forever
+    python manage.py housekeeping --once --task temp_files --dry-run
+"""
+import fnmatch
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+DRAFT_MAX_AGE_HOURS = getattr(settings, 'HOUSEKEEPING_DRAFT_MAX_AGE_HOURS', 12)
+# Files younger than this may still be in use by the request that wrote them
+TEMP_FILE_GRACE_HOURS = getattr(settings, 'HOUSEKEEPING_TEMP_FILE_GRACE_HOURS', 2)
+REPORT_RETENTION_DAYS = getattr(settings, 'HOUSEKEEPING_REPORT_RETENTION_DAYS', 30)
+MEDIA_GC_GRACE_HOURS = getattr(settings, 'HOUSEKEEPING_MEDIA_GC_GRACE_HOURS', 24)
+DRAFT_DIR = 'candidate_drafts'
+DRAFT_FILE_KEYS = ('passport_photo_draft_path', 'identification_document_draft_path', 'qualification_document_draft_path')
+# '*_regno*.png' only matches legacy files; see the temp_files entry above
+TEMP_FILE_PATTERNS = ('temp_photo_cell_*.jpg', '*_regno*.png')
+
+
+def _remove(path, stats, dry_run):
+    try:
+        size = os.path.getsize(path)
+        if not dry_run:
+            os.remove(path)
+    except OSError:
+        return
+    stats['files_removed'] += 1
+    stats['bytes_freed'] += size
+
+
+def _old_files(root, patterns, cutoff):
+    """Files under root matching any of patterns and last modified before cutoff (a timestamp)"""
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            if not any(fnmatch.fnmatch(filename, pattern) for pattern in patterns):
+                continue
+            path = os.path.join(dirpath, filename)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    yield path
+            except OSError:
+                continue
+
+
+def purge_stale_drafts(dry_run=False):
+    from django.core.files.storage import default_storage
+    from ..models import CandidateDraft
+
+    def draft_files(drafts):
+        names = set()
+        for data in drafts.values_list('data', flat=True):
+            names.update((data or {}).get(key) for key in DRAFT_FILE_KEYS)
+        return names
+
+    stats = {'drafts_deleted': 0, 'files_removed': 0, 'bytes_freed': 0}
+    now = timezone.now()
+    threshold = now - timedelta(hours=DRAFT_MAX_AGE_HOURS)
+    stale = CandidateDraft.objects.filter(updated_at__lt=threshold)
+    stale_files = draft_files(stale)
+    kept_files = draft_files(CandidateDraft.objects.filter(updated_at__gte=threshold))
+    stats['drafts_deleted'] = stale.count()
+    if not dry_run:
+        stale.delete()
+
+    # Uploads of the stale drafts, and uploads never saved into any draft
+    root = default_storage.path(DRAFT_DIR)
+    cutoff = (now - timedelta(hours=TEMP_FILE_GRACE_HOURS)).timestamp()
+    for path in _old_files(root, ('*',), cutoff):
+        name = os.path.relpath(path, default_storage.path('')).replace(os.sep, '/')
+        if name not in kept_files:
+            _remove(path, stats, dry_run)
+    # Uploads of stale drafts go even if younger than the grace period
+    for name in stale_files - kept_files - {None, ''}:
+        path = default_storage.path(name)
+        if os.path.isfile(path) and name.startswith(f'{DRAFT_DIR}/'):
+            _remove(path, stats, dry_run)
+    return stats
+
+
+def remove_temp_files(dry_run=False):
+    from ..models import Candidate
+
+    stats = {'files_removed': 0, 'bytes_freed': 0}
+    # Legacy stamped photos still in use by candidates not restamped since
+    referenced = {
+        os.path.join(settings.MEDIA_ROOT, name)
+        for name in Candidate.objects.filter(passport_photo_with_regno__endswith='.png')
+        .values_list('passport_photo_with_regno', flat=True)
+    }
+    cutoff = (timezone.now() - timedelta(hours=TEMP_FILE_GRACE_HOURS)).timestamp()
+    for path in _old_files(settings.MEDIA_ROOT, TEMP_FILE_PATTERNS, cutoff):
+        if path not in referenced:
+            _remove(path, stats, dry_run)
+    return stats
+
+
+def clear_expired_sessions(dry_run=False):
+    from importlib import import_module
+
+    engine = import_module(settings.SESSION_ENGINE)
+    stats = {'sessions_deleted': None}
+    if settings.SESSION_ENGINE in ('django.contrib.sessions.backends.db', 'django.contrib.sessions.backends.cached_db'):
+        from django.contrib.sessions.models import Session
+        stats['sessions_deleted'] = Session.objects.filter(expire_date__lt=timezone.now()).count()
+    if not dry_run:
+        engine.SessionStore.clear_expired()
+    return stats
+
+
+def prune_report_artifacts(dry_run=False):
+    from ..models import BackgroundJob, ImportSession
+
+    stats = {'jobs_deleted': 0, 'import_files_removed': 0, 'files_removed': 0, 'bytes_freed': 0}
+    cutoff = timezone.now() - timedelta(days=REPORT_RETENTION_DAYS)
+    jobs = BackgroundJob.objects.filter(status__in=['completed', 'failed'], finished_at__lt=cutoff)
+    stats['jobs_deleted'] = jobs.count()
+    if not dry_run:
+        jobs.delete()
+
+    # Completed sessions keep their row (its file hash still catches a repeated upload)
+    sessions = ImportSession.objects.filter(status='completed', updated_at__lt=cutoff).exclude(file='')
+    for session in sessions:
+        for field in (session.file, session.photo_zip):
+            if field and field.storage.exists(field.name):
+                stats['files_removed'] += 1
+                stats['bytes_freed'] += field.size
+                if not dry_run:
+                    field.storage.delete(field.name)
+        stats['import_files_removed'] += 1
+        if not dry_run:
+            ImportSession.objects.filter(pk=session.pk).update(file='', photo_zip='')
+    return stats
+
+
+def fail_stale_jobs(dry_run=False):
+    from .background_jobs import fail_stale_jobs as fail
+
+    return fail(dry_run=dry_run)
+
+
+def collect_media_garbage(dry_run=False):
+    from .media_store import collect_garbage
+
+    return collect_garbage(grace_hours=MEDIA_GC_GRACE_HOURS, dry_run=dry_run)
+
+
+# name -> (interval in seconds, task)
+TASKS = {
+    'stale_drafts': (60 * 60, purge_stale_drafts),
+    'temp_files': (6 * 60 * 60, remove_temp_files),
+    'expired_sessions': (24 * 60 * 60, clear_expired_sessions),
+    'report_artifacts': (24 * 60 * 60, prune_report_artifacts),
+    'stale_jobs': (10 * 60, fail_stale_jobs),
+    'media_blobs': (24 * 60 * 60, collect_media_garbage),
+}
+
+
+def run_tasks(job, names, dry_run=False):
+    """Background-job target: run the named tasks, recording each one's figures on the job"""
+    from .background_jobs import record_result
+
+    job.total = len(names)
+    job.summary = {'dry_run': dry_run, 'tasks': {}}
+    for name in names:
+        started = time.monotonic()
+        try:
+            stats = TASKS[name][1](dry_run=dry_run)
+            result = {'task': name, 'success': True, **stats}
+        except Exception as e:
+            result = {'task': name, 'success': False, 'error': str(e)}
+        result['seconds'] = round(time.monotonic() - started, 3)
+        job.summary['tasks'][name] = result
+        record_result(job, result, save=False)
+        job.save(update_fields=['total', 'processed', 'succeeded', 'failed', 'results', 'summary'])
+
+
+def run_housekeeping(names=None, dry_run=False, user=None):
+    """Run the named tasks (all by default) now; returns the finished BackgroundJob"""
+    from .background_jobs import start_job
+
+    names = list(names or TASKS)
+    return start_job('housekeeping', run_tasks, names, dry_run=dry_run, user=user, total=len(names), eager=True)
@@ -0,0 +1,176 @@
+"""
+In-memory lookups for candidate imports.
+
+Resolving each spreadsheet row's occupation, assessment center/branch, district and
+nationality used to cost several queries per row (and two passes over the country list).
+ImportLookups loads those tables once per upload and answers from dictionaries:
+
+    lookups = ImportLookups()
+    occupation = lookups.occupation('PR')             # by code, then by name
+    center, branch = lookups.center('UVT001')         # by branch code, center number, center name
+    district = lookups.district('Kampala')
+    country_code = lookups.country('Ugandan')
+
+Keys are compared case-insensitively, like the `__iexact` queries they replace; when two
+rows share a key the first in the model's default order wins, as `.first()` did.
+
+Passed to CandidateForm(data, lookups=lookups), it also resolves the form's model choice
+fields from querysets evaluated once per import rather than one query per row and field.
+The form declares those fields as the Preloaded* fields below, which behave like Django's
+own until bind_form() hands them the lookups.
+"""
+import re
+
+from django import forms
+from django.core.exceptions import ValidationError
+
+
+def _key(value):
+    return str(value).strip().lower()
+
+
+def normalize_country(value):
+    value = value.lower().replace('&', 'and')
+    value = re.sub(r'[^a-z0-9 ]', '', value)
+    return re.sub(r'\s+', ' ', value).strip()
+
+
+class PreloadedModelChoiceField(forms.ModelChoiceField):
+    """ModelChoiceField answered from ImportLookups.choices(), once bound, instead of a query per value"""
+    lookups = None
+
+    def to_python(self, value):
+        if self.lookups is None:
+            return super().to_python(value)
+        if value in self.empty_values:
+            return None
+        key = self.to_field_name or 'pk'
+        if isinstance(value, self.queryset.model):
+            value = getattr(value, key)
+        obj = self.lookups.choices(self.queryset, key).get(str(value))
+        if obj is None:
+            raise ValidationError(self.error_messages['invalid_choice'], code='invalid_choice', params={'value': value})
+        return obj
+
+
+class PreloadedModelMultipleChoiceField(forms.ModelMultipleChoiceField):
+    """ModelMultipleChoiceField answered from ImportLookups.choices(), once bound; cleans to a list"""
+    lookups = None
+
+    def _check_values(self, value):
+        if self.lookups is None:
+            return super()._check_values(value)
+        key = self.to_field_name or 'pk'
+        try:
+            value = frozenset(value)
+        except TypeError:
+            raise ValidationError(self.error_messages['invalid_list'], code='invalid_list')
+        choices = self.lookups.choices(self.queryset, key)
+        objects = []
+        for val in value:
+            obj = choices.get(str(val))
+            if obj is None:
+                raise ValidationError(self.error_messages['invalid_choice'], code='invalid_choice', params={'value': val})
+            objects.append(obj)
+        return objects
+
+
+def _index(queryset, *fields):
+    """One {lower-cased value: object} dict per field, first object winning"""
+    if not queryset.ordered:
+        queryset = queryset.order_by('pk')
+    maps = tuple({} for _ in fields)
+    for obj in queryset:
+        for field, mapping in zip(fields, maps):
+            value = getattr(obj, field)
+            if value:
+                mapping.setdefault(_key(value), obj)
+    return maps
+
+
+class ImportLookups:
+    """Reference data for one import, loaded with a handful of queries"""
+
+    def __init__(self):
+        from django_countries import countries
+        from ..models import AssessmentCenter, AssessmentCenterBranch, District, Occupation, OccupationCategory
+
+        self.occupation_codes, self.occupation_names = _index(Occupation.objects.only('id', 'code', 'name'), 'code', 'name')
+        self.branch_codes, = _index(
+            AssessmentCenterBranch.objects.select_related('assessment_center'), 'branch_code'
+        )
+        self.center_numbers, self.center_names = _index(AssessmentCenter.objects.all(), 'center_number', 'center_name')
+        self.districts, = _index(District.objects.only('id', 'name'), 'name')
+
+        self.centers_by_pk = {center.pk: center for center in self.center_numbers.values()}
+        self.category_names, = _index(OccupationCategory.objects.all(), 'name')
+        self._choices = {}
+
+        self.country_names = {}
+        self.country_normalized = {}
+        for code, name in countries:
+            self.country_names.setdefault(name.lower(), code)
+            self.country_normalized.setdefault(normalize_country(name), code)
+
+    def occupation(self, value):
+        key = _key(value)
+        return self.occupation_codes.get(key) or self.occupation_names.get(key)
+
+    def center(self, value):
+        """(center, branch) for a branch code, center number or center name; (None, None) if unknown"""
+        key = _key(value)
+        branch = self.branch_codes.get(key)
+        if branch:
+            return branch.assessment_center, branch
+        return self.center_numbers.get(key) or self.center_names.get(key), None
+
+    def district(self, value):
+        return self.districts.get(_key(value))
+
+    def country(self, value):
+        """Country code for a country name, matched exactly then after normalization"""
+        value = str(value).strip()
+        return self.country_names.get(value.lower()) or self.country_normalized.get(normalize_country(value))
+
+    def center_by_pk(self, pk):
+        from ..models import AssessmentCenter
+        try:
+            return self.centers_by_pk[pk]
+        except KeyError:
+            raise AssessmentCenter.DoesNotExist(pk)
+
+    def occupation_category(self, name):
+        from ..models import OccupationCategory
+        try:
+            return self.category_names[_key(name)]
+        except KeyError:
+            raise OccupationCategory.DoesNotExist(name)
+
+    def workers_pas_category(self):
+        """Same matching as CandidateForm: "Worker's PAS", "Worker PAS", then a looser pattern"""
+        for name in ("worker's pas", 'worker pas'):
+            if name in self.category_names:
+                return self.category_names[name]
+        pattern = re.compile(r"worker('?s)? pas")
+        return next((cat for name, cat in self.category_names.items() if pattern.search(name)), None)
+
+    def choices(self, queryset, key='pk'):
+        """{str(key value): object} for a queryset, evaluated once per distinct query"""
+        if queryset.query.is_empty():
+            return {}
+        cache_key = (queryset.model, str(queryset.query), key)
+        if cache_key not in self._choices:
+            self._choices[cache_key] = {str(getattr(obj, key)): obj for obj in queryset}
+        return self._choices[cache_key]
+
+    def bind_form(self, form):
+        """
+        Resolve the form's Preloaded* fields from these lookups and return their names.
+        The querysets the form set up on them still decide which choices are valid.
+        """
+        bound = set()
+        for name, field in form.fields.items():
+            if isinstance(field, (PreloadedModelChoiceField, PreloadedModelMultipleChoiceField)):
+                field.lookups = self
+                bound.add(name)
+        return bound
@@ -0,0 +1,240 @@
+"""
+Chunked, resumable spreadsheet imports.
+
+A large candidate registration file or marks sheet can be uploaded in chunked mode: the
+files are saved on an ImportSession and a background job (see background_jobs) works
+through the rows IMPORT_CHUNK_SIZE at a time. Each chunk's writes and the session's
+progress (rows_processed, created_ids, counters, errors) commit in one transaction, so:
+
+- an import that stops (server restart, crash) resumes after its last committed chunk;
+- uploading the same file with the same selections again finds the existing session:
+  an unfinished one is resumed, a completed one is reported, never imported twice.
+
+    session, existing = open_session('candidates', excel_file, request.user, photo_zip=photo_zip)
+    job = start_session_job(session, request.user)
+
+`python manage.py resume_import_sessions` restarts sessions left unfinished, e.g. after
+a deploy killed the web process running them.
+"""
+import hashlib
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+IMPORT_CHUNK_SIZE = 500
+# A running session that has not committed a chunk for this long is taken to be dead
+STALE_AFTER = timedelta(minutes=10)
+JOB_KINDS = {'candidates': 'candidate_import', 'marks': 'marks_upload'}
+
+
+def upload_hash(*files):
+    """SHA-256 over the uploaded files (None entries skipped); each file is rewound after"""
+    digest = hashlib.sha256()
+    for f in files:
+        if not f:
+            continue
+        f.seek(0)
+        for chunk in f.chunks():
+            digest.update(chunk)
+        f.seek(0)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def open_session(kind, excel_file, user, params=None, photo_zip=None):
+    """
+    (session, existing) for an upload: the session already holding the same files and
+    selections if there is one, else a new queued session with the files saved on it.
+    """
+    from ..models import ImportSession
+
+    params = params or {}
+    digest = upload_hash(excel_file, photo_zip)
+    for session in ImportSession.objects.filter(kind=kind, file_hash=digest).order_by('-created_at'):
+        if session.params == params:
+            return session, True
+
+    session = ImportSession(kind=kind, file_hash=digest, params=params, created_by=user,
+                            file_name=os.path.basename(excel_file.name))
+    session.file.save(session.file_name, excel_file, save=False)
+    if photo_zip:
+        session.photo_zip.save(os.path.basename(photo_zip.name), photo_zip, save=False)
+    session.save()
+    return session, False
+
+
+def is_active(session):
+    """True while a job is (or should still be) working on the session"""
+    if session.status not in ('queued', 'running'):
+        return False
+    return session.updated_at >= timezone.now() - STALE_AFTER
+
+
+def start_session_job(session, user=None, eager=None):
+    """
+    Run (or resume) a session in a background job. Returns the job working on it; a
+    completed session, or one whose job is still alive, is left as it is.
+
+    The session is claimed for the new job with one conditional UPDATE, so of two uploads
+    or resumes racing for it only one starts a job; the other gets the winner's job.
+    """
+    from django.db.models import Q
+    from ..models import BackgroundJob, ImportSession
+    from .background_jobs import start_job
+
+    if session.is_finished:
+        return session.job
+    job = BackgroundJob.objects.create(kind=JOB_KINDS[session.kind], total=session.total_rows, created_by=user)
+    now = timezone.now()
+    claimed = ImportSession.objects.filter(pk=session.pk).exclude(status='completed').filter(
+        Q(job__isnull=True) | ~Q(status__in=['queued', 'running']) | Q(updated_at__lt=now - STALE_AFTER)
+    ).update(status='queued', job=job, updated_at=now)
+    if not claimed:
+        job.delete()
+        session.refresh_from_db()
+        return session.job
+    session.refresh_from_db()
+    return start_job(job.kind, run_import_session, session.pk, job=job, eager=eager)
+
+
+def read_session_sheet(session):
+    """(headers, [(row number, values)]) of the session's spreadsheet, read as the upload view reads it"""
+    import openpyxl
+    from .candidate_import import read_candidate_sheet
+    from .marks_upload import read_marks_sheet
+
+    with session.file.open('rb') as f:
+        wb = openpyxl.load_workbook(f, read_only=True)
+        try:
+            reader = read_candidate_sheet if session.kind == 'candidates' else read_marks_sheet
+            return reader(wb.active)
+        finally:
+            wb.close()
+
+
+class CandidateChunks:
+    """Creates the candidates (and attaches the photos) of one chunk of rows"""
+
+    def __init__(self, session, headers):
+        from .import_lookups import ImportLookups
+        from .photo_ingest import PhotoIngest
+
+        self.headers = headers
+        self.lookups = ImportLookups()
+        self.photos = PhotoIngest(session.photo_zip.open('rb')) if session.photo_zip else None
+
+    def process(self, chunk, errors):
+        from .candidate_import import clean_candidate_row, create_candidates
+        from .photo_ingest import match_photo
+
+        valid_rows, row_photos = [], []
+        for idx, row in chunk:
+            data = dict(zip(self.headers, row))
+            img_name = None
+            if self.photos:
+                candidate_name_full = (data.get('full_name') or '').strip()
+                img_name = match_photo(self.photos.image_name_map, candidate_name_full)
+                if not img_name:
+                    errors.append(f"Row {idx}: No photo found for '{candidate_name_full}'")
+            cleaned = clean_candidate_row(idx, data, self.lookups, errors)
+            if cleaned is None:
+                continue
+            valid_rows.append((idx, *cleaned))
+            row_photos.append(img_name)
+
+        if self.photos:
+            self.photos.prefetch([name for name in row_photos if name])
+        created = create_candidates(valid_rows, errors) if valid_rows else []
+        pending = [(c, name) for c, name in zip(created, row_photos) if c is not None and name]
+        if self.photos and pending:
+            for candidate, img_name, error in self.photos.attach(pending):
+                errors.append(f"Photo '{img_name}' for '{candidate.full_name}' could not be processed ({error}) - candidate created without photo.")
+        ids = [c.pk for c in created if c is not None]
+        return ids, len(ids)
+
+    def close(self):
+        if self.photos:
+            self.photos.close()
+
+
+class MarksChunks:
+    """Saves the results of one chunk of marks sheet rows"""
+
+    def __init__(self, session, headers):
+        from .marks_upload import MarksUpload
+
+        self.headers = headers
+        self.upload = MarksUpload(session.params, session.created_by)
+        self.upload.set_headers(headers)
+
+    def process(self, chunk, errors):
+        updated = 0
+        for idx, row in chunk:
+            updated += self.upload.process_row(idx, dict(zip(self.headers, row)), errors)
+        return [], updated
+
+    def close(self):
+        pass
+
+
+def run_import_session(job, session_id):
+    """
+    Background job target: process the session's remaining rows chunk by chunk.
+
+    Each chunk locks the session row and re-reads its progress before slicing, and stops
+    if the session has been claimed by another job in the meantime (its old job looked
+    dead to start_session_job), so no row is ever processed by two jobs.
+    """
+    from ..models import ImportSession
+
+    session = ImportSession.objects.get(pk=session_id)
+    headers, rows = read_session_sheet(session)
+    job.total = len(rows)
+    job.processed = session.rows_processed
+    job.summary = {'session': session.pk, 'resumed_at_row': session.rows_processed}
+    if not ImportSession.objects.filter(pk=session_id, job=job).update(status='running', total_rows=len(rows),
+                                                                        updated_at=timezone.now()):
+        job.summary['superseded'] = True
+        job.save(update_fields=['total', 'processed', 'summary'])
+        return
+    job.save(update_fields=['total', 'processed', 'summary'])
+
+    chunk_size = getattr(settings, 'IMPORT_CHUNK_SIZE', IMPORT_CHUNK_SIZE)
+    handler = (CandidateChunks if session.kind == 'candidates' else MarksChunks)(session, headers)
+    status = 'completed'
+    try:
+        while True:
+            errors = []
+            with transaction.atomic():
+                session = ImportSession.objects.select_for_update().get(pk=session_id)
+                if session.job_id != job.pk:
+                    status = None
+                    job.summary['superseded'] = True
+                    break
+                if session.rows_processed >= len(rows):
+                    break
+                chunk = rows[session.rows_processed:session.rows_processed + chunk_size]
+                ids, updated = handler.process(chunk, errors)
+                session.rows_processed += len(chunk)
+                session.created_ids = session.created_ids + ids
+                session.updated_count += updated
+                session.errors = session.errors + errors
+                session.save(update_fields=['rows_processed', 'created_ids', 'updated_count', 'errors', 'updated_at'])
+            job.processed = session.rows_processed
+            job.succeeded = session.updated_count
+            job.save(update_fields=['processed', 'succeeded'])
+    except Exception:
+        status = 'failed'
+        raise
+    finally:
+        handler.close()
+        if status:
+            # Only the job that owns the session reports on it
+            ImportSession.objects.filter(pk=session_id, job=job).update(status=status, updated_at=timezone.now())
+            session.status = status
+        job.failed = len(session.errors)
+        job.summary = {**job.summary, 'created': len(session.created_ids), 'updated': session.updated_count,
+                       'errors': session.errors}
@@ -0,0 +1,216 @@
+"""
+Keyset (seek) pagination for long lists.
+
+Paginator pages with OFFSET, so page N reads and throws away every row before it, and
+each page also runs COUNT(*) over the filtered query. KeysetPaginator instead orders by
+sort keys that an index can serve, with the primary key as the tie-breaker, and fetches
+the rows after (or before) the last row shown. The position travels in an opaque, signed
+`cursor` parameter, so a deep page costs the same as the first one. The total comes from
+count_cache.cached_count().
+
+    paginator = KeysetPaginator(candidates, 100, ordering=('-created_at',))
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+    # template: page_obj.start_index, page_obj.has_next, ?cursor={{ page_obj.next_cursor }}
+
+Pages are numbered from their position (start_index) rather than looked up by number;
+the template links are first / previous / next / last.
+"""
+import datetime
+import decimal
+import uuid
+
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F, Q
+
+from .count_cache import cached_count
+
+CURSOR_SALT = 'eims.keyset_pagination'
+
+_NOTHING = Q(pk__in=[])
+
+
+def _cursor_value(value):
+    # Full precision: DjangoJSONEncoder drops microseconds, and the seek compares exactly
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    return value
+
+
+class SortKey:
+    """One column of the ordering: name (model field or annotation) and direction"""
+
+    def __init__(self, model, spec):
+        self.descending = spec.startswith('-')
+        self.name = spec.lstrip('-')
+        if self.name == 'pk':
+            self.nullable = False
+        else:
+            try:
+                self.nullable = model._meta.get_field(self.name).null
+            except FieldDoesNotExist:
+                # Annotation: its value may be NULL
+                self.nullable = True
+        # NULLs sort where a plain index puts them on PostgreSQL: last ascending, first descending
+        self.nulls_first = self.descending
+
+    def order_by(self, reverse=False):
+        descending = self.descending != reverse
+        nulls = {}
+        if self.nullable:
+            nulls = {'nulls_first': True} if self.nulls_first != reverse else {'nulls_last': True}
+        return F(self.name).desc(**nulls) if descending else F(self.name).asc(**nulls)
+
+    def after(self, value, reverse=False):
+        """Q for the rows that come after value in this column's order (before it, with reverse)"""
+        descending = self.descending != reverse
+        nulls_first = self.nullable and self.nulls_first != reverse
+        if value is None:
+            return Q(**{f'{self.name}__isnull': False}) if nulls_first else _NOTHING
+        q = Q(**{f'{self.name}__lt' if descending else f'{self.name}__gt': value})
+        if self.nullable and not nulls_first:
+            q |= Q(**{f'{self.name}__isnull': True})
+        return q
+
+    def equal(self, value):
+        if value is None:
+            return Q(**{f'{self.name}__isnull': True})
+        return Q(**{self.name: value})
+
+
+class KeysetPage:
+    """
+    One page of a KeysetPaginator. Offers the parts of Django's Page that the list
+    templates use (start_index, end_index, has_next, ...) plus next/previous cursors.
+    """
+
+    def __init__(self, object_list, paginator, offset, has_previous, has_next):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.offset = offset
+        self._has_previous = has_previous
+        self._has_next = has_next
+
+    def __repr__(self):
+        return f'<Page at {self.start_index()} of {self.paginator.per_page} per page>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    @property
+    def number(self):
+        return self.offset // self.paginator.per_page + 1
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    def start_index(self):
+        return self.offset + 1 if self.object_list else 0
+
+    def end_index(self):
+        return self.offset + len(self.object_list)
+
+    @property
+    def next_cursor(self):
+        if not self._has_next:
+            return ''
+        return self.paginator.make_cursor(self.object_list[-1], self.offset + len(self.object_list))
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous:
+            return ''
+        return self.paginator.make_cursor(self.object_list[0], self.offset, before=True)
+
+
+class KeysetPaginator:
+    """
+    Paginate queryset by ordering (model fields or annotations, '-' for descending).
+    The primary key is appended as the final tie-breaker unless ordering already ends
+    with it; ordering defaults to the queryset's own.
+    """
+
+    def __init__(self, queryset, per_page, ordering=None):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        ordering = list(ordering or queryset.query.order_by or queryset.model._meta.ordering)
+        if not ordering or ordering[-1].lstrip('-') not in ('pk', 'id'):
+            ordering.append('-pk' if ordering and ordering[-1].startswith('-') else 'pk')
+        self.keys = [SortKey(queryset.model, spec) for spec in ordering]
+
+    @property
+    def count(self):
+        if not hasattr(self, '_count'):
+            self._count = cached_count(self.queryset)
+        return self._count
+
+    @property
+    def num_pages(self):
+        return max(1, -(-self.count // self.per_page))
+
+    @property
+    def last_cursor(self):
+        return signing.dumps({'last': True}, salt=CURSOR_SALT, compress=True)
+
+    def make_cursor(self, obj, offset, before=False):
+        payload = {'k': [_cursor_value(getattr(obj, key.name)) for key in self.keys], 'o': offset}
+        if before:
+            payload['b'] = True
+        return signing.dumps(payload, salt=CURSOR_SALT, compress=True)
+
+    def _seek(self, values, reverse):
+        """Q for the rows strictly after values in the ordering (before them, with reverse)"""
+        q = _NOTHING
+        equal = Q()
+        for key, value in zip(self.keys, values):
+            q |= equal & key.after(value, reverse)
+            equal &= key.equal(value)
+        return q
+
+    def _rows(self, values=None, reverse=False, limit=None):
+        queryset = self.queryset.order_by(*[key.order_by(reverse) for key in self.keys])
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, reverse))
+        return list(queryset[:limit])
+
+    def get_page(self, cursor=None):
+        """The page at cursor; the first page if cursor is missing, tampered with or stale"""
+        try:
+            payload = signing.loads(cursor, salt=CURSOR_SALT) if cursor else {}
+        except signing.BadSignature:
+            payload = {}
+        values = payload.get('k')
+        if payload.get('last'):
+            rows = self._rows(reverse=True, limit=self.per_page)
+            rows.reverse()
+            offset = max(self.count - len(rows), 0)
+            return KeysetPage(rows, self, offset, has_previous=offset > 0, has_next=False)
+        if not isinstance(values, list) or len(values) != len(self.keys):
+            rows = self._rows(limit=self.per_page + 1)
+            return KeysetPage(rows[:self.per_page], self, 0, False, len(rows) > self.per_page)
+
+        offset = payload.get('o') or 0
+        if payload.get('b'):
+            rows = self._rows(values, reverse=True, limit=self.per_page + 1)
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            rows.reverse()
+            offset = max(offset - len(rows), 0) if has_previous else 0
+            return KeysetPage(rows, self, offset, has_previous, has_next=True)
+        rows = self._rows(values, limit=self.per_page + 1)
+        return KeysetPage(rows[:self.per_page], self, offset, has_previous=True,
+                          has_next=len(rows) > self.per_page)
@@ -0,0 +1,194 @@
+"""
+Marks sheet upload (upload_marks).
+
+MarksUpload holds what one upload was made for (series, registration category,
+occupation, level, module) and writes the results of one sheet row at a time, so the
+same code serves a direct upload, a validate-only dry run and a chunked import session:
+
+    upload = MarksUpload(request.POST, request.user)      # MarksUploadError if unusable
+    headers, rows = read_marks_sheet(ws)
+    upload.set_headers(headers)
+    updated += upload.process_row(idx, row_data, errors, write=not dry_run)
+"""
+import re
+
+from .registration_category import registration_category_code
+
+
+class MarksUploadError(ValueError):
+    """The upload's selections or sheet cannot be used at all"""
+
+
+PARAM_NAMES = ('registration_category', 'occupation', 'level', 'assessment_center', 'modules', 'assessment_series')
+
+
+def normalize_header(h):
+    return re.sub(r'[^a-z0-9]', '', h.strip().lower())
+
+
+def read_marks_sheet(ws):
+    """(headers, [(row number, values)]) of a marks worksheet"""
+    rows = ws.iter_rows(values_only=True)
+    headers = [str(value).strip() if value else '' for value in next(rows, ())]
+    return headers, list(enumerate(rows, start=2))
+
+
+class MarksUpload:
+
+    def __init__(self, params, user):
+        from ..models import AssessmentSeries, Level, Module, Occupation, OccupationLevel, Paper
+
+        self.params = {name: params.get(name) for name in PARAM_NAMES}
+        self.user = user
+        series_id = self.params['assessment_series']
+        if not series_id:
+            raise MarksUploadError('Assessment series is required.')
+        self.assessment_series = AssessmentSeries.objects.filter(pk=series_id).first()
+        if not self.assessment_series:
+            raise MarksUploadError('Invalid assessment series selected.')
+
+        # Normalize registration category
+        self.regcat = registration_category_code(self.params['registration_category'])
+
+        occupation_id, level_id = self.params['occupation'], self.params['level']
+        self.occupation = Occupation.objects.filter(pk=occupation_id).first() if occupation_id else None
+        self.level = Level.objects.filter(pk=level_id).first() if level_id else None
+        # Determine structure_type
+        self.structure_type = None
+        if self.occupation and self.level:
+            occ_level = OccupationLevel.objects.filter(occupation=self.occupation, level=self.level).first()
+            if occ_level:
+                self.structure_type = occ_level.structure_type
+
+        # Modular: use selected module and 'PRACTICAL' column
+        self.selected_module = None
+        if self.regcat == 'modular' and self.params['modules']:
+            self.selected_module = Module.objects.filter(pk=self.params['modules']).first()
+        # Formal module-based: use 'THEORY' and 'PRACTICAL' columns
+        # Paper-based/informal: use paper codes as columns
+        self.code_to_obj = {}
+        if self.regcat in ['formal', 'informal', 'modular']:
+            for p in Paper.objects.filter(occupation=self.occupation, level=self.level):
+                self.code_to_obj[p.code] = p
+            for m in Module.objects.filter(occupation=self.occupation, level=self.level):
+                self.code_to_obj[m.code] = m
+        self.regno_header = None
+
+    def set_headers(self, headers):
+        normalized_headers = {normalize_header(h): h for h in headers}
+        for candidate in ['regnumber', 'registrationno', 'registrationnumber', 'regno']:
+            if candidate in normalized_headers:
+                self.regno_header = normalized_headers[candidate]
+                return
+        raise MarksUploadError('Missing registration number (reg_number) column in Excel. Please use a marksheet generated by the system.')
+
+    def _save(self, write, **lookup):
+        """update_or_create one Result (when writing); returns the number of results counted"""
+        from ..models import Result
+
+        defaults = lookup.pop('defaults')
+        if write:
+            Result.objects.update_or_create(
+                assessment_date=self.assessment_series.start_date,
+                assessment_series=self.assessment_series,
+                defaults={**defaults, 'user': self.user, 'status': ''},
+                **lookup,
+            )
+        return 1
+
+    def process_row(self, idx, row_data, errors, write=True):
+        """
+        Check one sheet row (a {header: value} dict) and save its marks. Returns the number
+        of results saved, or that would be saved when write is False.
+        """
+        from ..models import Candidate, CandidateLevel, CandidatePaper
+
+        regno = str(row_data.get(self.regno_header, '')).strip()
+        if not regno:
+            errors.append(f"Row {idx}: Missing reg_number.")
+            return 0
+        candidate = Candidate.objects.filter(reg_number__iexact=regno).first()
+        if not candidate:
+            errors.append(f"Row {idx}: Candidate with reg_number '{regno}' not found.")
+            return 0
+        # Validate candidate registration category, occupation, level
+        if self.regcat != candidate.registration_category_code:
+            errors.append(f"Row {idx}: Candidate '{regno}' registration category mismatch.")
+            return 0
+        if self.occupation and candidate.occupation_id != self.occupation.id:
+            errors.append(f"Row {idx}: Candidate '{regno}' occupation mismatch.")
+            return 0
+        level = self.level
+        # For formal/module-based and informal, check level enrollment
+        if self.regcat in ['formal', 'informal'] and level:
+            if not CandidateLevel.objects.filter(candidate=candidate, level=level).exists():
+                errors.append(f"Row {idx}: Candidate '{regno}' not enrolled in selected level.")
+                return 0
+
+        updated = 0
+        # Modular: expects PRACTICAL column and selected module
+        if self.regcat == 'modular':
+            mark = row_data.get('PRACTICAL') or row_data.get('Practical') or row_data.get('practical')
+            if self.selected_module is None:
+                errors.append(f"Row {idx}: No module selected for modular upload.")
+                return 0
+            if mark is None or str(mark).strip() == '':
+                errors.append(f"Row {idx}: Missing practical mark for candidate '{regno}'.")
+                return 0
+            try:
+                mark_val = float(mark)
+            except Exception:
+                errors.append(f"Row {idx}: Invalid practical mark for candidate '{regno}'.")
+                return 0
+            updated += self._save(
+                write, candidate=candidate, module=self.selected_module, result_type='modular',
+                defaults={'assessment_type': 'practical', 'mark': mark_val},
+            )
+        # Formal module-based: expects THEORY and PRACTICAL columns
+        elif self.regcat == 'formal' and self.structure_type == 'modules':
+            for assessment_type, column in (('theory', 'THEORY'), ('practical', 'PRACTICAL')):
+                mark = row_data.get(column) or row_data.get(column.capitalize()) or row_data.get(column.lower())
+                if mark is None or str(mark).strip() == '':
+                    continue
+                try:
+                    mark_val = float(mark)
+                except Exception:
+                    errors.append(f"Row {idx}: Invalid {column} mark for candidate '{regno}'.")
+                    continue
+                updated += self._save(
+                    write, candidate=candidate, level=level, assessment_type=assessment_type,
+                    result_type='formal', defaults={'mark': mark_val},
+                )
+        # Formal paper-based and informal: expects paper code columns
+        else:
+            for code, obj in self.code_to_obj.items():
+                mark = row_data.get(code)
+                if mark is None or str(mark).strip() == '':
+                    continue
+                try:
+                    mark_val = float(mark)
+                except Exception:
+                    errors.append(f"Row {idx}: Invalid mark for {code} (candidate '{regno}').")
+                    continue
+                # Allow -1 for "Missing" (Ms) status, otherwise marks must be between 0 and 100
+                if not (mark_val == -1 or (0 <= mark_val <= 100)):
+                    errors.append(f"Row {idx}: Mark for {code} (candidate '{regno}') must be between 0 and 100, or -1 for Missing. Got {mark_val}.")
+                    continue
+                # Paper-based formal
+                if self.regcat == 'formal' and self.structure_type == 'papers':
+                    updated += self._save(
+                        write, candidate=candidate, level=level, paper=obj, result_type='formal',
+                        defaults={
+                            'assessment_type': obj.grade_type if hasattr(obj, 'grade_type') else 'practical',
+                            'mark': mark_val,
+                        },
+                    )
+                # Informal/worker's PAS
+                elif self.regcat == 'informal':
+                    candidate_paper = CandidatePaper.objects.filter(candidate=candidate, paper=obj, level=level).first()
+                    module = candidate_paper.module if candidate_paper else None
+                    updated += self._save(
+                        write, candidate=candidate, level=level, module=module, paper=obj,
+                        assessment_type='practical', result_type='informal', defaults={'mark': mark_val},
+                    )
+        return updated
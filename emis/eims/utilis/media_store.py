@@ -0,0 +1,263 @@
+"""
+Content-addressed media store for candidate photos and documents.
+
+Files are stored once per distinct content, as 'blobs/<h[:2]>/<sha256><ext>' under
+MEDIA_ROOT, so re-imports, restamps and repeated uploads of the same file share one blob
+and anything derived from a file can key on the hash in its name. Each blob has a
+MediaBlob row counting its references: every save() adds one and every delete() removes
+one. Requests never remove files: a delete racing a save of the same content could
+unlink a blob the save has just found and reused.
+
+Saves that are never matched by a delete (a record replaced through a form, a deleted
+candidate) leave counts too high, never too low. `python manage.py gc_media_blobs`
+(also a daily housekeeping task) recounts references from the database and removes blobs nothing
+points to once they are older than its grace period; a save that reuses a blob
+refreshes its modification time, so the blob is not collected before that save's
+row commits.
+Files uploaded before the store existed keep their old names until
+`python manage.py gc_media_blobs --adopt-legacy` moves them in.
+"""
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+BLOB_DIR = 'blobs'
+BLOB_NAME_RE = re.compile(rf'^{BLOB_DIR}/[0-9a-f]{{2}}/(?P<sha256>[0-9a-f]{{64}})(\.\w+)?$')
+
+
+def blob_hash(name):
+    """SHA-256 of a blob from its name, or None for files outside the store"""
+    match = BLOB_NAME_RE.match(name or '')
+    return match.group('sha256') if match else None
+
+
+def hash_file(content):
+    """(sha256 hex digest, size) of a Django File, read in chunks"""
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in content.chunks():
+        digest.update(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that names files by content and reference-counts them"""
+
+    def get_available_name(self, name, max_length=None):
+        # _save names the file after its content; identical content is meant to collide
+        return name
+
+    def _save(self, name, content):
+        from ..models import MediaBlob
+
+        sha256, size = hash_file(content)
+        ext = os.path.splitext(name)[1].lower()
+        blob_name = f"{BLOB_DIR}/{sha256[:2]}/{sha256}{ext}"
+        full_path = self.path(blob_name)
+
+        if os.path.exists(full_path):
+            # Restart gc_media_blobs' grace period: this save's reference is not committed yet
+            os.utime(full_path)
+        else:
+            directory = os.path.dirname(full_path)
+            os.makedirs(directory, exist_ok=True)
+            # Write beside the target and rename: concurrent writers of the same blob
+            # write the same bytes, so whichever rename lands last is still correct
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    for chunk in content.chunks():
+                        f.write(chunk)
+                if self.file_permissions_mode is not None:
+                    os.chmod(tmp_path, self.file_permissions_mode)
+                os.replace(tmp_path, full_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+        blob, created = MediaBlob.objects.get_or_create(
+            name=blob_name, defaults={'sha256': sha256, 'size': size, 'ref_count': 1}
+        )
+        if not created:
+            MediaBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+        return blob_name
+
+    def delete(self, name):
+        """Drop one reference; gc_media_blobs removes the file once nothing references it"""
+        from ..models import MediaBlob
+
+        if not blob_hash(name):
+            return super().delete(name)
+        MediaBlob.objects.filter(name=name, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+
+
+_storage = None
+
+
+def content_addressed_storage():
+    """Storage callable for model fields (keeps the field deconstruction stable)"""
+    global _storage
+    if _storage is None:
+        _storage = ContentAddressedStorage()
+    return _storage
+
+
+def _store_fields():
+    """(model, field name) for every file field kept in the store"""
+    from django.apps import apps
+    from django.db import models
+
+    for model in apps.get_app_config('eims').get_models():
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.FileField) and isinstance(field.storage, ContentAddressedStorage):
+                yield model, field.name
+
+
+def _rendition_names(renditions):
+    for entry in (renditions or {}).values():
+        for kind, name in entry.items():
+            if kind != 'source':
+                yield kind, name
+
+
+def referenced_blob_names():
+    """Counter of blob name -> number of references held in the database"""
+    from collections import Counter
+    from ..models import Candidate
+
+    counts = Counter()
+    for model, field in _store_fields():
+        names = model.objects.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''}).values_list(field, flat=True)
+        counts.update(name for name in names.iterator() if blob_hash(name))
+    renditions = Candidate.objects.exclude(photo_renditions={}).values_list('photo_renditions', flat=True)
+    for entry in renditions.iterator():
+        counts.update(name for _, name in _rendition_names(entry) if blob_hash(name))
+    return counts
+
+
+def collect_garbage(grace_hours=24, dry_run=False):
+    """
+    Recount blob references from the database, fix the MediaBlob counts and delete
+    blobs nothing references. Blobs (and abandoned partial uploads) younger than
+    grace_hours are kept: their referencing rows may not be committed yet.
+    """
+    import time
+    from ..models import MediaBlob
+
+    storage = content_addressed_storage()
+    refs = referenced_blob_names()
+    rows = {blob.name: blob for blob in MediaBlob.objects.all()}
+    cutoff = time.time() - grace_hours * 3600
+    stats = {'blobs': 0, 'referenced': 0, 'recounted': 0, 'deleted': 0, 'bytes_freed': 0, 'missing': 0}
+
+    root = storage.path(BLOB_DIR)
+    for directory, _, files in os.walk(root):
+        for filename in files:
+            full_path = os.path.join(directory, filename)
+            stat = os.stat(full_path)
+            name = os.path.relpath(full_path, storage.location).replace(os.sep, '/')
+            if filename.startswith('.upload-'):
+                if stat.st_mtime < cutoff and not dry_run:
+                    os.remove(full_path)
+                continue
+            if not blob_hash(name):
+                continue
+            stats['blobs'] += 1
+            count = refs.pop(name, 0)
+            row = rows.pop(name, None)
+            if count == 0:
+                if stat.st_mtime >= cutoff:
+                    continue
+                stats['deleted'] += 1
+                stats['bytes_freed'] += stat.st_size
+                if not dry_run:
+                    os.remove(full_path)
+                    if row is not None:
+                        row.delete()
+                continue
+            stats['referenced'] += 1
+            if row is None:
+                stats['recounted'] += 1
+                if not dry_run:
+                    MediaBlob.objects.create(name=name, sha256=blob_hash(name), size=stat.st_size, ref_count=count)
+            elif row.ref_count != count:
+                stats['recounted'] += 1
+                if not dry_run:
+                    MediaBlob.objects.filter(pk=row.pk).update(ref_count=count)
+
+    # Rows whose file is gone, and references to files that are gone
+    stats['missing'] = len(refs)
+    if rows and not dry_run:
+        MediaBlob.objects.filter(name__in=list(rows)).exclude(name__in=list(refs)).delete()
+    return stats
+
+
+def adopt_legacy_files(dry_run=False):
+    """
+    Move files saved before the store existed into it: each referencing row is repointed
+    at the blob, rendition records follow their source, and the old file is removed.
+    """
+    from django.core.files import File
+    from ..models import Candidate
+
+    storage = content_addressed_storage()
+    moved = {}
+    stats = {'adopted': 0, 'missing': 0, 'files_removed': 0}
+
+    def adopt(name):
+        if name not in moved:
+            path = storage.path(name)
+            if not os.path.exists(path):
+                stats['missing'] += 1
+                return None
+            if dry_run:
+                moved[name] = name
+            else:
+                with open(path, 'rb') as f:
+                    moved[name] = storage.save(name, File(f))
+        else:
+            # Another row shares the file: it holds its own reference to the blob
+            if not dry_run:
+                from ..models import MediaBlob
+                MediaBlob.objects.filter(name=moved[name]).update(ref_count=F('ref_count') + 1)
+        stats['adopted'] += 1
+        return moved[name]
+
+    for model, field in _store_fields():
+        rows = (model.objects.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''})
+                .values_list('pk', field))
+        for pk, name in list(rows.iterator()):
+            if blob_hash(name):
+                continue
+            new_name = adopt(name)
+            if new_name and not dry_run:
+                model.objects.filter(pk=pk).update(**{field: new_name})
+
+    for candidate in Candidate.objects.exclude(photo_renditions={}).only('id', 'photo_renditions').iterator():
+        renditions = candidate.photo_renditions
+        changed = False
+        for entry in renditions.values():
+            for kind, name in list(entry.items()):
+                if blob_hash(name):
+                    continue
+                new_name = moved.get(name) if kind == 'source' else adopt(name)
+                if new_name and new_name != name:
+                    entry[kind] = new_name
+                    changed = True
+        if changed and not dry_run:
+            Candidate.objects.filter(pk=candidate.pk).update(photo_renditions=renditions)
+
+    if not dry_run:
+        for name in moved:
+            if storage.exists(name):
+                FileSystemStorage.delete(storage, name)
+                stats['files_removed'] += 1
+    return stats
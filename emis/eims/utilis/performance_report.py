@@ -0,0 +1,133 @@
+"""
+Data layer for the assessment series performance report.
+
+All counts come from a single grouped query over the filtered candidates; per-candidate
+outcomes are expressed as EXISTS subqueries so no candidate or result rows are loaded
+into Python. The view only lays the numbers out as PDF tables.
+"""
+from collections import OrderedDict
+
+from django.db.models import Count, Exists, OuterRef, Q
+
+from ..models import Candidate, CandidateLevel, Result
+from .registration_category import FORMAL, registration_category_code
+
+# Column groups shown in the report, in table order
+METRICS = ('registered', 'absent', 'assessed', 'successful', 'unsuccessful')
+GENDERS = ('F', 'M', 'TT')
+
+
+def performance_candidates(assessment_series, category, level=None):
+    """Candidates included in the report for a series, category and (Formal only) level"""
+    candidates = Candidate.objects.filter(assessment_series=assessment_series)
+
+    code = registration_category_code(category)
+    if category:
+        candidates = candidates.filter(registration_category_code=code)
+
+    # Only Formal reports are split by level; match "Level 1", "Level 2", ... across occupations
+    if level and code == FORMAL:
+        candidates = candidates.filter(Exists(CandidateLevel.objects.filter(
+            candidate=OuterRef('pk'),
+            level__name__istartswith=f"Level {str(level).strip()}",
+        )))
+    return candidates
+
+
+def _outcome_conditions():
+    """
+    Conditions for "assessed" and "successful" candidates.
+
+    A candidate is assessed when they have any result. They are successful when every
+    practical result is marked Successful or, with no practical results, every result is.
+    """
+    results = Result.objects.filter(candidate=OuterRef('pk'))
+    practical = results.filter(assessment_type='practical')
+    not_successful = ~Q(comment__iexact='successful')
+
+    has_results = Exists(results)
+    has_practical = Exists(practical)
+    successful = has_results & (
+        (has_practical & ~Exists(practical.filter(not_successful)))
+        | (~has_practical & ~Exists(results.filter(not_successful)))
+    )
+    return has_results, successful
+
+
+def empty_counts():
+    return {metric: dict.fromkeys(GENDERS, 0) for metric in METRICS}
+
+
+def _accumulate(target, row):
+    for metric in ('registered', 'assessed', 'successful'):
+        for gender in GENDERS:
+            target[metric][gender] += row[f'{metric}_{gender}']
+    for gender in GENDERS:
+        target['absent'][gender] = target['registered'][gender] - target['assessed'][gender]
+        target['unsuccessful'][gender] = target['assessed'][gender] - target['successful'][gender]
+
+
+def percentage(part, whole):
+    return (part / whole * 100) if whole > 0 else 0.0
+
+
+def build_performance_report_data(assessment_series, category, level=None):
+    """
+    Return every figure used by the performance report.
+
+    {
+        'totals': counts,
+        'occupations': {code: {'code', 'name', 'sector', 'counts'}},
+        'sectors': {sector_name: counts},
+        'centers': {center_number: {'number', 'name', 'occupations': {code: counts}, 'totals': counts}},
+    }
+
+    where counts is {metric: {'F', 'M', 'TT'}} for each of METRICS.
+    """
+    has_results, successful = _outcome_conditions()
+    aggregates = {}
+    for metric, condition in (('registered', None), ('assessed', has_results), ('successful', successful)):
+        for gender in ('F', 'M'):
+            gender_q = Q(gender=gender)
+            aggregates[f'{metric}_{gender}'] = Count('pk', filter=gender_q if condition is None else gender_q & condition)
+        aggregates[f'{metric}_TT'] = Count('pk') if condition is None else Count('pk', filter=condition)
+
+    rows = performance_candidates(assessment_series, category, level).values(
+        'assessment_center__center_number',
+        'assessment_center__center_name',
+        'occupation__code',
+        'occupation__name',
+        'occupation__sector__name',
+    ).annotate(**aggregates).order_by('assessment_center__center_number', 'occupation__code')
+
+    data = {
+        'totals': empty_counts(),
+        'occupations': OrderedDict(),
+        'sectors': {},
+        'centers': OrderedDict(),
+    }
+    for row in rows:
+        code = row['occupation__code']
+        occupation = data['occupations'].setdefault(code, {
+            'code': code,
+            'name': row['occupation__name'],
+            'sector': row['occupation__sector__name'],
+            'counts': empty_counts(),
+        })
+        _accumulate(occupation['counts'], row)
+        _accumulate(data['totals'], row)
+        _accumulate(data['sectors'].setdefault(row['occupation__sector__name'] or 'Unknown Sector', empty_counts()), row)
+
+        center_number = row['assessment_center__center_number'] or 'Unknown'
+        center = data['centers'].setdefault(center_number, {
+            'number': center_number,
+            'name': row['assessment_center__center_name'] or 'Unknown Center',
+            'occupations': OrderedDict(),
+            'totals': empty_counts(),
+        })
+        _accumulate(center['occupations'].setdefault(code, empty_counts()), row)
+        _accumulate(center['totals'], row)
+
+    data['occupations'] = OrderedDict(sorted(data['occupations'].items(), key=lambda item: item[0] or ''))
+    data['sectors'] = OrderedDict(sorted(data['sectors'].items()))
+    return data
@@ -0,0 +1,199 @@
+"""
+Streaming photo ingestion for candidate imports.
+
+Photos are read straight out of the uploaded ZIP (nothing is extracted to disk) and
+decoded, oriented, resized and re-encoded in worker processes while the spreadsheet rows
+are being validated. Once the candidates are saved the finished JPEGs are attached in
+batches.
+
+    with PhotoIngest(photo_zip) as photos:
+        photos.prefetch(member_names)
+        for row in rows:
+            photos.pump()
+            ...validate and save the candidate...
+        failures = photos.attach(pending)   # [(candidate, member_name), ...]
+"""
+import os
+import zipfile
+from collections import deque
+from io import BytesIO
+
+from PIL import Image, ImageOps
+from django.conf import settings
+
+from .photo_renditions import render_renditions, store_renditions
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+# Same bound Candidate.resize_passport_photo uses
+MAX_PIXELS = 800
+JPEG_QUALITY = 85
+ATTACH_BATCH_SIZE = 100
+
+
+def photo_name_key(member_name):
+    """
+    Candidate name a ZIP member is for, lower-cased. Handles the three naming formats:
+    '540255.Afoyo_Vani.jpg' (old system, numeric prefix), '614956.Kajumba Ruth.jpg'
+    and 'Afoyo_Vani.jpg' all give 'afoyo vani' / 'kajumba ruth'.
+    """
+    stem = os.path.splitext(os.path.basename(member_name))[0]
+    if '.' in stem:
+        stem = stem.split('.', 1)[1]
+    return stem.replace('_', ' ').strip().lower()
+
+
+def index_photo_zip(zf):
+    """(name map {candidate name key: member name}, all image member names)"""
+    image_name_map = {}
+    members = []
+    for name in zf.namelist():
+        if name.endswith('/') or not name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        members.append(name)
+        key = photo_name_key(name)
+        if key:
+            image_name_map[key] = name
+    return image_name_map, members
+
+
+def match_photo(image_name_map, full_name):
+    """
+    Member name of the photo for `full_name`: tries the full name, then for names of
+    three or more parts the first two names, then the first and last names.
+    """
+    name_parts = full_name.split()
+    img_name = image_name_map.get(full_name.lower())
+    if not img_name and len(name_parts) >= 3:
+        img_name = image_name_map.get(" ".join(name_parts[:2]).lower())
+    if not img_name and len(name_parts) >= 3:
+        img_name = image_name_map.get(f"{name_parts[0]} {name_parts[-1]}".lower())
+    return img_name
+
+
+def prepare_photo(data, max_pixels=MAX_PIXELS, quality=JPEG_QUALITY):
+    """
+    (upright RGB JPEG bytes no larger than max_pixels on either side, {kind: rendition bytes})
+    """
+    with Image.open(BytesIO(data)) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        img.thumbnail((max_pixels, max_pixels), Image.Resampling.LANCZOS)
+        out = BytesIO()
+        img.save(out, format='JPEG', quality=quality)
+        return out.getvalue(), render_renditions(img)
+
+
+def prepare_photo_task(task):
+    """Worker-process entry point: (member_name, data, max_pixels, quality) -> (member_name, prepared, error)"""
+    member_name, data, max_pixels, quality = task
+    try:
+        return member_name, prepare_photo(data, max_pixels, quality), None
+    except Exception as e:
+        return member_name, None, str(e)
+
+
+class PhotoIngest:
+    """
+    Prepares photos from an uploaded ZIP in a process pool.
+
+    Only max_in_flight members are read from the ZIP and queued at a time, so the whole
+    archive is never held in memory; call pump() regularly to keep the workers busy.
+    Raises zipfile.BadZipFile if the upload is not a ZIP.
+    """
+
+    def __init__(self, zip_file, workers=None, max_in_flight=None):
+        from .background_jobs import process_pool
+
+        if workers is None:
+            workers = getattr(settings, 'PHOTO_WORKERS', None) or os.cpu_count() or 1
+        self.zf = zipfile.ZipFile(zip_file)
+        self.image_name_map, self.image_members = index_photo_zip(self.zf)
+        self.workers = workers
+        self.max_in_flight = max_in_flight or workers * 4
+        self.max_pixels = MAX_PIXELS
+        self.quality = getattr(settings, 'PHOTO_JPEG_QUALITY', JPEG_QUALITY)
+        self._pool = process_pool(workers) if workers > 1 else None
+        self._queue = deque()
+        self._futures = {}
+        self._running = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+        self.zf.close()
+
+    def _task(self, member_name):
+        return (member_name, self.zf.read(member_name), self.max_pixels, self.quality)
+
+    def _submit(self, member_name):
+        future = self._pool.submit(prepare_photo_task, self._task(member_name))
+        self._futures[member_name] = future
+        self._running.add(future)
+        return future
+
+    def prefetch(self, member_names):
+        """Queue members for preparation (duplicates are prepared once)"""
+        if self._pool is None:
+            return
+        queued = set(self._queue)
+        for name in member_names:
+            if name and name not in self._futures and name not in queued:
+                self._queue.append(name)
+                queued.add(name)
+        self.pump()
+
+    def pump(self):
+        """Top the workers up from the queue"""
+        if self._pool is None:
+            return
+        self._running = {f for f in self._running if not f.done()}
+        while self._queue and len(self._running) < self.max_in_flight:
+            name = self._queue.popleft()
+            if name not in self._futures:
+                self._submit(name)
+
+    def get(self, member_name):
+        """((jpeg bytes, renditions), error) for a member, waiting for its worker if necessary"""
+        if self._pool is None:
+            return prepare_photo_task(self._task(member_name))[1:]
+        future = self._futures.get(member_name) or self._submit(member_name)
+        result = future.result()
+        self.pump()
+        return result[1:]
+
+    def attach(self, pending, batch_size=ATTACH_BATCH_SIZE):
+        """
+        Save the prepared photo for each (candidate, member_name) of already-saved
+        candidates and bulk-update them. Returns [(candidate, member_name, error)] for
+        photos that could not be processed.
+        """
+        from django.core.files.base import ContentFile
+        from ..models import Candidate
+
+        failures = []
+        batch = []
+        for candidate, member_name in pending:
+            prepared, error = self.get(member_name)
+            if error:
+                failures.append((candidate, member_name, error))
+                continue
+            content, renditions = prepared
+            # Use only the base filename, not the full path from the ZIP
+            filename = os.path.splitext(os.path.basename(member_name))[0] + '.jpg'
+            candidate.passport_photo.save(filename, ContentFile(content), save=False)
+            store_renditions(candidate, 'passport_photo', renditions, save=False)
+            batch.append(candidate)
+            if len(batch) >= batch_size:
+                Candidate.objects.bulk_update(batch, ['passport_photo', 'photo_renditions'])
+                batch.clear()
+        if batch:
+            Candidate.objects.bulk_update(batch, ['passport_photo', 'photo_renditions'])
+        return failures
@@ -0,0 +1,243 @@
+"""
+EXIF orientation repair for candidate photos.
+
+Photos are checked in worker processes. The EXIF orientation is read from the file header
+(PIL opens images lazily), so only photos that actually need rotating are decoded and
+rewritten, in place. Every check is recorded in PhotoOrientationCheck; reruns skip photos
+whose file name, size and modification time are unchanged since they were last checked.
+
+Run from the Fix Photo Orientation page (as a background job) or with:
+
+    python manage.py fix_photo_orientation [--dry-run] [--workers N] [--force]
+"""
+import hashlib
+import os
+import time
+from io import BytesIO
+
+from PIL import Image, ImageOps
+from django.conf import settings
+
+from .media_store import blob_hash
+from .photo_renditions import build_photo_renditions
+
+ORIENTATION_TAG = 0x0112
+JPEG_QUALITY = 85
+
+
+def read_orientation(img):
+    """EXIF orientation of an opened (not yet decoded) image; 1 means upright"""
+    try:
+        return int(img.getexif().get(ORIENTATION_TAG, 1) or 1)
+    except Exception:
+        return 1
+
+
+def orientation_task(task):
+    """
+    Worker-process entry point: (candidate_id, photo_path, dry_run, quality, in_place).
+    Returns the candidate's manifest entry; touches no Django state. Files in the
+    content-addressed store are shared, so unless in_place the rotated photo is returned
+    as 'content' for the caller to store instead of being written over the original.
+    """
+    candidate_id, photo_path, dry_run, quality, in_place = task
+    try:
+        with open(photo_path, 'rb') as f:
+            data = f.read()
+        old_hash = hashlib.sha256(data).hexdigest()
+        outcome = {'id': candidate_id, 'old_hash': old_hash, 'new_hash': old_hash, 'fixed': False}
+
+        with Image.open(BytesIO(data)) as img:
+            outcome['orientation'] = read_orientation(img)
+            if outcome['orientation'] == 1 or dry_run:
+                outcome['needs_fix'] = outcome['orientation'] != 1
+            else:
+                img_format = img.format if img.format in ('JPEG', 'PNG') else 'JPEG'
+                fixed = ImageOps.exif_transpose(img)
+                if img_format == 'JPEG' and fixed.mode != 'RGB':
+                    fixed = fixed.convert('RGB')
+                out = BytesIO()
+                fixed.save(out, format=img_format, quality=quality)
+                content = out.getvalue()
+                outcome.update(new_hash=hashlib.sha256(content).hexdigest(), fixed=True, needs_fix=True)
+                if not in_place:
+                    outcome['content'] = content
+                    return outcome
+
+                # Replace the file atomically so a crash never leaves a half-written photo
+                tmp_path = f"{photo_path}.orient-tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(content)
+                os.replace(tmp_path, photo_path)
+
+        stat = os.stat(photo_path)
+        outcome.update(size=stat.st_size, mtime=stat.st_mtime)
+        return outcome
+    except Exception as e:
+        return {'id': candidate_id, 'error': str(e)}
+
+
+def _manifest_entry(candidate_id, photo_name, outcome):
+    from django.utils import timezone
+    from ..models import PhotoOrientationCheck
+    return PhotoOrientationCheck(
+        candidate_id=candidate_id,
+        photo_name=photo_name,
+        file_size=outcome['size'],
+        file_mtime=outcome['mtime'],
+        orientation=outcome['orientation'],
+        old_hash=outcome['old_hash'],
+        new_hash=outcome['new_hash'],
+        fixed=outcome['fixed'],
+        checked_at=timezone.now(),
+    )
+
+
+def _store_rotated(candidate, outcome):
+    """Save a rotated photo returned by orientation_task as the candidate's new passport_photo"""
+    from django.core.files.base import ContentFile
+
+    photo = candidate.passport_photo
+    old_name = photo.name
+    photo.save(os.path.basename(old_name), ContentFile(outcome.pop('content')), save=False)
+    type(candidate).objects.filter(pk=candidate.pk).update(passport_photo=photo.name)
+    photo.storage.delete(old_name)
+    stat = os.stat(photo.path)
+    outcome.update(size=stat.st_size, mtime=stat.st_mtime)
+    return photo.name
+
+
+def _save_manifest(entries):
+    from ..models import PhotoOrientationCheck
+    PhotoOrientationCheck.objects.bulk_create(
+        entries,
+        update_conflicts=True,
+        unique_fields=['candidate'],
+        update_fields=['photo_name', 'file_size', 'file_mtime', 'orientation', 'old_hash', 'new_hash', 'fixed', 'checked_at'],
+    )
+
+
+def repair_photo_orientation(job, candidate_ids=None, dry_run=False, force=False, workers=None):
+    """
+    BackgroundJob target: check (and unless dry_run, repair) candidate photo orientation.
+
+    Only repaired photos and failures are kept in job.results; job.summary holds the totals
+    and throughput.
+    """
+    from ..models import Candidate, PhotoOrientationCheck
+    from .background_jobs import process_pool, record_result
+
+    if workers is None:
+        workers = getattr(settings, 'PHOTO_WORKERS', None) or os.cpu_count() or 1
+    quality = getattr(settings, 'PHOTO_JPEG_QUALITY', JPEG_QUALITY)
+
+    candidates = Candidate.objects.exclude(passport_photo='').exclude(passport_photo__isnull=True)
+    if candidate_ids is not None:
+        candidates = candidates.filter(pk__in=candidate_ids)
+    photos = list(candidates.order_by('pk').values_list('pk', 'passport_photo'))
+    storage = Candidate._meta.get_field('passport_photo').storage
+
+    previous = {}
+    if not force:
+        previous = {
+            check.candidate_id: check
+            for check in PhotoOrientationCheck.objects.filter(candidate_id__in=[pk for pk, _ in photos])
+        }
+
+    job.total = len(photos)
+    job.save(update_fields=['total'])
+
+    tasks, names = [], {}
+    unchanged = 0
+    for pk, name in photos:
+        try:
+            path = storage.path(name)
+            stat = os.stat(path)
+        except (OSError, NotImplementedError) as e:
+            record_result(job, {'id': pk, 'success': False, 'error': f'Photo file not available: {e}'}, save=False)
+            continue
+        check = previous.get(pk)
+        if check and check.photo_name == name and check.file_size == stat.st_size and check.file_mtime == stat.st_mtime:
+            unchanged += 1
+            record_result(job, {'id': pk, 'skipped': True}, save=False, keep=False)
+            continue
+        names[pk] = name
+        tasks.append((pk, path, dry_run, quality, blob_hash(name) is None))
+    job.save(update_fields=['processed', 'succeeded', 'skipped', 'failed', 'results'])
+
+    manifest = []
+    fixed = 0
+    rewritten = []
+    started = time.monotonic()
+
+    def handle(outcome):
+        nonlocal fixed
+        pk = outcome['id']
+        if 'content' in outcome:
+            try:
+                names[pk] = _store_rotated(Candidate(pk=pk, passport_photo=names[pk]), outcome)
+            except Exception as e:
+                outcome = {'id': pk, 'error': str(e)}
+        if 'error' in outcome:
+            record_result(job, {'id': pk, 'success': False, 'error': outcome['error']}, save=False)
+        elif outcome.get('needs_fix'):
+            fixed += 1
+            record_result(job, {'id': pk, 'success': True, 'orientation': outcome['orientation'], 'fixed': outcome['fixed']}, save=False)
+            if outcome['fixed']:
+                rewritten.append(pk)
+        else:
+            record_result(job, {'id': pk, 'skipped': True}, save=False, keep=False)
+
+        if not dry_run and 'error' not in outcome:
+            manifest.append(_manifest_entry(pk, names[pk], outcome))
+        if job.processed % 200 == 0:
+            if manifest:
+                _save_manifest(manifest)
+                manifest.clear()
+            job.save(update_fields=['processed', 'succeeded', 'skipped', 'failed', 'results'])
+
+    if workers > 1 and len(tasks) > 1:
+        with process_pool(min(workers, len(tasks))) as pool:
+            for outcome in pool.map(orientation_task, tasks, chunksize=max(1, len(tasks) // (workers * 8))):
+                handle(outcome)
+    else:
+        for task in tasks:
+            handle(orientation_task(task))
+    if manifest:
+        _save_manifest(manifest)
+    # Renditions were rendered from the rotated file
+    for candidate in Candidate.objects.filter(pk__in=rewritten).only('id', 'passport_photo', 'photo_renditions'):
+        build_photo_renditions(candidate, 'passport_photo')
+
+    elapsed = time.monotonic() - started
+    job.summary = {
+        'dry_run': dry_run,
+        'workers': workers,
+        'checked': len(tasks),
+        'unchanged_since_last_run': unchanged,
+        'fixed' if not dry_run else 'would_fix': fixed,
+        'elapsed_seconds': round(elapsed, 2),
+        'photos_per_second': round(len(tasks) / elapsed, 1) if elapsed > 0 else None,
+    }
+    job.save()
+    return job
+
+
+def fix_candidate_photo(candidate, dry_run=False):
+    """Check (and unless dry_run, repair) one candidate's photo inline; True if it needed fixing"""
+    if not candidate.passport_photo:
+        return False
+    photo_path = candidate.passport_photo.path
+    if not os.path.exists(photo_path):
+        return False
+    quality = getattr(settings, 'PHOTO_JPEG_QUALITY', JPEG_QUALITY)
+    outcome = orientation_task((candidate.pk, photo_path, dry_run, quality, blob_hash(candidate.passport_photo.name) is None))
+    if 'error' in outcome:
+        raise Exception(f"Error processing photo: {outcome['error']}")
+    if 'content' in outcome:
+        _store_rotated(candidate, outcome)
+    if not dry_run:
+        _save_manifest([_manifest_entry(candidate.pk, candidate.passport_photo.name, outcome)])
+    if outcome['fixed']:
+        build_photo_renditions(candidate, 'passport_photo')
+    return outcome['needs_fix']
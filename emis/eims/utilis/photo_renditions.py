@@ -0,0 +1,138 @@
+"""
+Fixed-size renditions of candidate photos.
+
+Each photo field (passport_photo, passport_photo_with_regno) gets a thumbnail for lists,
+an album-size copy for albums and result lists, and a print-size copy for transcripts and
+certificates. Renditions are JPEGs stored next to the source ('<name>_thumb.jpg' etc.),
+each encoded at the highest quality that fits its byte budget. Their names are kept in
+Candidate.photo_renditions:
+
+    {'passport_photo': {'source': 'candidate_photos/x.jpg', 'thumb': '...', 'album': '...', 'print': '...'}}
+
+Candidate.save() renders the photos uploaded or replaced by that save (see
+renditions_due); other saves, such as fee updates, leave the renditions alone. Photos
+stored before renditions existed, or written behind save()'s back, are rendered by
+`python manage.py backfill_photo_renditions`.
+
+Consumers use the Candidate.photo_thumbnail_url / photo_album_url / photo_album_path /
+photo_print_path properties, which fall back to the full photo when no rendition exists.
+"""
+import os
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+# kind: (longest side in pixels, byte budget)
+RENDITIONS = {
+    'thumb': (160, 12 * 1024),
+    'album': (320, 40 * 1024),
+    'print': (640, 120 * 1024),
+}
+PHOTO_FIELDS = ('passport_photo', 'passport_photo_with_regno')
+MIN_QUALITY = 30
+MAX_QUALITY = 90
+
+
+def _encode_jpeg(img, quality):
+    out = BytesIO()
+    img.save(out, format='JPEG', quality=quality, optimize=True)
+    return out.getvalue()
+
+
+def encode_jpeg_within_budget(img, max_bytes, min_quality=MIN_QUALITY, max_quality=MAX_QUALITY):
+    """
+    JPEG bytes at the highest quality (binary search between min_quality and max_quality)
+    that fits in max_bytes, or at min_quality if nothing fits. `img` must be RGB.
+    """
+    best = None
+    low, high = min_quality, max_quality
+    while low <= high:
+        mid = (low + high) // 2
+        data = _encode_jpeg(img, mid)
+        if len(data) <= max_bytes:
+            best, low = data, mid + 1
+        else:
+            high = mid - 1
+    return best if best is not None else _encode_jpeg(img, min_quality)
+
+
+def render_renditions(img):
+    """{kind: jpeg bytes} for an opened image; touches no Django state"""
+    img = ImageOps.exif_transpose(img)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    renditions = {}
+    for kind, (max_pixels, max_bytes) in RENDITIONS.items():
+        copy = img.copy()
+        copy.thumbnail((max_pixels, max_pixels), Image.Resampling.LANCZOS)
+        renditions[kind] = encode_jpeg_within_budget(copy, max_bytes)
+    return renditions
+
+
+def rendition_name(source_name, kind):
+    base = os.path.splitext(source_name)[0]
+    return f"{base}_{kind}.jpg"
+
+
+def store_renditions(candidate, field, renditions, save=True):
+    """
+    Write rendition bytes for candidate.<field> next to the source and record them in
+    candidate.photo_renditions, replacing any earlier renditions of that field.
+    With save=False the caller must save photo_renditions (e.g. in a bulk_update).
+    """
+    from django.core.files.base import ContentFile
+
+    source = getattr(candidate, field)
+    storage = source.storage
+    previous = (candidate.photo_renditions or {}).get(field) or {}
+    for kind in RENDITIONS:
+        old_name = previous.get(kind)
+        if old_name and storage.exists(old_name):
+            storage.delete(old_name)
+
+    entry = {'source': source.name}
+    for kind, content in renditions.items():
+        name = rendition_name(source.name, kind)
+        if storage.exists(name):
+            storage.delete(name)
+        entry[kind] = storage.save(name, ContentFile(content))
+
+    candidate.photo_renditions = {**(candidate.photo_renditions or {}), field: entry}
+    if save:
+        type(candidate).objects.filter(pk=candidate.pk).update(photo_renditions=candidate.photo_renditions)
+
+
+def build_photo_renditions(candidate, field='passport_photo', save=True):
+    """Render and store the renditions of candidate.<field>; False if it has no readable photo"""
+    source = getattr(candidate, field)
+    if not source or not source.storage.exists(source.name):
+        return False
+    with source.storage.open(source.name, 'rb') as f, Image.open(f) as img:
+        renditions = render_renditions(img)
+    store_renditions(candidate, field, renditions, save=save)
+    return True
+
+
+def stale_rendition_fields(candidate):
+    """Photo fields whose recorded renditions are missing or belong to another file"""
+    recorded = candidate.photo_renditions or {}
+    return [
+        field for field in PHOTO_FIELDS
+        if getattr(candidate, field) and (recorded.get(field) or {}).get('source') != getattr(candidate, field).name
+    ]
+
+
+def renditions_due(candidate, update_fields=None):
+    """
+    Photo fields a save of candidate with update_fields has to render: written by the save,
+    holding a different file than when the candidate was loaded, and not rendered yet.
+    """
+    loaded = getattr(candidate, '_loaded_photo_names', {})
+    deferred = candidate.get_deferred_fields()
+    return [
+        field for field in PHOTO_FIELDS
+        if field not in deferred
+        and (update_fields is None or field in update_fields)
+        and getattr(candidate, field).name != loaded.get(field)
+        and field in stale_rendition_fields(candidate)
+    ]
@@ -0,0 +1,290 @@
+"""
+Query-plan checks for the hot Candidate and Result filters.
+
+_hot_queries() mirrors the filters the list, fee, marksheet, report and marks-upload views
+run most. check_query_plans() builds a synthetic dataset inside a transaction that is
+rolled back, EXPLAINs every query and reports the ones whose plan reads a whole
+candidate, result or enrollment table instead of using an index:
+
+    python manage.py check_query_plans                    # exits non-zero on a full scan
+    python manage.py check_query_plans --query fees_owing_list --show-plans
+
+On PostgreSQL sequential scans are disabled for the check (SET LOCAL enable_seqscan =
+off), so a "Seq Scan" in the plan means no index can serve the query at all, however
+small the synthetic tables are. SQLite plans are read as they come ("SCAN table" without
+an index is a full scan).
+"""
+import re
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, Exists, Max, OuterRef, Q
+
+from .enrollment_flags import billed_q
+
+SYNTHETIC_PREFIX = 'QPLAN'
+
+
+def scanned_tables():
+    """Tables that must never be read in full by a hot query"""
+    from ..models import Candidate, CandidateLevel, CandidateModule, Result
+
+    return [model._meta.db_table for model in (Candidate, Result, CandidateLevel, CandidateModule)]
+
+
+def build_dataset(candidates=2000, centers=20):
+    """
+    Synthetic series, centers, occupations and candidates with levels, modules and
+    results, written with bulk_create. Returns the sample objects the hot queries filter on.
+    Call inside a transaction that is rolled back.
+    """
+    from ..models import (
+        AssessmentCenter, AssessmentCenterCategory, AssessmentSeries, Candidate, CandidateLevel,
+        CandidateModule, District, Level, Module, Occupation, OccupationCategory, Paper, Result,
+    )
+
+    series = [
+        AssessmentSeries.objects.create(
+            name=f"{SYNTHETIC_PREFIX} {year}", start_date=date(year, 3, 1), end_date=date(year, 3, 30),
+            date_of_release=date(year, 5, 1),
+        )
+        for year in (2024, 2025)
+    ]
+    district = District.objects.create(name=f"{SYNTHETIC_PREFIX} district", region="Central")
+    center_category = AssessmentCenterCategory.objects.create(name=f"{SYNTHETIC_PREFIX} centers")
+    occupation_category = OccupationCategory.objects.create(name=f"{SYNTHETIC_PREFIX} occupations")
+    occupations, levels, modules, papers = [], [], [], []
+    for i in range(5):
+        occupation = Occupation.objects.create(code=f"{SYNTHETIC_PREFIX}{i}", name=f"Synthetic occupation {i}",
+                                               category=occupation_category)
+        level = Level.objects.create(name="Level 1", occupation=occupation)
+        occupations.append(occupation)
+        levels.append(level)
+        modules.append(Module.objects.create(name=f"Module {i}", code=f"{SYNTHETIC_PREFIX}{i}-M1", occupation=occupation, level=level))
+        papers.append(Paper.objects.create(name=f"Paper {i}", code=f"{SYNTHETIC_PREFIX}{i}-P1", occupation=occupation,
+                                           level=level, grade_type='practical'))
+    center_objs = AssessmentCenter.objects.bulk_create([
+        AssessmentCenter(center_number=f"{SYNTHETIC_PREFIX}{i:04d}", center_name=f"Synthetic center {i}",
+                         category=center_category, district=district)
+        for i in range(centers)
+    ])
+
+    categories = ('Formal', 'Modular', 'Informal')
+    rows = []
+    for n in range(candidates):
+        category = categories[n % 3]
+        rows.append(Candidate(
+            full_name=f"Synthetic candidate {n}",
+            date_of_birth=date(2000, 1, 1),
+            gender='F' if n % 2 else 'M',
+            nationality='Ugandan',
+            district=district,
+            assessment_center=center_objs[n % centers],
+            assessment_series=series[n % 2],
+            entry_year=2025,
+            intake='M',
+            occupation=occupations[n % len(occupations)],
+            registration_category=category,
+            registration_category_code=category.lower(),
+            assessment_date=date(2025, 3, 1) + timedelta(days=n % 28),
+            reg_number=f"{SYNTHETIC_PREFIX}{n % centers:04d}/U/25/M/{n % len(occupations)}/{category[0]}/{n:05d}",
+            regno_center_code=f"{SYNTHETIC_PREFIX}{n % centers:04d}",
+            regno_year='25',
+            regno_intake='M',
+            regno_serial=n,
+            fees_balance=Decimal(50000 if n % 4 == 0 else 0),
+            payment_cleared=n % 4 == 1,
+            has_enrollment=n % 10 != 0,
+            is_billed=n % 10 != 0,
+        ))
+    cands = Candidate.objects.bulk_create(rows, batch_size=500)
+
+    level_links, module_links, results = [], [], []
+    for n, cand in enumerate(cands):
+        i = n % len(occupations)
+        if n % 10 == 0:
+            continue
+        if cand.registration_category == 'Modular':
+            module_links.append(CandidateModule(candidate=cand, module=modules[i]))
+        else:
+            level_links.append(CandidateLevel(candidate=cand, level=levels[i]))
+        for assessment_type in ('theory', 'practical'):
+            results.append(Result(
+                candidate=cand, level=levels[i], paper=papers[i] if cand.registration_category != 'Modular' else None,
+                module=modules[i] if cand.registration_category == 'Modular' else None,
+                assessment_series=cand.assessment_series, assessment_date=cand.assessment_date,
+                result_type=cand.registration_category.lower(), assessment_type=assessment_type,
+                mark=60, grade='B', comment='Successful',
+            ))
+    CandidateLevel.objects.bulk_create(level_links, batch_size=500)
+    CandidateModule.objects.bulk_create(module_links, batch_size=500)
+    Result.objects.bulk_create(results, batch_size=500)
+
+    sample = cands[len(cands) // 2]
+    sample_result = Result.objects.filter(candidate__in=cands, paper__isnull=False).first()
+    return {
+        'series': series[0], 'center': center_objs[0], 'occupation': occupations[0], 'level': levels[0],
+        'module': modules[0], 'paper': papers[0], 'candidate': sample, 'result': sample_result,
+    }
+
+
+def _hot_queries():
+    from ..models import Candidate, CandidateLevel, CandidateModule, Result
+
+    enrolled = Candidate.objects.filter(has_enrollment=True)
+    return {
+        # Candidate lists (keyset pages, reg-number lookups)
+        'candidate_list_first_page': lambda s: Candidate.objects.order_by('-created_at', '-id')[:100],
+        'candidate_list_next_page': lambda s: Candidate.objects.filter(
+            Q(created_at__lt=s['candidate'].created_at) | Q(created_at=s['candidate'].created_at, id__lt=s['candidate'].pk)
+        ).order_by('-created_at', '-id')[:100],
+        'candidate_by_reg_number': lambda s: Candidate.objects.filter(reg_number=s['candidate'].reg_number),
+        'candidate_by_reg_number_iexact': lambda s: Candidate.objects.filter(reg_number__iexact=s['candidate'].reg_number),
+        'candidate_reg_number_prefix': lambda s: Candidate.objects.filter(
+            regno_center_code=s['candidate'].regno_center_code, regno_year='25', regno_intake='M'),
+        'reg_number_group_max_serial': lambda s: Candidate.objects.filter(
+            assessment_center=s['center'], intake='M', entry_year=2025, occupation=s['occupation'],
+            registration_category_code='formal',
+        ).values('assessment_center').annotate(m=Max('regno_serial')),
+        'enrollment_list': lambda s: enrolled.order_by('reg_number')[:25],
+        'results_home': lambda s: enrolled.filter(status='Active').annotate(
+            has_marks=Exists(Result.objects.filter(candidate=OuterRef('pk')))).order_by('reg_number')[:100],
+        # Series / center / category / occupation filters
+        'series_center_category_occupation': lambda s: Candidate.objects.filter(
+            assessment_series=s['series'], assessment_center=s['center'],
+            registration_category_code='formal', occupation=s['occupation']),
+        'performance_report_category': lambda s: Candidate.objects.filter(
+            assessment_series=s['series'], registration_category_code='informal'),
+        'series_modular_billing': lambda s: Candidate.objects.filter(
+            assessment_series=s['series'], registration_category_code='modular'),
+        'marksheet_candidates': lambda s: Candidate.objects.filter(
+            registration_category_code='formal', occupation=s['occupation']),
+        'marksheet_center_candidates': lambda s: Candidate.objects.filter(
+            registration_category_code='formal', occupation=s['occupation'], assessment_center=s['center']),
+        'center_series_candidates': lambda s: Candidate.objects.filter(
+            assessment_center=s['center'], assessment_series=s['series']),
+        'series_category_counts': lambda s: Candidate.objects.filter(assessment_series=s['series']).values(
+            'assessment_center', 'registration_category_code').annotate(n=Count('id')).order_by(),
+        'candidates_in_period': lambda s: Candidate.objects.filter(
+            assessment_date__gte=s['series'].start_date, assessment_date__lte=s['series'].end_date),
+        # Fees and payments
+        'fees_owing_list': lambda s: Candidate.objects.filter(fees_balance__gt=0).order_by('-fees_balance')[:25],
+        'fees_owing_center': lambda s: Candidate.objects.filter(fees_balance__gt=0, assessment_center=s['center']),
+        'fees_billed_center_series': lambda s: Candidate.objects.filter(
+            billed_q(), assessment_center=s['center'], assessment_series=s['series']),
+        # Summed for the fees dashboard, so unordered
+        'payments_cleared': lambda s: Candidate.objects.filter(payment_cleared=True).order_by(),
+        'payments_cleared_center': lambda s: Candidate.objects.filter(payment_cleared=True, assessment_center=s['center']),
+        # Results (marks upload, transcripts, statistics)
+        'result_for_paper': lambda s: Result.objects.filter(
+            candidate=s['result'].candidate_id, paper=s['result'].paper_id, assessment_type='practical',
+            assessment_date=s['result'].assessment_date, assessment_series=s['result'].assessment_series_id),
+        'result_for_module': lambda s: Result.objects.filter(
+            candidate=s['candidate'], module=s['module'], assessment_type='practical',
+            assessment_date=s['candidate'].assessment_date, assessment_series=s['series']),
+        'latest_result_by_type': lambda s: Result.objects.filter(
+            candidate=s['candidate'], assessment_type='theory', result_type='formal').order_by('-assessment_date')[:1],
+        'candidate_results': lambda s: Result.objects.filter(candidate=s['candidate']).order_by(
+            'assessment_date', 'level', 'module', 'paper'),
+        'results_in_period': lambda s: Result.objects.filter(
+            assessment_date__gte=s['series'].start_date, assessment_date__lte=s['series'].end_date),
+        'series_results': lambda s: Result.objects.filter(assessment_series=s['series']),
+        'center_series_results': lambda s: Result.objects.filter(candidate__in=Candidate.objects.filter(
+            assessment_center=s['center'], assessment_series=s['series']).values('pk')),
+        # Enrollments
+        'level_enrollments': lambda s: CandidateLevel.objects.filter(level=s['level'], candidate__occupation=s['occupation']),
+        'module_enrollments': lambda s: CandidateModule.objects.filter(module__in=[s['module']]),
+    }
+
+
+def hot_query_names():
+    return list(_hot_queries())
+
+
+# iexact is LIKE on SQLite, which no index serves; PostgreSQL uses candidate_regno_upper_idx
+POSTGRESQL_ONLY = {'candidate_by_reg_number_iexact'}
+# Subquery tables are aliased U0, U1, ... (or T2, T3, ... for joins) in plans
+_DJANGO_ALIAS = re.compile(r'^[TU]\d+$')
+
+
+def partial_indexes():
+    """Names of the conditional indexes on the checked tables"""
+    from ..models import Candidate, CandidateLevel, CandidateModule, Result
+
+    return {index.name for model in (Candidate, Result, CandidateLevel, CandidateModule)
+            for index in model._meta.indexes if index.condition is not None}
+
+
+def _scans(queryset):
+    """(table, index or None) for every scan in the plan that has no condition to start from"""
+    if connection.vendor == 'postgresql':
+        import json
+
+        def walk(node):
+            if node['Node Type'] == 'Seq Scan':
+                yield node.get('Relation Name') or node.get('Alias'), None
+            elif node['Node Type'] in ('Index Scan', 'Index Only Scan') and 'Index Cond' not in node:
+                yield node.get('Relation Name') or node.get('Alias'), node.get('Index Name')
+            for child in node.get('Plans', ()):
+                yield from walk(child)
+
+        yield from walk(json.loads(queryset.explain(format='json'))[0]['Plan'])
+        return
+    for line in queryset.explain().splitlines():
+        # "SCAN t" reads the table; "SCAN t USING [COVERING] INDEX i" walks all of index i
+        match = re.search(r'\bSCAN "?(\w+)"?(?: USING (?:COVERING )?INDEX (\w+))?\s*$', line.strip())
+        if match:
+            yield match.group(1), match.group(2)
+
+
+def full_scans(queryset, tables):
+    """
+    Tables among tables (as "table" or "table via index") that the queryset reads in full.
+    Walking a partial index, or any index in order for a sliced queryset (a keyset page),
+    only reads the rows wanted and does not count.
+    """
+    partial = partial_indexes()
+    sliced = queryset.query.high_mark is not None
+    found = []
+    for table, index in _scans(queryset):
+        if table not in tables and not _DJANGO_ALIAS.match(table or ''):
+            continue
+        if index and (index in partial or sliced):
+            continue
+        label = f"{table} via {index}" if index else table
+        if label not in found:
+            found.append(label)
+    return found
+
+
+def check_query_plans(candidates=2000, centers=20, names=None):
+    """
+    EXPLAIN the hot queries (all, or those named) against a synthetic dataset that is
+    rolled back afterwards. Returns [{'name', 'sql', 'plan', 'full_scans', 'skipped'}] in
+    query order; skipped queries only apply to another database backend.
+    """
+    queries = _hot_queries()
+    unknown = set(names or ()) - set(queries)
+    if unknown:
+        raise ValueError(f"Unknown queries: {', '.join(sorted(unknown))}")
+    tables = scanned_tables()
+    report = []
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        sample = build_dataset(candidates=candidates, centers=centers)
+        for name, build in queries.items():
+            if names and name not in names:
+                continue
+            if name in POSTGRESQL_ONLY and connection.vendor != 'postgresql':
+                report.append({'name': name, 'sql': '', 'plan': [], 'full_scans': [], 'skipped': True})
+                continue
+            queryset = build(sample)
+            report.append({
+                'name': name, 'sql': str(queryset.query), 'plan': queryset.explain().splitlines(),
+                'full_scans': full_scans(queryset, tables), 'skipped': False,
+            })
+        transaction.set_rollback(True)
+    return report
@@ -0,0 +1,61 @@
+"""
+Canonical registration category codes.
+
+Candidate.registration_category has been written as 'Formal', 'Modular', 'Informal',
+"Worker's PAS", 'Workers PAS', 'informal', ... by forms, imports and hand edits, so reads
+used to match it with iexact/iregex OR chains that no index can serve. Candidate now
+also stores registration_category_code, one of CATEGORY_CODES, set from the raw value by
+Candidate.save() through registration_category_code(). Filters compare the code exactly:
+
+    code = registration_category_code(request.GET.get('registration_category'))
+    candidates.filter(registration_category_code=code)
+
+Code that writes the category with queryset.update() or bulk_create sets the code in
+the same write; `python manage.py backfill_registration_category_codes` fills it for
+existing rows and for values written any other way.
+"""
+import re
+
+FORMAL = 'formal'
+MODULAR = 'modular'
+INFORMAL = 'informal'       # Worker's PAS
+CATEGORY_CODES = (FORMAL, MODULAR, INFORMAL)
+CATEGORY_CODE_CHOICES = [(FORMAL, 'Formal'), (MODULAR, 'Modular'), (INFORMAL, "Worker's PAS")]
+
+
+def registration_category_code(value):
+    """
+    Code of a registration category however it is spelled ('Formal', "Worker's PAS",
+    'workers_pas', 'informal', a RegistrationCategory, ...); '' when it is none of them.
+    """
+    letters = re.sub(r'[^a-z]', '', str(value or '').lower())
+    if not letters:
+        return ''
+    # 'informal' contains 'formal', so Worker's PAS is recognised first
+    if letters.startswith('informal') or 'worker' in letters or letters.endswith('pas'):
+        return INFORMAL
+    if letters.startswith('modular'):
+        return MODULAR
+    if letters.startswith('formal'):
+        return FORMAL
+    return ''
+
+
+def backfill_registration_category_codes(only_missing=False):
+    """
+    Set registration_category_code on every candidate (or only those without one) from
+    its registration_category, with one UPDATE per distinct spelling. Returns the number
+    of candidates updated.
+    """
+    from ..models import Candidate
+
+    candidates = Candidate.objects.all()
+    if only_missing:
+        candidates = candidates.filter(registration_category_code='')
+    spellings = candidates.order_by().values_list('registration_category', flat=True).distinct()
+    updated = 0
+    for spelling in list(spellings):
+        updated += candidates.filter(registration_category=spelling).update(
+            registration_category_code=registration_category_code(spelling)
+        )
+    return updated
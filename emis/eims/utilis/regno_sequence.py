@@ -0,0 +1,311 @@
+"""
+Registration numbers: component columns and serial allocation.
+
+The components of every reg number (center code, nationality, year, intake, occupation
+code, category letter, serial) are also stored in indexed Candidate columns, filled by
+Candidate.save() from split_reg_number(). Lookups by center/year/intake and max-serial
+queries use those columns instead of parsing strings; reg_number_filter() turns a search
+box value into such a lookup. `python manage.py backfill_regno_parts` fills the columns
+for numbers written some other way (raw SQL, queryset.update()).
+
+A reg number ends in a serial that is unique within its group (assessment center, intake,
+entry year, occupation, registration category code). Groups are keyed on the canonical
+code, not the stored spelling, so 'Formal' and 'formal' candidates, whose numbers share a
+prefix, draw from one sequence. The last serial handed out for each group
+is kept in a RegNumberSequence row. Allocation locks that row (SELECT ... FOR UPDATE), so
+concurrent registrations and imports never get the same serial and no candidate has to be
+read to find the next one.
+
+A group without a row is seeded from the serials already in its reg numbers the first time
+it is used. `python manage.py backfill_regno_sequences` seeds (or re-seeds) every group at
+once, e.g. after numbers were edited by hand.
+
+    first = reserve_serials(group, count=250)   # serials first .. first + 249
+
+Bulk actions and commands that renumber many candidates use regenerate_reg_numbers(),
+which reserves each group's serials in one go and writes the numbers with bulk_update.
+"""
+from collections import Counter, defaultdict
+
+
+# Candidate columns holding the components of reg_number (see split_reg_number)
+REGNO_PART_FIELDS = (
+    'regno_center_code', 'regno_nationality', 'regno_year', 'regno_intake',
+    'regno_occupation_code', 'regno_category', 'regno_serial',
+)
+_PART_LENGTHS = {
+    'regno_center_code': 20, 'regno_nationality': 1, 'regno_year': 2, 'regno_intake': 1,
+    'regno_occupation_code': 20, 'regno_category': 1,
+}
+
+
+def _parts(center, nationality, year, intake, occupation, category, serial):
+    values = dict(zip(REGNO_PART_FIELDS, (center, nationality, year, intake, occupation, category)))
+    values = {field: value.strip().upper()[:_PART_LENGTHS[field]] for field, value in values.items()}
+    values['regno_serial'] = int(serial)
+    return values
+
+
+def split_reg_number(reg_number):
+    """
+    Candidate column values (REGNO_PART_FIELDS, upper-case) for the components of a reg
+    number in any of the formats in use:
+      CENTER_NO/N/YY/I/OC_CODE/REG_TYPE/SERIAL   (current)
+      N/YY/I/OC_CODE/REG_TYPE/SERIAL-CENTER_NO   (old)
+      N/YY/I/OC_CODE/SERIAL-CENTER_NO            (old, no category)
+    Unrecognised numbers give blanks and a NULL serial.
+    """
+    try:
+        parts = reg_number.split('/')
+        if len(parts) >= 7:
+            return _parts(parts[0], parts[1], parts[2], parts[3], '/'.join(parts[4:-2]), parts[-2], parts[-1])
+        if len(parts) in (5, 6) and '-' in parts[-1]:
+            serial, center = parts[-1].split('-', 1)
+            category = parts[4] if len(parts) == 6 else ''
+            return _parts(center, parts[0], parts[1], parts[2], parts[3], category, serial)
+    except (ValueError, IndexError, AttributeError):
+        pass
+    return {**{field: '' for field in REGNO_PART_FIELDS}, 'regno_serial': None}
+
+
+def parse_reg_serial(reg_number):
+    """Serial of a reg number in any of the formats in use, or None"""
+    return split_reg_number(reg_number)['regno_serial']
+
+
+def reg_number_filter(value):
+    """
+    Q for a reg-number search box. A complete current-format number is matched exactly
+    (case-insensitively, via the UPPER(reg_number) index); a leading part such as
+    'UVT001/U/25/M' is matched on the indexed component columns; anything else is a
+    substring match through the search index (see candidate_search).
+    """
+    from django.db.models import Q
+    from .candidate_search import search_filter
+
+    value = (value or '').strip()
+    parts = value.upper().split('/')
+    if len(parts) == 7 and parts[-1].isdigit():
+        return Q(reg_number__iexact=value)
+    if 2 <= len(parts) <= 6 and all(parts[:-1]) and any(c.isdigit() for c in parts[0]):
+        fields = REGNO_PART_FIELDS[:len(parts)]
+        lookup = {field: part for field, part in zip(fields[:-1], parts[:-1])}
+        if parts[-1]:
+            # The last component may still be being typed
+            lookup[f'{fields[-1]}__startswith'] = parts[-1]
+        return Q(**lookup)
+    return search_filter(value, fields=['reg_number'])
+
+
+def format_reg_number(prefix, serial):
+    return f"{prefix}/{str(serial).zfill(3)}"
+
+
+def group_filter(group):
+    """
+    Filter kwargs for a (center_id, intake, entry_year, occupation_id, registration_category_code)
+    group; Candidate and RegNumberSequence share the field names
+    """
+    center_id, intake, entry_year, occupation_id, category_code = group
+    return {
+        'assessment_center_id': center_id,
+        'intake': intake,
+        'entry_year': entry_year,
+        'occupation_id': occupation_id,
+        'registration_category_code': category_code,
+    }
+
+
+def group_max_serial(group):
+    """Highest serial among the reg numbers already issued in a group (0 if none)"""
+    from django.db.models import Max
+    from ..models import Candidate
+
+    return Candidate.objects.filter(**group_filter(group)).aggregate(m=Max('regno_serial'))['m'] or 0
+
+
+def reserve_serials(group, count=1):
+    """
+    Reserve `count` consecutive serials in a group and return the first. The sequence row
+    stays locked until the surrounding transaction ends, so callers inside a longer
+    transaction should reserve once for all the serials they need.
+    """
+    from django.db import transaction
+    from ..models import RegNumberSequence
+
+    if count < 1:
+        raise ValueError("count must be at least 1")
+    with transaction.atomic():
+        sequence, created = RegNumberSequence.objects.select_for_update().get_or_create(
+            **group_filter(group), defaults={'last_serial': 0}
+        )
+        if created:
+            # First use of the group: continue after the numbers issued before the sequence existed
+            sequence.last_serial = group_max_serial(group)
+        first = sequence.last_serial + 1
+        sequence.last_serial += count
+        sequence.save(update_fields=['last_serial', 'updated_at'])
+    return first
+
+
+def backfill_reg_number_parts(only_missing=False, batch_size=1000):
+    """
+    Fill the reg-number component columns from reg_number. With only_missing, only rows
+    whose serial column is still empty are read. Returns the number of rows updated.
+    """
+    from ..models import Candidate
+
+    rows = Candidate.objects.exclude(reg_number__isnull=True).exclude(reg_number='')
+    if only_missing:
+        rows = rows.filter(regno_serial__isnull=True)
+    fields = ('pk', 'reg_number') + REGNO_PART_FIELDS
+    changed, updated = [], 0
+    for values in rows.order_by('pk').values_list(*fields).iterator(chunk_size=batch_size):
+        pk, reg_number, current = values[0], values[1], values[2:]
+        parts = split_reg_number(reg_number)
+        if tuple(parts[field] for field in REGNO_PART_FIELDS) == current:
+            continue
+        changed.append(Candidate(pk=pk, **parts))
+        if len(changed) >= batch_size:
+            Candidate.objects.bulk_update(changed, REGNO_PART_FIELDS)
+            updated += len(changed)
+            changed.clear()
+    if changed:
+        Candidate.objects.bulk_update(changed, REGNO_PART_FIELDS)
+        updated += len(changed)
+    return updated
+
+
+def backfill_sequences(dry_run=False):
+    """
+    Set every group's sequence to the highest serial found in its reg numbers, creating
+    rows for groups that have none. Sequences are never moved backwards, so serials handed
+    out and since released are not reissued. Returns counts of created/advanced/unchanged.
+    """
+    from django.db import transaction
+    from django.db.models import Max
+    from ..models import Candidate, RegNumberSequence
+
+    from .registration_category import backfill_registration_category_codes
+
+    if not dry_run:
+        backfill_reg_number_parts(only_missing=True)
+        backfill_registration_category_codes(only_missing=True)
+    group_fields = ('assessment_center_id', 'intake', 'entry_year', 'occupation_id', 'registration_category_code')
+    highest = {
+        tuple(row[field] for field in group_fields): row['max_serial']
+        for row in (Candidate.objects.exclude(assessment_center__isnull=True).exclude(regno_serial__isnull=True)
+                    .values(*group_fields).annotate(max_serial=Max('regno_serial')).order_by())
+    }
+
+    stats = {'groups': len(highest), 'created': 0, 'advanced': 0, 'unchanged': 0}
+    with transaction.atomic():
+        existing = {
+            (s.assessment_center_id, s.intake, s.entry_year, s.occupation_id, s.registration_category_code): s
+            for s in RegNumberSequence.objects.select_for_update()
+        }
+        to_create, to_update = [], []
+        for group, serial in highest.items():
+            sequence = existing.get(group)
+            if sequence is None:
+                to_create.append(RegNumberSequence(**group_filter(group), last_serial=serial))
+            elif sequence.last_serial < serial:
+                sequence.last_serial = serial
+                to_update.append(sequence)
+            else:
+                stats['unchanged'] += 1
+        stats['created'], stats['advanced'] = len(to_create), len(to_update)
+        if not dry_run:
+            RegNumberSequence.objects.bulk_create(to_create, batch_size=1000)
+            RegNumberSequence.objects.bulk_update(to_update, ['last_serial'], batch_size=1000)
+    return stats
+
+
+def assign_reg_numbers(candidates):
+    """
+    Give each candidate (saved or not) a new reg number: each group's serials are reserved
+    in a single allocation and collisions are checked with one IN query per round. Sets
+    reg_number and its component columns; saves nothing. Candidates without a center are
+    left alone, as build_reg_number does. Returns the candidates that were numbered.
+    """
+    from django.db import transaction
+    from ..models import Candidate
+
+    groups = defaultdict(list)
+    for candidate in candidates:
+        if candidate.assessment_center_id:
+            groups[candidate.reg_number_group()].append((candidate, candidate.reg_number_prefix()))
+
+    with transaction.atomic():
+        # Keyed by position: unsaved candidates have no pk yet
+        proposed = {}
+        for group, members in groups.items():
+            first = reserve_serials(group, len(members))
+            for offset, (candidate, prefix) in enumerate(members):
+                proposed[len(proposed)] = (candidate, prefix, format_reg_number(prefix, first + offset))
+
+        # Numbers edited by hand (or issued under older rules) can hold a fresh serial, and
+        # two groups can share a prefix (e.g. 'PR' and 'PR-old'); draw replacements until
+        # every new number is free
+        pending = dict(proposed)
+        while pending:
+            taken = set(Candidate.objects.filter(reg_number__in=[new for _, _, new in pending.values()])
+                        .values_list('reg_number', flat=True))
+            uses = Counter(new for _, _, new in proposed.values())
+            pending = {key: entry for key, entry in pending.items() if entry[2] in taken or uses[entry[2]] > 1}
+            for key, (candidate, prefix, _) in pending.items():
+                serial = reserve_serials(candidate.reg_number_group())
+                pending[key] = proposed[key] = (candidate, prefix, format_reg_number(prefix, serial))
+
+    numbered = []
+    for candidate, _, new in proposed.values():
+        candidate.reg_number = new
+        for field, value in split_reg_number(new).items():
+            setattr(candidate, field, value)
+        numbered.append(candidate)
+    return numbered
+
+
+def regenerate_reg_numbers(candidates, keep_current=True, dry_run=False, batch_size=500):
+    """
+    Rebuild the reg numbers of a Candidate queryset in one pass (see assign_reg_numbers)
+    and write them with bulk_update.
+
+    With keep_current, numbers that already match the candidate's details keep their
+    serial (regen_regnos_strip_old only renumbers what its rules change); without it
+    every candidate gets a fresh serial, as the bulk actions always have. With dry_run
+    nothing is saved and no serials are used up.
+    Returns {'changes': [{'id', 'old', 'new'}], 'unchanged': n, 'skipped': n}.
+    """
+    from django.db import transaction
+    from django.utils import timezone
+    from ..models import Candidate
+    from .count_cache import bump_count_version
+
+    report = {'changes': [], 'unchanged': 0, 'skipped': 0}
+    targets = []
+    for candidate in candidates.select_related('assessment_center', 'occupation').order_by('pk'):
+        if not candidate.assessment_center_id:
+            # Same safety as build_reg_number: never downgrade to NOCNTR
+            report['skipped'] += 1
+        elif keep_current and candidate.has_current_reg_number():
+            report['unchanged'] += 1
+        else:
+            targets.append(candidate)
+    old_numbers = {candidate.pk: candidate.reg_number for candidate in targets}
+
+    with transaction.atomic():
+        now = timezone.now()
+        changed = assign_reg_numbers(targets)
+        for candidate in changed:
+            report['changes'].append({'id': candidate.pk, 'old': old_numbers[candidate.pk], 'new': candidate.reg_number})
+            candidate.updated_at = now
+
+        if dry_run:
+            transaction.set_rollback(True)
+        else:
+            Candidate.objects.bulk_update(changed, ['reg_number', *REGNO_PART_FIELDS, 'updated_at'], batch_size=batch_size)
+            if changed:
+                # bulk_update sends no post_save; reg number searches are counted lists
+                bump_count_version(Candidate)
+    return report
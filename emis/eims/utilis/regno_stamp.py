@@ -1,31 +1,233 @@
+import glob
+import hashlib
 import os
+from functools import lru_cache
+from io import BytesIO
+
 from PIL import Image, ImageDraw, ImageFont
 from django.conf import settings
 
+from .photo_renditions import render_renditions, store_renditions
 
-def add_regno_to_image(img_path: str, reg_no: str) -> str:
+# System TrueType fonts tried in order; PIL's bitmap default is used if none exist
+TRUETYPE_PATHS = [
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf',
+    '/usr/share/fonts/dejavu/DejaVuSans-Bold.ttf',
+    '/usr/local/share/fonts/DejaVuSans-Bold.ttf',
+    '/usr/share/fonts/truetype/freefont/FreeSansBold.ttf',
+]
+MAX_FONT_SIZE = 40
+MIN_FONT_SIZE = 10
+SIDE_MARGIN = 16
+JPEG_QUALITY = 85
+
+
+@lru_cache(maxsize=1)
+def _truetype_path():
+    for path in TRUETYPE_PATHS:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+@lru_cache(maxsize=64)
+def _font(size):
+    """Font at `size`, loaded once per process"""
+    path = _truetype_path()
+    if path:
+        try:
+            return ImageFont.truetype(path, size=size)
+        except OSError:
+            pass
+    return ImageFont.load_default()
+
+
+def _text_size(font, text):
+    left, top, right, bottom = font.getbbox(text)
+    return right - left, bottom - top
+
+
+def fit_text(text, max_width):
     """
-    Adds `reg_no` along the bottom of `img_path`.
-    Returns the absolute path of the stamped file (same file, overwritten).
+    Largest font (binary search between MIN_FONT_SIZE and MAX_FONT_SIZE) that fits
+    `text` in `max_width`, truncating with an ellipsis if even the smallest is too wide.
+    Returns (font, text, (width, height)).
     """
-    img = Image.open(img_path).convert("RGBA")
+    if _truetype_path() is None:
+        font = _font(0)
+    else:
+        low, high = MIN_FONT_SIZE, MAX_FONT_SIZE
+        while low < high:
+            mid = (low + high + 1) // 2
+            if _text_size(_font(mid), text)[0] <= max_width:
+                low = mid
+            else:
+                high = mid - 1
+        font = _font(low)
+
+    size = _text_size(font, text)
+    if size[0] > max_width:
+        # Longest prefix that still fits once the ellipsis is added
+        low, high = 0, len(text) - 1
+        while low < high:
+            mid = (low + high + 1) // 2
+            if _text_size(font, text[:mid] + '...')[0] <= max_width:
+                low = mid
+            else:
+                high = mid - 1
+        text = text[:low] + '...'
+        size = _text_size(font, text)
+    return font, text, size
+
+
+def stamp_regno(img, reg_no):
+    """Draw `reg_no` centred on a white strip along the bottom of `img` (RGB), in place"""
+    width, height = img.size
+    font, text, (text_w, text_h) = fit_text(reg_no, width - 2 * SIDE_MARGIN)
+    padding_v = max(10, text_h // 4)
+    strip_h = text_h + 2 * padding_v
+    strip_y = height - strip_h
+
     draw = ImageDraw.Draw(img)
+    draw.rectangle([(0, strip_y), (width, height)], fill=(255, 255, 255))
+    draw.text(((width - text_w) // 2, strip_y + (strip_h - text_h) // 2), text, font=font, fill=(0, 0, 0))
+    return img
 
-    # pick a font – place a .ttf somewhere Django can reach, e.g. static/fonts
-    font_path = os.path.join(settings.BASE_DIR, "emis" , "static", "fonts", "DejaVuSansMono-BoldOblique.ttf")
-    # fallback to default if font missing
-    font = ImageFont.truetype(font_path, 20) if os.path.exists(font_path) else ImageFont.load_default()
 
-    txt = reg_no
-    w, h = img.size
-    text_w, text_h = draw.textsize(txt, font=font)
+def render_stamped_jpeg(source, reg_no, quality=None, with_renditions=False):
+    """
+    Stamp the image read from `source` (path or file) and return optimised JPEG bytes,
+    or (bytes, {kind: rendition bytes}) if with_renditions.
+    """
+    with Image.open(source) as img:
+        img = img.convert('RGB')
+    stamp_regno(img, reg_no)
+    out = BytesIO()
+    img.save(out, format='JPEG', quality=quality or JPEG_QUALITY, optimize=True)
+    if with_renditions:
+        return out.getvalue(), render_renditions(img)
+    return out.getvalue()
+
 
-    margin_x, margin_y = 10, 5
-    box_height = text_h + 2 * margin_y
-    # white strip
-    draw.rectangle([(0, h - box_height), (w, h)], fill="white")
-    # text (black)
-    draw.text((margin_x, h - box_height + margin_y), txt, fill="black", font=font)
+def photo_signature(photo_bytes, reg_no):
+    """Identifies a (photo, reg number) pair so unchanged candidates can be skipped"""
+    digest = hashlib.sha256(photo_bytes)
+    digest.update(b'\0' + reg_no.encode('utf-8'))
+    return digest.hexdigest()
 
-    img.save(img_path, optimize=True)
+
+def stamp_photo_task(task):
+    """
+    Worker-process entry point: (candidate_id, photo_path, reg_no, previous_signature, quality).
+    Touches no Django state, so it is safe to run in a process pool.
+    """
+    candidate_id, photo_path, reg_no, previous_signature, quality = task
+    try:
+        with open(photo_path, 'rb') as f:
+            photo_bytes = f.read()
+        signature = photo_signature(photo_bytes, reg_no)
+        if signature == previous_signature:
+            return {'id': candidate_id, 'success': True, 'skipped': True}
+        content, renditions = render_stamped_jpeg(BytesIO(photo_bytes), reg_no, quality, with_renditions=True)
+        return {'id': candidate_id, 'success': True, 'signature': signature, 'content': content, 'renditions': renditions}
+    except Exception as e:
+        return {'id': candidate_id, 'success': False, 'error': str(e)}
+
+
+def stamp_candidate_photos(job, candidate_ids, workers=None):
+    """
+    BackgroundJob target: stamp reg numbers on the candidates' passport photos.
+
+    Photos are decoded and encoded in a process pool; saving the files and updating the
+    candidates happens here, in batches. Candidates whose photo and reg number are unchanged
+    since the last stamp are reported as skipped.
+    """
+    from django.core.files.base import ContentFile
+    from ..models import Candidate
+    from .background_jobs import process_pool, record_result
+
+    if workers is None:
+        workers = getattr(settings, 'PHOTO_WORKERS', None) or os.cpu_count() or 1
+    quality = getattr(settings, 'REGNO_PHOTO_JPEG_QUALITY', JPEG_QUALITY)
+
+    candidates = {
+        c.pk: c for c in Candidate.objects.filter(pk__in=candidate_ids).only(
+            'id', 'reg_number', 'passport_photo', 'passport_photo_with_regno', 'regno_photo_signature', 'photo_renditions'
+        )
+    }
+    job.total = len(candidates)
+    job.save(update_fields=['total'])
+
+    tasks = []
+    for c in candidates.values():
+        if not c.passport_photo or not c.reg_number:
+            record_result(job, {'id': c.id, 'success': False, 'error': 'Missing photo or regno.'}, save=False)
+            continue
+        try:
+            photo_path = c.passport_photo.path
+        except Exception as e:
+            record_result(job, {'id': c.id, 'success': False, 'error': str(e)}, save=False)
+            continue
+        # Only trust the stored signature while the stamped file is still there
+        previous = c.regno_photo_signature if c.passport_photo_with_regno else ''
+        tasks.append((c.id, photo_path, c.reg_number, previous, quality))
+
+    pending = []
+
+    def flush():
+        if pending:
+            Candidate.objects.bulk_update(pending, ['passport_photo_with_regno', 'regno_photo_signature', 'photo_renditions'])
+            pending.clear()
+        job.save(update_fields=['processed', 'succeeded', 'skipped', 'failed', 'results'])
+
+    def handle(outcome):
+        c = candidates[outcome['id']]
+        content = outcome.pop('content', None)
+        signature = outcome.pop('signature', None)
+        renditions = outcome.pop('renditions', None)
+        if content is not None:
+            try:
+                old_name = c.passport_photo_with_regno.name
+                base_name = os.path.splitext(os.path.basename(c.passport_photo.name))[0]
+                c.passport_photo_with_regno.save(f"{base_name}_regno.jpg", ContentFile(content), save=False)
+                storage = c.passport_photo_with_regno.storage
+                if old_name and old_name != c.passport_photo_with_regno.name and storage.exists(old_name):
+                    storage.delete(old_name)
+                # Intermediate PNGs left next to the original by the old in-request stamping
+                photo_path = c.passport_photo.path
+                for old in glob.glob(os.path.join(os.path.dirname(photo_path), f"{base_name}_regno*.png")):
+                    try:
+                        os.remove(old)
+                    except OSError:
+                        pass
+                store_renditions(c, 'passport_photo_with_regno', renditions, save=False)
+                c.regno_photo_signature = signature
+                pending.append(c)
+            except Exception as e:
+                outcome = {'id': c.id, 'success': False, 'error': str(e)}
+        record_result(job, outcome, save=False)
+        if job.processed % 25 == 0:
+            flush()
+
+    if workers > 1 and len(tasks) > 1:
+        with process_pool(min(workers, len(tasks))) as pool:
+            for outcome in pool.map(stamp_photo_task, tasks, chunksize=max(1, len(tasks) // (workers * 4))):
+                handle(outcome)
+    else:
+        for task in tasks:
+            handle(stamp_photo_task(task))
+    flush()
+    return job
+
+
+def add_regno_to_image(img_path: str, reg_no: str) -> str:
+    """
+    Adds `reg_no` along the bottom of `img_path`.
+    Returns the absolute path of the stamped file (same file, overwritten).
+    """
+    with Image.open(img_path) as img:
+        img_format = img.format
+        img = img.convert('RGB')
+    stamp_regno(img, reg_no)
+    img.save(img_path, format=img_format, optimize=True)
     return img_path
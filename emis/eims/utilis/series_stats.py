@@ -0,0 +1,96 @@
+"""
+Build and read the SeriesStatsCube.
+
+The cube holds candidate counts grouped by every dimension the statistics pages break
+down on, so the pages sum a few hundred cube rows instead of scanning the candidates
+table. Each row records the Candidate and CandidateLevel count versions it was built
+from (see count_cache.py); every write to those tables, bulk writes included, bumps
+them, so series_stats() rebuilds a slice read after the candidates changed. Rebuild
+the whole cube ahead of time, e.g. nightly, with:
+
+    python manage.py rebuild_series_stats [--series <id>]
+"""
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Sum
+
+from ..models import AssessmentSeries, Candidate, CandidateLevel, SeriesStatsCube
+from .cache_generations import generations
+from .count_cache import count_version_name
+
+# Candidate fields copied onto each cube row, in grouping order
+CUBE_DIMENSIONS = (
+    'assessment_series_id',
+    'assessment_center_id',
+    'district_id',
+    'occupation_id',
+    'level_id',
+    'registration_category_code',
+    'gender',
+    'disability',
+    'is_refugee',
+)
+
+_ALL = object()
+
+
+def cube_version():
+    """Versions of the tables the cube is built from, as stored on its rows"""
+    names = [count_version_name(Candidate), count_version_name(CandidateLevel)]
+    versions = generations(names)
+    return ':'.join(str(versions[name]) for name in names)
+
+
+def _slice(series):
+    cube = SeriesStatsCube.objects.all()
+    if series is not _ALL:
+        cube = cube.filter(assessment_series=series)
+    return cube
+
+
+def rebuild_series_stats(series=_ALL):
+    """
+    Recompute cube rows from the candidates table in one grouped query.
+
+    Pass an AssessmentSeries (or None for candidates without a series) to rebuild just
+    that slice; with no argument the whole cube is rebuilt. Returns the number of rows written.
+    """
+    # Read first: a write committed during the build leaves the rows out of date
+    version = cube_version()
+    candidates = Candidate.objects.all()
+    if series is not _ALL:
+        candidates = candidates.filter(assessment_series=series)
+
+    # A candidate is counted once, under their first enrolled level
+    first_level = CandidateLevel.objects.filter(candidate=OuterRef('pk')).order_by('pk').values('level')[:1]
+    rows = candidates.annotate(level_id=Subquery(first_level)).values(*CUBE_DIMENSIONS).annotate(
+        candidate_count=Count('pk')
+    ).order_by()
+
+    objs = [SeriesStatsCube(**row, source_version=version) for row in rows]
+    with transaction.atomic():
+        if series is not _ALL and series is not None:
+            # Two requests rebuilding the same slice would otherwise both insert their rows
+            AssessmentSeries.objects.select_for_update().filter(pk=series.pk).exists()
+        _slice(series).delete()
+        SeriesStatsCube.objects.bulk_create(objs, batch_size=1000)
+    return len(objs)
+
+
+def series_stats(series=_ALL):
+    """
+    Cube rows for a series (or the whole cube), rebuilding the slice first if it is
+    missing or was built before the candidates last changed.
+    """
+    cube = _slice(series)
+    if not cube.filter(source_version=cube_version()).exists():
+        rebuild_series_stats(series)
+    return cube
+
+
+def breakdown(cube, *fields):
+    """Candidate totals grouped by the given cube fields, largest first"""
+    return cube.values(*fields).annotate(count=Sum('candidate_count')).order_by('-count', *fields)
+
+
+def total(cube, **filters):
+    return cube.filter(**filters).aggregate(total=Sum('candidate_count'))['total'] or 0
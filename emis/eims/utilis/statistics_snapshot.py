@@ -0,0 +1,203 @@
+"""
+Cached snapshot of the statistics dashboard (statistics_home).
+
+Every figure on the dashboard is derived from two grouped queries over the candidates
+table: candidate counts per (series, registration category, gender) with a conditional
+count of those with special needs, and the distinct (series, occupation) pairs. The
+finished page context is cached for STATISTICS_SNAPSHOT_SECONDS under a key that carries
+the snapshot's generation (see cache_generations.py), so a view costs one generation read
+and one cache read. Saving or deleting a Candidate (other than a save limited to fields
+the dashboard ignores, such as fees), CandidateLevel or CandidateModule bumps the
+generation (see signals.py) together with the list count versions, in the one upsert
+written when the transaction commits; bulk writers call invalidate_statistics_snapshot()
+themselves.
+
+    context = statistics_snapshot()          # cached, rebuilt when missing
+    invalidate_statistics_snapshot()         # after enrollments change
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .cache_generations import bump_generation, generation
+
+STATISTICS_SNAPSHOT_SECONDS = getattr(settings, 'STATISTICS_SNAPSHOT_SECONDS', 15 * 60)
+SNAPSHOT_KEY = 'statistics-home:snapshot'
+SNAPSHOT_GENERATION = 'statistics-home'
+# Candidate fields the dashboard groups on; saves limited to other fields keep the snapshot
+SNAPSHOT_FIELDS = ('assessment_series', 'registration_category', 'gender', 'disability', 'occupation')
+
+GENDER_COLORS = {'M': '#3B82F6', 'F': '#EC4899'}  # Blue for Male, Pink for Female
+REG_CATEGORY_COLORS = {
+    'Formal': '#3B82F6',        # Blue
+    'Modular': '#10B981',       # Green
+    'Informal': '#F59E0B',      # Yellow
+    "Worker's PAS": '#EF4444',  # Red
+}
+DEFAULT_COLOR = '#6B7280'
+
+
+def _percent(count, total):
+    return round((count / total) * 100, 1)
+
+
+def _largest_first(counts):
+    """(key, count) pairs ordered like a grouped count: largest first, then by key"""
+    return sorted(counts.items(), key=lambda item: (-item[1], item[0] is not None, item[0] or ''))
+
+
+def build_statistics_context():
+    """Compute the statistics_home context from the candidates table"""
+    from ..models import AssessmentCenter, Candidate, Occupation, Result
+
+    rows = list(Candidate.objects.values(
+        'assessment_series', 'assessment_series__name', 'assessment_series__start_date',
+        'registration_category', 'gender',
+    ).annotate(
+        count=Count('pk'),
+        special_needs=Count('pk', filter=Q(disability=True)),
+    ).order_by())
+    series_occupations = Candidate.objects.filter(
+        assessment_series__isnull=False, occupation__isnull=False,
+    ).values_list('assessment_series', 'occupation').distinct().order_by()
+
+    by_gender = defaultdict(int)
+    by_category = defaultdict(int)
+    by_category_gender = defaultdict(int)
+    special_needs_by_gender = defaultdict(int)
+    series_info = {}
+    series_totals = defaultdict(lambda: dict.fromkeys(
+        ('total_candidates', 'male_count', 'female_count', 'special_needs_count'), 0))
+    for row in rows:
+        gender, category = row['gender'], row['registration_category']
+        by_gender[gender] += row['count']
+        by_category[category] += row['count']
+        by_category_gender[(category, gender)] += row['count']
+        special_needs_by_gender[gender] += row['special_needs']
+        series_id = row['assessment_series']
+        if series_id is None:
+            continue
+        series_info[series_id] = (row['assessment_series__name'], row['assessment_series__start_date'])
+        totals = series_totals[series_id]
+        totals['total_candidates'] += row['count']
+        totals['male_count'] += row['count'] if gender == 'M' else 0
+        totals['female_count'] += row['count'] if gender == 'F' else 0
+        totals['special_needs_count'] += row['special_needs']
+
+    total_candidates = sum(by_gender.values())
+    divisor = total_candidates or 1
+
+    gender_breakdown = [{
+        'code': gender,
+        'name': 'Male' if gender == 'M' else 'Female' if gender == 'F' else 'Unknown',
+        'count': count,
+        'percentage': _percent(count, divisor),
+        'color': GENDER_COLORS.get(gender, DEFAULT_COLOR),
+    } for gender, count in _largest_first(by_gender)]
+
+    categories = _largest_first(by_category)
+    registration_categories = [{
+        'name': category or 'Unknown',
+        'count': count,
+        'percentage': _percent(count, divisor),
+        'color': REG_CATEGORY_COLORS.get(category, DEFAULT_COLOR),
+    } for category, count in categories]
+
+    with_special_needs = sum(special_needs_by_gender.values())
+    without_special_needs = total_candidates - with_special_needs
+    special_needs_breakdown = [
+        {'name': 'With Special Needs', 'count': with_special_needs,
+         'percentage': _percent(with_special_needs, divisor), 'color': '#EF4444'},
+        {'name': 'Without Special Needs', 'count': without_special_needs,
+         'percentage': _percent(without_special_needs, divisor), 'color': '#10B981'},
+    ]
+    special_needs_gender = [
+        {'category': 'Male with Special Needs', 'count': special_needs_by_gender['M'],
+         'percentage': _percent(special_needs_by_gender['M'], divisor), 'color': '#DC2626'},
+        {'category': 'Female with Special Needs', 'count': special_needs_by_gender['F'],
+         'percentage': _percent(special_needs_by_gender['F'], divisor), 'color': '#BE185D'},
+    ]
+
+    reg_cat_by_gender = []
+    for category, _ in categories:
+        if not category:
+            continue
+        male_count, female_count = by_category_gender[(category, 'M')], by_category_gender[(category, 'F')]
+        reg_cat_by_gender.append({
+            'category': category,
+            'male_count': male_count,
+            'female_count': female_count,
+            'total_count': male_count + female_count,
+            'male_percentage': _percent(male_count, divisor),
+            'female_percentage': _percent(female_count, divisor),
+            'color': REG_CATEGORY_COLORS.get(category, DEFAULT_COLOR),
+        })
+
+    # Occupations are counted distinct per series and across each year
+    occupations_by_series = defaultdict(set)
+    for series_id, occupation_id in series_occupations:
+        occupations_by_series[series_id].add(occupation_id)
+
+    assessment_series = []
+    year_totals = {}
+    year_occupations = defaultdict(set)
+    for series_id, (name, start_date) in sorted(series_info.items(), key=lambda item: item[1][1], reverse=True):
+        totals = series_totals[series_id]
+        assessment_series.append({
+            'year': start_date.year,
+            'month': start_date.month,
+            'period_name': name,
+            **totals,
+            'occupation_count': len(occupations_by_series[series_id]),
+        })
+        year = year_totals.setdefault(start_date.year, dict.fromkeys(totals, 0))
+        for key, value in totals.items():
+            year[key] += value
+        year_occupations[start_date.year] |= occupations_by_series[series_id]
+    for year, totals in year_totals.items():
+        totals['occupation_count'] = len(year_occupations[year])
+
+    # Group by year for better presentation across long-running series
+    assessment_series_by_year = defaultdict(list)
+    for row in assessment_series:
+        assessment_series_by_year[row['year']].append(row)
+    years_sorted_desc = sorted(assessment_series_by_year, reverse=True)
+
+    return {
+        'total_candidates': total_candidates,
+        'total_occupations': Occupation.objects.count(),
+        'total_centers': AssessmentCenter.objects.count(),
+        'total_results': Result.objects.count(),
+        'gender_breakdown': gender_breakdown,
+        'registration_categories': registration_categories,
+        'special_needs_breakdown': special_needs_breakdown,
+        'special_needs_by_gender': special_needs_gender,
+        'reg_cat_by_gender': reg_cat_by_gender,
+        'assessment_series': assessment_series,  # flat list kept for backward compatibility
+        'assessment_series_by_year': dict(assessment_series_by_year),
+        'assessment_series_year_totals': year_totals,
+        'years_sorted_desc': years_sorted_desc,
+        # Template-friendly blocks per year to avoid dict indexing in templates
+        'assessment_series_year_blocks': [{
+            'year': year,
+            'totals': year_totals.get(year, {}),
+            'series_list': assessment_series_by_year[year],
+        } for year in years_sorted_desc],
+    }
+
+
+def statistics_snapshot():
+    """The statistics_home context, from the cache when there is a current snapshot"""
+    key = f'{SNAPSHOT_KEY}:{generation(SNAPSHOT_GENERATION)}'
+    context = cache.get(key)
+    if context is None:
+        context = build_statistics_context()
+        cache.set(key, context, STATISTICS_SNAPSHOT_SECONDS)
+    return context
+
+
+def invalidate_statistics_snapshot():
+    """Make the snapshot out of date in every process once the current transaction commits"""
+    bump_generation(SNAPSHOT_GENERATION)
@@ -0,0 +1,89 @@
+"""
+Write-only Excel exports.
+
+Rows are written straight to the workbook's temporary sheet files as they are produced,
+so exporting a whole series keeps only one row in memory at a time. Column widths are
+decided up front (write-only sheets cannot be measured afterwards): either passed in,
+or computed from the headers and any rows the caller has already aggregated.
+
+    wb = streaming_workbook()
+    sheet = SheetWriter(wb, "Candidates", headers, widths=[18, 30, ...], freeze_header=True)
+    for candidate in queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        sheet.append([...])
+    return workbook_response(wb, "candidates.xlsx")  # from .file_responses
+"""
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, PatternFill
+from openpyxl.utils import get_column_letter
+
+# Rows fetched per database round-trip when iterating export querysets
+EXPORT_CHUNK_SIZE = 2000
+
+MIN_COLUMN_WIDTH = 10
+MAX_COLUMN_WIDTH = 50
+
+# Header look shared by the list exports (candidates, centers, occupations)
+BLUE_HEADER = {
+    'font': Font(bold=True, color='FFFFFF'),
+    'fill': PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid'),
+    'alignment': Alignment(horizontal='center', vertical='center'),
+}
+
+
+def streaming_workbook():
+    return Workbook(write_only=True)
+
+
+def column_widths(headers, rows=(), min_width=MIN_COLUMN_WIDTH, max_width=MAX_COLUMN_WIDTH):
+    """Widths that fit the headers and the given (already materialised) rows"""
+    lengths = [len(str(header)) for header in headers]
+    for row in rows:
+        for idx, value in enumerate(row[:len(lengths)]):
+            if value is not None:
+                lengths[idx] = max(lengths[idx], len(str(value)))
+    return [min(max(length + 2, min_width), max_width) for length in lengths]
+
+
+class SheetWriter:
+    """
+    A write-only worksheet with fixed column widths and shared cell styles.
+
+    header_style and cell_style are dicts of cell attributes (font, fill, alignment,
+    border); column_styles maps a 1-based column number to extra attributes for that column.
+    """
+
+    def __init__(self, wb, title, headers, widths=None, header_style=None, cell_style=None,
+                 column_styles=None, freeze_header=False):
+        self.ws = wb.create_sheet(title=title)
+        self.width = len(headers)
+        self.rows_written = 0
+
+        if widths is None:
+            widths = column_widths(headers)
+        for col, width in enumerate(widths, 1):
+            self.ws.column_dimensions[get_column_letter(col)].width = width
+        if freeze_header:
+            self.ws.freeze_panes = 'A2'
+
+        # Resolve per-column styles once instead of per cell
+        self._styles = None
+        if cell_style or column_styles:
+            self._styles = [
+                {**(cell_style or {}), **((column_styles or {}).get(col) or {})}
+                for col in range(1, self.width + 1)
+            ]
+
+        self.ws.append([self._cell(value, header_style) for value in headers] if header_style else list(headers))
+
+    def _cell(self, value, style):
+        cell = WriteOnlyCell(self.ws, value=value)
+        for attr, attr_value in style.items():
+            setattr(cell, attr, attr_value)
+        return cell
+
+    def append(self, values):
+        if self._styles:
+            values = [self._cell(value, style) if style else value for value, style in zip(values, self._styles)]
+        self.ws.append(values)
+        self.rows_written += 1
@@ -37,6 +37,18 @@ from collections import Counter
 import openpyxl
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 from openpyxl.utils import get_column_letter
+from .utilis.file_responses import spooled_buffer, pdf_response, workbook_response
+from .utilis.xlsx_export import streaming_workbook, SheetWriter, column_widths, EXPORT_CHUNK_SIZE, BLUE_HEADER
+from .utilis.photo_ingest import PhotoIngest, match_photo
+from .utilis.regno_sequence import reg_number_filter
+from .utilis.candidate_search import search_filter
+from .utilis.keyset_pagination import KeysetPaginator
+from .utilis.count_cache import CachedCountPaginator, bump_count_version
+from .utilis.enrollment_flags import refresh_enrollment_flags
+from .utilis.registration_category import CATEGORY_CODE_CHOICES, FORMAL, registration_category_code
+from .utilis.statistics_snapshot import invalidate_statistics_snapshot, statistics_snapshot
+from .utilis.import_lookups import ImportLookups
+from .utilis.candidate_import import clean_candidate_row, create_candidates, read_candidate_sheet
 
 # Session Management Utilities
 def get_user_staff_info(request):
@@ -261,7 +273,7 @@ def generate_result_list(request):
             # Filter candidates for occupation, level, center
             filters = {
                 'occupation_id': occupation_id,
-                'registration_category__iexact': regcat,
+                'registration_category_code': registration_category_code(regcat),
             }
             # For paper-based, fetch all papers for occupation/level
             structure_type = 'modules'
@@ -349,8 +361,8 @@ def generate_result_list(request):
                         'reg_number': cand.reg_number,
                         'full_name': cand.full_name,
                         'gender': cand.get_gender_display(),
-                        'passport_photo_with_regno': cand.passport_photo_with_regno.url if cand.passport_photo_with_regno else None,
-                        'passport_photo': cand.passport_photo.url if cand.passport_photo else None,
+                        'passport_photo_with_regno': cand.photo_thumbnail_url if cand.passport_photo_with_regno else None,
+                        'passport_photo': cand.photo_thumbnail_url if cand.passport_photo else None,
                         'assessment_center': getattr(cand.assessment_center, 'center_name', None),
                     }
                     # Serialize results fields needed by template
@@ -712,23 +724,21 @@ def results_home(request):
     from django.core.paginator import Paginator
     
     enrolled_candidates = Candidate.objects.filter(
-        status='Active'
-    ).filter(
-        Q(candidatelevel__isnull=False) | Q(candidatemodule__isnull=False)
-    ).distinct().select_related('occupation', 'assessment_center')
+        status='Active', has_enrollment=True
+    ).select_related('occupation', 'assessment_center')
     
     # Apply filters
     if reg_number:
-        enrolled_candidates = enrolled_candidates.filter(reg_number__icontains=reg_number)
+        enrolled_candidates = enrolled_candidates.filter(reg_number_filter(reg_number))
     if name:
-        enrolled_candidates = enrolled_candidates.filter(full_name__icontains=name)
+        enrolled_candidates = enrolled_candidates.filter(search_filter(name, fields=['full_name']))
     if registration_category:
-        enrolled_candidates = enrolled_candidates.filter(registration_category=registration_category)
+        enrolled_candidates = enrolled_candidates.filter(registration_category_code=registration_category_code(registration_category))
     
     enrolled_candidates = enrolled_candidates.order_by('reg_number')
     
     # Pagination: 50 per page
-    paginator = Paginator(enrolled_candidates, 50)
+    paginator = CachedCountPaginator(enrolled_candidates, 50)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
@@ -778,237 +788,56 @@ def upload_marks(request):
     """
     Bulk upload candidate marks from Excel for all registration categories.
     Expects POST with Excel file and selection params (occupation, level, registration_category, etc).
+    mode=dry_run checks every row and reports what would be saved without saving anything;
+    mode=chunked saves the sheet on an ImportSession processed by a background job.
     """
-    
+    from .utilis.marks_upload import MarksUpload, MarksUploadError, read_marks_sheet
+
     errors = []
     updated = 0
     file = request.FILES.get('marks_file') or request.FILES.get('excel_file')
-    regcat = request.POST.get('registration_category')
-    occupation_id = request.POST.get('occupation')
-    level_id = request.POST.get('level')
-    center_id = request.POST.get('assessment_center')
-    modules_param = request.POST.get('modules')
-    assessment_series_id = request.POST.get('assessment_series')
-    
-    # Get assessment series object
-    assessment_series = None
-    if assessment_series_id:
-        assessment_series = AssessmentSeries.objects.filter(pk=assessment_series_id).first()
-        if not assessment_series:
-            return JsonResponse({'success': False, 'error': 'Invalid assessment series selected.'})
-    else:
-        return JsonResponse({'success': False, 'error': 'Assessment series is required.'})
-    # Normalize registration category
-    regcat_normalized = regcat.strip().lower() if regcat else ''
-    if regcat_normalized in ["workers_pas", "worker's pas"]:
-        regcat_normalized = "informal"
+    mode = request.POST.get('mode', '')
+    try:
+        upload = MarksUpload(request.POST, request.user)
+    except MarksUploadError as e:
+        return JsonResponse({'success': False, 'error': str(e)})
     try:
         wb = load_workbook(file)
         ws = wb.active
     except Exception as e:
         print('Excel file load error:', e)
         return JsonResponse({'success': False, 'error': 'Invalid Excel file.'})
-    import re
-    def normalize_header(h):
-        return re.sub(r'[^a-z0-9]', '', h.strip().lower())
-    headers = [str(cell.value).strip() if cell.value else '' for cell in next(ws.iter_rows(min_row=1, max_row=1))]
-    normalized_headers = {normalize_header(h): h for h in headers}
-    regno_header = None
-    for candidate in ['regnumber', 'registrationno', 'registrationnumber', 'regno']:
-        if candidate in normalized_headers:
-            regno_header = normalized_headers[candidate]
-            break
-    if not regno_header:
-        return JsonResponse({'success': False, 'error': 'Missing registration number (reg_number) column in Excel. Please use a marksheet generated by the system.'})
+    headers, rows = read_marks_sheet(ws)
+    try:
+        upload.set_headers(headers)
+    except MarksUploadError as e:
+        return JsonResponse({'success': False, 'error': str(e)})
 
-    # Get occupation, level, center
-    occupation = Occupation.objects.filter(pk=occupation_id).first() if occupation_id else None
-    level = Level.objects.filter(pk=level_id).first() if level_id else None
-    # Determine structure_type
-    structure_type = None
-    from .models import OccupationLevel
-    occ_level = None
-    if occupation and level:
-        occ_level = OccupationLevel.objects.filter(occupation=occupation, level=level).first()
-        if occ_level:
-            structure_type = occ_level.structure_type
-    # Determine which modules/papers are in the Excel
-    code_to_obj = {}
-    # Modular: use selected module and 'PRACTICAL' column
-    if regcat_normalized == 'modular':
-        selected_module_id = modules_param
-        selected_module = Module.objects.filter(pk=selected_module_id).first() if selected_module_id else None
-    # Formal module-based: use 'THEORY' and 'PRACTICAL' columns
-    # Paper-based/informal: use paper codes as columns
-    if regcat_normalized in ['formal', 'informal', 'modular']:
-        papers = Paper.objects.filter(occupation=occupation, level=level)
-        for p in papers:
-            code_to_obj[p.code] = p
-        modules = Module.objects.filter(occupation=occupation, level=level)
-        for m in modules:
-            code_to_obj[m.code] = m
+    if mode == 'chunked':
+        from .utilis.import_sessions import open_session, start_session_job
+        session, existing = open_session('marks', file, request.user, params=upload.params)
+        job = start_session_job(session, request.user)
+        return JsonResponse({
+            'success': True,
+            'session_id': session.pk,
+            'existing': existing,
+            'status': session.status,
+            'updated_count': session.updated_count,
+            'errors': session.errors if session.is_finished else [],
+            'job_id': job.pk if job else None,
+            'status_url': reverse('job_status', args=[job.pk]) if job else None,
+        })
+
+    dry_run = mode == 'dry_run'
     # For each row, update results
-    for idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
+    for idx, row in rows:
         row_data = dict(zip(headers, row))
         print(f"[DEBUG] Row {idx} raw data: {row_data}")
-        regno = str(row_data.get(regno_header, '')).strip()
-        print(f"[DEBUG] Row {idx} regno: '{regno}'")
-        if not regno:
-            errors.append(f"Row {idx}: Missing reg_number.")
-            continue
-        candidate = Candidate.objects.filter(reg_number__iexact=regno).first()
-        if not candidate:
-            errors.append(f"Row {idx}: Candidate with reg_number '{regno}' not found.")
-            continue
-        # Validate candidate registration category, occupation, level
-        cand_regcat = getattr(candidate, 'registration_category', '').strip().lower()
-        cand_occupation_id = getattr(candidate, 'occupation_id', None)
-        if regcat_normalized != cand_regcat:
-            errors.append(f"Row {idx}: Candidate '{regno}' registration category mismatch.")
-            continue
-        if occupation and candidate.occupation_id != occupation.id:
-            errors.append(f"Row {idx}: Candidate '{regno}' occupation mismatch.")
-            continue
-        # For formal/module-based and informal, check level enrollment
-        if regcat_normalized in ['formal', 'informal'] and level:
-            if not CandidateLevel.objects.filter(candidate=candidate, level=level).exists():
-                errors.append(f"Row {idx}: Candidate '{regno}' not enrolled in selected level.")
-                continue
-        # Assessment date from assessment series
-        assessment_day = assessment_series.start_date
-        print(f"Assessment date from series: {assessment_day}")
-        # Modular: expects PRACTICAL column and selected module
-        if regcat_normalized == 'modular':
-            mark = row_data.get('PRACTICAL') or row_data.get('Practical') or row_data.get('practical')
-            if selected_module is None:
-                errors.append(f"Row {idx}: No module selected for modular upload.")
-                continue
-            if mark is None or str(mark).strip() == '':
-                errors.append(f"Row {idx}: Missing practical mark for candidate '{regno}'.")
-                continue
-            try:
-                mark_val = float(mark)
-            except Exception:
-                errors.append(f"Row {idx}: Invalid practical mark for candidate '{regno}'.")
-                continue
-            Result.objects.update_or_create(
-                candidate=candidate,
-                module=selected_module,
-                assessment_date=assessment_day,
-                assessment_series=assessment_series,
-                result_type='modular',
-                defaults={
-                    'assessment_type': 'practical',
-                    'mark': mark_val,
-                    'user': request.user,
-                    'status': ''
-                }
-            )
-            updated += 1
-        # Formal module-based: expects THEORY and PRACTICAL columns
-        elif regcat_normalized == 'formal' and structure_type == 'modules':
-            theory_mark = row_data.get('THEORY') or row_data.get('Theory') or row_data.get('theory')
-            practical_mark = row_data.get('PRACTICAL') or row_data.get('Practical') or row_data.get('practical')
-            # Save theory result (if present)
-            if theory_mark is not None and str(theory_mark).strip() != '':
-                try:
-                    theory_mark_val = float(theory_mark)
-                except Exception:
-                    errors.append(f"Row {idx}: Invalid THEORY mark for candidate '{regno}'.")
-                    theory_mark_val = None
-                if theory_mark_val is not None:
-                    Result.objects.update_or_create(
-                        candidate=candidate,
-                        level=level,
-                        assessment_date=assessment_day,
-                        assessment_series=assessment_series,
-                        assessment_type='theory',
-                        result_type='formal',
-                        defaults={
-                            'mark': theory_mark_val,
-                            'user': request.user,
-                            'status': ''
-                        }
-                    )
-                    updated += 1
-            # Save practical result (if present)
-            if practical_mark is not None and str(practical_mark).strip() != '':
-                try:
-                    practical_mark_val = float(practical_mark)
-                except Exception:
-                    errors.append(f"Row {idx}: Invalid PRACTICAL mark for candidate '{regno}'.")
-                    practical_mark_val = None
-                if practical_mark_val is not None:
-                    Result.objects.update_or_create(
-                        candidate=candidate,
-                        level=level,
-                        assessment_date=assessment_day,
-                        assessment_series=assessment_series,
-                        assessment_type='practical',
-                        result_type='formal',
-                        defaults={
-                            'mark': practical_mark_val,
-                            'user': request.user,
-                            'status': ''
-                        }
-                    )
-                    updated += 1
-        # Formal paper-based and informal: expects paper code columns
-        else:
-            for code, obj in code_to_obj.items():
-                mark = row_data.get(code)
-                if mark is None or str(mark).strip() == '':
-                    continue
-                try:
-                    mark_val = float(mark)
-                except Exception:
-                    errors.append(f"Row {idx}: Invalid mark for {code} (candidate '{regno}').")
-                    continue
-                # Allow -1 for "Missing" (Ms) status, otherwise marks must be between 0 and 100
-                if not (mark_val == -1 or (0 <= mark_val <= 100)):
-                    errors.append(f"Row {idx}: Mark for {code} (candidate '{regno}') must be between 0 and 100, or -1 for Missing. Got {mark_val}.")
-                    continue
-                # Paper-based formal
-                if regcat_normalized == 'formal' and structure_type == 'papers':
-                    Result.objects.update_or_create(
-                        candidate=candidate,
-                        level=level,
-                        paper=obj,
-                        assessment_date=assessment_day,
-                        assessment_series=assessment_series,
-                        result_type='formal',
-                        defaults={
-                            'assessment_type': obj.grade_type if hasattr(obj, 'grade_type') else 'practical',
-                            'mark': mark_val,
-                            'user': request.user,
-                            'status': ''
-                        }
-                    )
-                    updated += 1
-                # Informal/worker's PAS
-                elif regcat_normalized == 'informal':
-                    candidate_paper = CandidatePaper.objects.filter(candidate=candidate, paper=obj, level=level).first()
-                    module = candidate_paper.module if candidate_paper else None
-                    Result.objects.update_or_create(
-                        candidate=candidate,
-                        level=level,
-                        module=module,
-                        paper=obj,
-                        assessment_type='practical',
-                        assessment_date=assessment_day,
-                        assessment_series=assessment_series,
-                        result_type='informal',
-                        defaults={
-                            'mark': mark_val,
-                            'user': request.user,
-                            'status': ''
-                        }
-                    )
-                    updated += 1
+        updated += upload.process_row(idx, row_data, errors, write=not dry_run)
 
     if errors:
-        return JsonResponse({'success': False, 'updated_count': updated, 'errors': errors})
-    return JsonResponse({'success': True, 'updated_count': updated, 'errors': []})
+        return JsonResponse({'success': False, 'dry_run': dry_run, 'updated_count': updated, 'errors': errors})
+    return JsonResponse({'success': True, 'dry_run': dry_run, 'updated_count': updated, 'errors': []})
 
 @login_required
 @require_POST
@@ -1092,13 +921,10 @@ def generate_marksheet(request):
         print('[DEBUG] After NOT has_modular IDs and regcat (paper-based):', list(candidates.values_list('id', 'registration_category')))
     else:
         print('[DEBUG] Skipping occupation__has_modular filter for formal module-based marksheet.')
-    # Normalize 'workers_pas' to 'Informal' for DB filtering
-    regcat_db = regcat
-    if regcat and regcat.lower() in ['workers_pas', "worker's pas"]:
-        regcat_db = 'Informal'
-    if regcat_db:
-        candidates = candidates.filter(registration_category__iexact=regcat_db)
-        print(f'[DEBUG] After regcat ({regcat_db}) filter:', candidates.count())
+    regcat_code = registration_category_code(regcat)
+    if regcat:
+        candidates = candidates.filter(registration_category_code=regcat_code)
+        print(f'[DEBUG] After regcat ({regcat_code}) filter:', candidates.count())
         print(f'[DEBUG] After regcat IDs and regcat:', list(candidates.values_list('id', 'registration_category')))
     print('[DEBUG] Candidate IDs and occupation IDs:', list(candidates.values_list('id', 'occupation_id')))
     # For formal (module-based), filter by CandidateLevel FIRST, do NOT apply occupation filter before this!
@@ -1181,8 +1007,7 @@ def print_marksheet(request):
 
     # Check if any candidates match the criteria
     candidates = Candidate.objects.all()
-    regcat_filter = 'Informal' if regcat.lower() in ['workers_pas', "worker's pas"] else regcat
-    candidates = candidates.filter(registration_category__iexact=regcat_filter)
+    candidates = candidates.filter(registration_category_code=registration_category_code(regcat))
     candidates = candidates.filter(occupation_id=occupation_id)
 
     if level_id:
@@ -1203,6 +1028,7 @@ def print_marksheet(request):
         'occupation': occupation_id,
         'level': level_id,
         'assessment_center': center_id,
+        'output': request.POST.get('output'),
     }
     if regcat.lower() == 'modular' and modules:
         params['modules'] = ','.join(modules)
@@ -1212,47 +1038,190 @@ def print_marksheet(request):
     return JsonResponse({'success': True, 'download_url': url})
 
 
+class _SectionedDocTemplate(SimpleDocTemplate):
+    """
+    SimpleDocTemplate that lays a document out one section at a time (build_sections), so
+    a long document never holds every section's flowables in memory.
+    """
+
+    def build_sections(self, sections):
+        """
+        Build from an iterable of flowable lists, pulling each list only once the previous
+        one is laid out. Sets up the page templates as SimpleDocTemplate.build() does (no
+        onPage callbacks) and then runs BaseDocTemplate.build()'s handle_flowable() loop
+        once per section; keepWithNext does not reach across sections.
+        """
+        self._calc()
+        frame = Frame(self.leftMargin, self.bottomMargin, self.width, self.height, id='normal')
+        self.addPageTemplates([PageTemplate(id='First', frames=frame, pagesize=self.pagesize),
+                               PageTemplate(id='Later', frames=frame, pagesize=self.pagesize)])
+        self._startBuild()
+        self.canv._doctemplate = self
+        try:
+            for section in sections:
+                flowables = list(section)
+                while flowables:
+                    self.clean_hanging()
+                    self.handle_flowable(flowables)
+        finally:
+            del self.canv._doctemplate
+        self._endBuild()
+
+
+def _marksheet_month_number(month):
+    """Accept either a month number ('3') or a month name ('March')"""
+    if month and str(month).isdigit():
+        return int(month)
+    names = [m.lower() for m in calendar.month_name]
+    return names.index(month.lower()) if month and month.lower() in names else None
+
+
+def _printed_marksheet_center_section(center, candidates, *, regcat, structure_type, occupation, level, modules, papers, year, month, styles):
+    """Build the flowables for one center of the printed marksheet.
+
+    Results for the center's candidates are fetched in one query instead of one per candidate.
+    """
+    from .models import Result
+
+    center_name = center.center_name if center else "Unassigned Center"
+    center_number = center.center_number if center else "N/A"
+    table_style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.whitesmoke, colors.lightgrey]),
+        ('GRID', (0,0), (-1,-1), 1, colors.black)
+    ])
+
+    results = Result.objects.filter(candidate__in=candidates)
+    if year:
+        results = results.filter(assessment_date__year=year)
+    if month:
+        results = results.filter(assessment_date__month=month)
+    results = results.order_by('assessment_date', 'pk').only('candidate_id', 'module_id', 'paper_id', 'level_id', 'assessment_type', 'mark')
+
+    def missing_styles(row_index, col_index):
+        return [
+            ('BACKGROUND', (col_index, row_index), (col_index, row_index), colors.lightpink),
+            ('TEXTCOLOR', (col_index, row_index), (col_index, row_index), colors.red),
+        ]
+
+    def mark_text(res):
+        return f"{res.mark:.0f}" if res and res.mark is not None else ''
+
+    elements = []
+
+    # --- Modular ---
+    if regcat.lower() == 'modular':
+        by_module = {}
+        for res in results.filter(module__in=modules):
+            by_module.setdefault((res.candidate_id, res.module_id), res)
+        for print_module in modules:
+            elements.append(Paragraph(f"<b>Centre:</b> {center_number} - {center_name}", styles['h2']))
+            elements.append(Paragraph(f"<b>Occupation:</b> {occupation.name}", styles['Normal']))
+            elements.append(Paragraph(f"<b>Module:</b> {print_module.name}", styles['Normal']))
+            elements.append(Spacer(1, 12))
+            data = [["SN", "Regno", "Names", "Mark"]]
+            dynamic_styles = []
+            for i, c in enumerate(candidates, 1):
+                res = by_module.get((c.id, print_module.id))
+                if res and res.mark == -1:
+                    dynamic_styles += missing_styles(i, 3)
+                data.append([i, c.reg_number, c.full_name, mark_text(res)])
+            elements.append(Table(data, style=TableStyle(table_style.getCommands() + dynamic_styles)))
+            elements.append(Spacer(1, 24))
+
+    # --- Paper-Based (Formal & Informal) ---
+    elif structure_type == 'papers':
+        by_paper = {}
+        for res in results.filter(paper__in=papers):
+            by_paper.setdefault((res.candidate_id, res.paper_id), res)
+        elements.append(Paragraph(f"<b>Centre:</b> {center_number} - {center_name}", styles['h2']))
+        elements.append(Paragraph(f"<b>Occupation:</b> {occupation.name} - {level.name if level else ''}", styles['Normal']))
+        elements.append(Spacer(1, 12))
+        for paper in papers:
+            elements.append(Paragraph(f"<b>Paper:</b> {paper.name} ({paper.grade_type.title()})", styles['Normal']))
+            data = [["SN", "Regno", "Names", "Mark"]]
+            dynamic_styles = []
+            for i, c in enumerate(candidates, 1):
+                res = by_paper.get((c.id, paper.id))
+                if res and res.mark == -1:
+                    dynamic_styles += missing_styles(i, 3)
+                data.append([i, c.reg_number, c.full_name, mark_text(res)])
+            elements.append(Table(data, style=TableStyle(table_style.getCommands() + dynamic_styles)))
+            elements.append(Spacer(1, 12))
+
+    # --- Module-Based (Theory/Practical) ---
+    elif structure_type == 'modules':
+        by_type = {}
+        for res in results.filter(level=level):
+            by_type.setdefault((res.candidate_id, res.assessment_type), res)
+        elements.append(Paragraph(f"<b>Centre:</b> {center_number} - {center_name}", styles['h2']))
+        elements.append(Paragraph(f"<b>Occupation:</b> {occupation.name} - {level.name if level else ''}", styles['Normal']))
+        elements.append(Spacer(1, 12))
+        data = [["SN", "Regno", "Names", "Theory", "Practical"]]
+        dynamic_styles = []
+        for i, c in enumerate(candidates, 1):
+            theory = by_type.get((c.id, 'theory'))
+            practical = by_type.get((c.id, 'practical'))
+            if theory and theory.mark == -1:
+                dynamic_styles += missing_styles(i, 3)
+            if practical and practical.mark == -1:
+                dynamic_styles += missing_styles(i, 4)
+            data.append([i, c.reg_number, c.full_name, mark_text(theory), mark_text(practical)])
+        elements.append(Table(data, style=TableStyle(table_style.getCommands() + dynamic_styles)))
+        elements.append(Spacer(1, 24))
+
+    else:
+        logging.getLogger(__name__).error(f"Unknown structure type '{structure_type}' or category '{regcat}' for PDF generation.")
+        elements.append(Paragraph(f"Error: Could not determine marksheet structure for {occupation.name}.", styles['Normal']))
+
+    return elements
+
+
 @login_required
 def download_printed_marksheet(request):
     """
     Generates a printable PDF marksheet with candidates grouped by assessment center.
     The logic mirrors the filtering of `print_marksheet` to ensure consistency.
+
+    Each center is queried and laid out on its own, so national print runs don't hold the
+    whole cohort in memory. Pass output=zip to get one PDF per center in a ZIP archive.
     """
     # 1. Imports and setup
-    from io import BytesIO
-    from .models import (
-        Candidate, District, Village, Level, Module, Paper, Occupation, 
-        AssessmentCenter, AssessmentSeries, Enrollment, Result, Staff, 
-        RegistrationCategory, NatureOfDisability, PracticalMarksheet, 
-        PracticalMark, PracticalAssessor, PracticalAssessorAssignment
-    )
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
+    import shutil
+    import zipfile
+    from .models import Candidate, Level, Module, Paper, Occupation, OccupationLevel, AssessmentCenter
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
     from reportlab.lib.styles import getSampleStyleSheet
     from reportlab.lib.pagesizes import letter, landscape
-    from reportlab.lib import colors
+    from .utilis.file_responses import spooled_file_response, ZIP_CONTENT_TYPE
 
     logger = logging.getLogger(__name__)
 
     # 2. Get and log params from request.GET
     month = request.GET.get('assessment_month')
     year = request.GET.get('assessment_year')
-    regcat = request.GET.get('registration_category')
+    regcat = request.GET.get('registration_category') or ''
     occupation_id = request.GET.get('occupation')
-    occupation = Occupation.objects.get(id=occupation_id)   
+    occupation = get_object_or_404(Occupation, id=occupation_id)
     level_id = request.GET.get('level')
     center_id = request.GET.get('assessment_center')
-    branch_param = request.GET.get('assessment_center_branch')
     module_ids_raw = request.GET.get('modules', '')
     module_ids = [mid for mid in module_ids_raw.split(',') if mid]
+    as_zip = request.GET.get('output') == 'zip'
+    month_number = _marksheet_month_number(month)
+    month_label = calendar.month_name[month_number] if month_number else (month or '')
 
     logger.info(f"--- PDF Marksheet: regcat='{regcat}', occupation='{occupation_id}', level='{level_id}', modules='{module_ids}' ---")
 
     # 3. Filter candidates (mirroring the logic from print_marksheet)
-    candidates = Candidate.objects.select_related('occupation', 'assessment_center').order_by('assessment_center__center_name', 'full_name')
-    
-    regcat_filter = 'Informal' if regcat and regcat.lower() in ['workers_pas', "worker's pas"] else regcat
-    if regcat_filter:
-        candidates = candidates.filter(registration_category__iexact=regcat_filter)
+    candidates = Candidate.objects.all()
+
+    if regcat:
+        candidates = candidates.filter(registration_category_code=registration_category_code(regcat))
     if occupation_id:
         candidates = candidates.filter(occupation_id=occupation_id)
     if level_id:
@@ -1262,33 +1231,78 @@ def download_printed_marksheet(request):
     if regcat.lower() == 'modular' and module_ids:
         candidates = candidates.filter(candidatemodule__module_id__in=module_ids).distinct()
 
-    logger.info(f"Found {candidates.count()} candidates after filtering.")
+    # 4. Resolve what every center section prints
+    level = Level.objects.filter(pk=level_id).first() if level_id else None
+    structure_type = None
+    if level:
+        occ_level = OccupationLevel.objects.filter(occupation=occupation, level=level).first()
+        if occ_level:
+            structure_type = occ_level.structure_type
+    logger.info(f"Processing with structure_type: '{structure_type}'")
+    modules = list(Module.objects.filter(id__in=module_ids)) if regcat.lower() == 'modular' else []
+    papers = list(Paper.objects.filter(occupation=occupation, level=level)) if structure_type == 'papers' else []
+
+    center_ids = set(candidates.order_by().values_list('assessment_center_id', flat=True).distinct())
+    centers = list(AssessmentCenter.objects.filter(id__in=center_ids).order_by('center_name'))
+    if None in center_ids:
+        centers.append(None)
+    logger.info(f"Found candidates in {len(centers)} center(s) after filtering.")
 
-    # 4. Prepare PDF document
-    response = HttpResponse(content_type='application/pdf')
-    filename = f'marksheet_{regcat_filter}_{occupation.name}_{year}_{month}.pdf'
+    filename = f"marksheet_{registration_category_code(regcat) or 'all'}_{occupation.name}_{year}_{month}.pdf"
     pdf_title = f"Marksheet: {occupation.name} ({regcat.replace('_', ' ').title()}) - {month}/{year}"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=landscape(letter), topMargin=30, bottomMargin=30, title=pdf_title)
-    elements = []
     styles = getSampleStyleSheet()
-
-    # Main Title
     title_style = styles['h1']
     title_style.alignment = 1 # Center
-    elements.append(Paragraph(f"UGANDA VOCATIONAL AND TECHNICAL ASSESSMENT BOARD", title_style))
-    elements.append(Paragraph(f"CANDIDATES MARKSHEETS - {calendar.month_name[int(month)]} {year}", title_style))   
-    elements.append(Spacer(1, 24))
 
-    # 5. Handle no candidates
-    if not candidates.exists():
+    def heading():
+        return [
+            Paragraph(f"UGANDA VOCATIONAL AND TECHNICAL ASSESSMENT BOARD", title_style),
+            Paragraph(f"CANDIDATES MARKSHEETS - {month_label} {year}", title_style),
+            Spacer(1, 24),
+        ]
+
+    def center_section(center):
+        center_candidates = candidates.filter(assessment_center=center) if center else candidates.filter(assessment_center__isnull=True)
+        center_candidates = list(center_candidates.order_by('full_name').only('id', 'reg_number', 'full_name'))
+        return _printed_marksheet_center_section(
+            center, center_candidates,
+            regcat=regcat, structure_type=structure_type, occupation=occupation, level=level,
+            modules=modules, papers=papers, year=year, month=month_number, styles=styles,
+        )
+
+    def new_doc(buffer, title):
+        return _SectionedDocTemplate(buffer, pagesize=landscape(letter), topMargin=30, bottomMargin=30, title=title)
+
+    # 5. One PDF per center, bundled as a ZIP
+    if as_zip and centers:
+        archive = spooled_buffer()
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for center in centers:
+                center_number = center.center_number if center else 'unassigned'
+                center_buffer = spooled_buffer()
+                new_doc(center_buffer, f"{pdf_title} - {center_number}").build(heading() + center_section(center))
+                center_buffer.seek(0)
+                with zf.open(f"{center_number.replace('/', '-')}_{filename}", 'w') as member:
+                    shutil.copyfileobj(center_buffer, member)
+                center_buffer.close()
+        return spooled_file_response(archive, filename[:-len('.pdf')] + '.zip', ZIP_CONTENT_TYPE)
+
+    # 6. Single PDF, laid out one center at a time
+    buffer = spooled_buffer()
+    doc = new_doc(buffer, pdf_title)
+
+    if not centers:
         logger.warning("No candidates found, returning PDF with 'No data' message.")
-        elements.append(Paragraph("No data found for the selected criteria.", styles['h2']))
-        doc.build(elements)
-        response.write(buffer.getvalue())
-        buffer.close()
-        return response
+        doc.build(heading() + [Paragraph("No data found for the selected criteria.", styles['h2'])])
+        return pdf_response(buffer, filename)
+
+    def sections():
+        yield heading()
+        for index, center in enumerate(centers):
+            yield ([PageBreak()] if index else []) + center_section(center)
+
+    doc.build_sections(sections())
+    return pdf_response(buffer, filename)
 
 @login_required
 def assessment_series_download_excel(request, pk):
@@ -1304,50 +1318,47 @@ def assessment_series_download_excel(request, pk):
     """
     from decimal import Decimal
     from collections import defaultdict
-    from io import BytesIO
-    import openpyxl
     from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 
     # Locate series
     series = get_object_or_404(AssessmentSeries, pk=pk)
 
-    # Workbook setup
-    wb = openpyxl.Workbook()
-    # We'll create sheets explicitly; remove the default one after creating all
-    default_ws = wb.active
+    # Write-only workbook; each sheet is written once its groups are aggregated
+    wb = streaming_workbook()
 
-    header_fill = PatternFill(start_color="EEF2FF", end_color="EEF2FF", fill_type="solid")
-    header_font = Font(bold=True)
     thin = Side(style='thin', color='DDDDDD')
     border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    header_style = {
+        'font': Font(bold=True),
+        'fill': PatternFill(start_color="EEF2FF", end_color="EEF2FF", fill_type="solid"),
+        'alignment': Alignment(horizontal='center'),
+        'border': border,
+    }
 
-    def autosize(ws):
-        for column_cells in ws.columns:
-            length = max(len(str(cell.value)) if cell.value is not None else 0 for cell in column_cells)
-            ws.column_dimensions[get_column_letter(column_cells[0].column)].width = min(max(length + 2, 10), 45)
+    def write_sheet(title, headers, rows):
+        sheet = SheetWriter(
+            wb, title, headers,
+            widths=column_widths(headers, rows, max_width=45),
+            header_style=header_style,
+            cell_style={'border': border},
+        )
+        for row in rows:
+            sheet.append(row)
 
     # ---------- Modular Sheet ----------
-    modular_ws = wb.create_sheet(title="Modular")
     modular_headers = [
         'Assessment Center', 'Reg Category', 'Occupation', 'No. of Modules', 'Fees', 'No. of Candidates'
     ]
-    modular_ws.append(modular_headers)
-    for c in range(1, len(modular_headers) + 1):
-        cell = modular_ws.cell(row=1, column=c)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = Alignment(horizontal='center')
-        cell.border = border
 
     # Group by (center, 'Modular', occupation, module_bucket) where module_bucket ∈ {1,2}
     modular_groups = defaultdict(lambda: {'fees': Decimal('0.00'), 'cands': 0})
 
     modular_qs = Candidate.objects.filter(
         assessment_series=series,
-        registration_category='Modular',
+        registration_category_code='modular',
     ).select_related('assessment_center', 'occupation').prefetch_related('candidatelevel_set__level', 'candidatemodule_set')
 
-    for cand in modular_qs:
+    for cand in modular_qs.iterator(chunk_size=EXPORT_CHUNK_SIZE):
         center_name = cand.assessment_center.center_name if cand.assessment_center_id else '—'
         occ_name = cand.occupation.name if cand.occupation_id else '—'
 
@@ -1401,37 +1412,25 @@ def assessment_series_download_excel(request, pk):
         modular_groups[key]['fees'] += fee_amount
         modular_groups[key]['cands'] += 1
 
-    row_idx = 2
-    for (center_name, regcat, occ_name, module_bucket), agg in sorted(modular_groups.items()):
-        # Show bucket value (1 or 2) in the No. of Modules column
-        values = [center_name, regcat, occ_name, module_bucket, float(agg['fees']), agg['cands']]
-        modular_ws.append(values)
-        for c in range(1, len(modular_headers) + 1):
-            modular_ws.cell(row=row_idx, column=c).border = border
-        row_idx += 1
-    autosize(modular_ws)
+    # Show bucket value (1 or 2) in the No. of Modules column
+    write_sheet("Modular", modular_headers, [
+        [center_name, regcat, occ_name, module_bucket, float(agg['fees']), agg['cands']]
+        for (center_name, regcat, occ_name, module_bucket), agg in sorted(modular_groups.items())
+    ])
 
     # ---------- Formal Sheet ----------
-    formal_ws = wb.create_sheet(title="Formal")
     formal_headers = [
         'Assessment Center', 'Reg Category', 'Occupation', 'Level', 'Fees', 'No. of Candidates'
     ]
-    formal_ws.append(formal_headers)
-    for c in range(1, len(formal_headers) + 1):
-        cell = formal_ws.cell(row=1, column=c)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = Alignment(horizontal='center')
-        cell.border = border
 
     formal_groups = defaultdict(lambda: {'fees': Decimal('0.00'), 'cands': 0})
 
     formal_qs = Candidate.objects.filter(
         assessment_series=series,
-        registration_category='Formal',
+        registration_category_code='formal',
     ).select_related('assessment_center', 'occupation').prefetch_related('candidatelevel_set__level')
 
-    for cand in formal_qs:
+    for cand in formal_qs.iterator(chunk_size=EXPORT_CHUNK_SIZE):
         center_name = cand.assessment_center.center_name if cand.assessment_center_id else '—'
         occ_name = cand.occupation.name if cand.occupation_id else '—'
         level_name = '—'
@@ -1444,27 +1443,15 @@ def assessment_series_download_excel(request, pk):
         formal_groups[key]['fees'] += fee_amount
         formal_groups[key]['cands'] += 1
 
-    row_idx = 2
-    for (center_name, regcat, occ_name, level_name), agg in sorted(formal_groups.items()):
-        values = [center_name, regcat, occ_name, level_name, float(agg['fees']), agg['cands']]
-        formal_ws.append(values)
-        for c in range(1, len(formal_headers) + 1):
-            formal_ws.cell(row=row_idx, column=c).border = border
-        row_idx += 1
-    autosize(formal_ws)
+    write_sheet("Formal", formal_headers, [
+        [center_name, regcat, occ_name, level_name, float(agg['fees']), agg['cands']]
+        for (center_name, regcat, occ_name, level_name), agg in sorted(formal_groups.items())
+    ])
 
     # ---------- Worker's PAS (Informal) Sheet ----------
-    informal_ws = wb.create_sheet(title="Worker's PAS")
     informal_headers = [
         'Assessment Center', 'Reg Category', 'No. of Modules', 'Fees', 'No. of Candidates'
     ]
-    informal_ws.append(informal_headers)
-    for c in range(1, len(informal_headers) + 1):
-        cell = informal_ws.cell(row=1, column=c)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = Alignment(horizontal='center')
-        cell.border = border
 
     informal_groups = defaultdict(lambda: {'modules': 0, 'fees': Decimal('0.00'), 'cands': 0})
 
@@ -1473,10 +1460,10 @@ def assessment_series_download_excel(request, pk):
 
     informal_qs = Candidate.objects.filter(
         assessment_series=series,
-        registration_category='Informal',
+        registration_category_code='informal',
     ).select_related('assessment_center').prefetch_related('candidatepaper_set')
 
-    for cand in informal_qs:
+    for cand in informal_qs.iterator(chunk_size=EXPORT_CHUNK_SIZE):
         center_name = cand.assessment_center.center_name if cand.assessment_center_id else '—'
         key = (center_name, "Worker's PAS")
 
@@ -1498,30 +1485,14 @@ def assessment_series_download_excel(request, pk):
         informal_groups[key]['fees'] += fee_amount
         informal_groups[key]['cands'] += 1
 
-    row_idx = 2
-    for (center_name, regcat), agg in sorted(informal_groups.items()):
-        values = [center_name, regcat, agg['modules'], float(agg['fees']), agg['cands']]
-        informal_ws.append(values)
-        for c in range(1, len(informal_headers) + 1):
-            informal_ws.cell(row=row_idx, column=c).border = border
-        row_idx += 1
-    autosize(informal_ws)
-
-    # Remove the default empty sheet if we created others
-    if default_ws and default_ws.title == 'Sheet' and len(wb.worksheets) > 1:
-        wb.remove(default_ws)
+    write_sheet("Worker's PAS", informal_headers, [
+        [center_name, regcat, agg['modules'], float(agg['fees']), agg['cands']]
+        for (center_name, regcat), agg in sorted(informal_groups.items())
+    ])
 
     # Stream workbook
-    stream = BytesIO()
-    wb.save(stream)
-    stream.seek(0)
     filename = f"AssessmentSeries_{series.name.replace(' ', '_')}_summary.xlsx"
-    response = HttpResponse(
-        stream.getvalue(),
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    return response
+    return workbook_response(wb, filename)
 
 @login_required
 def assessment_series_center_mapping_excel(request, pk: int):
@@ -1532,10 +1503,7 @@ def assessment_series_center_mapping_excel(request, pk: int):
     """
     from django.shortcuts import get_object_or_404
     from django.http import HttpResponse
-    from django.db.models import Q
-    import openpyxl
     from openpyxl.styles import Font, Alignment
-    from io import BytesIO
     from .models import AssessmentSeries, Candidate, AssessmentCenterBranch, CenterRepresentative
 
     series = get_object_or_404(AssessmentSeries, pk=pk)
@@ -1546,26 +1514,14 @@ def assessment_series_center_mapping_excel(request, pk: int):
     )
 
     def qs_for_category(cat: str):
-        if cat == 'Modular':
-            return base_qs.filter(registration_category__iexact='Modular')
-        if cat == 'Formal':
-            return base_qs.filter(registration_category__iexact='Formal')
-        # Worker's PAS sheet includes variants and Informal
-        return base_qs.filter(
-            Q(registration_category__iexact="Worker's PAS") |
-            Q(registration_category__iexact='Workers PAS') |
-            Q(registration_category__iexact='Worker PAS') |
-            Q(registration_category__iexact='Informal') |
-            Q(registration_category__iregex=r"worker('?s)?\s*pas|informal")
-        )
+        # Worker's PAS sheet covers every spelling of Informal
+        return base_qs.filter(registration_category_code=registration_category_code(cat))
 
-    # Create workbook
-    wb = openpyxl.Workbook()
-    first_ws = wb.active
+    # Create write-only workbook
+    wb = streaming_workbook()
     categories = ['Modular', 'Formal', "Worker's PAS"]
 
-    def write_sheet(ws, cat: str):
-        ws.title = cat
+    def write_sheet(cat: str):
         # Headers: for Formal include Level column
         if cat == 'Formal':
             headers = [
@@ -1586,12 +1542,6 @@ def assessment_series_center_mapping_excel(request, pk: int):
                 'Occupation',
                 'No. of Candidates',
             ]
-        ws.append(headers)
-        for i in range(1, len(headers) + 1):
-            cell = ws.cell(row=1, column=i)
-            cell.font = Font(bold=True)
-            cell.alignment = Alignment(horizontal='center')
-
         qs = qs_for_category(cat)
         # Aggregate in Python to handle branch-aware grouping safely
         from collections import defaultdict
@@ -1600,7 +1550,7 @@ def assessment_series_center_mapping_excel(request, pk: int):
         # Cache for branch contacts via reps to avoid repeated queries
         branch_contact_cache = {}
 
-        for cand in qs:
+        for cand in qs.iterator(chunk_size=EXPORT_CHUNK_SIZE):
             center = cand.assessment_center
             branch = getattr(cand, 'assessment_center_branch', None)
             occupation = cand.occupation
@@ -1643,52 +1593,28 @@ def assessment_series_center_mapping_excel(request, pk: int):
                 key = (code, getattr(center, 'center_name', ''), district_name, contact_val, occ_label)
             counts[key] += 1
 
-        # Write rows
+        # Rows are (key..., total); Formal sorts by code, occupation and level
         if cat == 'Formal':
-            for (code, center_name, district_name, contact_val, occ_label, level_name), total in sorted(counts.items(), key=lambda x: (x[0][0], x[0][4], x[0][5])):
-                ws.append([
-                    code,
-                    center_name,
-                    district_name,
-                    contact_val,
-                    occ_label,
-                    level_name,
-                    total,
-                ])
+            rows = [list(key) + [total] for key, total in sorted(counts.items(), key=lambda x: (x[0][0], x[0][4], x[0][5]))]
         else:
-            for (code, center_name, district_name, contact_val, occ_label), total in sorted(counts.items(), key=lambda x: (x[0][0], x[0][4])):
-                ws.append([
-                    code,
-                    center_name,
-                    district_name,
-                    contact_val,
-                    occ_label,
-                    total,
-                ])
+            rows = [list(key) + [total] for key, total in sorted(counts.items(), key=lambda x: (x[0][0], x[0][4]))]
 
-        # Auto-size columns
-        for column in ws.columns:
-            try:
-                max_len = max(len(str(c.value)) if c.value is not None else 0 for c in column)
-            except Exception:
-                max_len = 15
-            col_letter = column[0].column_letter
-            ws.column_dimensions[col_letter].width = min(max(max_len + 2, 10), 50)
+        # Widths are sized from the aggregated rows before they are written
+        sheet = SheetWriter(
+            wb, cat, headers,
+            widths=column_widths(headers, rows),
+            header_style={'font': Font(bold=True), 'alignment': Alignment(horizontal='center')},
+        )
+        for row in rows:
+            sheet.append(row)
 
     # Populate sheets
-    write_sheet(first_ws, categories[0])
-    for cat in categories[1:]:
-        ws = wb.create_sheet(title=cat)
-        write_sheet(ws, cat)
+    for cat in categories:
+        write_sheet(cat)
 
     # Stream response
-    stream = BytesIO()
-    wb.save(stream)
-    stream.seek(0)
     filename = f"center_mapping_{series.start_date.year}_{series.start_date.month}.xlsx"
-    resp = HttpResponse(stream.getvalue(), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    resp['Content-Disposition'] = f'attachment; filename="{filename}"'
-    return resp
+    return workbook_response(wb, filename)
 @login_required
 def generate_assessment_series_excel(request, year, month):
     """Generate Excel export of candidate-level data for an assessment series.
@@ -1696,12 +1622,8 @@ def generate_assessment_series_excel(request, year, month):
     an .xlsx file with candidate details and an overall comment derived from results.
     """
     from django.http import HttpResponse
-    from django.db.models import Q
-    from io import BytesIO
     import time
     try:
-        import openpyxl
-        from openpyxl.utils import get_column_letter
         from openpyxl.styles import Font, Alignment
     except Exception:
         return HttpResponse("openpyxl is required for Excel export", status=500)
@@ -1718,43 +1640,10 @@ def generate_assessment_series_excel(request, year, month):
     if not assessment_series:
         return HttpResponse("Assessment series not found", status=404)
 
-    # Category mapping consistent with PDF view
-    category_mapping = {
-        'Modular': 'Modular',
-        'Formal': 'Formal',
-        "Worker's PAS": 'Informal',
-        'Workers PAS': 'Informal',
-        'Worker PAS': 'Informal',
-        'Informal': 'Informal',
-        'informal': 'Informal',
-        "worker's pas": 'Informal',
-        'workers pas': 'Informal',
-        'worker pas': 'Informal',
-    }
-    db_category = category_mapping.get(category, category)
-
-    # Build combined category filter (same approach as PDF)
-    candidate_filters = [
-        Q(registration_category=db_category),
-        Q(registration_category=category)
-    ]
-    if category and any(term in category.lower() for term in ['informal', 'worker', 'pas']):
-        candidate_filters.extend([
-            Q(registration_category='Informal'),
-            Q(registration_category='informal'),
-            Q(registration_category="Worker's PAS"),
-            Q(registration_category='Workers PAS'),
-            Q(registration_category='Worker PAS'),
-        ])
-    combined_filter = candidate_filters[0]
-    for f in candidate_filters[1:]:
-        combined_filter |= f
-
-    # Base queryset
+    # Base queryset; every spelling of the category shares its code
     qs = Candidate.objects.filter(
-        assessment_series=assessment_series
-    ).filter(
-        combined_filter
+        assessment_series=assessment_series,
+        registration_category_code=registration_category_code(category),
     ).select_related(
         'occupation', 'occupation__sector', 'assessment_center', 'district'
     ).prefetch_related(
@@ -1772,21 +1661,19 @@ def generate_assessment_series_excel(request, year, month):
             # Ignore invalid level
             pass
 
-    # Prepare workbook
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Candidates"
+    # Prepare write-only workbook; rows are streamed as candidates are read
+    wb = streaming_workbook()
 
     # Header (added District and Region)
     headers = [
         'Reg Number', 'Full Name', 'Center', 'District', 'Region',
         'Gender', 'Nationality', 'Disability', 'Occupation', 'Sector', 'Refugee', 'Overall Comment'
     ]
-    ws.append(headers)
-    header_font = Font(bold=True)
-    for col_idx in range(1, len(headers) + 1):
-        ws.cell(row=1, column=col_idx).font = header_font
-        ws.cell(row=1, column=col_idx).alignment = Alignment(horizontal='center')
+    sheet = SheetWriter(
+        wb, "Candidates", headers,
+        widths=[24, 30, 40, 18, 12, 12, 14, 12, 35, 25, 12, 17],
+        header_style={'font': Font(bold=True), 'alignment': Alignment(horizontal='center')},
+    )
 
     # Helper to derive overall comment based on results
     # Rule: consider ALL results across series and, for each paper/module/level,
@@ -1795,16 +1682,8 @@ def generate_assessment_series_excel(request, year, month):
     # 2) Otherwise, prefer non-missing over missing
     # 3) If tie remains, pick the one with the latest timestamp (date -> assessment_date)
     def derive_overall_comment(candidate):
-        # Fetch results robustly (explicit query, fallback to reverse relation)
-        try:
-            from .models import Result as ResultModel
-            results_qs = ResultModel.objects.filter(candidate=candidate)
-            results = list(results_qs)
-        except Exception:
-            try:
-                results = list(candidate.result_set.all())
-            except Exception:
-                results = []
+        # Results are prefetched per chunk of candidates
+        results = list(candidate.result_set.all())
         if not results:
             return 'No Results'
 
@@ -1873,8 +1752,7 @@ def generate_assessment_series_excel(request, year, month):
         return 'Mixed'
 
     # Populate rows
-    row_count = 1
-    for c in qs:
+    for c in qs.iterator(chunk_size=EXPORT_CHUNK_SIZE):
         district_obj = getattr(c, 'district', None)
         district_name = getattr(district_obj, 'name', '') if district_obj else ''
         region_name = getattr(district_obj, 'region', '') if district_obj else ''
@@ -1892,160 +1770,11 @@ def generate_assessment_series_excel(request, year, month):
             'Yes' if getattr(c, 'is_refugee', False) else 'No',
             derive_overall_comment(c),
         ]
-        ws.append(row)
-        row_count += 1
-
-    # Autosize columns
-    for col_idx in range(1, len(headers) + 1):
-        max_len = 0
-        col_letter = get_column_letter(col_idx)
-        for cell in ws[col_letter]:
-            try:
-                v = str(cell.value) if cell.value is not None else ''
-                if len(v) > max_len:
-                    max_len = len(v)
-            except Exception:
-                pass
-        ws.column_dimensions[col_letter].width = min(max(12, max_len + 2), 50)
+        sheet.append(row)
 
     # Stream the workbook
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-
-    response = HttpResponse(
-        buffer.getvalue(),
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    filename = f"assessment_series_{year}_{month}_{db_category or 'All'}.xlsx"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    return response
-
-    # 6. Get related objects
-    occupation = Occupation.objects.get(pk=occupation_id)
-    level = Level.objects.get(pk=level_id) if level_id else None
-    
-    structure_type = None
-    if occupation and level:
-        occ_level = OccupationLevel.objects.filter(occupation=occupation, level=level).first()
-        if occ_level:
-            structure_type = occ_level.structure_type
-    logger.info(f"Processing with structure_type: '{structure_type}'")
-
-    # 7. Group candidates by center
-    candidates_by_center = defaultdict(list)
-    for c in candidates:
-        center_key = c.assessment_center.id if c.assessment_center else 'unassigned'
-        candidates_by_center[center_key].append(c)
-
-    # 8. Build PDF content
-    table_style = TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.whitesmoke, colors.lightgrey]),
-        ('GRID', (0,0), (-1,-1), 1, colors.black)
-    ])
-
-    first_center = True
-    for center_id_key, candidates_in_center in sorted(candidates_by_center.items()):
-        if not first_center:
-            elements.append(PageBreak())
-        first_center = False
-        
-        center = AssessmentCenter.objects.get(pk=center_id_key) if center_id_key != 'unassigned' else None
-        center_name = center.center_name if center else "Unassigned Center"
-        center_number = center.center_number if center else "N/A"
-
-        # --- Modular ---
-        if regcat.lower() == 'modular':
-            modules_to_print = Module.objects.filter(id__in=module_ids)
-            for print_module in modules_to_print:
-                elements.append(Paragraph(f"<b>Centre:</b> {center_number} - {center_name}", styles['h2']))
-                elements.append(Paragraph(f"<b>Occupation:</b> {occupation.name}", styles['Normal']))
-                elements.append(Paragraph(f"<b>Module:</b> {print_module.name}", styles['Normal']))
-                elements.append(Spacer(1, 12))
-                data = [["SN", "Regno", "Names", "Mark"]]
-                dynamic_styles = []
-                for i, c in enumerate(candidates_in_center, 1):
-                    res = Result.objects.filter(candidate=c, module=print_module, assessment_date__year=year, assessment_date__month=month).first()
-                    mark_val = f"{res.mark:.0f}" if res and res.mark is not None else ''
-                    if res and res.mark == -1:
-                        row_index = i
-                        col_index = 3 # Mark column
-                        dynamic_styles.append(('BACKGROUND', (col_index, row_index), (col_index, row_index), colors.lightpink))
-                        dynamic_styles.append(('TEXTCOLOR', (col_index, row_index), (col_index, row_index), colors.red))
-                    data.append([i, c.reg_number, c.full_name, mark_val])
-                
-                final_table_style = TableStyle(table_style.getCommands() + dynamic_styles)
-                elements.append(Table(data, style=final_table_style))
-                elements.append(Spacer(1, 24))
-
-        # --- Paper-Based (Formal & Informal) ---
-        elif structure_type == 'papers':
-            papers = Paper.objects.filter(occupation=occupation, level=level)
-            elements.append(Paragraph(f"<b>Centre:</b> {center_number} - {center_name}", styles['h2']))
-            elements.append(Paragraph(f"<b>Occupation:</b> {occupation.name} - {level.name if level else ''}", styles['Normal']))
-            elements.append(Spacer(1, 12))
-            for paper in papers:
-                elements.append(Paragraph(f"<b>Paper:</b> {paper.name} ({paper.grade_type.title()})", styles['Normal']))
-                data = [["SN", "Regno", "Names", "Mark"]]
-                dynamic_styles = []
-                for i, c in enumerate(candidates_in_center, 1):
-                    res = Result.objects.filter(candidate=c, paper=paper, assessment_date__year=year, assessment_date__month=month).first()
-                    mark_val = f"{res.mark:.0f}" if res and res.mark is not None else ''
-                    if res and res.mark == -1:
-                        row_index = i
-                        col_index = 3 # Mark column
-                        dynamic_styles.append(('BACKGROUND', (col_index, row_index), (col_index, row_index), colors.lightpink))
-                        dynamic_styles.append(('TEXTCOLOR', (col_index, row_index), (col_index, row_index), colors.red))
-                    data.append([i, c.reg_number, c.full_name, mark_val])
-
-                final_table_style = TableStyle(table_style.getCommands() + dynamic_styles)
-                elements.append(Table(data, style=final_table_style))
-                elements.append(Spacer(1, 12))
-
-        # --- Module-Based (Theory/Practical) ---
-        elif structure_type == 'modules':
-            elements.append(Paragraph(f"<b>Centre:</b> {center_number} - {center_name}", styles['h2']))
-            elements.append(Paragraph(f"<b>Occupation:</b> {occupation.name} - {level.name if level else ''}", styles['Normal']))
-            elements.append(Spacer(1, 12))
-            data = [["SN", "Regno", "Names", "Theory", "Practical"]]
-            dynamic_styles = []
-            for i, c in enumerate(candidates_in_center, 1):
-                theory = Result.objects.filter(candidate=c, level=level, assessment_type='theory', assessment_date__year=year, assessment_date__month=month).first()
-                practical = Result.objects.filter(candidate=c, level=level, assessment_type='practical', assessment_date__year=year, assessment_date__month=month).first()
-                
-                theory_val = f"{theory.mark:.0f}" if theory and theory.mark is not None else ''
-                practical_val = f"{practical.mark:.0f}" if practical and practical.mark is not None else ''
-                
-                row_index = i
-                if theory and theory.mark == -1:
-                    dynamic_styles.append(('BACKGROUND', (3, row_index), (3, row_index), colors.lightpink))
-                    dynamic_styles.append(('TEXTCOLOR', (3, row_index), (3, row_index), colors.red))
-                
-                if practical and practical.mark == -1:
-                    dynamic_styles.append(('BACKGROUND', (4, row_index), (4, row_index), colors.lightpink))
-                    dynamic_styles.append(('TEXTCOLOR', (4, row_index), (4, row_index), colors.red))
-
-                data.append([i, c.reg_number, c.full_name, theory_val, practical_val])
-
-            final_table_style = TableStyle(table_style.getCommands() + dynamic_styles)
-            elements.append(Table(data, style=final_table_style))
-            elements.append(Spacer(1, 24))
-        
-        else:
-             logger.error(f"Unknown structure type '{structure_type}' or category '{regcat}' for PDF generation.")
-             elements.append(Paragraph(f"Error: Could not determine marksheet structure for {occupation.name}.", styles['Normal']))
-
-    # 9. Build and return PDF
-    doc.build(elements)
-    pdf = buffer.getvalue()
-    buffer.close()
-    response.write(pdf)
-    return response
+    filename = f"assessment_series_{year}_{month}_{registration_category_code(category) or 'All'}.xlsx"
+    return workbook_response(wb, filename)
 
 @login_required
 def download_marksheet(request):
@@ -2107,7 +1836,7 @@ def download_marksheet(request):
     # --- Candidate Query ---
     candidates = Candidate.objects.all()
     if regcat:
-        candidates = candidates.filter(registration_category__iexact=regcat)
+        candidates = candidates.filter(registration_category_code=registration_category_code(regcat))
     # For formal (module-based), filter by CandidateLevel FIRST, do not apply occupation filter before this!
     if regcat_normalized == 'formal' and structure_type == 'modules' and level and occupation:
         from .models import CandidateLevel
@@ -2215,18 +1944,13 @@ def download_marksheet(request):
                     ''  # PR mark cell (to be filled)
                 ])
                 sn += 1
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
         #filename = f"marksheet_{regcat_normalized or 'all'}_{month or ''}_{year or ''}.xlsx"
         occupation_name = occupation.name if occupation else 'Occupation'
         regcat_title = regcat_normalized.title() if regcat_normalized else 'All'
         month_str = calendar.month_name[int(month)] if month and month.isdigit() and int(month) in range(1, 13) else (month if month else '')
         year_str = year if year else ''
         filename = f"{occupation_name} Marksheet {month_str} {year_str} {regcat_title}.xlsx"
-        response = HttpResponse(output.getvalue(), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        return response
+        return workbook_response(wb, filename)
 
     # --- Formal (module-based): SN, REGISTRATION NO., FULL NAME, OCCUPATION CODE, CATEGORY, LEVEL, THEORY, PRACTICAL ---
     if regcat_normalized == 'formal' and structure_type == 'modules':
@@ -2247,49 +1971,34 @@ def download_marksheet(request):
                 '',  # Practical mark
             ])
             sn += 1
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
         #filename = f"marksheet_{regcat_normalized or 'all'}_{month or ''}_{year or ''}.xlsx"
         occupation_name = occupation.name if occupation else 'Occupation'
         regcat_title = regcat_normalized.title() if regcat_normalized else 'All'
         month_str = calendar.month_name[int(month)] if month and month.isdigit() and int(month) in range(1, 13) else (month if month else '')
         year_str = year if year else ''
         filename = f"{occupation_name} Marksheet {month_str} {year_str} {regcat_title}.xlsx"    
-        response = HttpResponse(output.getvalue(), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        return response
+        return workbook_response(wb, filename)
 
     if not modules and not papers:
         wb = Workbook()
         ws = wb.active
         ws.title = 'Marksheet'
         ws.append(['No modules or papers found for the selected occupation and level.'])
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
         #filename = f"marksheet_{regcat_normalized or 'all'}_{month or ''}_{year or ''}.xlsx"
         occupation_name = occupation.name if occupation else 'Occupation'
         regcat_title = regcat_normalized.title() if regcat_normalized else 'All'
         month_str = calendar.month_name[int(month)] if month and month.isdigit() and int(month) in range(1, 13) else (month if month else '')
         year_str = year if year else ''
         filename = f"{occupation_name} Marksheet {month_str} {year_str} {regcat_title}.xlsx"
-        response = HttpResponse(output, content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        return response
+        return workbook_response(wb, filename)
 
     if not candidates.exists():
         wb = Workbook()
         ws = wb.active
         ws.title = 'Marksheet'
         ws.append(['No enrolled candidates found for the selected parameters.'])
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
         filename = f"marksheet_{regcat_normalized or 'all'}_{month or ''}_{year or ''}.xlsx"
-        response = HttpResponse(output, content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        return response
+        return workbook_response(wb, filename)
 
     # --- Build Excel ---
     wb = Workbook()
@@ -2392,10 +2101,7 @@ def download_marksheet(request):
         elif informal:
             sn += 1
 
-    # --- Stream to memory ---
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
+    # --- Stream to client ---
     #filename = f"marksheet_{regcat_normalized or 'all'}_{month or ''}_{year or ''}.xlsx"
     occupation_name = occupation.name if occupation else 'Occupation'
     regcat_title = regcat_normalized.title() if regcat_normalized else 'All'
@@ -2403,9 +2109,7 @@ def download_marksheet(request):
     year_str = year if year else ''
     filename = f"{occupation_name} Marksheet {month_str} {year_str} {regcat_title}.xlsx"    
     
-    response = HttpResponse(output, content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    return response
+    return workbook_response(wb, filename)
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse, HttpResponse
 
@@ -2451,11 +2155,19 @@ def candidate_import_dual(request):
     """
     Handle GET (show dual import page) and POST (process Excel + photo zip upload).
     Excel is required, photos are optional and can be added later.
+    mode=dry_run validates every row and reports without creating anything;
+    mode=chunked saves the upload on an ImportSession processed by a background job.
     """
     if request.method == 'GET':
-        return render(request, 'candidates/import_dual.html')
+        context = {}
+        session_id = request.GET.get('session')
+        if session_id:
+            from .models import ImportSession
+            context['session'] = ImportSession.objects.filter(pk=session_id, kind='candidates').select_related('job').first()
+        return render(request, 'candidates/import_dual.html', context)
 
     excel_file = request.FILES.get('excel_file')
+    mode = request.POST.get('mode', '')
     errors = []
     created = 0
     
@@ -2471,68 +2183,20 @@ def candidate_import_dual(request):
         errors.append('Invalid Excel file.')
         return render(request, 'candidates/import_dual.html', {'errors': errors, 'imported_count': 0})
     
-    headers = [str(cell.value).replace(u'\xa0', ' ').strip().lower() for cell in ws[1] if cell.value]
+    headers, rows = read_candidate_sheet(ws)
 
-    # Process photos if ZIP file is provided (optional)
+    # Photos (optional) are read straight from the ZIP and prepared in worker processes
     image_name_map = {}
-    tmp_dir = None
+    photos = None
     photo_zip = request.FILES.get('photo_zip')
     if photo_zip:
-        tmp_dir = tempfile.mkdtemp()
         try:
-            with zipfile.ZipFile(photo_zip) as zf:
-                image_files = [n for n in zf.namelist() if n.lower().endswith(('.jpg', '.jpeg', '.png'))]
-                for image_name in zf.namelist():
-                    # Skip directories and non-image files
-                    if image_name.endswith('/') or not image_name.lower().endswith(('.jpg', '.jpeg', '.png')):
-                        continue
-                        
-                    # Extract filename without extension
-                    image_name_only = os.path.splitext(os.path.basename(image_name))[0]
-                    
-                    # Smart photo name parsing to handle multiple formats:
-                    # Format 1: '540255.Afoyo_Vani' -> extract 'Afoyo Vani' (old system with numeric prefix)
-                    # Format 2: '614956.Kajumba Ruth' -> extract 'Kajumba Ruth' (numbered format)
-                    # Format 3: 'Afoyo_Vani' -> extract 'Afoyo Vani' (simple format)
-                    
-                    cleaned_name = None
-                    
-                    if '.' in image_name_only:
-                        # Split by first dot to separate potential prefix from name
-                        prefix, name_part = image_name_only.split('.', 1)
-                        
-                        # Check if prefix is purely numeric (old system format)
-                        if prefix.isdigit():
-                            # Old system format: '540255.Afoyo_Vani' -> 'Afoyo Vani'
-                            cleaned_name = name_part.replace('_', ' ').strip()
-                            print(f"[PHOTO DEBUG] Old system format detected: '{image_name_only}' -> '{cleaned_name}'")
-                        else:
-                            # Mixed format: '614956.Kajumba Ruth' -> 'Kajumba Ruth'
-                            cleaned_name = name_part.replace('_', ' ').strip()
-                            print(f"[PHOTO DEBUG] Mixed format detected: '{image_name_only}' -> '{cleaned_name}'")
-                    else:
-                        # Simple format: 'Afoyo_Vani' -> 'Afoyo Vani'
-                        cleaned_name = image_name_only.replace('_', ' ').strip()
-                        print(f"[PHOTO DEBUG] Simple format detected: '{image_name_only}' -> '{cleaned_name}'")
-                    
-                    if cleaned_name:
-                        image_name_map[cleaned_name.lower()] = image_name
-                
-                # Debug: Show all parsed photo names
-                print(f"[PHOTO PARSING DEBUG] Total photos parsed: {len(image_name_map)}")
-                for parsed_name, original_file in image_name_map.items():
-                    print(f"[PHOTO PARSING DEBUG] '{parsed_name}' -> '{original_file}'")
-                
-                zf.extractall(tmp_dir)
+            photos = PhotoIngest(photo_zip)
         except Exception as e:
-            errors.append(f'Invalid ZIP file or unable to extract images: {e}')
-            if tmp_dir:
-                import shutil
-                shutil.rmtree(tmp_dir, ignore_errors=True)
+            errors.append(f'Invalid ZIP file or unable to read images: {e}')
             return render(request, 'candidates/import_dual.html', {'errors': errors, 'imported_count': 0})
-    
-    # Read Excel rows (always process Excel, regardless of photos)
-    rows = [row for row in ws.iter_rows(min_row=2, values_only=True) if not all(cell is None for cell in row)]
+        image_name_map = photos.image_name_map
+        print(f"[PHOTO PARSING DEBUG] Total photos parsed: {len(image_name_map)}")
     
     # If photos are provided, analyze photo-candidate matching first
     photo_analysis = []
@@ -2541,46 +2205,30 @@ def candidate_import_dual(request):
     
     if photo_zip and image_name_map:
         candidate_names = []
-        for row in rows:
+        for _, row in rows:
             data = dict(zip(headers, row))
             candidate_name_full = (data.get('full_name') or '').strip()
             if candidate_name_full:
                 candidate_names.append(candidate_name_full)
         
         # Analyze matching using multi-strategy approach
+        matched_members = []
         for candidate_name in candidate_names:
-            name_parts = candidate_name.split()
-            matched_photo = None
-            
-            # Strategy 1: Try full name first
-            if candidate_name.lower() in image_name_map:
-                matched_photo = image_name_map[candidate_name.lower()]
-            
-            # Strategy 2: If no match and 3+ parts, try first two names
-            elif len(name_parts) >= 3:
-                candidate_name_for_match = " ".join(name_parts[:2])
-                if candidate_name_for_match.lower() in image_name_map:
-                    matched_photo = image_name_map[candidate_name_for_match.lower()]
-            
-            # Strategy 3: If still no match and 3+ parts, try first and last names
-            if not matched_photo and len(name_parts) >= 3:
-                candidate_name_for_match = f"{name_parts[0]} {name_parts[-1]}"
-                if candidate_name_for_match.lower() in image_name_map:
-                    matched_photo = image_name_map[candidate_name_for_match.lower()]
+            matched_photo = match_photo(image_name_map, candidate_name)
             
             if matched_photo:
+                matched_members.append(matched_photo)
                 photo_analysis.append(f"✅ '{candidate_name}' → matches photo '{matched_photo}'")
             else:
                 unmatched_candidates.append(candidate_name)
         
+        # Start preparing matched photos while the rows are validated below
+        if not mode:
+            photos.prefetch(matched_members)
+        
         # Find photos that don't match any candidate
         matched_photos = set(image_name_map.values())
-        all_photos = set()
-        try:
-            with zipfile.ZipFile(photo_zip) as zf:
-                all_photos = {n for n in zf.namelist() if n.lower().endswith(('.jpg', '.jpeg', '.png')) and not n.endswith('/')}
-        except:
-            pass
+        all_photos = set(photos.image_members)
         unmatched_photos = list(all_photos - matched_photos)
         
         # If there are significant mismatches, provide detailed analysis
@@ -2613,298 +2261,83 @@ def candidate_import_dual(request):
             mismatch_rate = len(unmatched_candidates) / len(candidate_names) if candidate_names else 0
             if mismatch_rate > 0.5:
                 errors.append("\n⚠️  HIGH MISMATCH RATE: Consider fixing photo names before importing.")
+                photos.close()
                 return render(request, 'candidates/import_dual.html', {'errors': errors, 'imported_count': 0})
     
-    for idx, row in enumerate(rows, start=2):
+    if mode == 'chunked':
+        # Rows are created by a background job; the page follows the session's progress
+        from .utilis.import_sessions import open_session, start_session_job
+        if photos:
+            photos.close()
+        session, existing = open_session('candidates', excel_file, request.user, photo_zip=photo_zip)
+        start_session_job(session, request.user)
+        if existing:
+            logging.getLogger(__name__).debug("Upload matches import session %s (%s)", session.pk, session.status)
+        return redirect(f"{reverse('candidate_import_dual')}?session={session.pk}")
+
+    # Occupations, centers/branches, districts and countries are resolved from memory
+    lookups = ImportLookups()
+    valid_rows = []
+    row_photos = []
+    pending_photos = []
+    for idx, row in rows:
+        if photos:
+            photos.pump()
         data = dict(zip(headers, row))
         candidate_name_full = (data.get('full_name') or '').strip()
-
-        # Try multiple name matching strategies
-        name_parts = candidate_name_full.split()
-        img_name = None
-        
-        # Strategy 1: Try full name first
-        img_name = image_name_map.get(candidate_name_full.lower())
-        
-        # Strategy 2: If no match and 3+ parts, try first two names
-        if not img_name and len(name_parts) >= 3:
-            candidate_name_for_match = " ".join(name_parts[:2])
-            img_name = image_name_map.get(candidate_name_for_match.lower())
-        
-        # Strategy 3: If still no match and 3+ parts, try first and last names
-        if not img_name and len(name_parts) >= 3:
-            candidate_name_for_match = f"{name_parts[0]} {name_parts[-1]}"
-            img_name = image_name_map.get(candidate_name_for_match.lower())
-        
-        # For debugging, show what we tried
-        candidate_name_for_match = candidate_name_full if img_name else "(no match found)"
-        
-        # Debug photo matching
-        print(f"[PHOTO MATCH DEBUG] Row {idx}: Candidate '{candidate_name_full}' -> Looking for '{candidate_name_for_match}' -> Found: {img_name}")
-        if photo_zip and not img_name:
-            print(f"[PHOTO MATCH DEBUG] Available photos: {list(image_name_map.keys())}")
-
-        # If photos were provided but this candidate has no match, log it
-        if not img_name and photo_zip:
-            errors.append(f"Row {idx}: No photo found for '{candidate_name_full}' (searched for '{candidate_name_for_match}')")
-        
-        # --- (reuse import logic from candidate_import) ---
-        form_data = data.copy()
-        # Normalize registration_category for modular candidates
-        regcat = str(form_data.get('registration_category', '')).strip().capitalize()
-        if regcat == 'Modular':
-            form_data['registration_category'] = 'Modular'
-        
-        # Robust date parsing: handle string, datetime, and Excel serial (float/int)
-        from openpyxl.utils.datetime import from_excel
-        import datetime as dt
-        for date_field in ['date_of_birth', 'start_date', 'finish_date', 'assessment_date']:
-            val = form_data.get(date_field)
-            if not val:
-                continue
-            if isinstance(val, (dt.date, dt.datetime)):
-                form_data[date_field] = val.date() if isinstance(val, dt.datetime) else val
-            elif isinstance(val, (float, int)):
-                try:
-                    form_data[date_field] = from_excel(val).date()
-                except Exception:
-                    errors.append(f"Row {idx}: Invalid Excel serial date in '{date_field}'.")
-                    continue
-            elif isinstance(val, str):
-                for fmt in ('%d/%m/%Y', '%-d/%-m/%Y', '%Y-%m-%d'):
-                    try:
-                        form_data[date_field] = dt.datetime.strptime(val, fmt).date()
-                        break
-                    except Exception:
-                        continue
-                else:
-                    errors.append(f"Row {idx}: Invalid date format in '{date_field}'. Use D/M/YYYY, DD/MM/YYYY, or YYYY-MM-DD.")
-                    continue
-        
-        # DEBUG: Print nationality value before validation
-        print(f"[DEBUG] Row {idx} nationality value: '{form_data.get('nationality', '')}'")
-        from django_countries import countries
-        import re
-        def normalize_country(val):
-            val = val.lower().replace('&', 'and')
-            val = re.sub(r'[^a-z0-9 ]', '', val)
-            val = re.sub(r'\s+', ' ', val).strip()
-            return val
-        
-        nat_val = form_data.get('nationality', '')
-        if nat_val:
-            nat_val_str = str(nat_val).strip()
-            if nat_val_str:
-                # Try exact match first
-                country_found = None
-                for code, name in countries:
-                    if name.lower() == nat_val_str.lower():
-                        country_found = code
-                        break
-                
-                # If no exact match, try normalized matching
-                if not country_found:
-                    nat_normalized = normalize_country(nat_val_str)
-                    for code, name in countries:
-                        name_normalized = normalize_country(name)
-                        if name_normalized == nat_normalized:
-                            country_found = code
-                            break
-                
-                if country_found:
-                    form_data['nationality'] = country_found
-                    print(f"[DEBUG] Row {idx} nationality mapped: '{nat_val_str}' -> '{country_found}'")
-                else:
-                    errors.append(f"Row {idx}: Invalid nationality '{nat_val_str}'. Must be a valid country name.")
-                    continue
-        
-        # Handle occupation lookup (try both code and name)
-        occ_val = form_data.get('occupation')
-        if occ_val:
-            occ_str = str(occ_val).strip()
-            # Try to find by code first, then by name
-            occupation = Occupation.objects.filter(code__iexact=occ_str).first()
-            if not occupation:
-                occupation = Occupation.objects.filter(name__iexact=occ_str).first()
-            
-            if occupation:
-                form_data['occupation'] = occupation.id
-            else:
-                errors.append(f"Row {idx}: Occupation '{occ_str}' not found.")
-                continue
-        
-        # Enhanced assessment center/branch lookup (by code/number)
-        center_val = form_data.get('assessment_center')
-        if center_val:
-            center_str = str(center_val).strip()
-            
-            # First try to find a branch by branch_code
-            branch_found = None
-            center_found = None
-            
-            try:
-                # Try to find branch by branch_code first
-                from .models import AssessmentCenterBranch
-                branch_found = AssessmentCenterBranch.objects.select_related('assessment_center').filter(branch_code__iexact=center_str).first()
-                if branch_found:
-                    center_found = branch_found.assessment_center
-                    form_data['assessment_center'] = center_found.id
-                    form_data['assessment_center_branch'] = branch_found.id
-                else:
-                    # If no branch found, try to find assessment center by center_number or center_name
-                    center_found = AssessmentCenter.objects.filter(center_number__iexact=center_str).first()
-                    if not center_found:
-                        center_found = AssessmentCenter.objects.filter(center_name__iexact=center_str).first()
-                    
-                    if center_found:
-                        form_data['assessment_center'] = center_found.id
-                        form_data['assessment_center_branch'] = None  # No branch specified
-                    else:
-                        errors.append(f"Row {idx}: Assessment Center or Branch '{center_str}' not found. Please use a valid center number, center name, or branch code.")
-                        continue
-            except Exception as e:
-                errors.append(f"Row {idx}: Error looking up assessment center/branch '{center_str}': {str(e)}")
-                continue
-        
-        # District lookup: do this BEFORE form validation
-        district_val = form_data.get('district')
-        if district_val is None or str(district_val).strip() == '':
-            form_data['district'] = None
-        else:
-            district_str = str(district_val).strip()
-            district_obj = District.objects.filter(name__iexact=district_str).first()
-            if district_obj:
-                form_data['district'] = district_obj.id
-                print(f"[DEBUG] Row {idx}: District '{district_str}' found and mapped to ID {district_obj.id}")
-            else:
-                form_data['district'] = None
-                print(f"[DEBUG] Row {idx}: District '{district_str}' not found in system")
-                # Add to errors for visibility but don't stop processing
-                errors.append(f"Row {idx}: District '{district_str}' not found - candidate will be created without district")
-        
-        # Remove village processing completely
-        form_data['village'] = None
-        
-        # Use CandidateForm for validation, but patch required fields for import
-        form = CandidateForm(form_data)
-        for f in ['district']:
-            if f in form.fields:
-                form.fields[f].required = False
-        
-        if not form.is_valid():
-            print(f"[DEBUG] Row {idx} SKIPPED: CandidateForm errors: {form.errors}")
-            errors.append(f"Row {idx}: Form errors: {form.errors}")
-            continue
-        
-        # Debug: print after district assignment
-        print(f"[DEBUG] Row {idx} after district assignment: district={form_data.get('district')}")
-
-        # Define date and foreign key fields for use below
-        date_fields = ['date_of_birth', 'start_date', 'finish_date', 'assessment_date']
-        fk_fields = ['occupation', 'assessment_center', 'assessment_center_branch', 'district']
-        
-        # Coerce every other field except dates and foreign keys to string
-        for k in form_data:
-            if k not in date_fields + fk_fields:
-                v = form_data[k]
-                if v is not None and not isinstance(v, str):
-                    form_data[k] = str(v)
-        
-        # Debug: print types of all fields before form creation
-        print(f"[IMPORT DEBUG] Row {idx} form_data types: " + ", ".join(f"{k}: {type(v).__name__}" for k,v in form_data.items()))
-        
-        # Remove reg_number if present
-        form_data.pop('reg_number', None)
-        
-        # Use CandidateForm for validation, but patch required fields for import
-        form = CandidateForm(form_data)
-        for f in ['district']:
-            if f in form.fields:
-                form.fields[f].required = False
-        
-        if not form.is_valid():
-            error_list = '; '.join([f"{k}: {v[0]}" for k, v in form.errors.items()])
-            errors.append(f"Row {idx}: {error_list}")
-            continue
-        
-        # Convert date fields in form.cleaned_data from DD/MM/YYYY string to date objects
-        for date_field in date_fields:
-            val = form.cleaned_data.get(date_field)
-            if val and isinstance(val, str):
-                for fmt in ('%d/%m/%Y', '%-d/%-m/%Y', '%Y-%m-%d'):
-                    try:
-                        form.cleaned_data[date_field] = dt.datetime.strptime(val, fmt).date()
-                        break
-                    except ValueError:
-                        continue
-        
-        # Create candidate (handle many-to-many fields separately)
-        cleaned_data = form.cleaned_data.copy()
-        
-        # Extract many-to-many fields that need to be set after creation
-        m2m_fields = {}
-        if 'nature_of_disability' in cleaned_data:
-            m2m_fields['nature_of_disability'] = cleaned_data.pop('nature_of_disability')
-        
-        # Create candidate with non-m2m fields
-        candidate = Candidate(**cleaned_data)
-        
-        # Attach photo if available
-        if img_name and tmp_dir:
-            img_path = os.path.join(tmp_dir, img_name)
-            if os.path.exists(img_path):
-                from PIL import Image, ExifTags
-                import io
-                with Image.open(img_path) as img:
-                    # Handle EXIF orientation to prevent rotation issues
-                    try:
-                        for orientation in ExifTags.TAGS.keys():
-                            if ExifTags.TAGS[orientation] == 'Orientation':
-                                break
-                        exif = img._getexif()
-                        if exif is not None:
-                            orientation_value = exif.get(orientation)
-                            if orientation_value == 3:
-                                img = img.rotate(180, expand=True)
-                            elif orientation_value == 6:
-                                img = img.rotate(270, expand=True)
-                            elif orientation_value == 8:
-                                img = img.rotate(90, expand=True)
-                    except (AttributeError, KeyError, TypeError):
-                        # No EXIF data or orientation info, continue without rotation
-                        pass
-                    
-                    if img.mode != 'RGB':
-                        img = img.convert('RGB')
-                    buffer = io.BytesIO()
-                    img.save(buffer, format='JPEG', quality=85)
-                    buffer.seek(0)
-                    # Use only the base filename, not the full path from ZIP
-                    base_filename = os.path.basename(img_name)
-                    clean_filename = os.path.splitext(base_filename)[0] + '.jpg'
-                    candidate.passport_photo.save(
-                        clean_filename,
-                        File(buffer),
-                        save=False
-                    )
-                    print(f"[PHOTO SAVE DEBUG] Saved photo as: {clean_filename}")
-            else:
-                errors.append(f"Row {idx}: Image file '{img_name}' not found after extraction - candidate created without photo.")
+
+        # Try multiple name matching strategies
+        img_name = match_photo(image_name_map, candidate_name_full)
         
-        candidate.save()
+        # For debugging, show what we tried
+        candidate_name_for_match = candidate_name_full if img_name else "(no match found)"
         
-        # Set many-to-many fields after candidate is saved
-        for field_name, field_value in m2m_fields.items():
-            if field_value:
-                getattr(candidate, field_name).set(field_value)
+        # Debug photo matching
+        print(f"[PHOTO MATCH DEBUG] Row {idx}: Candidate '{candidate_name_full}' -> Looking for '{candidate_name_for_match}' -> Found: {img_name}")
+        if photo_zip and not img_name:
+            print(f"[PHOTO MATCH DEBUG] Available photos: {list(image_name_map.keys())}")
+
+        # If photos were provided but this candidate has no match, log it
+        if not img_name and photo_zip:
+            errors.append(f"Row {idx}: No photo found for '{candidate_name_full}' (searched for '{candidate_name_for_match}')")
         
+        # Validate only; every valid row is created together below
+        cleaned = clean_candidate_row(idx, data, lookups, errors)
+        if cleaned is None:
+            print(f"[DEBUG] Row {idx} SKIPPED")
+            continue
+        cleaned_data, m2m_fields = cleaned
+        valid_rows.append((idx, cleaned_data, m2m_fields))
+        row_photos.append(img_name)
+
+    if mode == 'dry_run':
+        if photos:
+            photos.close()
+        return render(request, 'candidates/import_dual.html', {
+            'errors': errors,
+            'dry_run': True,
+            'valid_count': len(valid_rows),
+            'row_count': len(rows),
+        })
+
+    # Reg numbers are reserved per group and the candidates inserted in batches
+    created_candidates = create_candidates(valid_rows, errors) if valid_rows else []
+    for candidate, img_name in zip(created_candidates, row_photos):
+        if candidate is None:
+            continue
+        # Photo is attached in batch once all rows are in
+        if img_name and photos:
+            pending_photos.append((candidate, img_name))
         created += 1
-        print(f"[DEBUG] Row {idx} IMPORTED: Candidate '{candidate.full_name}' saved.")
+    print(f"[DEBUG] {created} candidates imported")
     
-    # Cleanup temporary directory if photos were processed
-    if tmp_dir:
-        import shutil
-        shutil.rmtree(tmp_dir, ignore_errors=True)
+    if photos:
+        try:
+            failures = photos.attach(pending_photos)
+        finally:
+            photos.close()
+        for candidate, img_name, error in failures:
+            errors.append(f"Photo '{img_name}' for '{candidate.full_name}' could not be processed ({error}) - candidate created without photo.")
     
     success_message = None
     if created > 0:
@@ -2939,15 +2372,7 @@ def candidate_import_template(request):
     ws.append([
         'Sample: Use DD/MM/YYYY for all dates. Use occupation code and center code as in system. RegNo will be generated.'
     ] + [''] * (len(headers)-1))
-    # Save to temporary file
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp:
-        wb.save(tmp.name)
-        tmp.seek(0)
-        data = tmp.read()
-    response = HttpResponse(data, content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="candidate_import_template.xlsx"'
-    os.unlink(tmp.name)
-    return response
+    return workbook_response(wb, 'candidate_import_template.xlsx')
 
 @login_required
 def candidate_import(request):
@@ -3140,6 +2565,30 @@ def bulk_candidate_modules(request):
     print(f"[DEBUG] Returning module_list: {module_list}, suggested_count: {suggested_count}")
     return JsonResponse({'success': True, 'modules': module_list, 'level_id': level.id, 'suggested_count': suggested_count})
 
+def _update_candidates(candidates, **values):
+    """
+    candidates.update(**values) plus what Candidate.save() and its post_save receivers
+    (signals.py) would have done for those fields; returns the number updated.
+
+    Repeated here: updated_at, the list count version, the enrollment flags when a billing
+    input changes and the statistics snapshot when a dashboard field changes. Not needed:
+    registration_category_code (callers write it with the category), reg numbers (callers
+    run regenerate_reg_numbers afterwards), the search index (kept by database triggers)
+    and photo renditions (no photo changes).
+    """
+    from django.utils import timezone
+    from .utilis.enrollment_flags import BILLING_INPUT_FIELDS
+    from .utilis.statistics_snapshot import SNAPSHOT_FIELDS
+
+    updated = candidates.update(updated_at=timezone.now(), **values)
+    bump_count_version(Candidate)
+    if set(values) & set(BILLING_INPUT_FIELDS):
+        refresh_enrollment_flags(candidates)
+    if set(values) & set(SNAPSHOT_FIELDS):
+        invalidate_statistics_snapshot()
+    return updated
+
+
 @login_required
 @require_POST
 def bulk_candidate_action(request):
@@ -3163,9 +2612,7 @@ def bulk_candidate_action(request):
             filters = data.get('filters', {}) or {}
             from django.db.models import Prefetch, Q, Exists, OuterRef
             from .models import Result
-            qs = Candidate.objects.filter(
-                Q(candidatelevel__isnull=False) | Q(candidatemodule__isnull=False)
-            ).distinct()
+            qs = Candidate.objects.filter(has_enrollment=True)
             reg_number = (filters.get('reg_number') or '').strip()
             name = (filters.get('name') or '').strip()
             center = (filters.get('center') or '').strip()
@@ -3174,9 +2621,9 @@ def bulk_candidate_action(request):
             registration_category = (filters.get('registration_category') or '').strip()
             has_marks_filter = (filters.get('has_marks') or '').strip().lower()
             if reg_number:
-                qs = qs.filter(reg_number__icontains=reg_number)
+                qs = qs.filter(reg_number_filter(reg_number))
             if name:
-                qs = qs.filter(full_name__icontains=name)
+                qs = qs.filter(search_filter(name, fields=['full_name']))
             if center:
                 qs = qs.filter(assessment_center__center_name__icontains=center)
             if occupation:
@@ -3184,9 +2631,9 @@ def bulk_candidate_action(request):
             if assessment_series:
                 qs = qs.filter(assessment_series_id=assessment_series)
             if registration_category:
-                qs = qs.filter(registration_category__iexact=registration_category)
-                if registration_category.strip().lower() == 'modular':
-                    qs = qs.filter(candidatemodule__isnull=False)
+                qs = qs.filter(registration_category_code=registration_category_code(registration_category))
+                if registration_category_code(registration_category) == 'modular':
+                    qs = qs.filter(enrolled_module_count__gt=0)
             results_subquery = Result.objects.filter(candidate=OuterRef('pk'))
             if assessment_series:
                 results_subquery = results_subquery.filter(assessment_series_id=assessment_series)
@@ -3531,107 +2978,33 @@ def bulk_candidate_action(request):
         else:
             return JsonResponse({'success': False, 'error': 'Bulk enroll only supported for Formal, Modular, or Worker\'s PAS/Informal registration categories.'}, status=400)
     if action == 'add_regno_photo':
-        results = []
-        from PIL import Image as PILImage, ImageDraw, ImageFont
-        import glob
-        from django.core.files import File
-        for c in candidates:
-            try:
-                if not c.passport_photo or not c.reg_number:
-                    results.append({'id': c.id, 'success': False, 'error': 'Missing photo or regno.'})
-                    continue
-                image_path = c.passport_photo.path
-                img = PILImage.open(image_path).convert("RGBA")
-                draw = ImageDraw.Draw(img)
-                # Remove old regno-stamped images
-                base_dir = os.path.dirname(image_path)
-                base_name = os.path.splitext(os.path.basename(image_path))[0]
-                regno_img_pattern = os.path.join(base_dir, f"{base_name}_regno*.png")
-                for old in glob.glob(regno_img_pattern):
-                    try:
-                        os.remove(old)
-                    except Exception:
-                        pass
-                text = c.reg_number
-                width, height = img.size
-                max_width = width - 32
-                # Try to use system TrueType font (DejaVuSans-Bold), fallback to PIL default
-                font = None
-                truetype_paths = [
-                    '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf',
-                    '/usr/share/fonts/dejavu/DejaVuSans-Bold.ttf',
-                    '/usr/local/share/fonts/DejaVuSans-Bold.ttf',
-                    '/usr/share/fonts/truetype/freefont/FreeSansBold.ttf',
-                ]
-                font_size = 40
-                min_font_size = 10
-                for path in truetype_paths:
-                    if os.path.exists(path):
-                        try:
-                            font = ImageFont.truetype(path, size=font_size)
-                            break
-                        except Exception:
-                            font = None
-                if font is None:
-                    font = ImageFont.load_default()
-                    font_size = 12
-                    min_font_size = 8
-                # Dynamically shrink font size if needed
-                while font_size >= min_font_size:
-                    try:
-                        text_w, text_h = font.getsize(text)
-                    except AttributeError:
-                        bbox = font.getbbox(text)
-                        text_w, text_h = bbox[2] - bbox[0], bbox[3] - bbox[1]
-                    if text_w <= max_width:
-                        break
-                    font_size -= 2
-                    if hasattr(font, 'path'):
-                        try:
-                            font = ImageFont.truetype(font.path, size=font_size)
-                        except Exception:
-                            font = ImageFont.load_default()
-                            break
-                # If still too wide, truncate
-                if text_w > max_width:
-                    ellipsis = '...'
-                    for i in range(len(text)-1, 0, -1):
-                        truncated = text[:i] + ellipsis
-                        try:
-                            text_w, text_h = font.getsize(truncated)
-                        except AttributeError:
-                            bbox = font.getbbox(truncated)
-                            text_w, text_h = bbox[2] - bbox[0], bbox[3] - bbox[1]
-                        if text_w <= max_width:
-                            text = truncated
-                            break
-                padding_v = max(10, text_h // 4)
-                strip_h = text_h + 2 * padding_v
-                strip_y = height - strip_h
-                overlay = PILImage.new('RGBA', (width, strip_h), (255, 255, 255, 255))  # Solid white
-                img = img.convert('RGBA')
-                img.alpha_composite(overlay, (0, strip_y))
-                draw = ImageDraw.Draw(img)
-                x = (width - text_w) // 2
-                y = strip_y + (strip_h - text_h) // 2
-                draw.text((x, y), text, font=font, fill=(0,0,0,255))
-                new_filename = os.path.join(base_dir, f"{base_name}_regno.png")
-                img.save(new_filename)
-                with open(new_filename, 'rb') as f:
-                    c.passport_photo_with_regno.save(os.path.basename(new_filename), File(f), save=True)
-                results.append({'id': c.id, 'success': True})
-            except Exception as e:
-                results.append({'id': c.id, 'success': False, 'error': str(e)})
-        return JsonResponse({'success': True, 'results': results})
+        # Stamping runs as a background job; the page polls job_status for per-candidate results
+        from .utilis.background_jobs import start_job, job_payload
+        from .utilis.regno_stamp import stamp_candidate_photos
+        candidate_ids = list(candidates.values_list('id', flat=True))
+        job = start_job(
+            'regno_photo_stamp', stamp_candidate_photos, candidate_ids,
+            user=request.user, total=len(candidate_ids),
+        )
+        return JsonResponse({
+            'success': True,
+            'job_id': job.pk,
+            'status_url': reverse('job_status', args=[job.pk]),
+            'job': job_payload(job),
+        })
 
 
     elif action == 'regenerate':
-        updated = 0
-        for c in candidates:
-            c.reg_number = None
-            c.save()
-            updated += 1
-        return JsonResponse({'success': True, 'message': f'Regenerated registration numbers for {updated} candidates.'})
+        # One batch: serials reserved per group, numbers written with bulk_update. Every
+        # selected candidate gets a fresh serial, as when each number was cleared and rebuilt
+        from .utilis.regno_sequence import regenerate_reg_numbers
+        report = regenerate_reg_numbers(candidates, keep_current=False)
+        updated = len(report['changes'])
+        return JsonResponse({
+            'success': True,
+            'message': f'Regenerated registration numbers for {updated} candidates.',
+            'changes': report['changes'],
+        })
     elif action == 'change_reg_cat':
         # Bulk change registration category with validation
         new_cat = data.get('registration_category')
@@ -3654,12 +3027,12 @@ def bulk_candidate_action(request):
             else:
                 return JsonResponse({'success': False, 'error': 'Invalid registration category selected.'}, status=400)
         # If all valid, update
-        updated = 0
-        for candidate in candidates:
-            candidate.registration_category = new_cat
-            candidate.reg_number = None
-            candidate.save(update_fields=["registration_category", "reg_number"])
-            updated += 1
+        from django.db import transaction
+        from .utilis.regno_sequence import regenerate_reg_numbers
+        with transaction.atomic():
+            updated = _update_candidates(
+                candidates, registration_category=new_cat, registration_category_code=registration_category_code(new_cat))
+            regenerate_reg_numbers(candidates, keep_current=False)
         return JsonResponse({'success': True, 'message': f'Changed registration category for {updated} candidates.'})
     elif action == 'mark_disabled':
         # Bulk mark as disabled
@@ -3709,12 +3082,11 @@ def bulk_candidate_action(request):
             }, status=400)
         
         # Update occupation and regenerate registration numbers
-        updated = 0
-        for candidate in candidates:
-            candidate.occupation = new_occupation
-            candidate.build_reg_number()  # Regenerate registration number
-            candidate.save(update_fields=['occupation', 'reg_number'])
-            updated += 1
+        from django.db import transaction
+        from .utilis.regno_sequence import regenerate_reg_numbers
+        with transaction.atomic():
+            updated = _update_candidates(candidates, occupation=new_occupation)
+            regenerate_reg_numbers(candidates, keep_current=False)
         
         return JsonResponse({
             'success': True, 
@@ -3752,14 +3124,11 @@ def bulk_candidate_action(request):
         # Update center and regenerate reg numbers. Keep fees_balance intact so the
         # candidate's outstanding bill moves with them (reports group by center).
         from django.db import transaction
-        updated = 0
+        from .utilis.regno_sequence import regenerate_reg_numbers
         with transaction.atomic():
-            for candidate in candidates:
-                candidate.assessment_center = new_center
-                candidate.assessment_center_branch = new_branch
-                candidate.build_reg_number()  # Rebuild reg_number since center code changes
-                candidate.save(update_fields=['assessment_center', 'assessment_center_branch', 'reg_number'])
-                updated += 1
+            updated = _update_candidates(candidates, assessment_center=new_center, assessment_center_branch=new_branch)
+            # Rebuild reg numbers since the center code changes
+            regenerate_reg_numbers(candidates, keep_current=False)
         
         # Prepare response message
         center_display = new_center.center_name
@@ -3797,6 +3166,7 @@ def bulk_candidate_action(request):
                 updated += 1
             # Align results in bulk
             Result.objects.filter(candidate__in=candidates).update(assessment_series=series)
+            bump_count_version(Result)
 
             # Best-effort logging
             try:
@@ -4036,6 +3406,16 @@ def bulk_candidate_action(request):
     else:
         return JsonResponse({'success': False, 'error': 'Unknown action.'}, status=400)
 
+@login_required
+def job_status(request, job_id):
+    """Progress of a background job started by the current user (polled by the UI)"""
+    from .models import BackgroundJob
+    from .utilis.background_jobs import job_payload
+    job = get_object_or_404(BackgroundJob, pk=job_id)
+    if job.created_by_id != request.user.id and not request.user.is_superuser:
+        return JsonResponse({'success': False, 'error': 'Not allowed.'}, status=403)
+    return JsonResponse({'success': True, 'job': job_payload(job)})
+
 @login_required
 def export_candidates(request):
     """Export selected candidates or all filtered candidates to Excel with comprehensive data"""
@@ -4068,13 +3448,13 @@ def export_candidates(request):
         
         # Apply all current filters
         if current_filters.get('reg_number'):
-            candidates = candidates.filter(reg_number__icontains=current_filters.get('reg_number'))
+            candidates = candidates.filter(reg_number_filter(current_filters.get('reg_number')))
         if current_filters.get('search'):
-            candidates = candidates.filter(full_name__icontains=current_filters.get('search'))
+            candidates = candidates.filter(search_filter(current_filters.get('search'), fields=['full_name']))
         if current_filters.get('occupation'):
             candidates = candidates.filter(occupation_id=current_filters.get('occupation'))
         if current_filters.get('registration_category'):
-            candidates = candidates.filter(registration_category=current_filters.get('registration_category'))
+            candidates = candidates.filter(registration_category_code=registration_category_code(current_filters.get('registration_category')))
         if current_filters.get('assessment_center'):
             candidates = candidates.filter(assessment_center_id=current_filters.get('assessment_center'))
         if current_filters.get('sector'):
@@ -4102,7 +3482,7 @@ def export_candidates(request):
         
         # Add additional prefetch for export
         candidates = candidates.select_related(
-            'assessment_center', 'occupation', 'occupation__sector', 'district', 'village', 'created_by', 'updated_by'
+            'assessment_center', 'assessment_series', 'occupation', 'occupation__sector', 'district', 'village', 'created_by', 'updated_by'
         ).prefetch_related(
             'nature_of_disability', 'candidatelevel_set__level', 'candidatemodule_set__module',
             'candidatepaper_set__paper', 'result_set'
@@ -4112,17 +3492,12 @@ def export_candidates(request):
         candidates = Candidate.objects.filter(
             id__in=candidate_ids
         ).select_related(
-            'assessment_center', 'occupation', 'occupation__sector', 'district', 'village', 'created_by', 'updated_by'
+            'assessment_center', 'assessment_series', 'occupation', 'occupation__sector', 'district', 'village', 'created_by', 'updated_by'
         ).prefetch_related(
             'nature_of_disability', 'candidatelevel_set__level', 'candidatemodule_set__module',
             'candidatepaper_set__paper', 'result_set'
         ).order_by('reg_number')
     
-    # Create workbook and worksheet
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Candidates Export"
-    
     # Define styles
     header_font = Font(bold=True, color="FFFFFF")
     header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
@@ -4164,16 +3539,42 @@ def export_candidates(request):
         "Status", "Created Date", "Created By", "Updated Date", "Updated By"
     ]
     
-    # Write headers
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
-        cell.border = border
+    # Column widths are fixed up front so rows can be streamed straight to the sheet
+    widths = [
+        # Bio Data
+        24, 30, 14, 10, 14, 16,
+        # Address Information
+        18, 18,
+        # Assessment Information
+        40, 35, 25, 23, 12, 10, 16, 22, 14, 14,
+        # Disability Information
+        15, 25, 30,
+        # Enrollment Information
+        20, 40, 40,
+        # Financial Information
+        14,
+        # Results Summary
+        13, 14, 20,
+        # System Information
+        10, 18, 16, 18, 16,
+    ]
+    
+    # Format specific columns (positions kept from the original layout)
+    column_styles = {col: {'alignment': Alignment(horizontal="center")} for col in [3, 10, 12, 13, 18, 20, 22]}
+    column_styles[17] = {'alignment': Alignment(horizontal="right")}
+    
+    wb = streaming_workbook()
+    sheet = SheetWriter(
+        wb, "Candidates Export", headers,
+        widths=widths,
+        header_style={'font': header_font, 'fill': header_fill, 'alignment': header_alignment, 'border': border},
+        cell_style={'border': border},
+        column_styles=column_styles,
+        freeze_header=True,
+    )
     
     # Write data for each candidate
-    for row, candidate in enumerate(candidates, 2):
+    for candidate in candidates.iterator(chunk_size=EXPORT_CHUNK_SIZE):
         # Get enrollment information
         enrolled_levels = list(candidate.candidatelevel_set.all())
         enrolled_modules = list(candidate.candidatemodule_set.all())
@@ -4239,50 +3640,13 @@ def export_candidates(request):
             candidate.updated_by.username if candidate.updated_by else ""
         ]
         
-        # Write data to worksheet
-        for col, value in enumerate(data, 1):
-            cell = ws.cell(row=row, column=col, value=value)
-            cell.border = border
-            
-            # Format specific columns
-            if col in [3, 10, 12, 13, 18, 20, 22]:  # Date columns (DOB, Assessment Date, Start Date, Finish Date, Latest Result Date, Created Date, Updated Date)
-                cell.alignment = Alignment(horizontal="center")
-            elif col in [17]:  # Numeric columns (Fees Balance)
-                cell.alignment = Alignment(horizontal="right")
-    
-    # Auto-adjust column widths
-    for column in ws.columns:
-        max_length = 0
-        column_letter = get_column_letter(column[0].column)
-        
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        
-        # Set minimum and maximum widths
-        adjusted_width = min(max(max_length + 2, 10), 50)
-        ws.column_dimensions[column_letter].width = adjusted_width
-    
-    # Freeze the header row
-    ws.freeze_panes = "A2"
-    
-    # Create response
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
+        sheet.append(data)
     
     # Generate filename with timestamp
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     filename = f"EMIS_Candidates_Export_{timestamp}.xlsx"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
     
-    # Save workbook to response
-    wb.save(response)
-    
-    return response
+    return workbook_response(wb, filename)
 
 from django.urls import reverse
 from .models import AssessmentCenter, AssessmentCenterBranch, Candidate, Occupation, AssessmentCenterCategory, Level, Module, Paper, CandidateLevel, CandidateModule, Village, District
@@ -4509,11 +3873,6 @@ def export_centers(request):
         # Get selected centers with related data
         centers = centers_qs
         
-        # Create workbook and worksheet
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Assessment Centers"
-        
         # Define headers
         headers = [
             'Center Number',
@@ -4526,21 +3885,23 @@ def export_centers(request):
             'Has Branches'
         ]
         
-        # Add headers with styling
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = Font(bold=True, color='FFFFFF')
-            cell.fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
-            cell.alignment = Alignment(horizontal='center', vertical='center')
+        # Create write-only workbook; rows are streamed as the centers are read
+        wb = streaming_workbook()
+        sheet = SheetWriter(
+            wb, "Assessment Centers", headers,
+            widths=[15, 50, 20, 15, 20, 18, 22, 14],
+            header_style=BLUE_HEADER,
+            cell_style={'alignment': Alignment(horizontal='left', vertical='center')},
+        )
         
         # Add data rows
-        for row, center in enumerate(centers, 2):
+        for center in centers.iterator(chunk_size=EXPORT_CHUNK_SIZE):
             # Get region from district (assuming district has region relationship)
             region_name = getattr(center.district, 'region', 'N/A') if center.district else 'N/A'
             if hasattr(center.district, 'region') and center.district.region:
                 region_name = center.district.region.name if hasattr(center.district.region, 'name') else str(center.district.region)
             
-            data = [
+            sheet.append([
                 center.center_number,
                 center.center_name,
                 center.district.name if center.district else 'N/A',
@@ -4549,40 +3910,15 @@ def export_centers(request):
                 center.contact or 'N/A',
                 center.category.name if center.category else 'N/A',
                 'Yes' if center.has_branches else 'No'
-            ]
-            
-            for col, value in enumerate(data, 1):
-                cell = ws.cell(row=row, column=col, value=value)
-                cell.alignment = Alignment(horizontal='left', vertical='center')
-        
-        # Auto-adjust column widths
-        for col in range(1, len(headers) + 1):
-            column_letter = get_column_letter(col)
-            max_length = 0
-            for row in ws[column_letter]:
-                try:
-                    if len(str(row.value)) > max_length:
-                        max_length = len(str(row.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        # Create response
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+            ])
         
         # Generate filename with timestamp
         from datetime import datetime
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         filename = f'assessment_centers_{timestamp}.xlsx'
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response = workbook_response(wb, filename)
         
-        # Save workbook to response
-        wb.save(response)
-        
-        messages.success(request, f'Successfully exported {centers.count()} assessment centers to Excel.')
+        messages.success(request, f'Successfully exported {sheet.rows_written} assessment centers to Excel.')
         return response
         
     except Exception as e:
@@ -4847,49 +4183,27 @@ def occupations_export(request):
             return redirect('occupation_list')
         occ_qs = occ_qs.filter(id__in=ids)
 
-    # Build workbook
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'Occupations'
-
-    headers = ['Occupation Code', 'Occupation Name', 'Category', 'Sector']
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col, value=header)
-        cell.font = Font(bold=True, color='FFFFFF')
-        cell.fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
-        cell.alignment = Alignment(horizontal='center', vertical='center')
+    # Build write-only workbook
+    wb = streaming_workbook()
+    sheet = SheetWriter(
+        wb, 'Occupations', ['Occupation Code', 'Occupation Name', 'Category', 'Sector'],
+        widths=[18, 60, 25, 35],
+        header_style=BLUE_HEADER,
+        cell_style={'alignment': Alignment(horizontal='left', vertical='center')},
+    )
 
-    row_idx = 2
-    for occ in occ_qs:
-        data = [
+    for occ in occ_qs.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        sheet.append([
             occ.code or '',
             occ.name or '',
             occ.category.name if getattr(occ, 'category', None) else '',
             occ.sector.name if getattr(occ, 'sector', None) else '',
-        ]
-        for col, value in enumerate(data, 1):
-            c = ws.cell(row=row_idx, column=col, value=value)
-            c.alignment = Alignment(horizontal='left', vertical='center')
-        row_idx += 1
-
-    # Auto width
-    for col in range(1, len(headers) + 1):
-        letter = get_column_letter(col)
-        max_len = 0
-        for r in ws[letter]:
-            try:
-                max_len = max(max_len, len(str(r.value)))
-            except Exception:
-                pass
-        ws.column_dimensions[letter].width = min(max_len + 2, 60)
+        ])
 
     # Response
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
     from datetime import datetime
     ts = datetime.now().strftime('%Y%m%d_%H%M%S')
-    response['Content-Disposition'] = f'attachment; filename="occupations_{ts}.xlsx"'
-    wb.save(response)
-    return response
+    return workbook_response(wb, f"occupations_{ts}.xlsx")
 
 @login_required
 def occupations_bulk_change_sector(request):
@@ -5180,7 +4494,7 @@ def update_occupation_fees(request, pk):
         # Update candidate fees balances for all candidates in this occupation
         from .models import Candidate
         candidates_updated = 0
-        for candidate in Candidate.objects.filter(occupation=occupation, candidatelevel__isnull=False).distinct():
+        for candidate in Candidate.objects.filter(occupation=occupation, enrolled_level_count__gt=0):
             candidate.update_fees_balance()
             candidates_updated += 1
         
@@ -5673,12 +4987,10 @@ def _create_photo_cell_content(candidate, styles, photo_width=0.8*inch, photo_he
         leading=6
     )
 
-    # Prefer regno-stamped photo if available
+    # Album-size rendition of the regno-stamped photo if available, else the original
     photo_path = None
-    if hasattr(candidate, 'passport_photo_with_regno') and candidate.passport_photo_with_regno and hasattr(candidate.passport_photo_with_regno, 'path') and os.path.exists(candidate.passport_photo_with_regno.path):
-        photo_path = candidate.passport_photo_with_regno.path
-    elif hasattr(candidate, 'passport_photo') and candidate.passport_photo and hasattr(candidate.passport_photo, 'path') and os.path.exists(candidate.passport_photo.path):
-        photo_path = candidate.passport_photo.path
+    if candidate.photo_album_path and os.path.exists(candidate.photo_album_path):
+        photo_path = candidate.photo_album_path
     if photo_path:
         try:
             img = PILImage.open(photo_path)
@@ -5791,7 +5103,7 @@ def generate_album(request):
             ).prefetch_related('nature_of_disability').filter(
                 assessment_center=center,
                 occupation=occupation,
-                registration_category__iexact=reg_category_form, # Use form value for filtering
+                registration_category_code=registration_category_code(reg_category_form), # Use form value for filtering
                 assessment_series=series,
             )
             if normalized_branch == 'main':
@@ -5808,7 +5120,7 @@ def generate_album(request):
                 ).prefetch_related('nature_of_disability').filter(
                     assessment_center=center,
                     occupation=occupation,
-                    registration_category__iexact=reg_category_form,
+                    registration_category_code=registration_category_code(reg_category_form),
                     assessment_date__gte=series.start_date,
                     assessment_date__lte=series.end_date,
                 )
@@ -5877,7 +5189,7 @@ def generate_album(request):
 
             # PDF Generation with branch support
             logger.info("Starting PDF generation...")
-            buffer = BytesIO()
+            buffer = spooled_buffer()
             doc = SimpleDocTemplate(buffer, pagesize=landscape(letter),
                                     title="UVTAB",
                                     rightMargin=0.4*inch, leftMargin=0.4*inch,
@@ -6077,7 +5389,7 @@ def generate_album(request):
             logger.info("Starting first pass for page count.")
             # Use a deep copy of elements for the first pass to avoid consuming them
             first_pass_elements = copy.deepcopy(elements)
-            count_buffer = BytesIO() # Temporary buffer for counting
+            count_buffer = spooled_buffer() # Temporary buffer for counting
             # Ensure all SimpleDocTemplate parameters match the final document for accurate page count
             count_doc = SimpleDocTemplate(count_buffer, pagesize=landscape(letter),
                                           rightMargin=0.4*inch, leftMargin=0.4*inch,
@@ -6095,6 +5407,8 @@ def generate_album(request):
                 logger.error(f"Error during page count pass: {e}", exc_info=True)
                 # Fallback to simple page numbering if counting fails
                 total_pages = 0 # Indicates an issue, or use a flag
+            finally:
+                count_buffer.close()
 
             # --- End of first pass ---
 
@@ -6117,12 +5431,9 @@ def generate_album(request):
             doc.build(elements, 
                       onFirstPage=lambda c, d: _add_page_numbers(c, d, total_pages), 
                       onLaterPages=lambda c, d: _add_page_numbers(c, d, total_pages))
-            buffer.seek(0)
-            response = HttpResponse(buffer, content_type='application/pdf')
             safe_series = getattr(series, 'name', f"{assessment_year}_{assessment_month}").replace(' ', '_')
-            response['Content-Disposition'] = f'attachment; filename="candidate_album_{center.center_number}_{occupation.code}_{safe_series}.pdf"'
             logger.info("PDF generated successfully. Returning response.")
-            return response
+            return pdf_response(buffer, f"candidate_album_{center.center_number}_{occupation.code}_{safe_series}.pdf")
         except Exception as e:
             logger.critical(f"Unhandled exception in generate_album view: {e}", exc_info=True)
             import traceback
@@ -6300,13 +5611,13 @@ def candidate_list(request):
             pass
 
     if current_filters.get('reg_number'):
-        candidates = candidates.filter(reg_number__icontains=current_filters.get('reg_number'))
+        candidates = candidates.filter(reg_number_filter(current_filters.get('reg_number')))
     if current_filters.get('search'):
-        candidates = candidates.filter(full_name__icontains=current_filters.get('search'))
+        candidates = candidates.filter(search_filter(current_filters.get('search'), fields=['full_name']))
     if current_filters.get('occupation'):
         candidates = candidates.filter(occupation_id=current_filters.get('occupation'))
     if current_filters.get('registration_category'):
-        candidates = candidates.filter(registration_category=current_filters.get('registration_category'))
+        candidates = candidates.filter(registration_category_code=registration_category_code(current_filters.get('registration_category')))
     if current_filters.get('assessment_center'):
         candidates = candidates.filter(assessment_center_id=current_filters.get('assessment_center'))
     if current_filters.get('sector'):
@@ -6371,24 +5682,15 @@ def candidate_list(request):
     assessment_years = list(range(current_year - 2, current_year + 3))
     assessment_years.sort(reverse=True)
 
-    # Pagination: 100 per page
-    paginator = Paginator(candidates, 100)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Pagination: 100 per page, seeking on (created_at, id) instead of OFFSET
+    paginator = KeysetPaginator(candidates, 100, ordering=('-created_at',))
+    page_obj = paginator.get_page(request.GET.get('cursor'))
 
     import urllib
     filter_params = urllib.parse.urlencode(current_filters)
 
     from .models import NatureOfDisability, CandidateDraft
-    # Auto-cleanup: delete drafts older than 12 hours on access (no separate job needed)
-    try:
-        from django.utils import timezone
-        from datetime import timedelta
-        _threshold = timezone.now() - timedelta(hours=12)
-        CandidateDraft.objects.filter(updated_at__lt=_threshold).delete()
-    except Exception:
-        # Do not block the view if cleanup fails for any reason
-        pass
+    # Stale drafts are purged by `manage.py housekeeping` (utilis/housekeeping.py)
     # Fetch drafts for visibility (current user's drafts first; staff can see all)
     if request.user.is_staff or request.user.is_superuser:
         candidate_drafts = CandidateDraft.objects.select_related('assessment_center').all()
@@ -6488,7 +5790,7 @@ def generate_transcript(request, id):
     if candidate.occupation and level:
         occ_level = OccupationLevel.objects.filter(occupation=candidate.occupation, level=level).first()
     # PDF generation - both pages portrait orientation with landscape content layout
-    buffer = BytesIO()
+    buffer = spooled_buffer()
     doc = SimpleDocTemplate(buffer, pagesize=letter,
                             title="Transcript",
                             rightMargin=0.4*inch, leftMargin=0.4*inch,
@@ -6608,7 +5910,7 @@ def generate_transcript(request, id):
     photo = None
     if getattr(candidate, 'passport_photo', None) and candidate.passport_photo.name:
         try:
-            photo_path = candidate.passport_photo.path
+            photo_path = candidate.photo_print_path
             photo = RLImage(photo_path, width=1.0*inch, height=1.2*inch)
             photo.hAlign = 'LEFT'
         except Exception:
@@ -7064,10 +6366,7 @@ def generate_transcript(request, id):
                              ParagraphStyle('PassMark', parent=normal, fontSize=12, alignment=TA_CENTER, fontName='Helvetica-Bold')))
     
     doc.build(elements)
-    buffer.seek(0)
-    response = HttpResponse(buffer, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="transcript_{candidate.reg_number}.pdf"'
-    return response
+    return pdf_response(buffer, f"transcript_{candidate.reg_number}.pdf")
 
 
 def get_registration_category_display(registration_category):
@@ -7146,7 +6445,7 @@ def generate_verified_results(request, id):
     ).order_by('assessment_date', 'level', 'module', 'paper')
     
     # PDF generation with fixed footer
-    buffer = BytesIO()
+    buffer = spooled_buffer()
     
     # Create custom page template with fixed footer
     def create_footer_canvas(canvas, doc):
@@ -7320,7 +6619,7 @@ def generate_verified_results(request, id):
     photo = None
     if getattr(candidate, 'passport_photo', None) and candidate.passport_photo.name:
         try:
-            photo_path = candidate.passport_photo.path
+            photo_path = candidate.photo_print_path
             photo = RLImage(photo_path, width=1.0*inch, height=1.2*inch)
             photo.hAlign = 'LEFT'
         except Exception:
@@ -7666,10 +6965,7 @@ def generate_verified_results(request, id):
     
     # Build PDF
     doc.build(elements)
-    buffer.seek(0)
-    response = HttpResponse(buffer, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="verified_results_{candidate.reg_number}.pdf"'
-    return response
+    return pdf_response(buffer, f"verified_results_{candidate.reg_number}.pdf")
 
 
 def generate_testimonial(request, id):
@@ -7693,7 +6989,7 @@ def generate_testimonial(request, id):
     results = candidate.result_set.all().order_by('assessment_series__name', 'level__name', 'module__name')
     
     # Create PDF buffer
-    buffer = BytesIO()
+    buffer = spooled_buffer()
     doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=0.5*inch, bottomMargin=0.5*inch,
                           leftMargin=0.75*inch, rightMargin=0.75*inch)
     elements = []
@@ -7782,7 +7078,7 @@ def generate_testimonial(request, id):
     photo = None
     if getattr(candidate, 'passport_photo', None) and candidate.passport_photo.name:
         try:
-            photo_path = candidate.passport_photo.path
+            photo_path = candidate.photo_print_path
             photo = RLImage(photo_path, width=1.0*inch, height=1.2*inch)
             photo.hAlign = 'LEFT'
         except Exception:
@@ -8215,10 +7511,7 @@ def generate_testimonial(request, id):
     
     # Build PDF
     doc.build(elements)
-    buffer.seek(0)
-    response = HttpResponse(buffer, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="testimonial_{candidate.reg_number}.pdf"'
-    return response
+    return pdf_response(buffer, f"testimonial_{candidate.reg_number}.pdf")
 
 
 def candidate_create(request):
@@ -9470,9 +8763,7 @@ def enrollment_list(request):
     # Get all candidates with enrollment data (levels OR modules)
     from django.db.models import Prefetch, Q
     
-    enrolled_candidates = Candidate.objects.filter(
-        Q(candidatelevel__isnull=False) | Q(candidatemodule__isnull=False)
-    ).distinct().select_related(
+    enrolled_candidates = Candidate.objects.filter(has_enrollment=True).select_related(
         'assessment_center',
         'assessment_center_branch',
         'occupation',
@@ -9493,9 +8784,9 @@ def enrollment_list(request):
     has_marks_filter = (request.GET.get('has_marks', '') or '').strip().lower()
     
     if reg_number:
-        enrolled_candidates = enrolled_candidates.filter(reg_number__icontains=reg_number)
+        enrolled_candidates = enrolled_candidates.filter(reg_number_filter(reg_number))
     if name:
-        enrolled_candidates = enrolled_candidates.filter(full_name__icontains=name)
+        enrolled_candidates = enrolled_candidates.filter(search_filter(name, fields=['full_name']))
     if center:
         enrolled_candidates = enrolled_candidates.filter(assessment_center__center_name__icontains=center)
     if occupation:
@@ -9503,10 +8794,10 @@ def enrollment_list(request):
     if assessment_series:
         enrolled_candidates = enrolled_candidates.filter(assessment_series_id=assessment_series)
     if registration_category:
-        enrolled_candidates = enrolled_candidates.filter(registration_category__iexact=registration_category)
+        enrolled_candidates = enrolled_candidates.filter(registration_category_code=registration_category_code(registration_category))
         # If Modular is selected, ensure they actually have module enrollments
-        if registration_category.strip().lower() == 'modular':
-            enrolled_candidates = enrolled_candidates.filter(candidatemodule__isnull=False)
+        if registration_category_code(registration_category) == 'modular':
+            enrolled_candidates = enrolled_candidates.filter(enrolled_module_count__gt=0)
 
     # Annotate whether the candidate has any marks/results
     # If an assessment_series filter is provided, restrict the check to that series
@@ -9521,11 +8812,9 @@ def enrollment_list(request):
     if has_marks_filter in ('yes', 'no'):
         enrolled_candidates = enrolled_candidates.filter(has_marks=(has_marks_filter == 'yes'))
     
-    # Pagination
-    from django.core.paginator import Paginator
-    paginator = Paginator(enrolled_candidates, 25)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Pagination: seek on reg_number (unique, indexed) rather than OFFSET
+    paginator = KeysetPaginator(enrolled_candidates, 25, ordering=('reg_number',))
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
     # Get assessment series for dropdown
     assessment_series_list = AssessmentSeries.objects.all().order_by('-start_date')
@@ -9878,6 +9167,7 @@ def change_assessment_series(request, id):
 
         # Align results (if any)
         Result.objects.filter(candidate=candidate).update(assessment_series=series)
+        bump_count_version(Result)
 
         # Log change (best-effort)
         try:
@@ -10685,14 +9975,15 @@ def profile(request):
 def fix_all_photos(request):
     """Fix orientation for existing candidate photos that were imported with rotation issues"""
     from django.contrib import messages
-    from PIL import Image, ExifTags
-    from django.core.files.base import ContentFile
-    import io
-    import os
-    
-    if request.method == 'GET':
-        return render(request, 'admin/fix_photos.html')
-    
+    from .models import BackgroundJob
+    from .utilis.background_jobs import start_job
+    from .utilis.photo_orientation import repair_photo_orientation
+
+    context = {}
+    job_id = request.GET.get('job')
+    if job_id:
+        context['job'] = BackgroundJob.objects.filter(pk=job_id, kind='photo_orientation').first()
+
     if request.method == 'POST':
         action = request.POST.get('action')
         dry_run = request.POST.get('dry_run') == '1'
@@ -10701,7 +9992,7 @@ def fix_all_photos(request):
             candidate_id = request.POST.get('candidate_id')
             if not candidate_id:
                 messages.error(request, 'Please provide a candidate ID.')
-                return render(request, 'admin/fix_photos.html')
+                return render(request, 'admin/fix_photos.html', context)
             
             try:
                 candidate = Candidate.objects.get(id=candidate_id)
@@ -10718,113 +10009,22 @@ def fix_all_photos(request):
                 messages.error(request, f'Error fixing photo for candidate {candidate_id}: {str(e)}')
         
         elif action == 'fix_all':
-            try:
-                candidates = Candidate.objects.exclude(passport_photo='')
-                total_candidates = candidates.count()
-                fixed_count = 0
-                error_count = 0
-                
-                for candidate in candidates:
-                    try:
-                        if fix_candidate_photo_orientation(candidate, dry_run):
-                            fixed_count += 1
-                    except Exception as e:
-                        error_count += 1
-                
-                if dry_run:
-                    messages.info(request, f'Dry run completed: Would fix {fixed_count} photos out of {total_candidates} candidates checked. Errors: {error_count}')
-                else:
-                    messages.success(request, f'Photo orientation fix completed: Fixed {fixed_count} photos out of {total_candidates} candidates checked. Errors: {error_count}')
-                    
-            except Exception as e:
-                messages.error(request, f'Error during batch photo fix: {str(e)}')
+            # Photos are checked in worker processes by a background job; the page polls its progress
+            force = request.POST.get('force') == '1'
+            job = start_job(
+                'photo_orientation', repair_photo_orientation,
+                user=request.user, dry_run=dry_run, force=force,
+            )
+            print(f"[DEBUG] Started photo orientation job {job.pk} (dry_run={dry_run}, force={force})")
+            return redirect(f"{reverse('fix_all_photos')}?job={job.pk}")
     
-    return render(request, 'admin/fix_photos.html')
+    return render(request, 'admin/fix_photos.html', context)
 
 
 def fix_candidate_photo_orientation(candidate, dry_run=False):
     """Fix orientation for a single candidate's photo"""
-    if not candidate.passport_photo:
-        return False
-        
-    try:
-        # Open the existing photo
-        photo_path = candidate.passport_photo.path
-        if not os.path.exists(photo_path):
-            return False
-            
-        with Image.open(photo_path) as img:
-            # Check if image has EXIF orientation data
-            orientation_applied = False
-            
-            try:
-                for orientation in ExifTags.TAGS.keys():
-                    if ExifTags.TAGS[orientation] == 'Orientation':
-                        break
-                
-                exif = img._getexif()
-                if exif is not None:
-                    orientation_value = exif.get(orientation)
-                    
-                    if orientation_value and orientation_value != 1:  # 1 means normal orientation
-                        if dry_run:
-                            return True
-                        
-                        # Apply rotation based on EXIF orientation
-                        # Handle all 8 EXIF orientation values
-                        if orientation_value == 2:
-                            img = img.transpose(Image.FLIP_LEFT_RIGHT)
-                            orientation_applied = True
-                        elif orientation_value == 3:
-                            img = img.rotate(180, expand=True)
-                            orientation_applied = True
-                        elif orientation_value == 4:
-                            img = img.transpose(Image.FLIP_TOP_BOTTOM)
-                            orientation_applied = True
-                        elif orientation_value == 5:
-                            img = img.rotate(90, expand=True).transpose(Image.FLIP_LEFT_RIGHT)
-                            orientation_applied = True
-                        elif orientation_value == 6:
-                            img = img.rotate(270, expand=True)
-                            orientation_applied = True
-                        elif orientation_value == 7:
-                            img = img.rotate(270, expand=True).transpose(Image.FLIP_LEFT_RIGHT)
-                            orientation_applied = True
-                        elif orientation_value == 8:
-                            img = img.rotate(90, expand=True)
-                            orientation_applied = True
-                        
-                        if orientation_applied:
-                            # Convert to RGB if needed
-                            if img.mode != 'RGB':
-                                img = img.convert('RGB')
-                            
-                            # Save the corrected image
-                            buffer = io.BytesIO()
-                            img.save(buffer, format='JPEG', quality=85)
-                            buffer.seek(0)
-                            
-                            # Get the original filename
-                            original_name = os.path.basename(candidate.passport_photo.name)
-                            
-                            # Save the corrected image back to the same field
-                            candidate.passport_photo.save(
-                                original_name,
-                                ContentFile(buffer.getvalue()),
-                                save=True
-                            )
-                            
-                            return True
-                            
-            except (AttributeError, KeyError, TypeError):
-                # No EXIF data
-                pass
-                
-    except Exception as e:
-        raise Exception(f'Error processing photo: {str(e)}')
-        
-    return False
-
+    from .utilis.photo_orientation import fix_candidate_photo
+    return fix_candidate_photo(candidate, dry_run)
 
 from PIL import Image as PILImage, ImageDraw, ImageFont
 from django.conf import settings
@@ -11054,7 +10254,7 @@ def download_result_list_pdf(request):
     # Build the candidate filter
     candidate_filter = {
         'occupation': occupation,
-        'registration_category__iexact': regcat,
+        'registration_category_code': registration_category_code(regcat),
     }
     if level:
         candidate_filter['candidatelevel__level'] = level
@@ -11210,8 +10410,8 @@ def download_result_list_pdf(request):
                             'reg_number': candidate.reg_number,
                             'full_name': candidate.full_name,
                             'gender': candidate.gender,
-                            'passport_photo_with_regno': candidate.passport_photo_with_regno.url if candidate.passport_photo_with_regno else None,
-                            'passport_photo': candidate.passport_photo.url if candidate.passport_photo else None,
+                            'passport_photo_with_regno': candidate.photo_thumbnail_url if candidate.passport_photo_with_regno else None,
+                            'passport_photo': candidate.photo_thumbnail_url if candidate.passport_photo else None,
                             'assessment_center': center_name,
                         }
                         
@@ -11290,7 +10490,7 @@ def download_result_list_pdf(request):
     import os
     
     # Create PDF buffer
-    buffer = BytesIO()
+    buffer = spooled_buffer()
     
     # Create PDF document in landscape orientation
     doc = SimpleDocTemplate(
@@ -11414,10 +10614,9 @@ def download_result_list_pdf(request):
                     actual_candidate = Candidate.objects.get(id=candidate['id'])
                     photo_path = None
                     
-                    if hasattr(actual_candidate, 'passport_photo_with_regno') and actual_candidate.passport_photo_with_regno and hasattr(actual_candidate.passport_photo_with_regno, 'path') and os.path.exists(actual_candidate.passport_photo_with_regno.path):
-                        photo_path = actual_candidate.passport_photo_with_regno.path
-                    elif hasattr(actual_candidate, 'passport_photo') and actual_candidate.passport_photo and hasattr(actual_candidate.passport_photo, 'path') and os.path.exists(actual_candidate.passport_photo.path):
-                        photo_path = actual_candidate.passport_photo.path
+                    # Album-size rendition of the regno-stamped photo if available, else the original
+                    if actual_candidate.photo_album_path and os.path.exists(actual_candidate.photo_album_path):
+                        photo_path = actual_candidate.photo_album_path
                     
                     if photo_path:
                         try:
@@ -11765,10 +10964,9 @@ def download_result_list_pdf(request):
                 photo_path = None
                 
                 # Use the same logic that works for formal PDFs - check .path instead of .url
-                if hasattr(candidate, 'passport_photo_with_regno') and candidate.passport_photo_with_regno and hasattr(candidate.passport_photo_with_regno, 'path') and os.path.exists(candidate.passport_photo_with_regno.path):
-                    photo_path = candidate.passport_photo_with_regno.path
-                elif hasattr(candidate, 'passport_photo') and candidate.passport_photo and hasattr(candidate.passport_photo, 'path') and os.path.exists(candidate.passport_photo.path):
-                    photo_path = candidate.passport_photo.path
+                # Album-size rendition of the regno-stamped photo if available, else the original
+                if candidate.photo_album_path and os.path.exists(candidate.photo_album_path):
+                    photo_path = candidate.photo_album_path
                 
                 if photo_path:
                     try:
@@ -11891,15 +11089,9 @@ def download_result_list_pdf(request):
     
     # Build PDF
     doc.build(elements)
-    pdf = buffer.getvalue()
-    buffer.close()
-    
-    # Return PDF response
-    response = HttpResponse(pdf, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
     
     logger.info(f"Generated custom PDF: {filename}")
-    return response
+    return pdf_response(buffer, filename)
 
 
 def _create_photo_cell_content(candidate, styles, photo_width=0.8*inch, photo_height=0.8*inch):
@@ -11930,224 +11122,27 @@ def _create_photo_cell_content(candidate, styles, photo_width=0.8*inch, photo_he
         leading=5
     )
     
-    # Handle photo with fallback logic
-    if hasattr(candidate, 'passport_photo_with_regno') and candidate.passport_photo_with_regno:
-        try:
-            photo_image = Image(candidate.passport_photo_with_regno.path, width=photo_width, height=photo_height)
-        except:
-            pass
-    elif hasattr(candidate, 'passport_photo') and candidate.passport_photo:
+    # Album-size rendition of the regno-stamped photo if available, else the original
+    if candidate.display_photo:
         try:
-            photo_image = Image(candidate.passport_photo.path, width=photo_width, height=photo_height)
+            photo_image = Image(candidate.photo_album_path, width=photo_width, height=photo_height)
         except:
             pass
     
-    if not photo_image:
-        photo_image = Paragraph('No Photo', ParagraphStyle('NoPhoto', fontSize=6, alignment=TA_CENTER))
-    
-    cell_elements.append(photo_image)
-    
-    occupation_code = candidate.occupation.code if candidate.occupation else 'N/A'
-    reg_category_short = candidate.registration_category.upper() if candidate.registration_category else 'N/A'
-    
-    return cell_elements
-@login_required
-def statistics_home(request):
-    """Enhanced statistics dashboard showing system overview and detailed metrics including assessment series"""
-    
-    # Get basic counts
-    total_candidates = Candidate.objects.count()
-    total_occupations = Occupation.objects.count()
-    total_centers = AssessmentCenter.objects.count()
-    total_results = Result.objects.count()
-    
-    # Gender breakdown
-    gender_data = Candidate.objects.values('gender').annotate(
-        count=Count('id')
-    ).order_by('-count')
-    
-    gender_breakdown = []
-    gender_colors = {'M': '#3B82F6', 'F': '#EC4899'}  # Blue for Male, Pink for Female
-    total_candidates_for_percentage = total_candidates if total_candidates > 0 else 1
-    
-    for gender in gender_data:
-        gender_code = gender['gender']
-        count = gender['count']
-        percentage = (count / total_candidates_for_percentage) * 100
-        
-        gender_breakdown.append({
-            'code': gender_code,
-            'name': 'Male' if gender_code == 'M' else 'Female' if gender_code == 'F' else 'Unknown',
-            'count': count,
-            'percentage': round(percentage, 1),
-            'color': gender_colors.get(gender_code, '#6B7280')
-        })
-    
-    # Registration categories breakdown
-    registration_categories = []
-    reg_cat_data = Candidate.objects.values('registration_category').annotate(
-        count=Count('id')
-    ).order_by('-count')
-    
-    # Define colors for different registration categories
-    reg_colors = {
-        'Formal': '#3B82F6',      # Blue
-        'Modular': '#10B981',     # Green
-        'Informal': '#F59E0B',    # Yellow
-        'Worker\'s PAS': '#EF4444', # Red
-    }
-    
-    for category in reg_cat_data:
-        reg_cat = category['registration_category']
-        count = category['count']
-        percentage = (count / total_candidates_for_percentage) * 100
-        
-        registration_categories.append({
-            'name': reg_cat or 'Unknown',
-            'count': count,
-            'percentage': round(percentage, 1),
-            'color': reg_colors.get(reg_cat, '#6B7280')  # Default gray
-        })
-    
-    # Special needs breakdown
-    total_with_special_needs = Candidate.objects.filter(disability=True).count()
-    total_without_special_needs = Candidate.objects.filter(disability=False).count()
-    
-    special_needs_breakdown = [
-        {
-            'name': 'With Special Needs',
-            'count': total_with_special_needs,
-            'percentage': round((total_with_special_needs / total_candidates_for_percentage) * 100, 1),
-            'color': '#EF4444'  # Red
-        },
-        {
-            'name': 'Without Special Needs',
-            'count': total_without_special_needs,
-            'percentage': round((total_without_special_needs / total_candidates_for_percentage) * 100, 1),
-            'color': '#10B981'  # Green
-        }
-    ]
-    
-    # Special needs by Gender breakdown
-    special_needs_by_gender = []
-    
-    # Male with special needs
-    male_with_special_needs = Candidate.objects.filter(gender='M', disability=True).count()
-    # Female with special needs
-    female_with_special_needs = Candidate.objects.filter(gender='F', disability=True).count()
-    # Male without special needs
-    male_without_special_needs = Candidate.objects.filter(gender='M', disability=False).count()
-    # Female without special needs
-    female_without_special_needs = Candidate.objects.filter(gender='F', disability=False).count()
-    
-    special_needs_by_gender = [
-        {
-            'category': 'Male with Special Needs',
-            'count': male_with_special_needs,
-            'percentage': round((male_with_special_needs / total_candidates_for_percentage) * 100, 1),
-            'color': '#DC2626'  # Dark red
-        },
-        {
-            'category': 'Female with Special Needs',
-            'count': female_with_special_needs,
-            'percentage': round((female_with_special_needs / total_candidates_for_percentage) * 100, 1),
-            'color': '#BE185D'  # Dark pink
-        }
-    ]
-    
-    # Registration Category by Gender
-    reg_cat_by_gender = []
-    for category in reg_cat_data:
-        reg_cat = category['registration_category']
-        if reg_cat:
-            male_count = Candidate.objects.filter(registration_category=reg_cat, gender='M').count()
-            female_count = Candidate.objects.filter(registration_category=reg_cat, gender='F').count()
-            
-            reg_cat_by_gender.append({
-                'category': reg_cat,
-                'male_count': male_count,
-                'female_count': female_count,
-                'total_count': male_count + female_count,
-                'male_percentage': round((male_count / total_candidates_for_percentage) * 100, 1),
-                'female_percentage': round((female_count / total_candidates_for_percentage) * 100, 1),
-                'color': reg_colors.get(reg_cat, '#6B7280')
-            })
-    
-    # Assessment Series breakdown (using actual assessment series relationships)
-    assessment_series = []
-
-    # Get assessment series with candidate counts using proper relationships
-    from django.db.models import Q
-    series_with_candidates = AssessmentSeries.objects.annotate(
-        total_candidates=Count('candidate'),
-        male_count=Count('candidate', filter=Q(candidate__gender='M')),
-        female_count=Count('candidate', filter=Q(candidate__gender='F')),
-        special_needs_count=Count('candidate', filter=Q(candidate__disability=True)),
-        occupation_count=Count('candidate__occupation', distinct=True)
-    ).filter(total_candidates__gt=0).order_by('-start_date')
-
-    for series in series_with_candidates:
-        assessment_series.append({
-            'year': series.start_date.year,
-            'month': series.start_date.month,
-            'period_name': series.name,
-            'total_candidates': series.total_candidates,
-            'male_count': series.male_count,
-            'female_count': series.female_count,
-            'special_needs_count': series.special_needs_count,
-            'occupation_count': series.occupation_count
-        })
-
-    # Group by year for better presentation across long-running series
-    from collections import defaultdict
-    assessment_series_by_year = defaultdict(list)
-    for row in assessment_series:
-        assessment_series_by_year[row['year']].append(row)
-
-    # Compute per-year totals (accurately) using Candidate-level aggregation
-    assessment_series_year_totals = {}
-    years_sorted_desc = sorted(assessment_series_by_year.keys(), reverse=True)
-    for y in years_sorted_desc:
-        year_candidates = Candidate.objects.filter(assessment_series__start_date__year=y)
-        total = year_candidates.count()
-        male = year_candidates.filter(gender='M').count()
-        female = year_candidates.filter(gender='F').count()
-        special = year_candidates.filter(disability=True).count()
-        occ_count = year_candidates.values('occupation').distinct().count()
-        assessment_series_year_totals[y] = {
-            'total_candidates': total,
-            'male_count': male,
-            'female_count': female,
-            'special_needs_count': special,
-            'occupation_count': occ_count,
-        }
-
-    # Build template-friendly blocks per year to avoid dict indexing in templates
-    assessment_series_year_blocks = []
-    for y in years_sorted_desc:
-        assessment_series_year_blocks.append({
-            'year': y,
-            'totals': assessment_series_year_totals.get(y, {}),
-            'series_list': assessment_series_by_year.get(y, []),
-        })
-    
-    context = {
-        'total_candidates': total_candidates,
-        'total_occupations': total_occupations,
-        'total_centers': total_centers,
-        'total_results': total_results,
-        'gender_breakdown': gender_breakdown,
-        'registration_categories': registration_categories,
-        'special_needs_breakdown': special_needs_breakdown,
-        'special_needs_by_gender': special_needs_by_gender,
-        'reg_cat_by_gender': reg_cat_by_gender,
-        'assessment_series': assessment_series,  # flat list kept for backward compatibility
-        'assessment_series_by_year': dict(assessment_series_by_year),
-        'assessment_series_year_totals': assessment_series_year_totals,
-        'years_sorted_desc': years_sorted_desc,
-        'assessment_series_year_blocks': assessment_series_year_blocks,
-    }
-    return render(request, 'statistics/home.html', context)
+    if not photo_image:
+        photo_image = Paragraph('No Photo', ParagraphStyle('NoPhoto', fontSize=6, alignment=TA_CENTER))
+    
+    cell_elements.append(photo_image)
+    
+    occupation_code = candidate.occupation.code if candidate.occupation else 'N/A'
+    reg_category_short = candidate.registration_category.upper() if candidate.registration_category else 'N/A'
+    
+    return cell_elements
+@login_required
+def statistics_home(request):
+    """Enhanced statistics dashboard showing system overview and detailed metrics including assessment series"""
+    # Two grouped queries, cached until enrollments change (utilis/statistics_snapshot.py)
+    return render(request, 'statistics/home.html', statistics_snapshot())
 from django.core.exceptions import ValidationError
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
@@ -12594,12 +11589,11 @@ def download_practical_marksheet(request, marksheet_id):
         return HttpResponse("Forbidden", status=403)
     
     # Create PDF
-    response = HttpResponse(content_type='application/pdf')
     filename = f"practical_marksheet_{marksheet.assessment_center.center_number}_{marksheet.occupation.code}_{marksheet.assessment_series.name.replace(' ', '_')}.pdf"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    buffer = spooled_buffer()
     
     # Generate PDF content
-    p = canvas.Canvas(response, pagesize=A4)
+    p = canvas.Canvas(buffer, pagesize=A4)
     width, height = A4
     
     # Add logo
@@ -12719,12 +11713,15 @@ def download_practical_marksheet(request, marksheet_id):
     p.drawString(50, 50, f"Generated by EMIS - Practical Assessment Module")
     
     p.save()
-    return response
+    return pdf_response(buffer, filename)
 
 
 @login_required
 def assessment_series_detail(request, year, month):
     """Detailed breakdown for a specific assessment series using actual series relationships"""
+    from django.db.models import Sum
+    from .models import SeriesStatsCube
+    from .utilis.series_stats import series_stats, breakdown, total
     
     # Find the assessment series based on year/month
     # We'll look for a series that starts in the given year/month
@@ -12744,25 +11741,32 @@ def assessment_series_detail(request, year, month):
             # Create a fallback if no series found
             month_name = calendar.month_name[int(month)]
             period_name = f"{month_name} {year}"
-            candidates_in_period = Candidate.objects.none()
+            cube = SeriesStatsCube.objects.none()
         else:
             period_name = assessment_series.name
-            # Get candidates enrolled in this specific assessment series
-            candidates_in_period = Candidate.objects.filter(assessment_series=assessment_series)
+            # Pre-aggregated counts for candidates enrolled in this specific assessment series
+            cube = series_stats(assessment_series)
             
     except (ValueError, AssessmentSeries.DoesNotExist):
         month_name = calendar.month_name[int(month)]
         period_name = f"{month_name} {year}"
-        candidates_in_period = Candidate.objects.none()
+        cube = SeriesStatsCube.objects.none()
     
-    total_candidates = candidates_in_period.count()
+    total_candidates = total(cube)
     total_candidates_for_percentage = total_candidates if total_candidates > 0 else 1
     
+    # Candidate counts split by gender, used by every "male/female" column below
+    gender_counts = dict(
+        total=Sum('candidate_count', default=0),
+        male=Sum('candidate_count', filter=Q(gender='M'), default=0),
+        female=Sum('candidate_count', filter=Q(gender='F'), default=0),
+    )
+    
     # Gender breakdown
     gender_breakdown = []
     gender_colors = {'M': '#3B82F6', 'F': '#EC4899'}
     
-    gender_data = candidates_in_period.values('gender').annotate(count=Count('id'))
+    gender_data = breakdown(cube, 'gender')
     for gender in gender_data:
         gender_code = gender['gender']
         count = gender['count']
@@ -12785,10 +11789,12 @@ def assessment_series_detail(request, year, month):
         'Worker\'s PAS': '#EF4444',
     }
     
-    reg_cat_data = candidates_in_period.values('registration_category').annotate(count=Count('id'))
+    # The cube groups on the category code; spellings of one category are counted together
+    category_names = dict(CATEGORY_CODE_CHOICES)
+    reg_cat_data = list(cube.values('registration_category_code').annotate(**gender_counts).order_by('-total'))
     for category in reg_cat_data:
-        reg_cat = category['registration_category']
-        count = category['count']
+        reg_cat = category_names.get(category['registration_category_code'])
+        count = category['total']
         percentage = (count / total_candidates_for_percentage) * 100
         
         reg_cat_breakdown.append({
@@ -12801,10 +11807,10 @@ def assessment_series_detail(request, year, month):
     # Registration category by gender breakdown
     reg_cat_by_gender = []
     for category in reg_cat_data:
-        reg_cat = category['registration_category']
+        reg_cat = category_names.get(category['registration_category_code'])
         if reg_cat:
-            male_count = candidates_in_period.filter(registration_category=reg_cat, gender='M').count()
-            female_count = candidates_in_period.filter(registration_category=reg_cat, gender='F').count()
+            male_count = category['male']
+            female_count = category['female']
             
             reg_cat_by_gender.append({
                 'category': reg_cat,
@@ -12818,7 +11824,7 @@ def assessment_series_detail(request, year, month):
     
     # Special needs breakdown
     special_needs_breakdown = []
-    special_needs_data = candidates_in_period.values('disability').annotate(count=Count('id'))
+    special_needs_data = breakdown(cube, 'disability')
     for special_need in special_needs_data:
         disability = special_need['disability']
         count = special_need['count']
@@ -12833,7 +11839,7 @@ def assessment_series_detail(request, year, month):
     
     # Occupation breakdown
     occupation_breakdown = []
-    occupation_data = candidates_in_period.values('occupation__name').annotate(count=Count('id')).order_by('-count')
+    occupation_data = breakdown(cube, 'occupation__name')
     for occupation in occupation_data:
         occupation_name = occupation['occupation__name']
         count = occupation['count']
@@ -12849,161 +11855,98 @@ def assessment_series_detail(request, year, month):
     # Count candidates by enrolled level for those in Formal category in this series
     formal_levels_breakdown = []
     formal_levels_by_occupation = []
-    try:
-        formal_candidates = candidates_in_period.filter(registration_category__iexact='Formal')
-        levels_data = formal_candidates.values('candidatelevel__level__name').annotate(
-            total=Count('id'),
-            male=Count('id', filter=Q(gender='M')),
-            female=Count('id', filter=Q(gender='F'))
-        ).order_by('-total')
-        for row in levels_data:
-            level_name = row['candidatelevel__level__name'] or 'Unassigned Level'
-            formal_levels_breakdown.append({
-                'level_name': level_name,
-                'male': row['male'],
-                'female': row['female'],
-                'total': row['total']
-            })
-
-        # By occupation inside each level
-        lvl_occ_qs = formal_candidates.values(
-            'candidatelevel__level__name', 'occupation__name'
-        ).annotate(
-            total=Count('id'),
-            male=Count('id', filter=Q(gender='M')),
-            female=Count('id', filter=Q(gender='F'))
-        ).order_by('candidatelevel__level__name', '-total')
-
-        # Group rows by level
-        grouped = {}
-        for r in lvl_occ_qs:
-            lvl = r['candidatelevel__level__name'] or 'Unassigned Level'
-            occ = r['occupation__name'] or 'Unknown Occupation'
-            grouped.setdefault(lvl, {'level_name': lvl, 'rows': [], 'level_total': 0})
-            grouped[lvl]['rows'].append({
-                'occupation': occ,
-                'male': r['male'],
-                'female': r['female'],
-                'total': r['total']
-            })
-            grouped[lvl]['level_total'] += r['total']
-
-        # Keep order consistent with levels_data totals desc
-        lvl_order = [item['level_name'] for item in formal_levels_breakdown]
-        for lvl in lvl_order:
-            if lvl in grouped:
-                formal_levels_by_occupation.append(grouped[lvl])
-        # Add any remaining groups not present in levels list
-        for lvl, payload in grouped.items():
-            if lvl not in lvl_order:
-                formal_levels_by_occupation.append(payload)
-    except Exception as e:
-        # Keep page robust if relation names change
-        print(f"[WARN] Formal levels breakdown failed: {e}")
+    formal_cube = cube.filter(registration_category_code=FORMAL)
+    
+    # By occupation inside each level; level totals are summed from these rows
+    lvl_occ_qs = formal_cube.values('level__name', 'occupation__name').annotate(**gender_counts).order_by('level__name', '-total')
+    grouped = {}
+    for r in lvl_occ_qs:
+        lvl = r['level__name'] or 'Unassigned Level'
+        occ = r['occupation__name'] or 'Unknown Occupation'
+        grouped.setdefault(lvl, {'level_name': lvl, 'rows': [], 'level_total': 0, 'male': 0, 'female': 0})
+        grouped[lvl]['rows'].append({
+            'occupation': occ,
+            'male': r['male'],
+            'female': r['female'],
+            'total': r['total']
+        })
+        grouped[lvl]['level_total'] += r['total']
+        grouped[lvl]['male'] += r['male']
+        grouped[lvl]['female'] += r['female']
+
+    # Order levels by total, largest first
+    for payload in sorted(grouped.values(), key=lambda item: -item['level_total']):
+        formal_levels_breakdown.append({
+            'level_name': payload['level_name'],
+            'male': payload.pop('male'),
+            'female': payload.pop('female'),
+            'total': payload['level_total']
+        })
+        formal_levels_by_occupation.append(payload)
     
     # Assessment Center breakdown
     center_breakdown = []
-    try:
-        centers_qs = candidates_in_period.values(
-            'assessment_center__center_name',
-            'assessment_center_id'
-        ).annotate(
-            total=Count('id'),
-            male=Count('id', filter=Q(gender='M')),
-            female=Count('id', filter=Q(gender='F'))
-        ).order_by('-total')
-
-        for row in centers_qs:
-            center_breakdown.append({
-                'center_id': row['assessment_center_id'],
-                'center_name': row['assessment_center__center_name'] or 'Unknown Center',
-                'male': row['male'],
-                'female': row['female'],
-                'total': row['total'],
-                'percentage': round((row['total'] / total_candidates_for_percentage) * 100, 1)
-            })
-    except Exception as e:
-        print(f"[WARN] Center breakdown failed: {e}")
-    # Sector-based analytics
+    centers_qs = cube.values(
+        'assessment_center__center_name',
+        'assessment_center_id'
+    ).annotate(**gender_counts).order_by('-total')
+
+    for row in centers_qs:
+        center_breakdown.append({
+            'center_id': row['assessment_center_id'],
+            'center_name': row['assessment_center__center_name'] or 'Unknown Center',
+            'male': row['male'],
+            'female': row['female'],
+            'total': row['total'],
+            'percentage': round((row['total'] / total_candidates_for_percentage) * 100, 1)
+        })
+    
+    # Sector-based analytics, all built from one sector/occupation grouping
+    sector_rows = cube.values('occupation__sector__name', 'occupation__name').annotate(
+        total_count=Sum('candidate_count', default=0),
+        male_count=Sum('candidate_count', filter=Q(gender='M'), default=0),
+        female_count=Sum('candidate_count', filter=Q(gender='F'), default=0),
+        with_special_needs=Sum('candidate_count', filter=Q(disability=True), default=0),
+        without_special_needs=Sum('candidate_count', filter=Q(disability=False), default=0),
+        male_with_special_needs=Sum('candidate_count', filter=Q(gender='M', disability=True), default=0),
+        male_without_special_needs=Sum('candidate_count', filter=Q(gender='M', disability=False), default=0),
+        female_with_special_needs=Sum('candidate_count', filter=Q(gender='F', disability=True), default=0),
+        female_without_special_needs=Sum('candidate_count', filter=Q(gender='F', disability=False), default=0),
+    ).order_by('-total_count')
+    
+    sectors = {}
+    for row in sector_rows:
+        sector_name = row.pop('occupation__sector__name') or 'Unknown Sector'
+        row['count'] = row['total_count']
+        sector = sectors.setdefault(sector_name, {'sector_name': sector_name, 'total_candidates': 0, 'occupations': []})
+        sector['total_candidates'] += row['total_count']
+        sector['occupations'].append(row)
+    sectors_with_candidates = sorted(
+        (sector for sector in sectors.values() if sector['total_candidates'] > 0),
+        key=lambda sector: -sector['total_candidates']
+    )
+    
     # 1. Occupation by Sector analysis
     sector_occupation_analysis = []
-    sectors_with_candidates = candidates_in_period.values('occupation__sector__name').annotate(
-        total_candidates=Count('id'),
-        occupation_count=Count('occupation', distinct=True)
-    ).filter(total_candidates__gt=0).order_by('-total_candidates')
-    
-    for sector_data in sectors_with_candidates:
-        sector_name = sector_data['occupation__sector__name'] or 'Unknown Sector'
-        sector_candidates = candidates_in_period.filter(occupation__sector__name=sector_name)
-        
-        # Get occupations within this sector
-        sector_occupations = sector_candidates.values('occupation__name').annotate(
-            count=Count('id')
-        ).order_by('-count')
-        
+    for sector in sectors_with_candidates:
         sector_occupation_analysis.append({
-            'sector_name': sector_name,
-            'total_candidates': sector_data['total_candidates'],
-            'occupation_count': sector_data['occupation_count'],
-            'percentage': round((sector_data['total_candidates'] / total_candidates_for_percentage) * 100, 1),
-            'occupations': list(sector_occupations)
+            'sector_name': sector['sector_name'],
+            'total_candidates': sector['total_candidates'],
+            'occupation_count': len([occ for occ in sector['occupations'] if occ['occupation__name']]),
+            'percentage': round((sector['total_candidates'] / total_candidates_for_percentage) * 100, 1),
+            'occupations': sector['occupations']
         })
     
     # 2. Gender by Occupation by Sector analysis
-    gender_occupation_sector_analysis = []
-    for sector_data in sectors_with_candidates:
-        sector_name = sector_data['occupation__sector__name'] or 'Unknown Sector'
-        sector_candidates = candidates_in_period.filter(occupation__sector__name=sector_name)
-        
-        sector_occupations = sector_candidates.values('occupation__name').annotate(
-            total_count=Count('id'),
-            male_count=Count('id', filter=Q(gender='M')),
-            female_count=Count('id', filter=Q(gender='F'))
-        ).order_by('-total_count')
-        
-        gender_occupation_sector_analysis.append({
-            'sector_name': sector_name,
-            'occupations': list(sector_occupations)
-        })
-    
     # 3. Special Needs by Occupation by Sector analysis
-    special_needs_occupation_sector_analysis = []
-    for sector_data in sectors_with_candidates:
-        sector_name = sector_data['occupation__sector__name'] or 'Unknown Sector'
-        sector_candidates = candidates_in_period.filter(occupation__sector__name=sector_name)
-        
-        sector_occupations = sector_candidates.values('occupation__name').annotate(
-            total_count=Count('id'),
-            with_special_needs=Count('id', filter=Q(disability=True)),
-            without_special_needs=Count('id', filter=Q(disability=False))
-        ).order_by('-total_count')
-        
-        special_needs_occupation_sector_analysis.append({
-            'sector_name': sector_name,
-            'occupations': list(sector_occupations)
-        })
-    
     # 4. Most granular: Special Needs by Gender by Occupation by Sector
-    granular_sector_analysis = []
-    for sector_data in sectors_with_candidates:
-        sector_name = sector_data['occupation__sector__name'] or 'Unknown Sector'
-        sector_candidates = candidates_in_period.filter(occupation__sector__name=sector_name)
-        
-        sector_occupations = sector_candidates.values('occupation__name').annotate(
-            total_count=Count('id'),
-            male_with_special_needs=Count('id', filter=Q(gender='M', disability=True)),
-            male_without_special_needs=Count('id', filter=Q(gender='M', disability=False)),
-            female_with_special_needs=Count('id', filter=Q(gender='F', disability=True)),
-            female_without_special_needs=Count('id', filter=Q(gender='F', disability=False))
-        ).order_by('-total_count')
-        
-        granular_sector_analysis.append({
-            'sector_name': sector_name,
-            'occupations': list(sector_occupations)
-        })
-    
-    # Add this debug line right before the context = { line
-    print(f"DEBUG: reg_cat_breakdown = {reg_cat_breakdown}")
+    # Each sector's occupation rows carry every count these sections display
+    gender_occupation_sector_analysis = [
+        {'sector_name': sector['sector_name'], 'occupations': sector['occupations']}
+        for sector in sectors_with_candidates
+    ]
+    special_needs_occupation_sector_analysis = gender_occupation_sector_analysis
+    granular_sector_analysis = gender_occupation_sector_analysis
     
     context = {
         'period_name': period_name,
@@ -13030,7 +11973,11 @@ def assessment_series_detail(request, year, month):
 
 @login_required
 def generate_performance_report(request, year, month):
-    """Generate performance report PDF for assessment series - OPTIMIZED VERSION"""
+    """Generate performance report PDF for assessment series.
+
+    Figures come from eims.utilis.performance_report in a fixed number of grouped
+    queries; this view only lays them out.
+    """
     from reportlab.lib.pagesizes import landscape, A4
     from reportlab.lib import colors
     from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -13038,15 +11985,15 @@ def generate_performance_report(request, year, month):
     from reportlab.lib.units import inch
     from django.http import HttpResponse
     from django.conf import settings
-    from django.db.models import Q, Count
-    from io import BytesIO
+    from .utilis.performance_report import build_performance_report_data, percentage
     import os
     import time
-    from django.db import connection
-    
+
+    logger = logging.getLogger(__name__)
+
     # Performance monitoring
     start_time = time.time()
-    print(f"[PERFORMANCE] Report generation started at {time.strftime('%Y-%m-%d %H:%M:%S')}")
+    logger.debug("Performance report %s/%s started", year, month)
     
     # Get parameters
     category = request.GET.get('category')
@@ -13061,162 +12008,25 @@ def generate_performance_report(request, year, month):
     if not assessment_series:
         return HttpResponse("Assessment series not found", status=404)
     
-    # Map category parameter to database registration_category values (robust to variations)
-    # We will also filter case-insensitively using __iexact so capitalization differences don't exclude candidates
-    category_mapping = {
-        'Modular': 'Modular', 'modular': 'Modular',
-        'Formal': 'Formal',   'formal': 'Formal',
-        "Worker's PAS": 'Informal', 'Workers PAS': 'Informal', 'Worker PAS': 'Informal',
-        'Informal': 'Informal', 'informal': 'Informal',
-        "worker's pas": 'Informal', 'workers pas': 'Informal', 'worker pas': 'Informal'
-    }
-
-    # Get the normalized category we should use
-    db_category = category_mapping.get(category, category)
-    print(f"[DEBUG] Frontend category: '{category}', Normalized DB category: '{db_category}'")
-
-    # Additional debugging: Check what registration categories actually exist in the database
-    existing_categories = Candidate.objects.values_list('registration_category', flat=True).distinct()
-    print(f"[DEBUG] Existing registration categories in database: {list(existing_categories)}")
-
-    # Build case-insensitive filters. Always include an iexact filter for the normalized value
-    candidate_filters = [
-        Q(registration_category__iexact=db_category)
-    ]
-
-    # Also include a fallback to the original value (in case it's something custom/unmapped)
-    if category:
-        candidate_filters.append(Q(registration_category__iexact=category))
-
-    # Add common variants explicitly for each group
-    cat_lower = (category or '').lower()
-    if any(term in cat_lower for term in ['informal', 'worker', 'pas']):
-        candidate_filters.extend([
-            Q(registration_category__iexact='Informal'),
-            Q(registration_category__iregex=r'^\s*informal\s*$'),
-            Q(registration_category__iexact="Worker's PAS"),
-            Q(registration_category__iexact='Workers PAS'),
-            Q(registration_category__iexact='Worker PAS')
-        ])
-    elif 'formal' in cat_lower:
-        candidate_filters.extend([
-            Q(registration_category__iexact='Formal'),
-            Q(registration_category__iregex=r'^\s*formal\s*$')
-        ])
-    elif 'modular' in cat_lower:
-        candidate_filters.extend([
-            Q(registration_category__iexact='Modular'),
-            Q(registration_category__iregex=r'^\s*modular\s*$')
-        ])
-    
-    # Combine all filters with OR
-    combined_filter = candidate_filters[0]
-    for filter_q in candidate_filters[1:]:
-        combined_filter |= filter_q
-    
-    # Filter candidates with optimized queries to prevent N+1 problems
-    # Use the combined filter to handle all category variations
-    filtered_candidates = Candidate.objects.filter(
-        assessment_series=assessment_series
-    ).filter(
-        combined_filter  # Apply the combined category filter
-    ).select_related(
-        'occupation',
-        'occupation__sector',
-        'assessment_center'
-    ).prefetch_related(
-        'result_set',  # Prefetch all results to avoid N+1 queries
-        'candidatelevel_set__level'
-    )
-    
-    # Step-by-step debugging to identify where candidates are lost
-    print(f"[DEBUG] === FILTERING BREAKDOWN ===")
-    
-    # Step 1: Check total candidates in assessment series
-    series_candidates = Candidate.objects.filter(assessment_series=assessment_series)
-    print(f"[DEBUG] Step 1 - Total candidates in assessment series: {series_candidates.count()}")
-    
-    # Step 2: Check candidates after category filter
-    category_candidates = series_candidates.filter(combined_filter)
-    print(f"[DEBUG] Step 2 - Candidates after category filter: {category_candidates.count()}")
-    
-    # Step 3: Apply the full filter
-    filtered_candidates = Candidate.objects.filter(
-        assessment_series=assessment_series
-    ).filter(
-        combined_filter
-    ).select_related(
-        'occupation',
-        'occupation__sector',
-        'assessment_center'
-    ).prefetch_related(
-        'result_set',
-        'candidatelevel_set__level'
-    )
-    
-    print(f"[DEBUG] Step 3 - After full filtering: {filtered_candidates.count()}")
-    print(f"[DEBUG] Category: {category}, Level: {level}")
-    
-    # Step 4: Level filtering (if applicable)
-    # IMPORTANT: Only apply level filtering for Formal category
-    # Informal/Worker's PAS should show ALL candidates regardless of level
-    if level and category == 'Formal':
-        print(f"[DEBUG] Step 4 - Applying level filter for category: {category}")
-        pre_level_count = filtered_candidates.count()
+    report = build_performance_report_data(assessment_series, category, level)
+
+    def metric_cells(counts, metrics):
+        """F, M, TT and % (of registered) cells for each metric"""
+        registered_total = counts['registered']['TT']
+        cells = []
+        for metric in metrics:
+            cells += [
+                str(counts[metric]['F']),
+                str(counts[metric]['M']),
+                str(counts[metric]['TT']),
+                f"{percentage(counts[metric]['TT'], registered_total):.1f}",
+            ]
+        return cells
 
-        # Support level-number filtering across all occupations.
-        # The modal sends '1', '2', '3'. Match Level names like "Level 1", "Level 2", ...
-        try:
-            level_str = str(level).strip()
-            # Build a startswith filter for the Level name
-            name_prefix = f"Level {level_str}"
-            candidates_with_level = filtered_candidates.filter(
-                candidatelevel__level__name__istartswith=name_prefix
-            )
-            print(f"[DEBUG] Candidates with level name starting '{name_prefix}': {candidates_with_level.count()}")
-            filtered_candidates = candidates_with_level
-            print(f"[DEBUG] After level filter: {pre_level_count} -> {filtered_candidates.count()}")
-        except Exception as e:
-            print(f"[DEBUG] Level filtering error (name-based): {e}")
-            # Fallback: keep unfiltered if anything goes wrong
-            pass
-    else:
-        print(f"[DEBUG] Step 4 - No level filtering applied for category: {category} (showing all candidates)")
-    
-    print(f"[DEBUG] === FINAL RESULT ===")
-    print(f"[DEBUG] Final filtered candidates count: {filtered_candidates.count()}")
-    
-    # Additional debugging: Show some sample candidate data if any exist
-    if filtered_candidates.exists():
-        sample_candidates = filtered_candidates[:3]
-        for i, candidate in enumerate(sample_candidates):
-            print(f"[DEBUG] Sample candidate {i+1}: {candidate.reg_number} - {candidate.full_name} - {candidate.registration_category}")
-    else:
-        print(f"[DEBUG] No candidates found after all filters!")
-        
-        # Debug: Check if there are any informal candidates at all in this series
-        informal_in_series = Candidate.objects.filter(
-            assessment_series=assessment_series,
-            registration_category='Informal'
-        ).count()
-        print(f"[DEBUG] Total Informal candidates in this series: {informal_in_series}")
-        
-        # Debug: Check if the assessment series exists and has candidates
-        if assessment_series:
-            print(f"[DEBUG] Assessment series: {assessment_series.name} (ID: {assessment_series.id})")
-            total_in_series = Candidate.objects.filter(assessment_series=assessment_series).count()
-            print(f"[DEBUG] Total candidates in series: {total_in_series}")
-        else:
-            print(f"[DEBUG] No assessment series found!")
-    
-    print(f"[DEBUG] === END DEBUGGING ===")
-    
-    # Debug logging (original)
-    print(f"[DEBUG] Initial candidates count: {filtered_candidates.count()}")
-    print(f"[DEBUG] Category: {category}, Level: {level}")
+    all_metrics = ('registered', 'absent', 'assessed', 'successful', 'unsuccessful')
     
     # Create PDF document
-    buffer = BytesIO()
+    buffer = spooled_buffer()
     doc = SimpleDocTemplate(buffer, pagesize=landscape(A4), topMargin=0.5*inch)
     elements = []
     
@@ -13263,19 +12073,8 @@ def generate_performance_report(request, year, month):
     # Page 1: Candidate breakdown by occupation
     elements.append(Paragraph("Candidates Performance Details", styles['Heading3']))
     
-    # Get occupation data with results using occupation codes
-    occupation_data = []
-    occupations = filtered_candidates.values('occupation__code', 'occupation__name').annotate(
-        registered=Count('id'),
-        # Add result-based counts - adjust field names based on your Result model
-        # missing=Count('id', filter=Q(result__isnull=True)),
-        # normal_progress=Count('id', filter=Q(result__status='passed')),
-        # probationary=Count('id', filter=Q(result__status='failed'))
-    ).order_by('occupation__code')
-    
     # Create table with gender breakdown columns
-    table_data = [[
-        'S/N', 'Occupation code', 
+    performance_header = [
         # Registered columns
         'Registered', '', '', '',
         # Absent columns  
@@ -13286,238 +12085,30 @@ def generate_performance_report(request, year, month):
         'Completed Successfully', '', '', '',
         # Unsuccessful columns
         'Unsuccessful', '', '', ''
-    ]]
-    
-    # Add sub-header row for gender breakdown
-    table_data.append([
-        '', '',
+    ]
+    performance_subheader = [
         'F', 'M', 'TT', '%',  # Registered
         'F', 'M', 'TT', '%',  # Absent
         'F', 'M', 'TT', '%',  # Assessed
         'F', 'M', 'TT', '%',  # Completed Successfully
         'F', 'M', 'TT', '%'   # Unsuccessful
-    ])
-    
-    for i, occ in enumerate(occupations, 1):
-        # Get candidates for this occupation
-        occupation_candidates = filtered_candidates.filter(
-            occupation__code=occ['occupation__code']
-        )
-        
-        # Calculate gender breakdowns for registered
-        registered_total = occupation_candidates.count()
-        registered_female = occupation_candidates.filter(gender='F').count()
-        registered_male = occupation_candidates.filter(gender='M').count()
-        registered_pct = 100.0 if registered_total > 0 else 0.0
-        
-        # Calculate missing (enrolled but no results) by gender
-        candidates_with_results = occupation_candidates.filter(
-            result__isnull=False
-        ).distinct()
-        candidates_without_results = occupation_candidates.exclude(
-            id__in=candidates_with_results.values_list('id', flat=True)
-        )
-        
-        missing_total = candidates_without_results.count()
-        missing_female = candidates_without_results.filter(gender='F').count()
-        missing_male = candidates_without_results.filter(gender='M').count()
-        missing_pct = (missing_total / registered_total * 100) if registered_total > 0 else 0.0
-        
-        # Calculate sat for exams by gender
-        sat_total = candidates_with_results.count()
-        sat_female = candidates_with_results.filter(gender='F').count()
-        sat_male = candidates_with_results.filter(gender='M').count()
-        sat_pct = (sat_total / registered_total * 100) if registered_total > 0 else 0.0
-        
-        # Calculate Completed Successfully and Unsuccessful by gender
-        normal_progress_candidates = []
-        probationary_candidates = []
-        
-        for candidate in candidates_with_results:
-            # Get all results for this candidate
-            candidate_results = candidate.result_set.all()
-            
-            if not candidate_results.exists():
-                continue
-            
-            # Check if candidate has multiple papers
-            practical_results = candidate_results.filter(assessment_type='practical')
-            
-            if practical_results.exists():
-                # For candidates with multiple papers, practical is important
-                practical_comments = [r.comment.lower() for r in practical_results]
-                
-                # If any practical contains "unsuccessful", "ctr", or "fail" -> probationary
-                if any(comment in ['unsuccessful', 'ctr', 'fail'] for comment in practical_comments):
-                    probationary_candidates.append(candidate)
-                elif all(comment == 'successful' for comment in practical_comments):
-                    normal_progress_candidates.append(candidate)
-                else:
-                    probationary_candidates.append(candidate)
-            else:
-                # No practical results, check all results
-                all_comments = [r.comment.lower() for r in candidate_results]
-                
-                if all(comment == 'successful' for comment in all_comments):
-                    normal_progress_candidates.append(candidate)
-                else:
-                    probationary_candidates.append(candidate)
-        
-        # Calculate gender breakdowns for Completed Successfully
-        np_total = len(normal_progress_candidates)
-        np_female = sum(1 for c in normal_progress_candidates if c.gender == 'F')
-        np_male = sum(1 for c in normal_progress_candidates if c.gender == 'M')
-        np_pct = (np_total / registered_total * 100) if registered_total > 0 else 0.0
-        
-        # Calculate gender breakdowns for Probationary Pass
-        pp_total = len(probationary_candidates)
-        pp_female = sum(1 for c in probationary_candidates if c.gender == 'F')
-        pp_male = sum(1 for c in probationary_candidates if c.gender == 'M')
-        pp_pct = (pp_total / registered_total * 100) if registered_total > 0 else 0.0
-        
-        table_data.append([
-            str(i),
-            occ['occupation__code'] or 'Unknown',
-            # Registered: F, M, TT, %
-            str(registered_female),
-            str(registered_male), 
-            str(registered_total),
-            f"{registered_pct:.1f}",
-            # Missing: F, M, TT, %
-            str(missing_female),
-            str(missing_male),
-            str(missing_total),
-            f"{missing_pct:.1f}",
-            # Assessed: F, M, TT, %
-            str(sat_female),
-            str(sat_male),
-            str(sat_total),
-            f"{sat_pct:.1f}",
-            # Completed Successfully: F, M, TT, %
-            str(np_female),
-            str(np_male),
-            str(np_total),
-            f"{np_pct:.1f}",
-            # Unsuccessful: F, M, TT, %
-            str(pp_female),
-            str(pp_male),
-            str(pp_total),
-            f"{pp_pct:.1f}"
-        ])
-    
-    # Add totals row with actual calculations and gender breakdown
-    total_registered = filtered_candidates.count()
-    total_registered_female = filtered_candidates.filter(gender='F').count()
-    total_registered_male = filtered_candidates.filter(gender='M').count()
-    total_registered_pct = 100.0 if total_registered > 0 else 0.0
-    
-    # Calculate totals across all occupations
-    total_candidates_with_results = filtered_candidates.filter(
-        result__isnull=False
-    ).distinct()
-    total_candidates_without_results = filtered_candidates.exclude(
-        id__in=total_candidates_with_results.values_list('id', flat=True)
-    )
-    
-    total_missing = total_candidates_without_results.count()
-    total_missing_female = total_candidates_without_results.filter(gender='F').count()
-    total_missing_male = total_candidates_without_results.filter(gender='M').count()
-    total_missing_pct = (total_missing / total_registered * 100) if total_registered > 0 else 0.0
-    
-    total_sat_for_exams = total_candidates_with_results.count()
-    total_sat_female = total_candidates_with_results.filter(gender='F').count()
-    total_sat_male = total_candidates_with_results.filter(gender='M').count()
-    total_sat_pct = (total_sat_for_exams / total_registered * 100) if total_registered > 0 else 0.0
-    
-    # Calculate total Normal Progress (NP) and Probationary Pass (PP) with gender breakdown
-    total_normal_progress_candidates = []
-    total_probationary_candidates = []
-    
-    for candidate in total_candidates_with_results:
-        candidate_results = candidate.result_set.all()
-        
-        if not candidate_results.exists():
-            continue
-        
-        practical_results = candidate_results.filter(assessment_type='practical')
-        
-        if practical_results.exists():
-            practical_comments = [r.comment.lower() for r in practical_results]
-            
-            if any(comment in ['unsuccessful', 'ctr', 'fail'] for comment in practical_comments):
-                total_probationary_candidates.append(candidate)
-            elif all(comment == 'successful' for comment in practical_comments):
-                total_normal_progress_candidates.append(candidate)
-            else:
-                total_probationary_candidates.append(candidate)
-        else:
-            all_comments = [r.comment.lower() for r in candidate_results]
-            
-            if all(comment == 'successful' for comment in all_comments):
-                total_normal_progress_candidates.append(candidate)
-            else:
-                total_probationary_candidates.append(candidate)
-    
-    # Calculate gender breakdowns for totals
-    total_np = len(total_normal_progress_candidates)
-    total_np_female = sum(1 for c in total_normal_progress_candidates if c.gender == 'F')
-    total_np_male = sum(1 for c in total_normal_progress_candidates if c.gender == 'M')
-    total_np_pct = (total_np / total_registered * 100) if total_registered > 0 else 0.0
+    ]
+    table_data = [['S/N', 'Occupation code'] + performance_header, ['', ''] + performance_subheader]
     
-    total_pp = len(total_probationary_candidates)
-    total_pp_female = sum(1 for c in total_probationary_candidates if c.gender == 'F')
-    total_pp_male = sum(1 for c in total_probationary_candidates if c.gender == 'M')
-    total_pp_pct = (total_pp / total_registered * 100) if total_registered > 0 else 0.0
+    for i, occ in enumerate(report['occupations'].values(), 1):
+        table_data.append([str(i), occ['code'] or 'Unknown'] + metric_cells(occ['counts'], all_metrics))
     
-    table_data.append([
-        'Total',
-        '',
-        # Registered: F, M, TT, %
-        str(total_registered_female),
-        str(total_registered_male),
-        str(total_registered),
-        f"{total_registered_pct:.1f}",
-        # Missing: F, M, TT, %
-        str(total_missing_female),
-        str(total_missing_male),
-        str(total_missing),
-        f"{total_missing_pct:.1f}",
-        # Sat For Exams: F, M, TT, %
-        str(total_sat_female),
-        str(total_sat_male),
-        str(total_sat_for_exams),
-        f"{total_sat_pct:.1f}",
-        # Normal Progress: F, M, TT, %
-        str(total_np_female),
-        str(total_np_male),
-        str(total_np),
-        f"{total_np_pct:.1f}",
-        # Probationary Pass: F, M, TT, %
-        str(total_pp_female),
-        str(total_pp_male),
-        str(total_pp),
-        f"{total_pp_pct:.1f}"
-    ])
+    # Add totals row with gender breakdown
+    table_data.append(['Total', ''] + metric_cells(report['totals'], all_metrics))
     
-    # Create table with blue color scheme and proper column widths
     # Column widths: S/N, Program, then 4 columns each for 5 metrics = 22 total columns
+    metric_col_widths = [0.4*inch, 0.4*inch, 0.5*inch, 0.5*inch] * 5
     col_widths = [
         0.8*inch,  # S/N
         1.2*inch,  # Program code
-        # Registered: F, M, TT, %
-        0.4*inch, 0.4*inch, 0.5*inch, 0.5*inch,
-        # Missing: F, M, TT, %
-        0.4*inch, 0.4*inch, 0.5*inch, 0.5*inch,
-        # Sat For Exams: F, M, TT, %
-        0.4*inch, 0.4*inch, 0.5*inch, 0.5*inch,
-        # Normal Progress: F, M, TT, %
-        0.4*inch, 0.4*inch, 0.5*inch, 0.5*inch,
-        # Probationary Pass: F, M, TT, %
-        0.4*inch, 0.4*inch, 0.5*inch, 0.5*inch
-    ]
+    ] + metric_col_widths
     
-    table = Table(table_data, colWidths=col_widths)
-    table.setStyle(TableStyle([
+    performance_table_style = [
         ('BACKGROUND', (0, 0), (-1, 0), colors.Color(0.2, 0.4, 0.8)),  # Blue header
         ('BACKGROUND', (0, 1), (-1, 1), colors.Color(0.3, 0.5, 0.9)),  # Blue sub-header
         ('TEXTCOLOR', (0, 0), (-1, 1), colors.whitesmoke),
@@ -13539,7 +12130,10 @@ def generate_performance_report(request, year, month):
         ('BOX', (0, 0), (-1, -1), 1, colors.Color(0.3, 0.5, 0.9)),  # Blue outer border only
         ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
         ('ROWBACKGROUNDS', (0, 2), (-1, -2), [colors.Color(0.95, 0.98, 1.0), colors.Color(0.9, 0.95, 1.0)])
-    ]))
+    ]
+    
+    table = Table(table_data, colWidths=col_widths)
+    table.setStyle(TableStyle(performance_table_style))
     
     elements.append(table)
     elements.append(Spacer(1, 30))
@@ -13548,25 +12142,17 @@ def generate_performance_report(request, year, month):
     elements.append(Paragraph("Occupation Summary", styles['Heading3']))
     elements.append(Spacer(1, 10))
     
-    # Get unique occupations with their sectors from the filtered candidates
-    occupation_summary_data = filtered_candidates.values(
-        'occupation__code', 
-        'occupation__name', 
-        'occupation__sector__name'
-    ).distinct().order_by('occupation__code')
-    
     # Create occupation summary table
     summary_table_data = [[
         'S/N', 'Occupation Code', 'Occupation Name', 'Sector'
     ]]
     
-    for idx, occ in enumerate(occupation_summary_data, 1):
-        sector_name = occ['occupation__sector__name'] or 'Unknown Sector'
+    for idx, occ in enumerate(report['occupations'].values(), 1):
         summary_table_data.append([
             str(idx),
-            occ['occupation__code'] or 'N/A',
-            occ['occupation__name'] or 'N/A',
-            sector_name
+            occ['code'] or 'N/A',
+            occ['name'] or 'N/A',
+            occ['sector'] or 'Unknown Sector'
         ])
     
     # Create summary table with appropriate column widths
@@ -13603,36 +12189,6 @@ def generate_performance_report(request, year, month):
     elements.append(Paragraph("Performance by Occupation by Sector", title_style))
     elements.append(Spacer(1, 20))
     
-    # Get sector data with gender breakdown - OPTIMIZED with batch processing
-    # Fix sector query to handle NULL sectors properly
-    sectors_raw = filtered_candidates.values('occupation__sector__name').distinct()
-    
-    # Debug sector information to identify the issue
-    sector_list = list(sectors_raw)
-    print(f"[DEBUG] Raw sectors found: {sector_list[:10]}...")  # Show first 10 sectors
-    print(f"[DEBUG] Total unique sectors: {len(sector_list)}")
-    
-    # Check if we have NULL sectors causing the issue
-    null_sector_count = filtered_candidates.filter(occupation__sector__name__isnull=True).count()
-    print(f"[DEBUG] Candidates with NULL sectors: {null_sector_count}")
-    
-    # Get actual unique sector names, handling NULLs
-    unique_sectors = set()
-    for sector in sector_list:
-        sector_name = sector['occupation__sector__name'] or 'Unknown Sector'
-        unique_sectors.add(sector_name)
-    
-    print(f"[DEBUG] Actual unique sectors: {list(unique_sectors)}")
-    
-    # Add batch processing for large datasets
-    candidate_count = filtered_candidates.count()
-    print(f"[PERFORMANCE] Processing {candidate_count} candidates across {len(unique_sectors)} sectors")
-    
-    # If dataset is very large, implement chunking to prevent memory issues
-    BATCH_SIZE = 1000  # Process candidates in batches of 1000
-    if candidate_count > BATCH_SIZE:
-        print(f"[PERFORMANCE] Large dataset detected, using batch processing with size {BATCH_SIZE}")
-    
     # Create sector table with gender breakdown columns
     sector_table_data = [[
         'Sector',
@@ -13652,90 +12208,8 @@ def generate_performance_report(request, year, month):
         'F', 'M', 'TT', '%'   # Unsuccessful
     ])
     
-    for sector_name in unique_sectors:
-        print(f"[DEBUG] Processing sector: {sector_name}")
-        
-        # Get candidates for this sector - handle NULL sectors properly
-        if sector_name == 'Unknown Sector':
-            sector_candidates = filtered_candidates.filter(
-                occupation__sector__name__isnull=True
-            )
-        else:
-            sector_candidates = filtered_candidates.filter(
-                occupation__sector__name=sector_name
-            )
-        
-        # Calculate total candidates by gender
-        total_candidates = sector_candidates.count()
-        total_female = sector_candidates.filter(gender='F').count()
-        total_male = sector_candidates.filter(gender='M').count()
-        total_pct = 100.0 if total_candidates > 0 else 0.0
-        
-        # Calculate successful candidates (Normal Progress) by gender - OPTIMIZED VERSION
-        successful_candidates = []
-        unsuccessful_candidates = []
-        
-        # Get all candidates with results for this sector (already prefetched)
-        candidates_with_results = [c for c in sector_candidates if hasattr(c, 'result_set') and c.result_set.exists()]
-        
-        # Process candidates using prefetched data (no additional DB queries)
-        for candidate in candidates_with_results:
-            # Use prefetched results - no DB query here
-            candidate_results = list(candidate.result_set.all())
-            
-            if not candidate_results:
-                continue
-            
-            # Filter practical results from prefetched data
-            practical_results = [r for r in candidate_results if r.assessment_type == 'practical']
-            
-            if practical_results:
-                practical_comments = [r.comment.lower() if r.comment else '' for r in practical_results]
-                
-                if any(comment in ['unsuccessful', 'ctr', 'fail'] for comment in practical_comments):
-                    unsuccessful_candidates.append(candidate)
-                elif all(comment == 'successful' for comment in practical_comments):
-                    successful_candidates.append(candidate)
-                else:
-                    unsuccessful_candidates.append(candidate)
-            else:
-                all_comments = [r.comment.lower() if r.comment else '' for r in candidate_results]
-                
-                if all(comment == 'successful' for comment in all_comments):
-                    successful_candidates.append(candidate)
-                else:
-                    unsuccessful_candidates.append(candidate)
-        
-        # Calculate successful by gender
-        successful_total = len(successful_candidates)
-        successful_female = sum(1 for c in successful_candidates if c.gender == 'F')
-        successful_male = sum(1 for c in successful_candidates if c.gender == 'M')
-        successful_pct = (successful_total / total_candidates * 100) if total_candidates > 0 else 0.0
-        
-        # Calculate unsuccessful by gender
-        unsuccessful_total = len(unsuccessful_candidates)
-        unsuccessful_female = sum(1 for c in unsuccessful_candidates if c.gender == 'F')
-        unsuccessful_male = sum(1 for c in unsuccessful_candidates if c.gender == 'M')
-        unsuccessful_pct = (unsuccessful_total / total_candidates * 100) if total_candidates > 0 else 0.0
-        
-        sector_table_data.append([
-            sector_name,
-            # Total Candidates: F, M, TT, %
-            str(total_female),
-            str(total_male),
-            str(total_candidates),
-            f"{total_pct:.1f}",
-            # Successful: F, M, TT, %
-            str(successful_female),
-            str(successful_male),
-            str(successful_total),
-            f"{successful_pct:.1f}",
-            # Unsuccessful: F, M, TT, %
-            str(unsuccessful_female),
-            str(unsuccessful_male),
-            str(unsuccessful_total),
-            f"{unsuccessful_pct:.1f}"
-        ])
+    for sector_name, counts in report['sectors'].items():
+        sector_table_data.append([sector_name] + metric_cells(counts, ('registered', 'successful', 'unsuccessful')))
     
     # Column widths for sector table: Sector name + 3 metrics × 4 columns each = 13 total columns
     sector_col_widths = [
@@ -13773,313 +12247,36 @@ def generate_performance_report(request, year, month):
     elements.append(PageBreak())
     
     # Page 3+: Center summary pages
-    centers = filtered_candidates.values('assessment_center__center_number', 'assessment_center__center_name').annotate(
-        total_candidates=Count('id')
-    ).filter(total_candidates__gt=0).order_by('assessment_center__center_number')
-    
-    for center_data in centers:
-        center_number = center_data['assessment_center__center_number'] or 'Unknown'
-        center_name = center_data['assessment_center__center_name'] or 'Unknown Center'
-        center_candidates = filtered_candidates.filter(assessment_center__center_number=center_number)
-        
+    centers = list(report['centers'].values())
+    for center_index, center in enumerate(centers):
         elements.append(Paragraph(f"Performance by Assessment Center", title_style))
-        elements.append(Paragraph(f"Center: {center_number} - {center_name}", styles['Heading3']))
+        elements.append(Paragraph(f"Center: {center['number']} - {center['name']}", styles['Heading3']))
         elements.append(Spacer(1, 20))
         
         # Center-specific occupation breakdown
-        center_occupations = center_candidates.values('occupation__code', 'occupation__name').annotate(
-            registered=Count('id')
-        ).order_by('occupation__code')
-        
-        # Create center table with gender breakdown columns
-        center_table_data = [[
-            'S/N', 'Occupation',
-            # Registered columns
-            'Registered', '', '', '',
-            # Absent columns  
-            'Absent', '', '', '',
-            # Assessed columns
-            'Assessed', '', '', '',
-            # Completed Successfully columns
-            'Completed Successfully', '', '', '',
-            # Unsuccessful columns
-            'Unsuccessful', '', '', ''
-        ]]
+        center_table_data = [['S/N', 'Occupation'] + performance_header, ['', ''] + performance_subheader]
+        for i, (code, counts) in enumerate(center['occupations'].items(), 1):
+            center_table_data.append([str(i), code or 'Unknown'] + metric_cells(counts, all_metrics))
+        center_table_data.append(['TOTAL', ''] + metric_cells(center['totals'], all_metrics))
         
-        # Add sub-header row for gender breakdown
-        center_table_data.append([
-            '', '',
-            'F', 'M', 'TT', '%',  # Registered
-            'F', 'M', 'TT', '%',  # Absent
-            'F', 'M', 'TT', '%',  # Assessed
-            'F', 'M', 'TT', '%',  # Completed Successfully
-            'F', 'M', 'TT', '%'   # Unsuccessful
-        ])
-        
-        for i, occ in enumerate(center_occupations, 1):
-            # Get candidates for this occupation in this center
-            center_occupation_candidates = center_candidates.filter(
-                occupation__code=occ['occupation__code']
-            )
-            
-            # Calculate gender breakdowns for registered
-            registered_total = center_occupation_candidates.count()
-            registered_female = center_occupation_candidates.filter(gender='F').count()
-            registered_male = center_occupation_candidates.filter(gender='M').count()
-            registered_pct = 100.0 if registered_total > 0 else 0.0
-            
-            # Calculate missing (enrolled but no results) by gender
-            center_candidates_with_results = center_occupation_candidates.filter(
-                result__isnull=False
-            ).distinct()
-            center_candidates_without_results = center_occupation_candidates.exclude(
-                id__in=center_candidates_with_results.values_list('id', flat=True)
-            )
-            
-            missing_total = center_candidates_without_results.count()
-            missing_female = center_candidates_without_results.filter(gender='F').count()
-            missing_male = center_candidates_without_results.filter(gender='M').count()
-            missing_pct = (missing_total / registered_total * 100) if registered_total > 0 else 0.0
-            
-            # Calculate sat for exams by gender
-            sat_total = center_candidates_with_results.count()
-            sat_female = center_candidates_with_results.filter(gender='F').count()
-            sat_male = center_candidates_with_results.filter(gender='M').count()
-            sat_pct = (sat_total / registered_total * 100) if registered_total > 0 else 0.0
-            
-            # Calculate Completed Successfully and Unsuccessful by gender
-            normal_progress_candidates = []
-            probationary_candidates = []
-            
-            for candidate in center_candidates_with_results:
-                candidate_results = candidate.result_set.all()
-                
-                if not candidate_results.exists():
-                    continue
-                
-                practical_results = candidate_results.filter(assessment_type='practical')
-                
-                if practical_results.exists():
-                    practical_comments = [r.comment.lower() for r in practical_results]
-                    
-                    if any(comment in ['unsuccessful', 'ctr', 'fail'] for comment in practical_comments):
-                        probationary_candidates.append(candidate)
-                    elif all(comment == 'successful' for comment in practical_comments):
-                        normal_progress_candidates.append(candidate)
-                    else:
-                        probationary_candidates.append(candidate)
-                else:
-                    all_comments = [r.comment.lower() for r in candidate_results]
-                    
-                    if all(comment == 'successful' for comment in all_comments):
-                        normal_progress_candidates.append(candidate)
-                    else:
-                        probationary_candidates.append(candidate)
-            
-            # Calculate gender breakdowns for Completed Successfully
-            np_total = len(normal_progress_candidates)
-            np_female = sum(1 for c in normal_progress_candidates if c.gender == 'F')
-            np_male = sum(1 for c in normal_progress_candidates if c.gender == 'M')
-            np_pct = (np_total / registered_total * 100) if registered_total > 0 else 0.0
-            
-            # Calculate gender breakdowns for Probationary Pass
-            pp_total = len(probationary_candidates)
-            pp_female = sum(1 for c in probationary_candidates if c.gender == 'F')
-            pp_male = sum(1 for c in probationary_candidates if c.gender == 'M')
-            pp_pct = (pp_total / registered_total * 100) if registered_total > 0 else 0.0
-            
-            center_table_data.append([
-                str(i),
-                occ['occupation__code'] or 'Unknown',
-                # Registered: F, M, TT, %
-                str(registered_female),
-                str(registered_male),
-                str(registered_total),
-                f"{registered_pct:.1f}",
-                # Missing: F, M, TT, %
-                str(missing_female),
-                str(missing_male),
-                str(missing_total),
-                f"{missing_pct:.1f}",
-                # Assessed: F, M, TT, %
-                str(sat_female),
-                str(sat_male),
-                str(sat_total),
-                f"{sat_pct:.1f}",
-                # Completed Successfully: F, M, TT, %
-                str(np_female),
-                str(np_male),
-                str(np_total),
-                f"{np_pct:.1f}",
-                # Unsuccessful: F, M, TT, %
-                str(pp_female),
-                str(pp_male),
-                str(pp_total),
-                f"{pp_pct:.1f}"
-            ])
-        
-        # Center totals with actual calculations and gender breakdown
-        center_total = center_candidates.count()
-        center_total_female = center_candidates.filter(gender='F').count()
-        center_total_male = center_candidates.filter(gender='M').count()
-        center_total_pct = 100.0 if center_total > 0 else 0.0
-        
-        # Calculate center totals
-        center_total_with_results = center_candidates.filter(
-            result__isnull=False
-        ).distinct()
-        center_total_without_results = center_candidates.exclude(
-            id__in=center_total_with_results.values_list('id', flat=True)
-        )
-        
-        center_total_missing = center_total_without_results.count()
-        center_total_missing_female = center_total_without_results.filter(gender='F').count()
-        center_total_missing_male = center_total_without_results.filter(gender='M').count()
-        center_total_missing_pct = (center_total_missing / center_total * 100) if center_total > 0 else 0.0
-        
-        center_total_sat_for_exams = center_total_with_results.count()
-        center_total_sat_female = center_total_with_results.filter(gender='F').count()
-        center_total_sat_male = center_total_with_results.filter(gender='M').count()
-        center_total_sat_pct = (center_total_sat_for_exams / center_total * 100) if center_total > 0 else 0.0
-        
-        # Calculate center total Normal Progress (NP) and Probationary Pass (PP) with gender breakdown
-        center_total_normal_progress_candidates = []
-        center_total_probationary_candidates = []
-        
-        for candidate in center_total_with_results:
-            candidate_results = candidate.result_set.all()
-            
-            if not candidate_results.exists():
-                continue
-            
-            practical_results = candidate_results.filter(assessment_type='practical')
-            
-            if practical_results.exists():
-                practical_comments = [r.comment.lower() for r in practical_results]
-                
-                if any(comment in ['unsuccessful', 'ctr', 'fail'] for comment in practical_comments):
-                    center_total_probationary_candidates.append(candidate)
-                elif all(comment == 'successful' for comment in practical_comments):
-                    center_total_normal_progress_candidates.append(candidate)
-                else:
-                    center_total_probationary_candidates.append(candidate)
-            else:
-                all_comments = [r.comment.lower() for r in candidate_results]
-                
-                if all(comment == 'successful' for comment in all_comments):
-                    center_total_normal_progress_candidates.append(candidate)
-                else:
-                    center_total_probationary_candidates.append(candidate)
-        
-        # Calculate gender breakdowns for center totals
-        center_total_np = len(center_total_normal_progress_candidates)
-        center_total_np_female = sum(1 for c in center_total_normal_progress_candidates if c.gender == 'F')
-        center_total_np_male = sum(1 for c in center_total_normal_progress_candidates if c.gender == 'M')
-        center_total_np_pct = (center_total_np / center_total * 100) if center_total > 0 else 0.0
-        
-        center_total_pp = len(center_total_probationary_candidates)
-        center_total_pp_female = sum(1 for c in center_total_probationary_candidates if c.gender == 'F')
-        center_total_pp_male = sum(1 for c in center_total_probationary_candidates if c.gender == 'M')
-        center_total_pp_pct = (center_total_pp / center_total * 100) if center_total > 0 else 0.0
-        
-        center_table_data.append([
-            'TOTAL',
-            '',
-            # Registered: F, M, TT, %
-            str(center_total_female),
-            str(center_total_male),
-            str(center_total),
-            f"{center_total_pct:.1f}",
-            # Missing: F, M, TT, %
-            str(center_total_missing_female),
-            str(center_total_missing_male),
-            str(center_total_missing),
-            f"{center_total_missing_pct:.1f}",
-            # Assessed: F, M, TT, %
-            str(center_total_sat_female),
-            str(center_total_sat_male),
-            str(center_total_sat_for_exams),
-            f"{center_total_sat_pct:.1f}",
-            # Completed Successfully: F, M, TT, %
-            str(center_total_np_female),
-            str(center_total_np_male),
-            str(center_total_np),
-            f"{center_total_np_pct:.1f}",
-            # Unsuccessful: F, M, TT, %
-            str(center_total_pp_female),
-            str(center_total_pp_male),
-            str(center_total_pp),
-            f"{center_total_pp_pct:.1f}"
-        ])
-        
-        # Column widths for center table: S/N, Program, then 4 columns each for 5 metrics = 22 total columns
-        center_col_widths = [
-            0.8*inch,  # S/N
-            1.2*inch,  # Program code
-            # Registered: F, M, TT, %
-            0.4*inch, 0.4*inch, 0.5*inch, 0.5*inch,
-            # Missing: F, M, TT, %
-            0.4*inch, 0.4*inch, 0.5*inch, 0.5*inch,
-            # Assessed: F, M, TT, %
-            0.4*inch, 0.4*inch, 0.5*inch, 0.5*inch,
-            # Completed Successfully: F, M, TT, %
-            0.4*inch, 0.4*inch, 0.5*inch, 0.5*inch,
-            # Unsuccessful: F, M, TT, %
-            0.4*inch, 0.4*inch, 0.5*inch, 0.5*inch
-        ]
-        
-        center_table = Table(center_table_data, colWidths=center_col_widths)
-        center_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.Color(0.2, 0.4, 0.8)),  # Blue header
-            ('BACKGROUND', (0, 1), (-1, 1), colors.Color(0.3, 0.5, 0.9)),  # Blue sub-header
-            ('TEXTCOLOR', (0, 0), (-1, 1), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 9),
-            ('FONTSIZE', (0, 1), (-1, 1), 8),
-            ('FONTSIZE', (0, 2), (-1, -1), 8),
-            ('BOTTOMPADDING', (0, 0), (-1, 1), 8),
-            # Column spanning for center table headers
-            ('SPAN', (2, 0), (5, 0)),   # Registered spans 4 columns
-            ('SPAN', (6, 0), (9, 0)),   # Absent spans 4 columns
-            ('SPAN', (10, 0), (13, 0)), # Assessed spans 4 columns
-            ('SPAN', (14, 0), (17, 0)), # Completed Successfully spans 4 columns
-            ('SPAN', (18, 0), (21, 0)), # Unsuccessful spans 4 columns
-            ('BACKGROUND', (0, 2), (-1, -2), colors.Color(0.9, 0.95, 1.0)),  # Light blue rows
-            ('BACKGROUND', (0, -1), (-1, -1), colors.Color(0.7, 0.85, 0.95)),  # Darker blue for totals
-            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),  # Bold totals row
-            ('BOX', (0, 0), (-1, -1), 1, colors.Color(0.3, 0.5, 0.9)),  # Blue outer border only
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('ROWBACKGROUNDS', (0, 2), (-1, -2), [colors.Color(0.95, 0.98, 1.0), colors.Color(0.9, 0.95, 1.0)])
-        ]))
+        center_table = Table(center_table_data, colWidths=col_widths)
+        center_table.setStyle(TableStyle(performance_table_style))
         
         elements.append(center_table)
         
         # Add page break if not the last center
-        if center_data != list(centers)[-1]:
+        if center_index < len(centers) - 1:
             elements.append(PageBreak())
     
     # Build PDF
     doc.build(elements)
     
-    # Get the value of the BytesIO buffer and create response
-    pdf = buffer.getvalue()
-    buffer.close()
-    
     # Performance monitoring
-    end_time = time.time()
-    execution_time = end_time - start_time
-    query_count = len(connection.queries)
-    print(f"[PERFORMANCE] Report generation completed in {execution_time:.2f} seconds")
-    print(f"[PERFORMANCE] Total database queries: {query_count}")
-    print(f"[PERFORMANCE] Report generated at {time.strftime('%Y-%m-%d %H:%M:%S')}")
+    execution_time = time.time() - start_time
+    logger.debug("Performance report %s/%s built in %.2f seconds", year, month, execution_time)
     
     # Create PDF response
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="performance_report_{category}_{year}_{month}.pdf"'
-    response.write(pdf)
-    
-    return response
+    return pdf_response(buffer, f"performance_report_{category}_{year}_{month}.pdf")
 
     def get_candidate_filter_urls(assessment_year=None, assessment_month=None):
         """Generate common filter URLs for statistics templates"""
@@ -14390,18 +12587,17 @@ def assessment_series_toggle_results(request, pk):
 @login_required
 def assessment_series_statistical_report(request, pk):
     """Generate a statistical PDF report for a specific Assessment Series"""
+    from django.db.models import Sum
+    from .utilis.series_stats import series_stats, total
     series = get_object_or_404(AssessmentSeries, pk=pk)
     
-    # Get candidates linked to this assessment series
-    candidates = Candidate.objects.filter(assessment_series=series)
-    
-    # Create the HttpResponse object with PDF headers
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="Assessment_Series_Report_{series.name.replace(" ", "_")}.pdf"'
+    # Pre-aggregated counts for candidates linked to this assessment series
+    cube = series_stats(series)
+    total_candidates = total(cube)
     
     # Create the PDF object
     from reportlab.lib.pagesizes import landscape, A4
-    buffer = BytesIO()
+    buffer = spooled_buffer()
     # Reduce left/right margins to allow more table width
     doc = SimpleDocTemplate(
         buffer,
@@ -14451,7 +12647,7 @@ def assessment_series_statistical_report(request, pk):
     <b>Series Period:</b> {series.start_date.strftime('%B %d, %Y')} - {series.end_date.strftime('%B %d, %Y')}<br/>
     <b>Results Release Date:</b> {series.date_of_release.strftime('%B %d, %Y')}<br/>
     <b>Report Generated:</b> {datetime.now().strftime('%B %d, %Y at %I:%M %p')}<br/>
-    <b>Total Enrolled Candidates:</b> {candidates.count()}
+    <b>Total Enrolled Candidates:</b> {total_candidates}
     """
     elements.append(Paragraph(series_info, normal_style))
     elements.append(Spacer(1, 20))
@@ -14459,10 +12655,9 @@ def assessment_series_statistical_report(request, pk):
     # 1. GENDER DISTRIBUTION
     elements.append(Paragraph("1. GENDER DISTRIBUTION", heading_style))
     
-    gender_stats = candidates.values('gender').annotate(count=Count('gender')).order_by('gender')
+    gender_stats = cube.values('gender').annotate(count=Sum('candidate_count')).order_by('gender')
     gender_data = [['Gender', 'Count', 'Percentage']]
     
-    total_candidates = candidates.count()
     for stat in gender_stats:
         gender_name = 'Male' if stat['gender'] == 'M' else 'Female'
         percentage = (stat['count'] / total_candidates * 100) if total_candidates > 0 else 0
@@ -14488,8 +12683,8 @@ def assessment_series_statistical_report(request, pk):
     # 2. SPECIAL NEEDS DISTRIBUTION
     elements.append(Paragraph("2. SPECIAL NEEDS DISTRIBUTION", heading_style))
     
-    special_needs_count = candidates.filter(disability=True).count()
-    no_special_needs_count = candidates.filter(disability=False).count()
+    special_needs_count = total(cube, disability=True)
+    no_special_needs_count = total(cube, disability=False)
     
     special_needs_data = [['Category', 'Count', 'Percentage']]
     
@@ -14520,20 +12715,16 @@ def assessment_series_statistical_report(request, pk):
         elements.append(Spacer(1, 10))
         elements.append(Paragraph("2.1 Nature of Disabilities", ParagraphStyle('SubHeading', parent=styles['Heading3'], fontSize=12, spaceAfter=8)))
         
-        # Get all disability natures for candidates in this series
-        disability_stats = []
-        special_needs_candidates = candidates.filter(disability=True)
-        
-        for candidate in special_needs_candidates:
-            for disability in candidate.nature_of_disability.all():
-                disability_stats.append(disability.name)
-        
-        # Count occurrences
-        disability_counts = Counter(disability_stats)
+        # Nature of disability is not a cube dimension; count it in one grouped query
+        disability_counts = Candidate.objects.filter(
+            assessment_series=series,
+            disability=True,
+            nature_of_disability__isnull=False,
+        ).values('nature_of_disability__name').annotate(count=Count('id')).order_by('-count', 'nature_of_disability__name')
         
         disability_data = [['Nature of Disability', 'Count']]
-        for disability_name, count in disability_counts.most_common():
-            disability_data.append([disability_name, str(count)])
+        for row in disability_counts:
+            disability_data.append([row['nature_of_disability__name'], str(row['count'])])
         
         if not disability_counts:
             disability_data.append(['No specific disabilities recorded', '-'])
@@ -14556,12 +12747,12 @@ def assessment_series_statistical_report(request, pk):
     # 3. ASSESSMENT CENTERS BREAKDOWN
     elements.append(Paragraph("3. ASSESSMENT CENTERS", heading_style))
 
-    center_qs = candidates.values(
+    center_qs = cube.values(
         'assessment_center__center_name'
     ).annotate(
-        total=Count('id'),
-        male=Count('id', filter=Q(gender='M')),
-        female=Count('id', filter=Q(gender='F'))
+        total=Sum('candidate_count', default=0),
+        male=Sum('candidate_count', filter=Q(gender='M'), default=0),
+        female=Sum('candidate_count', filter=Q(gender='F'), default=0)
     ).order_by('-total')
 
     # Short, compact headers to avoid clipping
@@ -14640,11 +12831,11 @@ def assessment_series_statistical_report(request, pk):
     # 4. OCCUPATIONS ENROLLED
     elements.append(Paragraph("4. OCCUPATIONS ENROLLED", heading_style))
     
-    occupation_stats = candidates.values(
+    occupation_stats = cube.values(
         'occupation__name', 
         'occupation__category__name'
     ).annotate(
-        count=Count('occupation')
+        count=Sum('candidate_count')
     ).order_by('occupation__category__name', 'occupation__name')
     
     # Short, compact headers to avoid clipping
@@ -14724,12 +12915,8 @@ def assessment_series_statistical_report(request, pk):
     # Build PDF
     doc.build(elements)
     
-    # Get the value of the BytesIO buffer and write it to the response
-    pdf = buffer.getvalue()
-    buffer.close()
-    response.write(pdf)
-    
-    return response
+    filename = f"Assessment_Series_Report_{series.name.replace(' ', '_')}.pdf"
+    return pdf_response(buffer, filename)
 
 
 @login_required
@@ -15080,10 +13267,9 @@ def awards_list(request):
     if center:
         qs = qs.filter(assessment_center_id=center)
     if category:
-        qs = qs.filter(registration_category__iexact=category)
+        qs = qs.filter(registration_category_code=registration_category_code(category))
     if q:
-        from django.db.models import Q
-        qs = qs.filter(Q(full_name__icontains=q) | Q(reg_number__icontains=q))
+        qs = qs.filter(search_filter(q))
 
     # Build querystring (without page) for pagination links
     from urllib.parse import urlencode
@@ -15877,10 +14063,9 @@ def helpdesk_team_delete(request, pk):
 @login_required
 def complaint_attachment_view(request, attachment_id):
     """Serve complaint attachment files."""
-    from django.http import HttpResponse, Http404
+    from django.http import Http404
     from django.shortcuts import get_object_or_404
-    import mimetypes
-    import os
+    from .utilis.file_responses import serve_file
     
     attachment = get_object_or_404(ComplaintAttachment, id=attachment_id)
     complaint = attachment.complaint
@@ -15895,26 +14080,12 @@ def complaint_attachment_view(request, attachment_id):
             raise Http404("Attachment not found")
     
     try:
-        # Get the file path
         file_path = attachment.file.path
-        
-        # Check if file exists
-        if not os.path.exists(file_path):
-            raise Http404("File not found")
-        
-        # Determine content type
-        content_type, _ = mimetypes.guess_type(file_path)
-        if not content_type:
-            content_type = 'application/octet-stream'
-        
-        # Read and serve the file
-        with open(file_path, 'rb') as f:
-            response = HttpResponse(f.read(), content_type=content_type)
-            response['Content-Disposition'] = f'inline; filename="{attachment.filename}"'
-            return response
-            
-    except Exception as e:
+    except Exception:
         raise Http404("File not found")
+    
+    # Streamed (or handed to the web server), with Range and conditional GET support
+    return serve_file(request, file_path, attachment.filename)
 
 
 # Practical Assessor Management Views
@@ -16250,7 +14421,7 @@ def generate_marksheets_for_assignment(assignment):
             assessment_center=assignment.assessment_center,
             assessment_series=assignment.assessment_series,
             occupation=occupation,
-            registration_category=registration_category
+            registration_category_code=registration_category_code(registration_category.name)
         )
         
         # Further filter based on level or module
@@ -1,7 +1,7 @@
 from django.shortcuts import render, get_object_or_404
 from django.http import JsonResponse, HttpResponse
 from django.db import models
-from django.db.models import Q, Count, F, Value, DecimalField, ExpressionWrapper, Subquery, OuterRef
+from django.db.models import Q, F, Value, DecimalField, ExpressionWrapper, Subquery, OuterRef
 from django.db.models.functions import Coalesce
 from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
 from django.contrib.auth.decorators import login_required
@@ -12,6 +12,12 @@ from django.utils import timezone
 import io
 import json
 from urllib.parse import urlencode
+from .utilis.file_responses import spooled_buffer, pdf_response
+from .utilis.candidate_search import search_filter
+from .utilis.keyset_pagination import KeysetPaginator
+from .utilis.count_cache import CachedCountPaginator
+from .utilis.enrollment_flags import billed_q
+from .utilis.registration_category import registration_category_code
 
 # ReportLab imports for PDF generation
 from reportlab.pdfgen import canvas
@@ -54,19 +60,13 @@ def uvtab_fees_home(request):
         user_center = None
     
     # Base queryset: ALL billed/enrolled candidates (both paid and unpaid)
-    qs = Candidate.objects.filter(
-        Q(candidatelevel__isnull=False) |
-        Q(registration_category__iexact='modular', modular_module_count__in=[1, 2]) |
-        Q(registration_category__iexact='modular', candidatemodule__isnull=False) |
-        Q(fees_balance__gt=0) |
-        Q(payment_cleared=True)
-    )
+    qs = Candidate.objects.filter(billed_q())
     if user_center:
         qs = qs.filter(assessment_center=user_center)
     if user_branch_id:
         qs = qs.filter(assessment_center_branch_id=user_branch_id)
     # Only fetch fields we show; pull related foreign keys in one go
-    qs = qs.select_related('assessment_center', 'occupation', 'assessment_series').distinct()
+    qs = qs.select_related('assessment_center', 'occupation', 'assessment_series')
 
     # Filters for redesigned list
     search = (request.GET.get('search') or '').strip()
@@ -78,8 +78,7 @@ def uvtab_fees_home(request):
 
     if search:
         qs = qs.filter(
-            Q(full_name__icontains=search) |
-            Q(reg_number__icontains=search) |
+            search_filter(search) |
             Q(assessment_center__center_name__icontains=search)
         )
     if center_id:
@@ -87,13 +86,13 @@ def uvtab_fees_home(request):
     if series_id:
         qs = qs.filter(assessment_series_id=series_id)
     if category:
-        qs = qs.filter(registration_category__iexact=category)
+        qs = qs.filter(registration_category_code=registration_category_code(category))
     if occupation_id:
         qs = qs.filter(occupation_id=occupation_id)
 
     # Lightweight annotations for counts and totals (explicit Decimal output)
     qs = qs.annotate(
-        module_count=Count('candidatemodule', distinct=True),
+        module_count=F('enrolled_module_count'),
         amount_paid=Coalesce(
             F('payment_amount_cleared'),
             Value(Decimal('0.00')),
@@ -123,21 +122,15 @@ def uvtab_fees_home(request):
     elif payment_status == 'not_paid':
         qs = qs.filter(Q(total_amount__gt=0) & ~Q(fees_balance=0) | Q(total_amount=0))
 
-    # Pagination directly on queryset — allow variable page_size
-    page_number = request.GET.get('page')
+    # Keyset pagination on the sort keys — allow variable page_size
     try:
         page_size = int(request.GET.get('page_size') or 25)
     except ValueError:
         page_size = 25
     if page_size not in [10, 25, 50, 100]:
         page_size = 25
-    paginator = Paginator(qs.order_by('-total_amount', '-fees_balance', 'reg_number'), page_size)
-    try:
-        page_qs = paginator.page(page_number)
-    except PageNotAnInteger:
-        page_qs = paginator.page(1)
-    except EmptyPage:
-        page_qs = paginator.page(paginator.num_pages)
+    paginator = KeysetPaginator(qs, page_size, ordering=('-total_amount', '-fees_balance', 'reg_number'))
+    page_qs = paginator.get_page(request.GET.get('cursor'))
 
     # Build lightweight items for current page
     page_items = []
@@ -224,7 +217,7 @@ def uvtab_fees_home(request):
     fees_by_category = {}
     for category in ['Formal', 'Modular', 'Informal']:
         category_qs = Candidate.objects.filter(
-            registration_category=category,
+            registration_category_code=registration_category_code(category),
             fees_balance__gt=0
         )
         if user_center:
@@ -234,7 +227,7 @@ def uvtab_fees_home(request):
         category_fees = category_qs.aggregate(total=models.Sum('fees_balance'))['total'] or Decimal('0.00')
 
         category_count_qs = Candidate.objects.filter(
-            registration_category=category,
+            registration_category_code=registration_category_code(category),
             fees_balance__gt=0
         )
         if user_center:
@@ -287,10 +280,11 @@ def uvtab_fees_home(request):
     # Build query string without 'page' for pagination links
     qs_params = request.GET.copy()
     qs_params.pop('page', None)
+    qs_params.pop('cursor', None)
     query_no_page = urlencode([(k, v) for k, v in qs_params.items() if v])
 
     context = {
-        'total_candidates': qs.count(),
+        'total_candidates': paginator.count,
         'candidates_with_fees': (Candidate.objects.filter(fees_balance__gt=0, assessment_center=user_center, **({'assessment_center_branch_id': user_branch_id} if user_branch_id else {})).count() if user_center else Candidate.objects.filter(fees_balance__gt=0).count()),
         'total_fees': total_fees,
         'amount_paid': amount_paid,
@@ -346,8 +340,7 @@ def candidate_fees_list(request):
     search_query = request.GET.get('search', '')
     if search_query:
         candidates = candidates.filter(
-            models.Q(full_name__icontains=search_query) |
-            models.Q(reg_number__icontains=search_query) |
+            search_filter(search_query) |
             models.Q(assessment_center__center_name__icontains=search_query) |
             models.Q(occupation__name__icontains=search_query) |
             models.Q(assessment_series__name__icontains=search_query)
@@ -356,7 +349,7 @@ def candidate_fees_list(request):
     # Add filtering by registration category
     category_filter = request.GET.get('category', '')
     if category_filter:
-        candidates = candidates.filter(registration_category=category_filter)
+        candidates = candidates.filter(registration_category_code=registration_category_code(category_filter))
     
     # Add filtering by assessment center
     center_filter = request.GET.get('center', '')
@@ -369,7 +362,7 @@ def candidate_fees_list(request):
         candidates = candidates.filter(assessment_series_id=series_filter)
     
     # Pagination
-    paginator = Paginator(candidates, 25)  # Show 25 candidates per page
+    paginator = CachedCountPaginator(candidates, 25)  # Show 25 candidates per page
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
@@ -420,16 +413,7 @@ def center_fees_list(request):
     
     # Get ALL candidates who have been billed or enrolled (level or modular)
     # CRITICAL: Include payment_cleared=True to count historically cleared/paid candidates
-    candidates_with_billing = Candidate.objects.filter(
-        (
-            Q(candidatelevel__isnull=False) |
-            Q(registration_category__iexact='modular', modular_module_count__in=[1, 2]) |
-            Q(registration_category__iexact='modular', candidatemodule__isnull=False) |
-            Q(fees_balance__gt=0) |
-            Q(payment_cleared=True)  # Include historically cleared/paid candidates
-        ),
-        assessment_center__isnull=False
-    )
+    candidates_with_billing = Candidate.objects.filter(billed_q(), assessment_center__isnull=False)
     try:
         cr = CenterRepresentative.objects.get(user=request.user)
         candidates_with_billing = candidates_with_billing.filter(assessment_center=cr.center)
@@ -455,7 +439,7 @@ def center_fees_list(request):
     if center_no:
         candidates_with_billing = candidates_with_billing.filter(assessment_center__center_number__icontains=center_no)
 
-    candidates_with_billing = candidates_with_billing.distinct().select_related('assessment_center', 'assessment_series', 'assessment_center__district', 'assessment_center__village')
+    candidates_with_billing = candidates_with_billing.select_related('assessment_center', 'assessment_series', 'assessment_center__district', 'assessment_center__village')
     
     # Group by center and assessment series
     center_series_data = {}
@@ -563,20 +547,12 @@ def center_fees_list(request):
         # Re-compute candidate count using the SAME billing query used by modal/PDF
         # to avoid any edge-case discrepancies from in-memory grouping
         try:
-            billing_qs = Candidate.objects.filter(
-                assessment_center=center
-            ).filter(
-                Q(candidatelevel__isnull=False) |
-                Q(registration_category__iexact='modular', modular_module_count__in=[1, 2]) |
-                Q(registration_category__iexact='modular', candidatemodule__isnull=False) |
-                Q(fees_balance__gt=0) |
-                Q(payment_cleared=True)
-            )
+            billing_qs = Candidate.objects.filter(billed_q(), assessment_center=center)
             if series:
                 billing_qs = billing_qs.filter(assessment_series=series)
             else:
                 billing_qs = billing_qs.filter(assessment_series__isnull=True)
-            candidate_count_exact = billing_qs.distinct().count()
+            candidate_count_exact = billing_qs.count()
         except Exception:
             # Fallback to grouped count if anything goes wrong
             candidate_count_exact = data['candidate_count']
@@ -677,27 +653,9 @@ def center_candidates_report(request, center_id, series_id=None):
     try:
         # Get ALL candidates for this center-series combination (both paid and unpaid)
         # Include: level enrollments, modular billed/enrolled, any positive fees_balance, OR paid candidates
-        try:
-            # Include payment_cleared to capture all paid candidates
-            candidates_query = Candidate.objects.filter(
-                assessment_center=center
-            ).filter(
-                Q(candidatelevel__isnull=False) |
-                Q(registration_category__iexact='modular', modular_module_count__in=[1, 2]) |
-                Q(registration_category__iexact='modular', candidatemodule__isnull=False) |
-                Q(fees_balance__gt=0) |
-                Q(payment_cleared=True)
-            ).distinct().select_related('occupation', 'assessment_series')
-        except:
-            # Fallback if payment_cleared column doesn't exist
-            candidates_query = Candidate.objects.filter(
-                assessment_center=center
-            ).filter(
-                Q(candidatelevel__isnull=False) |
-                Q(registration_category__iexact='modular', modular_module_count__in=[1, 2]) |
-                Q(registration_category__iexact='modular', candidatemodule__isnull=False) |
-                Q(fees_balance__gt=0)
-            ).distinct().select_related('occupation', 'assessment_series')
+        candidates_query = Candidate.objects.filter(
+            billed_q(), assessment_center=center
+        ).select_related('occupation', 'assessment_series')
         # If the requesting user is a Branch CenterRep, restrict to their branch
         try:
             cr = CenterRepresentative.objects.get(user=request.user)
@@ -897,27 +855,9 @@ def generate_pdf_invoice(request, center_id, series_id=None):
     
     # Get ALL candidates for this center-series combination (both paid and unpaid)
     # Use the same logic as the audit command - include enrolled AND paid candidates
-    try:
-        # Include payment_cleared to capture all paid candidates
-        candidates_query = Candidate.objects.filter(
-            assessment_center=center
-        ).filter(
-            Q(candidatelevel__isnull=False) |
-            Q(registration_category__iexact='modular', modular_module_count__in=[1, 2]) |
-            Q(registration_category__iexact='modular', candidatemodule__isnull=False) |
-            Q(fees_balance__gt=0) |
-            Q(payment_cleared=True)
-        ).distinct().select_related('occupation', 'assessment_series')
-    except:
-        # Fallback if payment_cleared column doesn't exist
-        candidates_query = Candidate.objects.filter(
-            assessment_center=center
-        ).filter(
-            Q(candidatelevel__isnull=False) |
-            Q(registration_category__iexact='modular', modular_module_count__in=[1, 2]) |
-            Q(registration_category__iexact='modular', candidatemodule__isnull=False) |
-            Q(fees_balance__gt=0)
-        ).distinct().select_related('occupation', 'assessment_series')
+    candidates_query = Candidate.objects.filter(
+        billed_q(), assessment_center=center
+    ).select_related('occupation', 'assessment_series')
     
     if assessment_series:
         candidates_query = candidates_query.filter(assessment_series=assessment_series)
@@ -1065,10 +1005,7 @@ def generate_pdf_invoice(request, center_id, series_id=None):
         series_code = 'NONE'
     invoice_number = f"{center.center_number}-{series_code.upper()}-{total_candidates:03d}"
     
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    buffer = io.BytesIO()
+    buffer = spooled_buffer()
     # Use landscape for detailed invoices to prevent column clipping (e.g., long Reg. Numbers)
     page_size = landscape(A4) if (request.GET.get('type', 'summary') == 'detailed') else A4
     doc = SimpleDocTemplate(buffer, pagesize=page_size, topMargin=0.5*inch, bottomMargin=0.5*inch)
@@ -1446,10 +1383,7 @@ def generate_pdf_invoice(request, center_id, series_id=None):
     doc.build(elements)
     
     # Return PDF
-    pdf = buffer.getvalue()
-    buffer.close()
-    response.write(pdf)
-    return response
+    return pdf_response(buffer, filename)
 
 @login_required
 @require_POST